@@ -0,0 +1,7 @@
+"""Helpers shared by the benchmark scripts."""
+
+
+def check(label, ok, detail=""):
+    """Print one check's verdict (``ok`` or ``FAIL``) with its detail; returns ``ok``."""
+    print(f"  {'ok  ' if ok else 'FAIL'} {label}{': ' + detail if detail else ''}")
+    return ok
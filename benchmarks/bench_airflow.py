@@ -0,0 +1,119 @@
+"""Checks and zone-steps/s of the zonal airflow solver (``corridor.airflow``).
+
+Checks (exit status 1 on any failure):
+
+* a closed building (no vents, no losses) keeps every species' total;
+* two rooms joined by one door and isolated vented rooms follow the
+  closed-form discrete solution;
+* without sources every reading stays between its start and outdoor levels;
+* buildings stepped in lock-step match the same buildings stepped alone.
+
+Then it times ``--steps`` one-second ticks of the villa (7 zones) with
+random vents, door states and a kitchen smoke source, for each building
+count, and reports zone-steps/s and how many times faster than real time
+the whole batch runs.
+
+    python benchmarks/bench_airflow.py [--buildings 1 100 1000 10000] [--steps 600]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, "..")
+sys.path.insert(0, ROOT)
+
+from benchmarks._common import check  # noqa: E402
+from corridor.airflow import (  # noqa: E402
+    HOUSE, LOSS, OUTDOOR, SPECIES, Connection, amounts, building, initial, simulate,
+)
+from corridor.sensors import ROOMS, VENT_FACTORS  # noqa: E402
+
+NO_LOSS = dict.fromkeys(SPECIES, 0.0)
+
+
+def random_case(count, rng):
+    smoke = np.zeros((count, len(ROOMS)))
+    smoke[:, 0] = rng.uniform(0, 100, count)
+    c0 = initial(count, smoke=smoke, co2=rng.uniform(400, 2000, (count, len(ROOMS))),
+                 pm25=rng.uniform(0, 200, (count, len(ROOMS))))
+    vents = rng.integers(0, 4, (count, len(ROOMS)))
+    openness = rng.uniform(0, 1, (count, len(HOUSE.connections)))
+    return c0, vents, openness
+
+
+def checks(rng):
+    ok = True
+    c0, vents, openness = random_case(50, rng)
+    closed = simulate(c0, 2000, np.zeros_like(vents), openness, loss=NO_LOSS, record=False)
+    drift = np.abs(amounts(closed.final) / amounts(c0) - 1).max()
+    ok &= check("closed building conserves every species", drift < 1e-12, f"max relative drift {drift:.1e}")
+
+    volumes = (300.0, 500.0)
+    pair = building((Connection(0, 1, "door", 0.4),), volumes, rooms=ROOMS[:2], floors=(0, 0))
+    start = initial(1, pair, smoke=np.array([[90.0, 10.0]]))
+    trace = simulate(start, 120, np.zeros((1, 2), int), house=pair, loss=NO_LOSS)
+    n = np.arange(1, 121)
+    gap = 80.0 * (1 - 0.4 * (1 / volumes[0] + 1 / volumes[1])) ** n
+    found = trace.sensors["smoke"][0, 0] - trace.sensors["smoke"][0, 1]
+    error = np.abs(found - gap).max()
+    ok &= check("two rooms, one door: closed form", error < 1e-9, f"max error {error:.1e}")
+
+    alone = building((), HOUSE.volumes, ROOMS, HOUSE.floors)
+    levels = np.arange(4)
+    start = initial(4, alone, smoke=np.full((4, len(ROOMS)), 60.0))
+    trace = simulate(start, 100, np.repeat(levels[:, None], len(ROOMS), axis=1), house=alone)
+    rate = VENT_FACTORS[levels] + LOSS["smoke"]
+    expected = 60.0 * (1 - rate[:, None]) ** np.arange(1, 101)
+    error = np.abs(trace.sensors["smoke"][:, 0] - expected).max()
+    ok &= check("isolated rooms at OFF/LOW/MED/HIGH: closed form", error < 1e-9, f"max error {error:.1e}")
+
+    trace = simulate(c0, 600, vents, openness)
+    for i, metric in enumerate(SPECIES):
+        lo = np.minimum(c0[..., i].min(axis=1), OUTDOOR[metric])[:, None, None]
+        hi = np.maximum(c0[..., i].max(axis=1), OUTDOOR[metric])[:, None, None]
+        values = trace.sensors[metric]
+        inside = bool(((values >= lo - 1e-9) & (values <= hi + 1e-9)).all())
+        ok &= check(f"{metric} stays between start and outdoor levels", inside)
+
+    together = trace.final
+    alone = np.concatenate([simulate(c0[i:i + 1], 600, vents[i:i + 1], openness[i:i + 1], record=False).final
+                            for i in range(len(c0))])
+    error = np.abs(together - alone).max()
+    ok &= check("lock-step batch matches buildings run alone", error < 1e-9, f"max difference {error:.1e}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--buildings", type=int, nargs="+", default=[1, 100, 1000, 10000])
+    parser.add_argument("--steps", type=int, default=600, help="one-second ticks per run")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    print("checks")
+    if not checks(rng):
+        sys.exit(1)
+
+    zones = len(HOUSE.rooms)
+    print(f"\n{zones} zones, {len(HOUSE.connections)} connections, {args.steps} s per run")
+    print(f"{'buildings':>9} {'seconds':>8} {'M zone-steps/s':>15} {'x real time':>12}  kitchen smoke p50/p99 at end")
+    for count in args.buildings:
+        c0, vents, openness = random_case(count, rng)
+        source = np.zeros((count, zones))
+        source[:, 0] = rng.uniform(0, 200, count)
+        start = time.perf_counter()
+        trace = simulate(c0, args.steps, vents, openness, sources={"smoke": source}, record=False)
+        seconds = time.perf_counter() - start
+        rate = count * zones * args.steps / seconds
+        p50, p99 = np.percentile(trace.final[:, 0, 0], [50, 99])
+        print(f"{count:9,} {seconds:8.2f} {rate / 1e6:15.2f} {args.steps / seconds:12,.0f}  "
+              f"{p50:.1f} / {p99:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""Parity, throughput and disagreement map of the reference controller.
+
+Parity (exit status 1 on any mismatch):
+
+* the thresholds in ``corridor.controller`` against the constants in
+  sketch.ino, ripes.s, Readme.md and the deck's ``vars``;
+* ESP32: the decision block of sketch.ino's ``loop()`` is cut out of the
+  sketch, compiled with the host C++ compiler and fed random local and
+  simulation readings (skipped when no compiler is found);
+* RISC-V: ripes.s runs on the headless machine for every value of the
+  switch bits it reads, stopping at draw_green / draw_alarm.
+
+Then it times ``evaluate`` on random readings and prints every region of
+the sensor ranges where the ESP32, RISC-V and README rules disagree,
+cross-checked point by point against batch evaluation.  --check-only runs
+the parity checks and the cross-check on --check-readings readings and skips
+the timing and the list, for CI.
+
+    python benchmarks/bench_controller.py [--readings 10000000] [--check-only]
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, "..")
+sys.path.insert(0, ROOT)
+
+from corridor.controller import (  # noqa: E402
+    DOMAIN, ESP32, README, RISCV, RULE_SETS, SAFE, alarm, describe, disagreements, evaluate, fuse,
+)
+from corridor.riscv import Machine  # noqa: E402
+
+HARNESS = """#include <algorithm>
+#include <cstdio>
+#include <string>
+using std::max;
+typedef std::string String;
+%(constants)s
+int main() {
+    int local_pm25, local_co2, local_smoke, sim_smoke, sim_co2, sim_pm25, sim_temp;
+    while (scanf("%%d %%d %%d %%d %%d %%d %%d", &local_pm25, &local_co2, &local_smoke,
+                 &sim_smoke, &sim_co2, &sim_pm25, &sim_temp) == 7) {
+%(decision)s
+        printf("%%d|%%s|%%s\\n", (int)need_ventilation, status_msg.c_str(), alert_level.c_str());
+    }
+}
+"""
+
+
+def _source(path):
+    with open(os.path.join(ROOT, path), encoding="utf-8") as f:
+        return f.read()
+
+
+def _rule(rule_set, metric):
+    return next(rule.threshold for rule in rule_set.rules if rule.metric == metric)
+
+
+def check_constants():
+    """Thresholds in the sources (and the deck) against the rule data."""
+    sketch = {m.group(1): int(m.group(2)) for m in re.finditer(r"const int THRESH_(\w+) = (\d+);", _source(
+        "wokvi/sketch.ino"))}
+    ripes = {m.group(1): int(m.group(2), 0) for m in re.finditer(r"\.equ THRESH_(\w+),\s+(\w+)", _source(
+        "ripes/ripes.s"))}
+    readme = _source("Readme.md")
+    deck = json.loads(_source("slides/deck.json")).get("vars", {})
+    checks = [(f"sketch.ino THRESH_{name}", sketch.get(name.upper()), _rule(ESP32, metric))
+              for name, metric in (("smoke", "smoke"), ("temp", "temp"), ("pm25", "pm25"), ("co2", "co2"))]
+    checks += [(f"ripes.s THRESH_{name}", ripes.get(name), _rule(RISCV, metric))
+               for name, metric in (("PM25", "pm25"), ("CO2", "co2"))]
+    for label, metric in (("PM2.5", "pm25"), ("CO2", "co2")):
+        found = re.search(r"\*\*%s\*\* > (\d+)" % re.escape(label), readme)
+        checks.append((f"Readme.md {label}", found and int(found.group(1)), _rule(README, metric)))
+    checks += [(f"deck.json {var}", deck.get(var), _rule(ESP32, metric))
+               for var, metric in (("thresh_smoke", "smoke"), ("thresh_temp", "temp"), ("thresh_pm25", "pm25"))]
+    checks.append(("deck.json riscv_thresh_pm25", deck.get("riscv_thresh_pm25"), _rule(RISCV, "pm25")))
+    failures = [(label, found, expected) for label, found, expected in checks if found != expected]
+    for label, found, expected in failures:
+        print(f"  MISMATCH {label} = {found}, rules say {expected}")
+    print(f"constants: {len(checks) - len(failures)}/{len(checks)} match")
+    return not failures
+
+
+def check_sketch(count, rng):
+    """sketch.ino's own decision code against ESP32 + fuse on random readings."""
+    compiler = shutil.which("g++") or shutil.which("clang++")
+    if compiler is None:
+        print("sketch.ino: skipped, no C++ compiler")
+        return True
+    sketch = _source("wokvi/sketch.ino")
+    constants = "\n".join(re.findall(r"const int THRESH_\w+ = \d+;", sketch))
+    decision = sketch[sketch.index("// --- COMBINE DATA"):sketch.index("// --- ACTUATE LOCAL HARDWARE")]
+    with tempfile.TemporaryDirectory() as tmp:
+        source, binary = os.path.join(tmp, "decide.cpp"), os.path.join(tmp, "decide")
+        with open(source, "w") as f:
+            f.write(HARNESS % {"constants": constants, "decision": decision})
+        subprocess.run([compiler, "-O1", "-o", binary, source], check=True)
+        local = {"pm25": rng.integers(0, 201, count), "co2": rng.integers(400, 2001, count),
+                 "smoke": rng.integers(0, 2, count)}
+        sim = {"smoke": rng.integers(0, 101, count), "co2": rng.integers(400, 2001, count),
+               "pm25": rng.integers(0, 201, count), "temp": rng.integers(0, 61, count)}
+        # Mostly calm simulation readings, so every rule gets its turn to decide
+        calm = rng.random(count) < 0.5
+        sim["smoke"][calm] = 0
+        local["smoke"][rng.random(count) < 0.8] = 0
+        columns = [local["pm25"], local["co2"], local["smoke"], sim["smoke"], sim["co2"], sim["pm25"], sim["temp"]]
+        stdin = "\n".join(" ".join(map(str, row)) for row in zip(*(c.tolist() for c in columns)))
+        out = subprocess.run([binary], input=stdin, capture_output=True, text=True, check=True).stdout.split("\n")
+    verdicts = evaluate(ESP32, fuse(local, sim))
+    failures = 0
+    for i, line in enumerate(out[:count]):
+        vent, status, level = line.split("|")
+        rule = ESP32.rules[verdicts[i]] if verdicts[i] != SAFE else None
+        expected = ("1", rule.status, rule.level) if rule else ("0", "SAFE", "normal")
+        if (vent, status, level) != expected:
+            if failures < 5:
+                print(f"  MISMATCH sketch.ino {[int(c[i]) for c in columns]}: {line} != {'|'.join(expected)}")
+            failures += 1
+    print(f"sketch.ino: {count - failures:,}/{count:,} decisions match ({os.path.basename(compiler)})")
+    return failures == 0
+
+
+def check_ripes():
+    """ripes.s on the machine for every smoke/PM2.5 and CO2 switch value it reads."""
+    machine = Machine.from_file(os.path.join(ROOT, "ripes", "ripes.s"))
+    symbols = machine.program.symbols
+    machine.run(until="main_loop")
+    machine.add_breakpoint(symbols["draw_green"])
+    machine.add_breakpoint(symbols["draw_alarm"])
+    bank0, bank1 = np.meshgrid(np.arange(256), np.arange(256), indexing="ij")
+    bank0, bank1 = bank0.ravel(), bank1.ravel()
+    # Switches above the fields it reads must not matter
+    bank0 = bank0 | (np.arange(len(bank0)) % 7 << 8)
+    bank1 = bank1 | (np.arange(len(bank1)) % 5 << 8)
+    start = time.perf_counter()
+    alarmed = np.empty(len(bank0), bool)
+    for i, (sw0, sw1) in enumerate(zip(bank0.tolist(), bank1.tolist())):
+        machine.set_switches(0, sw0)
+        machine.set_switches(1, sw1)
+        machine.pc = symbols["main_loop"]
+        machine.run()
+        alarmed[i] = machine.pc == symbols["draw_alarm"]
+    seconds = time.perf_counter() - start
+    raw = {"smoke": bank0 & 1, "pm25": (bank0 >> 1) & 0x7F, "co2": bank1 & 0xFF}
+    expected = alarm(RISCV._replace(fields={}), raw)
+    failures = int((expected != alarmed).sum())
+    print(f"ripes.s: {len(bank0) - failures:,}/{len(bank0):,} switch settings match ({seconds:.1f} s on the machine)")
+    return failures == 0
+
+
+def random_readings(count, rng):
+    return {metric: rng.integers(lo, hi + 1, count).astype(np.int16) for metric, (lo, hi) in DOMAIN.items()}
+
+
+def check_map(regions, readings):
+    """Every reading must be disputed exactly when it falls in one of ``regions``."""
+    count = len(next(iter(readings.values())))
+    alarms = np.stack([alarm(rule_set, readings) for rule_set in RULE_SETS])
+    sampled = alarms.any(axis=0) & ~alarms.all(axis=0)
+    inside = np.zeros(count, bool)
+    for region in regions:
+        box = np.ones(count, bool)
+        for metric, (lo, hi) in region.bounds.items():
+            box &= (readings[metric] >= lo) & (readings[metric] <= hi)
+        inside |= box
+    if (inside != sampled).any():
+        print(f"  MISMATCH map vs batch evaluation on {(inside != sampled).sum():,} readings")
+        return False
+    points = np.prod([hi - lo + 1 for lo, hi in DOMAIN.values()])
+    print(f"map agrees with batch evaluation on all {count:,} readings "
+          f"({sampled.mean():.2%} disputed, {sum(region.points for region in regions) / points:.2%} expected)")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readings", type=int, default=10_000_000, help="random readings per throughput run")
+    parser.add_argument("--sketch-cases", type=int, default=200_000)
+    parser.add_argument("--check-only", action="store_true", help="only the parity checks and the map cross-check")
+    parser.add_argument("--check-readings", type=int, default=100_000, help="readings cross-checked by --check-only")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    ok = check_constants()
+    ok = check_sketch(args.sketch_cases, rng) and ok
+    ok = check_ripes() and ok
+    if not ok:
+        sys.exit(1)
+    if args.check_only:
+        if not check_map(disagreements(), random_readings(args.check_readings, rng)):
+            sys.exit(1)
+        return
+
+    readings = random_readings(args.readings, rng)
+    print(f"\n{args.readings:,} random readings")
+    for rule_set in RULE_SETS:
+        start = time.perf_counter()
+        verdicts = evaluate(rule_set, readings)
+        seconds = time.perf_counter() - start
+        print(f"  {rule_set.name:7} {args.readings / seconds / 1e6:7.1f} M readings/s, "
+              f"alarm {(verdicts != SAFE).mean():6.1%}")
+
+    start = time.perf_counter()
+    regions = disagreements()
+    seconds = time.perf_counter() - start
+    points = np.prod([hi - lo + 1 for lo, hi in DOMAIN.values()])
+    disputed = sum(region.points for region in regions)
+    print(f"\n{len(regions)} regions where {', '.join(r.name for r in RULE_SETS)} disagree "
+          f"({disputed / points:.2%} of all {points:,} integer readings, mapped in {seconds * 1e3:.0f} ms):")
+    for region in regions:
+        print(f"  {describe(region)}")
+    if not check_map(regions, readings):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
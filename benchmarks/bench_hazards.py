@@ -0,0 +1,231 @@
+"""Correctness and throughput of the rolling-window hazard aggregator (``corridor.hazards``).
+
+Checks (exit status 1 on any failure):
+
+* windowed max/min, EWMA, rate and debounced status match a per-sample
+  reference (lists of the samples in the window) on streams with irregular
+  sample times, gaps and bursts past the deque capacity;
+* a stream's first sample, and the first after a gap longer than the
+  window, do not raise the status on their own: it rises only once the
+  rule has held for a whole window;
+* ``ingest`` times bare payloads by their own ``timestamp`` when the
+  capture has no envelopes;
+* a run checkpointed halfway (``save`` / ``load``) ends in the same state
+  and emits the same transitions as an uninterrupted one.
+
+Then it counts status transitions of noisy readings near the ESP32
+thresholds, debounced against deciding on each sample (``window=0``), and
+reports samples per second for ``--corridors`` corridors of seven rooms
+updated in batches, and one sample at a time through ``feed`` (a
+convenience path: live ingest must batch, as ``ingest`` does).
+
+    python benchmarks/bench_hazards.py [--corridors 2000] [--ticks 300]
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, "..")
+sys.path.insert(0, ROOT)
+
+from benchmarks._common import check  # noqa: E402
+from corridor.controller import ESP32, SAFE  # noqa: E402
+from corridor.hazards import Aggregator, ingest  # noqa: E402
+from corridor.sensors import METRICS, ROOMS  # noqa: E402
+
+
+class Reference:
+    """One stream, sample by sample, the obvious way."""
+
+    def __init__(self, window, tau, capacity):
+        self.window, self.tau, self.capacity = window, tau, capacity
+        self.samples = []
+        self.ewma = self.rate = None
+        self.status = SAFE
+        self.since = [math.inf] * len(ESP32.rules)
+
+    def add(self, t, x):
+        x = np.asarray(x, float)
+        restart = not self.samples or t - self.samples[-1][0] > self.window
+        for i, rule in enumerate(ESP32.rules):
+            if x[METRICS.index(rule.metric)] <= rule.threshold:
+                self.since[i] = math.inf
+            elif restart or self.since[i] == math.inf:
+                self.since[i] = t
+        if self.samples:
+            last_t, last_x = self.samples[-1]
+            dt = max(t - last_t, 0.0)
+            alpha = -math.expm1(-dt / self.tau)
+            slope = (x - last_x) / dt if dt > 0 else np.zeros_like(x)
+            self.rate = self.rate + alpha * (slope - self.rate)
+            self.ewma = self.ewma + alpha * (x - self.ewma)
+        else:
+            self.ewma, self.rate = x.copy(), np.zeros_like(x)
+        self.samples.append((t, x))
+        recent = [s for s in self.samples[-self.capacity:] if s[0] >= t - self.window]
+        self.high = np.max([s[1] for s in recent], axis=0)
+        self.low = np.min([s[1] for s in recent], axis=0)
+
+        sustained = next((i for i, since in enumerate(self.since) if since <= t - self.window), SAFE)
+        rank = lambda i: len(ESP32.rules) if i == SAFE else i  # noqa: E731
+        current = self.status
+        held = current != SAFE and self.high[METRICS.index(ESP32.rules[current].metric)] > \
+            ESP32.rules[current].threshold
+        if rank(sustained) < rank(current) or not held:
+            self.status = sustained
+        return current != self.status
+
+
+def readings(rng, count, streams):
+    """(count, streams, metrics) random walks around the ESP32 thresholds, with one-sample spikes."""
+    steps = rng.normal(0, 1, (count, streams, len(METRICS))) * [3, 25, 4, 0.6]
+    walk = np.cumsum(steps, axis=0) * 0.3 + [25, 780, 75, 33]
+    spikes = rng.random(walk.shape) < 0.03
+    walk = np.where(spikes, walk + [20, 150, 20, 5], walk)
+    return np.clip(np.round(walk), [0, 400, 0, 0], [100, 2000, 200, 60])
+
+
+def reference_checks(rng):
+    ok = True
+    streams, count = 12, 600
+    window, tau, capacity = 5.0, 8.0, 8
+    aggregator = Aggregator(window, tau, capacity)
+    refs = [Reference(window, tau, capacity) for _ in range(streams)]
+    # Irregular times: mostly ~1 s, some gaps, some bursts of 10 samples a second
+    gaps = rng.choice([1.0, 0.1, 7.0, 0.0], (count, streams), p=[0.8, 0.15, 0.04, 0.01])
+    times = 1_717_200_000 + np.cumsum(gaps * rng.uniform(0.8, 1.2, gaps.shape), axis=0)
+    values = readings(rng, count, streams)
+    keys = [("corridor-0", room) for room in ROOMS] + [("corridor-1", room) for room in ROOMS[:streams - len(ROOMS)]]
+    rows = aggregator.rows(keys)
+    stats_ok = status_ok = True
+    transitions = expected = 0
+    for i in range(count):
+        # Random subsets per batch, in random order
+        batch = rng.permutation(streams)[:rng.integers(1, streams + 1)]
+        result = aggregator.update(times[i, batch], rows[batch], values[i, batch])
+        transitions += len(result.rows)
+        for s in batch:
+            expected += refs[s].add(times[i, s], values[i, s])
+        stats = aggregator.stats(rows[batch])
+        for k, s in enumerate(batch):
+            ref = refs[s]
+            stats_ok &= np.array_equal(stats.max[k], ref.high) and np.array_equal(stats.min[k], ref.low)
+            stats_ok &= np.allclose(stats.ewma[k], ref.ewma) and np.allclose(stats.rate[k], ref.rate)
+            status_ok &= stats.status[k] == ref.status
+    samples = sum(len(ref.samples) for ref in refs)
+    ok &= check(f"windowed max/min, EWMA and rate of {samples:,} samples", bool(stats_ok))
+    ok &= check("debounced status", bool(status_ok) and transitions == expected,
+                f"{transitions} transitions, reference {expected}")
+    return ok
+
+
+def run(aggregator, rows, values, start=0, stop=None):
+    out = []
+    for t in range(start, len(values) if stop is None else stop):
+        result = aggregator.update(1_717_200_000.0 + t, rows, values[t])
+        out += list(zip(result.rows.tolist(), result.ts.tolist(), result.before.tolist(), result.after.tolist()))
+    return out
+
+
+def debounce_check(window=5.0):
+    aggregator = Aggregator(window)
+    smoke, rule = {"smoke": 90}, next(i for i, r in enumerate(ESP32.rules) if r.metric == "smoke")
+    first = aggregator.feed("first", 0.0, smoke)
+    held = [aggregator.feed("held", float(t), smoke) for t in range(int(window) + 1)]
+    rises = [t for t, result in enumerate(held) if len(result.rows)]
+    for t in range(10):
+        aggregator.feed("gap", float(t), {"smoke": 10})
+    gap = aggregator.feed("gap", 100.0, smoke)
+    after = [aggregator.feed("gap", 100.0 + t, smoke) for t in range(1, int(window) + 1)]
+    ok = check("a stream's first sample of smoke 90 leaves it SAFE", not len(first.rows))
+    ok &= check(f"smoke 90 every second raises it after {window:g} s", rises == [int(window)]
+                and held[-1].after.tolist() == [rule], f"raised at {rises} s")
+    ok &= check(f"after a 90 s gap, smoke 90 raises it only {window:g} s on", not len(gap.rows)
+                and len(after[-1].rows) == 1 and not any(len(r.rows) for r in after[:-1]))
+    return ok
+
+
+def ingest_check(window=5.0, start=1_717_200_000):
+    # The same readings as topic/ts envelopes and as bare payloads stamped only with Date.now() ms
+    seconds = range(int(window) + 3)
+    payloads = [{"room": "kitchen", "smoke": 90, "timestamp": (start + t) * 1000} for t in seconds]
+    lines = {"envelopes": [json.dumps({"topic": "smart-corridor/sensors", "ts": start + t, "payload": p})
+                           for t, p in zip(seconds, payloads)],
+             "bare payloads": [json.dumps(p) for p in payloads]}
+    got = {name: [(ts, after) for result in ingest(Aggregator(window), capture)
+                  for ts, after in zip(result.ts.tolist(), result.after.tolist())]
+           for name, capture in lines.items()}
+    return check("a capture of bare payloads with only their timestamp raises as one with envelopes",
+                 got["bare payloads"] == got["envelopes"] and len(got["envelopes"]) == 1,
+                 f"{len(got['bare payloads'])} / {len(got['envelopes'])} transitions")
+
+
+def checkpoint_check(rng):
+    values = readings(rng, 200, 70)
+    keys = [(f"corridor-{c}", room) for c in range(10) for room in ROOMS]
+    whole = Aggregator()
+    rows = whole.rows(keys)
+    expected = run(whole, rows, values)
+    first = Aggregator()
+    got = run(first, first.rows(keys), values, 0, 100)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "hazards.npz")
+        first.save(path)
+        resumed = Aggregator.load(path)
+    got += run(resumed, resumed.rows(keys), values, 100)
+    a, b = whole.stats(), resumed.stats()
+    same = got == expected and all(np.array_equal(x, y) for x, y in zip(a, b)) and resumed.keys == whole.keys
+    return check("checkpoint halfway and resume", same, f"{len(expected)} transitions")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corridors", type=int, default=2000)
+    parser.add_argument("--ticks", type=int, default=300, help="samples per stream")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    print("checks")
+    ok = reference_checks(rng)
+    ok &= debounce_check()
+    ok &= ingest_check()
+    ok &= checkpoint_check(rng)
+
+    streams = args.corridors * len(ROOMS)
+    keys = [(f"corridor-{c}", room) for c in range(args.corridors) for room in ROOMS]
+    values = readings(rng, args.ticks, streams)
+    print(f"\n{args.corridors:,} corridors, {streams:,} streams, {args.ticks} samples each")
+    print(f"{'window s':>8} {'transitions':>12} {'per stream-hour':>16} {'M samples/s':>12}")
+    for window in (0.0, 3.0, 5.0, 10.0):
+        aggregator = Aggregator(window)
+        rows = aggregator.rows(keys)
+        start = time.perf_counter()
+        count = 0
+        for t in range(args.ticks):
+            count += len(aggregator.update(1_717_200_000.0 + t, rows, values[t]).rows)
+        seconds = time.perf_counter() - start
+        print(f"{window:8g} {count:12,} {count / streams / args.ticks * 3600:16.1f} "
+              f"{streams * args.ticks / seconds / 1e6:12.2f}")
+
+    aggregator = Aggregator()
+    payloads = [dict(zip(METRICS, map(float, row))) for row in values[:, 0]]
+    start = time.perf_counter()
+    for t, payload in enumerate(payloads):
+        aggregator.feed(("corridor-0", "kitchen"), 1_717_200_000.0 + t, payload)
+    seconds = time.perf_counter() - start
+    print(f"one sample at a time (feed, convenience only; batch live ingest): "
+          f"{len(payloads) / seconds / 1e3:,.1f} k samples/s")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
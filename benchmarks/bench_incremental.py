@@ -0,0 +1,67 @@
+"""Cold vs. warm rebuild times for the per-slide cache.
+
+Builds the Smart Corridor deck and a synthetic 500-slide deck three ways:
+cold (empty cache), warm (nothing changed) and warm with one edited slide.
+
+    python benchmarks/bench_incremental.py [--slides 500]
+"""
+import argparse
+import copy
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generate_slides import DECK_SPEC  # noqa: E402
+from slides import build_deck, load_deck  # noqa: E402
+
+
+def synthetic_deck(deck, count):
+    """Cycle the real slides up to ``count``, tagging each so every hash is unique."""
+    big = copy.deepcopy(deck)
+    big["slides"] = []
+    for i in range(count):
+        slide = copy.deepcopy(deck["slides"][i % len(deck["slides"])])
+        slide["elements"].append({"type": "text", "text": f"Slide {i + 1}",
+                                  "box": [12, 7, 1, 0.4], "size": 10})
+        big["slides"].append(slide)
+    return big
+
+
+def edit_one(deck):
+    edited = copy.deepcopy(deck)
+    middle = edited["slides"][len(edited["slides"]) // 2]
+    middle["elements"].append({"type": "text", "text": "edited", "box": [0.5, 7, 2, 0.4]})
+    return edited
+
+
+def run(label, deck, workdir):
+    cache_dir = os.path.join(workdir, label + "-cache")
+    output = os.path.join(workdir, label + ".pptx")
+    rows = [
+        ("no cache", build_deck(deck, output)),
+        ("cold", build_deck(deck, output, cache_dir)),
+        ("warm", build_deck(deck, output, cache_dir)),
+        ("warm, 1 edit", build_deck(edit_one(deck), output, cache_dir)),
+    ]
+    print(f"\n{label}: {rows[0][1].slides} slides")
+    print(f"  {'run':<14}{'ms':>10}{'rendered':>10}{'cached':>8}")
+    for name, stats in rows:
+        print(f"  {name:<14}{stats.seconds * 1000:>10.1f}{stats.rendered:>10}{stats.cached:>8}")
+    print(f"  speedup warm vs cold: {rows[1][1].seconds / rows[2][1].seconds:.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--slides", type=int, default=500, help="size of the synthetic deck")
+    args = parser.parse_args()
+
+    deck = load_deck(DECK_SPEC)
+    with tempfile.TemporaryDirectory() as workdir:
+        run("smart-corridor", deck, workdir)
+        run("synthetic", synthetic_deck(deck, args.slides), workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""Font metrics, containers and text fitting of ``slides.layout``, and what fitting costs a build.
+
+Checks (exit status 1 on any failure):
+
+* advances read from the installed TrueType files (the DejaVu fonts, or
+  ``--font-dir``) give the run widths PIL measures with FreeType;
+* parsed faces are kept in the cache directory: a second ``FontMetrics``
+  parses nothing and gets the same tables, and a font file that changes is
+  parsed again;
+* stacks and grids give the boxes the deck used to place by hand (team
+  cards, implementation steps, capability cards);
+* ``fit`` picks the largest size at which the text fits, the one a linear
+  search over every size finds, and reports text that fits at no size,
+  also through a build's ``BuildStats.overflows``;
+* ``measure`` takes thousands of runs per millisecond;
+* laying out a generated ``--slides`` deck whose every slide is fitted
+  costs under ``--max-share`` of building it.
+
+    python benchmarks/bench_layout.py [--runs 100000] [--slides 1000] [--max-share 0.1]
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+from benchmarks._common import check  # noqa: E402
+from slides.build import DeckWriter  # noqa: E402
+from slides.layout import (MIN_SIZE, STEP, FontMetrics, fit, grid, insets, layout_slide,  # noqa: E402
+                           measure_blocks, paragraphs, place, sized)
+from slides.spec import slide_resolver  # noqa: E402
+
+# family, bold, file
+FACES = (("DejaVu Sans", False, "DejaVuSans.ttf"), ("DejaVu Sans", True, "DejaVuSans-Bold.ttf"),
+         ("DejaVu Sans Mono", False, "DejaVuSansMono.ttf"), ("DejaVu Serif", False, "DejaVuSerif.ttf"))
+WORDS = ("smoke", "sensor", "threshold", "ventilation", "CO2", "PM2.5", "µg/m³", "alert", "kitchen", "ESP32",
+         "RISC-V", "MQTT", "latency", "—", "burning", "room", "ppm", "HIGH", "fan", "Überlüftung")
+
+
+def sentence(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def code(rng, lines):
+    return "\n".join(f"    {rng.choice(('li', 'lw', 'sw', 'addi', 'bnez'))} t{rng.randint(0, 6)}, "
+                     f"0x{rng.getrandbits(32):08X}    # {sentence(rng, rng.randint(1, 5))}" for _ in range(lines))
+
+
+def generated_slide(n, rng):
+    return {"name": f"generated-{n}", "elements": [
+        {"type": "title", "text": f"Incident {n}: {sentence(rng, 3)}"},
+        {"type": "grid", "box": [1, 1.6, 11.3, 2], "columns": 3, "gap": 0.3, "elements": [
+            {"type": "shape", "shape": "rounded_rectangle", "fill": "CARD_BG", "line": "ACCENT_BLUE", "fit": True,
+             "paragraphs": [{"text": sentence(rng, 2), "size": 20, "bold": True, "color": "ACCENT_BLUE"},
+                            {"text": sentence(rng, rng.randint(5, 40)), "size": 14}]} for _ in range(3)]},
+        {"type": "stack", "box": [1, 3.9, 11.3, 3.3], "direction": "horizontal", "gap": 0.3, "elements": [
+            {"type": "text", "text": sentence(rng, 4), "basis": 4, "size": 20, "fit": True,
+             "bullets": [sentence(rng, rng.randint(3, 20)) for _ in range(rng.randint(2, 6))]},
+            {"type": "code", "code": code(rng, rng.randint(4, 24)), "fit": True}]},
+    ]}
+
+
+def fonts(metrics, font_dir):
+    ok = True
+    from PIL import ImageFont
+
+    rng = random.Random(1)
+    texts = [sentence(rng, rng.randint(1, 12)) for _ in range(200)]
+    for family, bold, file in FACES:
+        path = os.path.join(font_dir, file)
+        if not os.path.exists(path):
+            continue
+        ours = metrics.measure(texts, family, 1000, bold)
+        pil = ImageFont.truetype(path, 1000)
+        theirs = np.array([pil.getlength(text) for text in texts])
+        error = np.abs(ours - theirs).max() / theirs.max()
+        ok &= check(f"{family}{' bold' if bold else ''}: widths match FreeType", error < 2e-4,
+                    f"worst {error:.1e} of the widest run, line height {metrics.face(family, bold).line:.3f} em")
+    return ok
+
+
+def cache(font_dir):
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        fonts_dir, cache_dir = os.path.join(tmp, "fonts"), os.path.join(tmp, "cache")
+        os.makedirs(fonts_dir)
+        for _, _, file in FACES[:2]:
+            shutil.copy(os.path.join(font_dir, file), fonts_dir)
+        first = FontMetrics(cache_dir, font_dirs=(fonts_dir,))
+        tables = [first.face(family, bold).advances for family, bold, _ in FACES[:2]]
+        second = FontMetrics(cache_dir, font_dirs=(fonts_dir,))
+        start = time.perf_counter()
+        same = all(np.array_equal(second.face(family, bold).advances, table)
+                   for (family, bold, _), table in zip(FACES[:2], tables))
+        loaded = time.perf_counter() - start
+        ok &= check("faces parsed once, then loaded from the cache", first.parsed == 2 and second.parsed == 0 and same,
+                    f"{loaded * 1e3:.1f} ms for 2 faces")
+        path = os.path.join(fonts_dir, FACES[0][2])
+        os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 10**9))
+        third = FontMetrics(cache_dir, font_dirs=(fonts_dir,))
+        third.face(*FACES[0][:2])
+        third.face(*FACES[1][:2])
+        ok &= check("a changed font file is parsed again", third.parsed == 1)
+    return ok
+
+
+def containers():
+    team = [[round(v, 9) for v in box] for box in grid([1, 2.5, 11.8, 3.5], 4, 4)]
+    ok = check("team cards at 1 + 3 i in", team == [[1 + 3 * i, 2.5, 2.8, 3.5] for i in range(4)])
+    steps = place([{"type": "stack", "box": [2, 2, 9, 4.6], "elements": [{"type": "shape"}] * 6}])
+    ok &= check("implementation steps at 2 + 0.8 i in",
+                [[round(v, 9) for v in el["box"]] for el in steps] == [[2, 2 + 0.8 * i, 9, 0.6] for i in range(6)])
+    cards = place([{"type": "grid", "box": [1, 2, 11.5, 4.5], "columns": 2, "gap": 0.5,
+                    "elements": [{"type": "stack", "direction": "horizontal", "gap": 0,
+                                  "elements": [{"type": "text", "basis": 1}, {"type": "text"}]}] * 4}])
+    ok &= check("nested containers", [el["box"] for el in cards[:2]] == [[1, 2, 1, 2], [2, 2, 4.5, 2]]
+                and cards[-1]["box"] == [8, 4.5, 4.5, 2])
+    return ok
+
+
+def fitting(metrics, rng):
+    ok, same, fitted, overflowed = True, True, 0, 0
+    for n in range(300):
+        el = {"type": "code", "code": code(rng, rng.randint(2, 60)), "box": [1, 2, rng.uniform(3, 11), 4.5],
+              "fit": True}
+        result, _ = fit(el, metrics)
+        # Linear search: the largest size, in STEP decrements, whose wrapped height fits
+        block = measure_blocks([paragraphs(el)], metrics)[0]
+        left, top, right, bottom = insets(el)
+        best = None
+        size = 12
+        while size >= MIN_SIZE:
+            if block.height([size], (el["box"][2] - left - right) * 72) / 72 + top + bottom <= el["box"][3]:
+                best = size
+                break
+            size -= STEP
+        same &= (result is None and best is None) or (result is not None and result.get("size", 12) == best)
+        fitted += result is not None and best != 12
+        overflowed += result is None
+    ok &= check("fit finds the largest size that fits", same, f"{fitted} shrunk, {overflowed} overflow of 300")
+    bullets = {"type": "text", "text": "Title", "box": [1, 2, 4, 2], "size": 24, "fit": True,
+               "bullets": [sentence(rng, 12) for _ in range(4)]}
+    shrunk, _ = fit(bullets, metrics)
+    ok &= check("title and bullets shrink together", shrunk is not None and shrunk["size"] < 24
+                and shrunk["bullet_size"] == sized(bullets, shrunk["size"] / 24)["bullet_size"] < 18,
+                f"{shrunk['size']} / {shrunk['bullet_size']} pt" if shrunk else "")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with DeckWriter(os.path.join(tmp, "overflow.pptx")) as deck:
+            deck.add_slide({"name": "long", "elements": [{"type": "code", "code": code(rng, 200),
+                                                          "box": [1, 2, 11, 4.5], "fit": True}]})
+        overflows = deck.stats.overflows
+    ok &= check("text too long at any size is reported", len(overflows) == 1 and overflows[0].slide == "long"
+                and overflows[0].needed > overflows[0].height,
+                f"needs {overflows[0].needed:.1f} in of {overflows[0].height} in" if overflows else "")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=100_000, help="text runs per measure() batch")
+    parser.add_argument("--slides", type=int, default=1000, help="slides of the generated deck")
+    parser.add_argument("--max-share", type=float, default=0.1, help="of the build time layout may take")
+    parser.add_argument("--font-dir", default="/usr/share/fonts/truetype/dejavu")
+    args = parser.parse_args()
+    rng = random.Random(0)
+    metrics = FontMetrics()
+
+    print("checks")
+    ok = True
+    if os.path.exists(os.path.join(args.font_dir, FACES[0][2])):
+        ok &= fonts(metrics, args.font_dir)
+        ok &= cache(args.font_dir)
+    else:
+        print(f"  skip TrueType checks: no {FACES[0][2]} in {args.font_dir}")
+    ok &= containers()
+    ok &= fitting(metrics, rng)
+
+    texts = [sentence(rng, rng.randint(1, 8)) for _ in range(args.runs)]
+    for face in (("Arial", False), ("Arial", True), ("Courier New", False)):
+        metrics.measure(texts[:10], face[0], 18, face[1])
+    best = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        metrics.measure(texts, "Arial", 18)
+        best = min(best, time.perf_counter() - start)
+    rate = args.runs / best / 1000
+    ok &= check("measure() takes thousands of runs per ms", rate >= 1000,
+                f"{rate:,.0f} runs/ms ({args.runs:,} runs of {sum(map(len, texts)) / args.runs:.0f} characters)")
+
+    resolve = slide_resolver({})
+    slides = [resolve(generated_slide(n, rng)) for n in range(args.slides)]
+    start = time.perf_counter()
+    overflows = sum(len(layout_slide(slide, metrics)[1]) for slide in slides)
+    laid_out = time.perf_counter() - start
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        with DeckWriter(os.path.join(tmp, "generated.pptx")) as deck:
+            for slide in slides:
+                deck.add_slide(slide)
+        built = time.perf_counter() - start
+    elements = sum(len(place(slide["elements"])) for slide in slides)
+    ok &= check(f"layout of {args.slides:,} fitted slides is under {args.max_share:.0%} of the build",
+                laid_out <= args.max_share * built,
+                f"{laid_out * 1e3:.0f} ms of {built:.2f} s ({laid_out / built:.1%}), {elements:,} elements, "
+                f"{overflows} overflow")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Parity and throughput of the LED-matrix frame renderer (``corridor.leds``).
+
+Parity (exit status 1 on any mismatch): ripes.s runs one ``main_loop`` pass
+on the headless machine for every threshold edge and ``--parity`` random
+switch words (upper bits included), and the matrix it leaves must equal the
+rendered frame, after a frame of every kind.
+
+Then it times frame rendering on random switch states and a full-scenario
+animation: the kitchen readings of ``--scenarios`` simulated hazard runs
+(``corridor.sensors``) played back to back, encoded as a GIF, then fetched
+again from the in-memory and on-disk caches.
+
+    python benchmarks/bench_leds.py [--frames 1000000] [--scenarios 200] [--steps 300]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, "..")
+sys.path.insert(0, ROOT)
+
+from corridor.leds import RIPES_S, LedRenderer, from_readings, runs, switch_words  # noqa: E402
+from corridor.riscv import Machine  # noqa: E402
+from corridor.sensors import KITCHEN, METRICS, ROOMS, random_hazards, simulate  # noqa: E402
+
+
+def check_machine(renderer, count, rng):
+    """Frames against the matrix ripes.s leaves after one pass, for edge and random switch words."""
+    edges = [switch_words(smoke, pm25, co2) for smoke in (0, 1) for pm25 in (0, 100, 101, 127)
+             for co2 in (0, 100, 101, 255)]
+    sw0 = np.concatenate([[int(a) for a, _ in edges], rng.integers(0, 1 << 32, count)])
+    sw1 = np.concatenate([[int(b) for _, b in edges], rng.integers(0, 1 << 32, count)])
+    expected = renderer.frames(sw0, sw1)
+    machine = Machine.from_file(RIPES_S)
+    machine.run(until="main_loop")
+    start = time.perf_counter()
+    failures = 0
+    for i, (a, b) in enumerate(zip(sw0.tolist(), sw1.tolist())):
+        machine.set_switches(0, a)
+        machine.set_switches(1, b)
+        machine.run(until="main_loop")
+        words = np.array(machine.leds.pixels, dtype=np.uint32).reshape(expected.shape[1:3])
+        rgb = np.stack([(words >> 16) & 0xFF, (words >> 8) & 0xFF, words & 0xFF], axis=-1)
+        if not np.array_equal(rgb, expected[i]):
+            if failures < 5:
+                print(f"  MISMATCH SW0={a:#010x} SW1={b:#010x}")
+            failures += 1
+    seconds = time.perf_counter() - start
+    print(f"ripes.s: {len(sw0) - failures:,}/{len(sw0):,} frames match the machine ({seconds:.1f} s)")
+    return failures == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--parity", type=int, default=2000, help="random switch words run on the machine")
+    parser.add_argument("--frames", type=int, default=1_000_000, help="random frames per throughput run")
+    parser.add_argument("--scenarios", type=int, default=200)
+    parser.add_argument("--steps", type=int, default=300, help="seconds per scenario")
+    parser.add_argument("--fps", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    start = time.perf_counter()
+    renderer = LedRenderer()
+    print(f"renderer: {len(renderer.images)} distinct images captured in {(time.perf_counter() - start) * 1e3:.0f} ms")
+    if not check_machine(renderer, args.parity, rng):
+        sys.exit(1)
+
+    sw0, sw1 = rng.integers(0, 1 << 16, args.frames), rng.integers(0, 1 << 16, args.frames)
+    start = time.perf_counter()
+    frames = renderer.frames(sw0, sw1)
+    seconds = time.perf_counter() - start
+    print(f"\n{args.frames:,} random frames {frames.shape}: {args.frames / seconds / 1e6:.2f} M frames/s")
+
+    start = time.perf_counter()
+    hazards = random_hazards(args.scenarios, rng)
+    trace = simulate(hazards, np.full((args.scenarios, len(ROOMS)), 3), args.steps)
+    kitchen = {metric: trace.sensors[metric][:, KITCHEN].ravel() for metric in METRICS}
+    sw0, sw1 = from_readings(kitchen)
+    simulated = time.perf_counter() - start
+    count = len(sw0)
+
+    start = time.perf_counter()
+    frames = renderer.frames(sw0, sw1)
+    rendered = time.perf_counter() - start
+    keys, lengths = runs(renderer.keys(sw0, sw1))
+    print(f"\nscenario animation: {args.scenarios} kitchens x {args.steps} s = {count:,} frames "
+          f"({simulated:.2f} s to simulate), {len(keys):,} runs of identical frames, "
+          f"{(frames[:, 0, 2, 0] == 255).mean():.1%} in alarm")
+    print(f"  frames   {rendered * 1e3:8.1f} ms  ({count / rendered / 1e6:.2f} M frames/s)")
+    with tempfile.TemporaryDirectory() as cache:
+        for label in ("encode", "memo", "disk"):
+            if label == "disk":
+                renderer = LedRenderer()  # fresh memo, same cache directory
+            start = time.perf_counter()
+            gif = renderer.animation(sw0, sw1, fps=args.fps, cache_dir=cache)
+            seconds = time.perf_counter() - start
+            print(f"  {label:8} {seconds * 1e3:8.1f} ms  ({count / seconds / 1e3:,.0f} k frames/s), "
+                  f"GIF {len(gif) / 1e3:.0f} kB")
+
+
+if __name__ == "__main__":
+    main()
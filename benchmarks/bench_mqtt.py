@@ -0,0 +1,72 @@
+"""Publish-to-deliver latency and messages/s through the local MQTT broker.
+
+Starts ``python -m corridor.mqtt`` on free localhost ports in its own
+process, then connects ``--nodes`` simulated corridor nodes (half sketch.ino
+controllers, half simulation tabs) and ``--subscribers`` dashboards on
+``smart-corridor/#``, over TCP and over WebSocket.  Nothing leaves the
+machine.
+
+    python benchmarks/bench_mqtt.py [--nodes 2000] [--rate 1] [--duration 10] [--transport tcp ws]
+"""
+import argparse
+import asyncio
+import os
+import re
+import subprocess
+import sys
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, "..")
+sys.path.insert(0, ROOT)
+
+from corridor.mqtt import run_load  # noqa: E402
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def start_broker():
+    """Broker subprocess and its (tcp, websocket) ports."""
+    proc = subprocess.Popen([sys.executable, "-m", "corridor.mqtt", "--port", "0", "--ws-port", "0"],
+                            cwd=ROOT, stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline()
+    match = re.search(r":(\d+) \(tcp\), ws://[^:]+:(\d+)/", line)
+    if not match:
+        proc.kill()
+        sys.exit(f"broker did not start: {line!r}")
+    return proc, int(match.group(1)), int(match.group(2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=1.0, help="publish periods per node per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of publishing per transport")
+    parser.add_argument("--subscribers", type=int, default=4, help="dashboards on smart-corridor/#")
+    parser.add_argument("--transport", nargs="+", choices=("tcp", "ws"), default=["tcp", "ws"])
+    args = parser.parse_args()
+
+    broker, tcp_port, ws_port = start_broker()
+    try:
+        print(f"{args.nodes} nodes x {args.rate:g}/s for {args.duration:g} s, {args.subscribers} subscribers")
+        print(f"{'transport':9} {'pub/s':>8} {'deliv/s':>8} {'lost':>6} "
+              + " ".join(f"{'p' + format(p, 'g'):>7}" for p in PERCENTILES) + f" {'max':>7}  (ms)")
+        for transport in args.transport:
+            port = ws_port if transport == "ws" else tcp_port
+            stats = asyncio.run(run_load("127.0.0.1", port, args.nodes, args.rate, args.duration, args.subscribers,
+                                         websocket=transport == "ws"))
+            ms = stats.latencies * 1e3
+            quantiles = np.percentile(ms, PERCENTILES) if len(ms) else [np.nan] * len(PERCENTILES)
+            print(f"{transport:9} {stats.published / stats.seconds:8.0f} {stats.delivered / stats.seconds:8.0f} "
+                  f"{stats.lost:6d} " + " ".join(f"{q:7.2f}" for q in quantiles)
+                  + f" {ms.max() if len(ms) else np.nan:7.2f}")
+            print(f"{'':9} " + ", ".join(f"{topic.split('/')[-1]} {n // max(stats.subscribers, 1)}"
+                                         for topic, n in sorted(stats.per_topic.items())) + " messages")
+    finally:
+        broker.terminate()
+        broker.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Parity, size and bake throughput of the particle baker (``corridor.particles``).
+
+Checks (exit status 1 on any failure):
+
+* closed-form clips match a port of the ``useFrame`` loops of
+  ``SmokeEffects.jsx``, stepping Float32Array positions update by update
+  through the same respawn positions;
+* smoke loops are seamless: across the wrap every particle either moves by
+  its step or respawns, as it does between any two frames;
+* int16 positions decode within half a quantisation step;
+* the written buffer and index read back to the same clips.
+
+Then it reports the bytes per second of animation of each emitter, int16
+and float16 against raw float32, and bake throughput in particle-frames/s
+for ``--seconds`` loops.
+
+    python benchmarks/bench_particles.py [--seconds 10 60 600]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, "..")
+sys.path.insert(0, ROOT)
+
+from benchmarks._common import check  # noqa: E402
+from corridor.particles import (  # noqa: E402
+    EMITTERS, FPS, LIFETIME, LIMIT, UPDATE_DELTA, bake_all, dequantize, loop_frames, play, quantize, schedule,
+    write,
+)
+
+
+def step_like_js(emitter, sched, frames):
+    """Positions of ``frames`` updates from each particle's first respawn, as the JS loop computes them."""
+    f32 = np.float32
+    n = emitter.count
+    positions = sched.resets[:, 0].astype(f32)
+    steps = sched.steps
+    lifetimes = np.zeros(n)
+    following = np.ones(n, np.int64)
+    out = np.empty((frames, n, 3), f32)
+    out[0] = positions
+    for t in range(1, frames):
+        if emitter.kind == "smoke":
+            lifetimes += UPDATE_DELTA * 0.3
+            respawn = lifetimes > 1
+            lifetimes[respawn] = 0
+            moving = ~respawn
+            positions[moving] = (positions[moving] + steps[moving]).astype(f32)
+        else:
+            positions = (positions + steps).astype(f32)
+            dist = np.sqrt((positions.astype(np.float64) ** 2).sum(axis=1))
+            respawn = (dist > 1) | (positions[:, 1] < -0.5)
+        rows = np.flatnonzero(respawn)
+        cycles = np.minimum(following[rows], sched.resets.shape[1] - 1)
+        positions[rows] = sched.resets[rows, cycles]
+        following[rows] += 1
+        out[t] = positions
+    return out
+
+
+def checks(seconds, rng):
+    ok = True
+    frames = loop_frames(seconds)
+    for emitter in EMITTERS:
+        sched = schedule(emitter, 60, frames, rng)
+        baked = play(sched, frames)
+        stepped = step_like_js(emitter, sched, frames)
+        # Up to where a cut-short cycle starts: the JS loop never cuts one
+        last = (np.cumsum(sched.lengths, axis=1) - sched.lengths)[np.arange(emitter.count),
+                                                                   (sched.lengths > 0).sum(axis=1) - 1]
+        valid = np.arange(frames)[:, None] < np.where(sched.cut, last, frames)[None, :]
+        _, scale = quantize(baked)
+        error = (np.abs(baked - stepped) / scale * LIMIT["int16"]).max(axis=2)[valid].max()
+        ok &= check(f"{emitter.name}: {valid.sum():,} particle-frames match the JS loop", error < 0.5,
+                    f"max error {error:.3f} int16 steps")
+
+        if emitter.kind == "smoke":
+            phase = rng.integers(0, frames, emitter.count)
+            clip = play(sched, frames + 1, phase)
+            moved = np.abs(clip[0] - clip[-2] - sched.steps).max(axis=1) < 1e-5
+            respawned = clip[0][:, 1] == 0
+            ok &= check(f"{emitter.name}: seamless loop of {frames} frames", bool((moved | respawned).all()),
+                        f"{int((moved | respawned).sum())}/{emitter.count} particles continue")
+
+        data, scale = quantize(baked)
+        error = np.abs(dequantize(data, scale) - baked).max(axis=(0, 1)) / np.asarray(scale) * LIMIT["int16"]
+        # Half a step, and float32 rounding of the decoded value
+        ok &= check(f"{emitter.name}: int16 within half a step", bool((error <= 0.51).all()),
+                    f"max {error.max():.3f} steps")
+
+    clips = bake_all(seconds=seconds, seed=1)
+    with tempfile.TemporaryDirectory() as tmp:
+        index = write(clips, tmp)
+        with open(os.path.join(tmp, "particles.json")) as f:
+            same = json.load(f) == index
+        buffer = np.fromfile(os.path.join(tmp, index["buffer"]), np.uint8)
+    for clip, entry in zip(clips, index["clips"]):
+        view = buffer[entry["byte_offset"]:entry["byte_offset"] + entry["byte_length"]].view("<i2")
+        decoded = dequantize(view.reshape(entry["frames"], entry["count"], 3), entry["scale"])
+        same &= entry["byte_offset"] % 16 == 0
+        same &= np.abs(decoded - clip.positions).max() <= max(entry["scale"]) / LIMIT["int16"]
+    ok &= check(f"{len(clips)} clips read back from the buffer and index", bool(same))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, nargs="+", default=[10, 60, 600], help="loop lengths to bake")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    print(f"checks (lifetime {LIFETIME} updates, {FPS} updates/s)")
+    if not checks(args.seconds[0], rng):
+        sys.exit(1)
+
+    print(f"\nbytes per second of animation at {FPS} fps")
+    print(f"{'emitter':18} {'particles':>9} {'int16/float16 kB/s':>19} {'float32 kB/s':>13}")
+    for emitter in EMITTERS:
+        values = emitter.count * 3 * FPS
+        print(f"{emitter.name:18} {emitter.count:9} {values * 2 / 1e3:19.1f} {values * 4 / 1e3:13.1f}")
+    values = sum(emitter.count for emitter in EMITTERS) * 3 * FPS
+    print(f"{'all at once':18} {'':9} {values * 2 / 1e3:19.1f} {values * 4 / 1e3:13.1f}")
+
+    print(f"\n{'loop s':>7} {'clips':>6} {'frames':>7} {'MB':>7} {'bake ms':>8} {'write ms':>9} "
+          f"{'M particle-frames/s':>20}")
+    for seconds in args.seconds:
+        start = time.perf_counter()
+        clips = bake_all(seconds=seconds, seed=args.seed)
+        baked = time.perf_counter() - start
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            index = write(clips, tmp)
+            written = time.perf_counter() - start
+        count = sum(clip.positions.shape[0] * clip.positions.shape[1] for clip in clips)
+        size = sum(entry["byte_length"] for entry in index["clips"])
+        print(f"{loop_frames(seconds) / FPS:7.0f} {len(clips):6} {loop_frames(seconds):7} {size / 1e6:7.2f} "
+              f"{baked * 1e3:8.0f} {written * 1e3:9.0f} {count / baked / 1e6:20.2f}")
+
+
+if __name__ == "__main__":
+    main()
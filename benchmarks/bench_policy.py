@@ -0,0 +1,154 @@
+"""Ventilation policies (``corridor.policy``): exact costs, tables no worse than the sketch, and policies per second.
+
+Checks (exit status 1 on any failure):
+
+* for random hazards and random schedules, ``outcomes`` gives the
+  time-to-safe of ``corridor.sensors.simulate`` with the schedule's vents,
+  and the fan-seconds counted from them up to when the fans may go off;
+* costs on ``--workers`` processes (at least two) are the costs in one;
+* the optimised table costs no more than the sketch's kitchen HIGH in
+  every class it was trained on;
+* the table survives a JSON round trip;
+* a replay of kitchen-fire with a table sends the table's levels phase by
+  phase and turns those vents off when the alarm clears.
+
+Then it reports policies evaluated per second, in one process and on the
+pool, and a whole optimisation over ``--hazards`` random hazards.
+
+    python benchmarks/bench_policy.py [--hazards 20000] [--batch 4096] [--workers N] [--min-rate 5000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+from benchmarks._common import check  # noqa: E402
+from corridor.controller import ESP32  # noqa: E402
+from corridor.policy import (BANDS, HORIZON, PHASES, POWER, PolicyTable, _Evaluator, cases,  # noqa: E402
+                             optimize, outcomes, phase_of, policy_costs, repair, training_cases)
+from corridor.replay import SCENARIOS, load_scenario, replay  # noqa: E402
+from corridor.sensors import ROOMS, VENT_LEVELS, random_hazards, simulate, time_to_safe  # noqa: E402
+
+
+def random_policies(rng, n):
+    return repair(rng.integers(0, len(VENT_LEVELS), (n, len(PHASES), len(ROOMS))) * (rng.random((n, 1, 1)) < 0.9))
+
+
+def exact(count, policies, rng, horizon):
+    hazards = random_hazards(count, rng)
+    policies = random_policies(rng, policies)
+    steps = phase_of(horizon)
+    vents = np.moveaxis(policies[:, steps], 1, -1)  # (P, rooms, horizon)
+    fans = POWER[policies[:, steps]].sum(axis=2)
+    checked, wrong = 0, []
+    for i in range(count):
+        one = type(hazards)(*(np.asarray(field)[[i]] for field in hazards))
+        found = cases(one)
+        if not len(found.count):
+            continue  # never safe whatever the fans do
+        checked += 1
+        repeated = type(hazards)(*(np.repeat(field, len(policies), axis=0) for field in one))
+        trace = simulate(repeated, vents, horizon)
+        want = np.minimum(time_to_safe(trace.status), horizon)
+        gone = (trace.smoke_level > 0).sum(axis=1)
+        off = np.minimum(np.maximum(want, gone), horizon - 1).astype(int)
+        fan_seconds = np.array([fans[p, 1:off[p] + 1].sum() for p in range(len(policies))])
+        got = outcomes(policies, found, horizon)
+        bad = np.flatnonzero((got.time_to_safe[:, 0] != want) | (got.fan_seconds[:, 0] != fan_seconds))
+        if len(bad):
+            p = bad[0]
+            wrong.append(f"hazards {i}, policy {p}: {got.time_to_safe[p, 0]:g} s / {got.fan_seconds[p, 0]:g} fan-s, "
+                         f"not {want[p]:g} s / {fan_seconds[p]:g} fan-s")
+    return check(f"{len(policies)} schedules on {checked} fixable hazards as simulate() gives them", not wrong,
+                 "; ".join(wrong[:3]) or f"{count - checked} never safe left out")
+
+
+def replayed():
+    """kitchen-fire with the same two-phase schedule for every class."""
+    policy = np.zeros((len(PHASES), len(ROOMS)), np.uint8)
+    policy[0, :2], policy[1:, :2] = 2, 1
+    keys = [f"{rule.metric}/{band}" for rule in ESP32.rules for band in range(len(BANDS) + 1)]
+    table = PolicyTable({key: policy for key in keys})
+    records = replay(load_scenario(os.path.join(SCENARIOS, "kitchen-fire.json")), table)
+    commands = [r for r in records if r.event == "command" and "VENT" in r.fields["action"]]
+    alarms = [r.ms for r in records if r.event == "command" and r.fields["action"] == "SET_ALERT"
+              and r.fields["level"] != "normal"]
+    want = []
+    for start in alarms:
+        clear = next(r.ms for r in records if r.ms > start and r.event == "command" and r.fields["level"] == "normal")
+        want += [(start, room, "MED") for room in ROOMS[:2]]
+        if clear - start > PHASES[1] * 1000:
+            want += [(start + PHASES[1] * 1000, room, "LOW") for room in ROOMS[:2]]
+        want += [(clear, room, "OFF") for room in ROOMS[:2]]
+    got = [(r.ms, r.fields["room"], r.fields["level"]) for r in commands]
+    return check(f"kitchen-fire with a table: {len(got)} vent commands over {len(alarms)} alarms, as the table says",
+                 got == want and len(alarms) > 0, "" if got == want else f"got {got[:6]}, want {want[:6]}")
+
+
+def rate(label, evaluator, key, policies):
+    evaluator(key, policies[:evaluator.pool_batch])  # the workers start and take their cases
+    start = time.perf_counter()
+    evaluator(key, policies)
+    seconds = time.perf_counter() - start
+    print(f"  {label:24} {len(policies) / seconds:10,.0f} policies/s  "
+          f"({len(policies) * len(evaluator.by_class[key].count) / seconds:,.0f} policy-cases/s)")
+    return len(policies) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hazards", type=int, default=20_000, help="random hazards to train on")
+    parser.add_argument("--batch", type=int, default=4096, help="policies per timed batch")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--horizon", type=int, default=HORIZON)
+    parser.add_argument("--exact", type=int, default=100, help="random hazards to check against simulate()")
+    parser.add_argument("--min-rate", type=float, default=5000, help="policies per second in one process")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    print("checks")
+    ok = exact(args.exact, 32, rng, args.horizon)
+    by_class = training_cases(args.hazards, args.seed)
+    key, found = max(by_class.items(), key=lambda item: len(item[1].count))
+    policies = random_policies(rng, args.batch)
+    serial = policy_costs(policies, found, args.horizon)
+    pool = _Evaluator(by_class, args.horizon, workers=max(args.workers, 2), pool_batch=0)
+    try:
+        pooled = pool(key, policies)
+    finally:
+        pool.close()
+    ok &= check(f"{pool.workers} workers give the costs of one", np.array_equal(serial, pooled))
+
+    table, results, evaluated, seconds = optimize(by_class, args.horizon, workers=args.workers, seed=args.seed)
+    worse = [f"{k} {r.cost:.2f} > {r.baseline:.2f}" for k, r in results.items() if r.cost > r.baseline + 1e-9]
+    ok &= check(f"{len(results)} classes cost no more than the sketch's", not worse, "; ".join(worse) or
+                ", ".join(f"{k} {r.baseline:.1f} -> {r.cost:.1f}" for k, r in results.items()))
+    again = PolicyTable.from_dict(json.loads(json.dumps(table.to_dict())))
+    ok &= check("the table survives a JSON round trip", again.to_dict() == table.to_dict()
+                and all(np.array_equal(again.policies[k], p) for k, p in table.policies.items()))
+    ok &= replayed()
+
+    print(f"\n{args.batch:,} random schedules on {key} ({len(found.count)} cases, {found.count.sum():,} hazards)")
+    per_second = rate("one process", _Evaluator(by_class, args.horizon), key, policies)
+    pool = _Evaluator(by_class, args.horizon, workers=args.workers)
+    try:
+        rate(f"{args.workers} workers", pool, key, policies)
+    finally:
+        pool.close()
+    print(f"  optimised {len(results)} classes of {args.hazards:,} hazards: {evaluated:,} policies in {seconds:.2f} s "
+          f"({evaluated / seconds:,.0f} policies/s)")
+    ok &= check(f"at least {args.min_rate:,.0f} policies/s in one process", per_second >= args.min_rate,
+                f"{per_second:,.0f} policies/s")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Slide previews (``slides.preview``): what they draw, what the cache saves, and slides per second.
+
+Checks (exit status 1 on any failure):
+
+* a slide of every shape the generator emits -- rectangle, rounded
+  rectangle, oval, cloud, connector, text -- has its fills, outlines,
+  corners and text where the spec put them;
+* every slide of slides/deck.json comes out at the preview size;
+* a second preview of the same deck draws nothing and gives the same PNGs,
+  and after one slide changes only that slide is drawn again;
+* drawing on ``--workers`` processes (at least two) gives the PNGs drawing
+  in one does.
+
+Then it reports slides per second for a ``--slides`` deck: drawn in one
+process, drawn on the pool, and all from the cache.
+
+    python benchmarks/bench_preview.py [--slides 200] [--workers N] [--width 960] [--min-rate 10]
+"""
+import argparse
+import copy
+import io
+import os
+import sys
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, "..")
+sys.path.insert(0, ROOT)
+
+from benchmarks._common import check  # noqa: E402
+from slides.build import build_deck  # noqa: E402
+from slides.preview import contact_sheet, preview_deck  # noqa: E402
+from slides.spec import load_deck  # noqa: E402
+
+BG, FILL, LINE, TEXT = [10, 10, 15], [20, 120, 60], [255, 200, 0], [255, 255, 255]
+ACCENT1 = (0x4F, 0x81, 0xBD)  # the template theme's accent1, which connectors are drawn in
+SHAPES = {"title": "Shapes", "background": BG, "palette": {}, "slides": [{"name": "shapes", "elements": [
+    {"type": "shape", "shape": "rectangle", "box": [1, 1.5, 2.5, 1.5], "fill": FILL, "line": LINE},
+    {"type": "shape", "shape": "rounded_rectangle", "box": [4.5, 1.5, 2.5, 1.5], "fill": FILL, "line": "none"},
+    {"type": "shape", "shape": "oval", "box": [8, 1.5, 2.5, 1.5], "fill": FILL, "line": "none"},
+    {"type": "shape", "shape": "cloud", "box": [1, 4, 3, 2.5], "fill": FILL, "line": LINE},
+    {"type": "connector", "begin": [5, 5], "end": [7, 5]},
+    {"type": "text", "text": "Preview", "box": [8, 4, 4, 1], "size": 40, "color": TEXT, "bold": True},
+]}]}
+
+
+def near(pixel, color, tolerance=8):
+    return all(abs(a - b) <= tolerance for a, b in zip(pixel, color))
+
+
+def shapes(tmp, width):
+    path = os.path.join(tmp, "shapes.pptx")
+    build_deck(copy.deepcopy(SHAPES), path)
+    image = Image.open(io.BytesIO(preview_deck(path, width=width, workers=1).pngs[0])).convert("RGB")
+    per_in = width / 13.333
+
+    def at(x, y):
+        return image.getpixel((min(round(x * per_in), image.width - 1), min(round(y * per_in), image.height - 1)))
+
+    samples = {
+        "background": (at(0.2, 7.3), BG),
+        "rectangle fill": (at(2.25, 2.25), FILL),
+        "rectangle outline": (at(1, 2.25), LINE),
+        "rounded rectangle fill": (at(5.75, 2.25), FILL),
+        "rounded corner cut": (at(4.5 + 0.5 / per_in, 1.5 + 0.5 / per_in), BG),
+        "oval fill": (at(9.25, 2.25), FILL),
+        "oval corner empty": (at(8.1, 1.6), BG),
+        "cloud fill": (at(2.5, 5.25), FILL),
+        "connector": (at(6, 5), ACCENT1),
+    }
+    wrong = [f"{name} {pixel} not {tuple(color)}" for name, (pixel, color) in samples.items() if not near(pixel, color)]
+    ok = check("fills, outlines and corners where the spec put them", not wrong, "; ".join(wrong))
+    text = image.crop((round(8 * per_in), round(4 * per_in), round(12 * per_in), round(5 * per_in)))
+    inked = (np.abs(np.asarray(text, np.int16) - TEXT) <= 40).all(axis=-1).mean()
+    ok &= check("text drawn in its box", inked > 0.02, f"{inked:.1%} of the box in the text color")
+    return ok
+
+
+def numbered(deck, copies):
+    """``deck`` with its slides repeated ``copies`` times, each copy's titles numbered so no two slides match."""
+    slides = []
+    for n in range(copies):
+        for slide in deck["slides"]:
+            slide = copy.deepcopy(slide)
+            for el in slide["elements"]:
+                if el["type"] == "title":
+                    el["text"] += f" ({n + 1})"
+            slides.append(slide)
+    return dict(deck, slides=slides)
+
+
+def rate(label, result):
+    print(f"  {label:28} {len(result.pngs) / result.seconds:8.1f} slides/s  "
+          f"({result.rendered} drawn on {result.workers} workers, {result.cached} cached, {result.seconds:.2f} s)")
+    return len(result.pngs) / result.seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slides", type=int, default=200, help="slides of the timed deck")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--width", type=int, default=960, help="pixels per slide")
+    parser.add_argument("--min-rate", type=float, default=10, help="slides per second drawn in one process")
+    parser.add_argument("--spec", default=os.path.join(ROOT, "slides", "deck.json"))
+    args = parser.parse_args()
+    deck = load_deck(args.spec)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print("checks")
+        ok = shapes(tmp, args.width)
+
+        path, cache_dir = os.path.join(tmp, "deck.pptx"), os.path.join(tmp, "previews")
+        build_deck(deck, path)
+        first = preview_deck(path, width=args.width, cache_dir=cache_dir, workers=1)
+        sizes = {Image.open(io.BytesIO(blob)).size for blob in first.pngs}
+        ok &= check(f"{len(first.pngs)} slides previewed at {args.width} px", first.rendered == len(deck["slides"])
+                    and sizes == {(args.width, round(args.width * 7.5 / 13.333))}, f"sizes {sorted(sizes)}")
+        again = preview_deck(path, width=args.width, cache_dir=cache_dir, workers=1)
+        ok &= check("nothing drawn again for an unchanged deck", again.rendered == 0 and again.pngs == first.pngs,
+                    f"{again.seconds * 1e3:.0f} ms from the cache")
+        edited = copy.deepcopy(deck)
+        title = next(el for el in edited["slides"][2]["elements"] if el["type"] == "title")
+        title["text"] += " (revised)"
+        build_deck(edited, path)
+        changed = preview_deck(path, width=args.width, cache_dir=cache_dir, workers=1)
+        same = [a == b for a, b in zip(changed.pngs, first.pngs)]
+        ok &= check("one slide changed, one drawn", changed.rendered == 1 and same.count(False) == 1 and not same[2])
+        pooled = preview_deck(path, width=args.width, workers=max(args.workers, 2))
+        ok &= check(f"{pooled.workers} workers give the same PNGs", pooled.pngs == changed.pngs)
+
+        copies = max(-(-args.slides // len(deck["slides"])), 1)
+        path, cache_dir = os.path.join(tmp, "big.pptx"), os.path.join(tmp, "big-previews")
+        build_deck(numbered(deck, copies), path)
+        print(f"\n{copies * len(deck['slides'])} slides at {args.width} px")
+        serial = rate("drawn in one process", preview_deck(path, width=args.width, workers=1))
+        rate(f"drawn on {args.workers} workers", preview_deck(path, width=args.width, cache_dir=cache_dir,
+                                                             workers=args.workers))
+        cached = preview_deck(path, width=args.width, cache_dir=cache_dir, workers=args.workers)
+        rate("from the cache", cached)
+        sheet = contact_sheet(cached.pngs[:len(deck["slides"])])
+        print(f"  contact sheet of {len(deck['slides'])} slides: {sheet.width} x {sheet.height} px")
+        ok &= check(f"at least {args.min_rate:g} slides/s drawn in one process", serial >= args.min_rate,
+                    f"{serial:.1f} slides/s")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""Scenario replay (``corridor.replay``): determinism, golden traces, the decay model, and simulated seconds per second.
+
+Checks (exit status 1 on any failure):
+
+* every scenario replays to the same trace twice, and in steps to the one
+  it gives in one run;
+* the scenarios in corridor/scenarios match their golden traces;
+* with the controller off, random hazards and vents set by hand give the
+  smoke level, burning items and aggregated status of
+  ``corridor.sensors.simulate`` every second;
+* a capture made of a replay's sensors and commands messages, replayed
+  without the twin publishing (plus the sketch's local switches, which
+  no capture holds), gets the same commands from the sketch, and the
+  same capture as bare payloads, timed by their own ``timestamp``, gives
+  the same sensors messages.
+
+Then it reports simulated seconds per wall-clock second over ``--scenarios``
+random scenarios of ``--duration`` seconds.
+
+    python benchmarks/bench_replay.py [--scenarios 50] [--duration 600] [--hazards 200] [--min-speedup 1000]
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+from benchmarks._common import check  # noqa: E402
+from corridor.replay import (APPLIANCES, SCENARIOS, Replayer, compare_traces, golden_path, load_scenario,  # noqa: E402
+                             random_scenario, read_trace, replay, scenario_from_capture, trace_lines)
+from corridor.sensors import ROOMS, STATUS, VENT_LEVELS, random_hazards, simulate  # noqa: E402
+
+# Hazards fields of the appliances, in APPLIANCES order
+APPLIANCE_FIELDS = ("tv_living", "tv_master", "stove", "fridge")
+EPOCH = 1_700_000_000
+
+
+def deterministic(scenarios):
+    same = stepped = True
+    for scenario in scenarios:
+        first = replay(scenario)
+        same &= first == replay(scenario)
+        replayer = Replayer(scenario)
+        for seconds in range(0, scenario["duration"] + 1, 37):
+            replayer.run(seconds)
+        stepped &= replayer.run() == first
+    ok = check(f"{len(scenarios)} scenarios replay to the same trace twice", same)
+    ok &= check("replaying in steps gives the trace of one run", stepped)
+    return ok
+
+
+def goldens():
+    ok = True
+    for path in sorted(glob.glob(os.path.join(SCENARIOS, "*.json"))):
+        scenario = load_scenario(path)
+        records = replay(scenario)
+        diff = compare_traces(read_trace(golden_path(path)), trace_lines(scenario["name"], records))
+        ok &= check(f"{scenario['name']} matches its golden trace", diff is None,
+                    f"{len(records)} records" if diff is None else f"line {diff[0]}: want {diff[1]}, got {diff[2]}")
+    return ok
+
+
+def hazard_events(h, i, vents):
+    """User actions at t=0 that leave the twin in hazards row ``i`` with ``vents`` (level codes per room)."""
+    events = [{"at": 0, "action": "burners", "lit": int(h.burners[i])}]
+    events += [{"at": 0, "action": "burn"} for _ in range(int(h.burning[i]))]
+    for r, room in enumerate(ROOMS[1:], 1):
+        if h.heater_overloaded[i, r]:
+            events.append({"at": 0, "action": "overload", "room": room})
+        else:
+            events.append({"at": 0, "action": "heater", "room": room, "on": bool(h.heater_on[i, r]),
+                           "level": int(h.heater_level[i, r])})
+    events += [{"at": 0, "action": "explode", "appliance": appliance}
+               for appliance, field in zip(APPLIANCES, APPLIANCE_FIELDS) if getattr(h, field)[i]]
+    events.append({"at": 0, "action": "chimney", "blocked": bool(h.chimney[i])})
+    events += [{"at": 0, "action": "vent", "room": room, "level": VENT_LEVELS[code]}
+               for room, code in zip(ROOMS, vents) if code]
+    if h.emergency[i]:
+        events.append({"at": 0, "action": "emergency"})
+    return events
+
+
+def decay(count, steps, rng):
+    hazards = random_hazards(count, np.random.default_rng(rng.getrandbits(32)))
+    vents = np.array([[rng.choice((0, 0, 1, 2, 3)) for _ in ROOMS] if rng.random() < 0.7 else [0] * len(ROOMS)
+                      for _ in range(count)])
+    trace = simulate(hazards, vents, steps)
+    wrong = []
+    for i in range(count):
+        replayer = Replayer({"name": f"hazards-{i}", "duration": steps, "controller": False, "publish": False,
+                             "events": hazard_events(hazards, i, vents[i])})
+        twin = replayer.twin
+        for t in range(steps):
+            replayer.run(t)
+            got = (twin.smoke, len(twin.burning), twin.aggregated()["status"])
+            want = (trace.smoke_level[i, t], trace.burning[i, t], STATUS[trace.status[i, t]])
+            if got != want:
+                wrong.append(f"hazards {i} at {t} s: {got} not {want}")
+                break
+    smoky = int((hazards.smoke_level > 0).sum())
+    return check(f"{count} random hazards decay as simulate() does for {steps} s", not wrong,
+                 "; ".join(wrong[:3]) or f"{smoky} with smoke, {int((vents > 0).any(axis=1).sum())} vented")
+
+
+def capture(scenario, records, bare=False):
+    """The capture a broker-side recorder would make of the sensors and commands in ``records``.
+
+    ``bare`` records the payloads alone, the sensors stamped with the twin's ``Date.now()``.
+    """
+    latency = scenario["latency"]
+    lines = []
+    for record in records:
+        if record.event == "publish":
+            ms, topic = record.ms + latency.get("sensors", 50), "smart-corridor/sensors"
+            payload = dict(record.fields, timestamp=round(EPOCH * 1000) + record.ms if bare else record.ms)
+        elif record.event == "command":
+            ms, topic = record.ms + latency.get("commands", 50), "smart-corridor/commands"
+            payload = dict(record.fields, timestamp=record.ms)
+        else:
+            continue
+        lines.append(json.dumps(payload if bare else {"topic": topic, "ts": EPOCH + ms / 1000, "payload": payload}))
+    return lines
+
+
+def readings(events):
+    """(seconds since the first, payload less its timestamp) of each sensors event."""
+    events = [event for event in events if event["action"] == "sensors"]
+    return [(round(event["at"] - events[0]["at"], 3), dict(event["payload"], timestamp=None)) for event in events]
+
+
+def recorded(scenario):
+    records = replay(scenario)
+    commands = [r.fields for r in records if r.event == "command"]
+    captured = scenario_from_capture(capture(scenario, records))
+    # The sketch's own switches are not on the broker: replay them as they were, on the capture's clock
+    start = min(r.ms for r in records if r.event in ("publish", "command")) / 1000
+    captured["events"] += [dict(event, at=round(event["at"] - start, 3)) for event in scenario["events"]
+                           if event["action"] == "local"]
+    captured["events"].sort(key=lambda event: event["at"])
+    replayed = [r.fields for r in replay(captured) if r.event == "command"]
+    ok = check(f"{scenario['name']}: a capture of it gets the same {len(commands)} commands", replayed == commands)
+    sensors = readings(captured["events"])
+    bare = readings(scenario_from_capture(capture(scenario, records, bare=True))["events"])
+    return ok & check(f"{scenario['name']}: its bare payloads give the same {len(sensors)} sensors readings",
+                      bare == sensors and len(sensors) > 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", type=int, default=50, help="random scenarios to time")
+    parser.add_argument("--duration", type=int, default=600, help="seconds per random scenario")
+    parser.add_argument("--hazards", type=int, default=200, help="random hazards to check against simulate()")
+    parser.add_argument("--steps", type=int, default=60, help="seconds of each hazard check")
+    parser.add_argument("--min-speedup", type=float, default=1000, help="simulated seconds per wall-clock second")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    print("checks")
+    shipped = [load_scenario(path) for path in sorted(glob.glob(os.path.join(SCENARIOS, "*.json")))]
+    scenarios = [random_scenario(rng, args.duration, rng.randint(5, 40), f"random-{n}") for n in range(args.scenarios)]
+    ok = deterministic(shipped + scenarios[:10])
+    ok &= goldens()
+    ok &= decay(args.hazards, args.steps, rng)
+    for scenario in shipped:
+        ok &= recorded(scenario)
+
+    print(f"\n{args.scenarios} random scenarios of {args.duration} s")
+    start = time.perf_counter()
+    records = sum(len(replay(scenario)) for scenario in scenarios)
+    seconds = time.perf_counter() - start
+    speedup = args.scenarios * args.duration / seconds
+    print(f"  {records:,} records in {seconds:.2f} s, {records / seconds:,.0f} records/s")
+    ok &= check(f"at least {args.min_speedup:,.0f} simulated seconds per second", speedup >= args.min_speedup,
+                f"{speedup:,.0f}x real time")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
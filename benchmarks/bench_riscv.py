@@ -0,0 +1,113 @@
+"""Instructions/s and cycles per main_loop iteration of ripes/ripes.s.
+
+Runs the controller headless under each switch scenario.  Every main_loop
+iteration redraws all 875 LED pixels (draw_green or draw_alarm), which is
+where nearly all instructions are spent.  The "naive" line interprets the
+same decoded program by looking at each instruction's operation name on
+every step, for comparison with the pre-decoded dispatch table.
+
+    python benchmarks/bench_riscv.py [--iterations 200] [--source ripes/ripes.s]
+"""
+import argparse
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+from corridor.riscv import FIVE_STAGE, SINGLE_CYCLE, Machine, assemble_file  # noqa: E402
+
+# name: (switch bank 0, switch bank 1)
+SCENARIOS = {
+    "safe": (0, 0),
+    "smoke": (1, 0),
+    "pm25>100": (101 << 1, 0),
+    "co2>100": (0, 101),
+}
+
+
+def naive_run(program, switches, count):
+    """Step through ``program`` dispatching on the operation name each time (sw/lw/ALU subset)."""
+    regs, pixels, symbols = [0] * 32, {}, program.symbols
+    pc = 0
+    for _ in range(count):
+        ins = program.instructions[pc >> 2]
+        op, rd, rs1, rs2, imm = ins.op, ins.rd, ins.rs1, ins.rs2, ins.imm
+        nxt = pc + 4
+        if op == "lui":
+            value = imm << 12
+        elif op == "addi":
+            value = regs[rs1] + imm
+        elif op == "and":
+            value = regs[rs1] & regs[rs2]
+        elif op == "srli":
+            value = regs[rs1] >> imm
+        elif op == "lw":
+            addr = (regs[rs1] + imm) & 0xFFFFFFFF
+            value = switches[0] if addr == symbols["SW0_BASE"] else switches[1]
+        elif op == "sw":
+            pixels[(regs[rs1] + imm) & 0xFFFFFFFF] = regs[rs2]
+            rd = 0
+        elif op in ("bne", "blt"):
+            a, b = regs[rs1], regs[rs2]
+            if op == "blt":
+                a, b = a - (a >> 31 << 32), b - (b >> 31 << 32)
+            if (a != b) if op == "bne" else (a < b):
+                nxt = imm
+            rd = 0
+        elif op == "jal":
+            value, nxt = pc + 4, imm
+        elif op == "jalr":
+            value, nxt = pc + 4, (regs[rs1] + imm) & ~1
+        else:
+            raise ValueError(f"unsupported op {op!r}")
+        if rd:
+            regs[rd] = value & 0xFFFFFFFF
+        pc = nxt
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default=os.path.join(HERE, "..", "ripes", "ripes.s"))
+    parser.add_argument("--iterations", type=int, default=200, help="main_loop iterations per scenario")
+    args = parser.parse_args()
+
+    program = assemble_file(args.source)
+    print(f"{os.path.relpath(args.source)}: {len(program.instructions)} instructions")
+    print(f"{'scenario':10} {'instr/iter':>10} {FIVE_STAGE.name + ' cyc':>13} {'CPI':>5} "
+          f"{SINGLE_CYCLE.name + ' cyc':>17} {'Minstr/s':>9}")
+    for name, (sw0, sw1) in SCENARIOS.items():
+        machine = Machine(program, FIVE_STAGE)
+        flat = Machine(program, SINGLE_CYCLE)
+        for m in (machine, flat):
+            m.set_switches(0, sw0)
+            m.set_switches(1, sw1)
+            m.run(until="main_loop")  # _start
+            m.run(until="main_loop")  # warm-up iteration
+        instructions = cycles = seconds = flat_cycles = 0
+        for _ in range(args.iterations):
+            stats = machine.run(until="main_loop")
+            instructions += stats.instructions
+            cycles += stats.cycles
+            seconds += stats.seconds
+            flat_cycles += flat.run(until="main_loop").cycles
+        n = args.iterations
+        print(f"{name:10} {instructions / n:10.0f} {cycles / n:13.0f} {cycles / instructions:5.2f} "
+              f"{flat_cycles / n:17.0f} {instructions / seconds / 1e6:9.2f}")
+
+    # Raw throughput without breakpoints, then the naive interpreter on the same work
+    machine = Machine(program)
+    count = 2_000_000
+    stats = machine.run(count)
+    print(f"\nfree run   {stats.instructions:,} instructions in {stats.seconds:.2f} s "
+          f"({stats.instructions / stats.seconds / 1e6:.2f} M instr/s)")
+    start = time.perf_counter()
+    naive_run(program, (0, 0), count)
+    naive = time.perf_counter() - start
+    print(f"naive      {count:,} instructions in {naive:.2f} s ({count / naive / 1e6:.2f} M instr/s, "
+          f"{naive / stats.seconds:.1f}x slower)")
+
+
+if __name__ == "__main__":
+    main()
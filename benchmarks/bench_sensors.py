@@ -0,0 +1,139 @@
+"""Parity and Monte-Carlo throughput of the vectorized room sensor model.
+
+First checks ``corridor.sensors`` against readings worked out by hand from
+the sensorData useMemo and the ventilation effect in SimulationContext.jsx
+(exit status 1 on any mismatch), then sweeps random hazard combinations
+under a few ventilation policies and reports scenarios/s and the
+time-to-safe distribution ("never" is the share of initially unsafe
+scenarios still unsafe at the end).  --check-only stops after the parity
+checks, for CI.
+
+    python benchmarks/bench_sensors.py [--scenarios 200000] [--steps 300] [--chunk 20000] [--check-only]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+from corridor.sensors import (  # noqa: E402
+    CRITICAL, KITCHEN, LIVING, MASTER, ROOMS, SAFE, WARNING, Hazards, random_hazards, room_sensors, simulate,
+    time_to_safe,
+)
+
+HEATERS_OFF = np.zeros(len(ROOMS), bool)
+
+
+def _heaters(room, **state):
+    # per-room heater arrays with only ``room`` set
+    arrays = {key: HEATERS_OFF.copy() for key in ("heater_on", "heater_overloaded")}
+    levels = np.ones(len(ROOMS), int)
+    for key, value in state.items():
+        if key == "heater_level":
+            levels[room] = value
+        else:
+            arrays[key][room] = value
+    return dict(arrays, heater_level=levels)
+
+
+# name: (hazards, room, expected (smoke, co2, pm25, temp)), values as sensorData computes them
+PARITY_CASES = {
+    "baseline": (Hazards(), LIVING, (0, 400, 15, 22)),
+    "two burners, one item burning": (Hazards(burners=2, burning=1), KITCHEN, (50, 650, 45, 28)),
+    "stove and fridge exploded": (Hazards(stove=True, fridge=True, smoke_level=80.0), KITCHEN, (100, 600, 75, 37)),
+    "blocked chimney": (Hazards(chimney=True), LIVING, (70, 700, 65, 22)),
+    "master TV exploded": (Hazards(tv_master=True, smoke_level=40.0), MASTER, (80, 400, 50, 22)),
+    "heater on, level 3": (Hazards(**_heaters(MASTER, heater_on=True, heater_level=3)), MASTER, (0, 400, 15, 34)),
+    "heater overloaded": (Hazards(**_heaters(MASTER, heater_on=True, heater_level=3, heater_overloaded=True),
+                                  smoke_level=30.0), MASTER, (80, 400, 55, 47)),
+    "emergency floor": (Hazards(emergency=True, smoke_level=12.3), KITCHEN, (60, 800, 15, 22)),
+    "Math.round of x.5": (Hazards(smoke_level=20.5), KITCHEN, (21, 400, 15, 22)),
+    "clamped": (Hazards(burners=4, burning=5, stove=True, **_heaters(LIVING)), KITCHEN, (100, 1350, 200, 49)),
+}
+
+# smokeLevel per tick from 80 with every vent on HIGH (0.1 * 7, capped at 0.3):
+# 80, 56, 39.2, 27.44, ... 1.107, then 0.775 < 1 drops to 0; 80 * 0.99**t with no
+# vent running.
+DECAY_CASES = {
+    "all vents HIGH": (np.full(len(ROOMS), 3), [80, 56, 39, 27, 19, 13, 9, 7, 5, 3, 2, 2, 1, 0]),
+    "kitchen LOW": (np.eye(len(ROOMS), dtype=int)[KITCHEN], [80, 78, 77, 75, 74, 72, 71, 69, 68, 67, 65, 64, 63]),
+    "no vents": (np.zeros(len(ROOMS), int), [80, 79, 78, 78, 77, 76, 75, 75, 74, 73, 72, 72, 71]),
+}
+
+# name: vent level codes per room for every scenario in the sweep
+POLICIES = {
+    "no vents": np.zeros(len(ROOMS), int),
+    "kitchen HIGH": np.eye(len(ROOMS), dtype=int)[KITCHEN] * 3,
+    "all MED": np.full(len(ROOMS), 2),
+    "all HIGH": np.full(len(ROOMS), 3),
+}
+
+
+def check_parity():
+    failures = 0
+    for name, (hazards, room, expected) in PARITY_CASES.items():
+        sensors = room_sensors(hazards)
+        got = tuple(int(sensors[metric][0, room, 0]) for metric in ("smoke", "co2", "pm25", "temp"))
+        if got != expected:
+            print(f"  MISMATCH {name}: {ROOMS[room]} {got} != {expected}")
+            failures += 1
+    for name, (vents, expected) in DECAY_CASES.items():
+        trace = simulate(Hazards(smoke_level=np.array([80.0])), vents[None], len(expected))
+        got = [int(value) for value in trace.sensors["smoke"][0, LIVING]]
+        if got != expected:
+            print(f"  MISMATCH {name}: {got} != {expected}")
+            failures += 1
+    # Burning items clear after 10 s of ventilation, not without it
+    vented = simulate(Hazards(burning=np.array([1, 1])), np.array([POLICIES["all HIGH"], POLICIES["no vents"]]), 12)
+    if vented.burning[:, 9].tolist() != [1, 1] or vented.burning[:, 10].tolist() != [0, 1]:
+        print(f"  MISMATCH burning expiry: {vented.burning.tolist()}")
+        failures += 1
+    print(f"parity: {len(PARITY_CASES) + len(DECAY_CASES) + 1 - failures}/"
+          f"{len(PARITY_CASES) + len(DECAY_CASES) + 1} cases match")
+    return failures == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", type=int, default=200_000)
+    parser.add_argument("--steps", type=int, default=300, help="one-second ticks per scenario")
+    parser.add_argument("--chunk", type=int, default=20_000, help="scenarios simulated per batch")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--check-only", action="store_true", help="only the parity checks, no sweep")
+    args = parser.parse_args()
+
+    if not check_parity():
+        sys.exit(1)
+    if args.check_only:
+        return
+
+    rng = np.random.default_rng(args.seed)
+    print(f"\n{args.scenarios:,} scenarios x {args.steps} s, {len(ROOMS)} rooms")
+    print(f"{'policy':14} {'scen/s':>10} {'start crit':>10} {'start warn':>10} "
+          f"{'p50 safe':>9} {'p90 safe':>9} {'p99 safe':>9} {'never':>7}")
+    for name, policy in POLICIES.items():
+        seconds, waits, initial = 0.0, [], []
+        for offset in range(0, args.scenarios, args.chunk):
+            n = min(args.chunk, args.scenarios - offset)
+            hazards = random_hazards(n, rng)
+            start = time.perf_counter()
+            trace = simulate(hazards, np.broadcast_to(policy, (n, len(ROOMS))), args.steps)
+            waits.append(time_to_safe(trace.status))
+            seconds += time.perf_counter() - start
+            initial.append(trace.status[:, 0])
+        waits, initial = np.concatenate(waits), np.concatenate(initial)
+        hazardous = waits[initial != SAFE]
+        finite = hazardous[np.isfinite(hazardous)]
+        quantiles = np.percentile(finite, (50, 90, 99)) if len(finite) else ()
+        safe = " ".join(f"{q:8.0f}s" for q in quantiles) or f"{'-':>9} {'-':>9} {'-':>9}"
+        never = (~np.isfinite(hazardous)).mean() if len(hazardous) else 0.0
+        print(f"{name:14} {args.scenarios / seconds:10,.0f} {(initial == CRITICAL).mean():10.1%} "
+              f"{(initial == WARNING).mean():10.1%} {safe} {never:7.1%}")
+
+
+if __name__ == "__main__":
+    main()
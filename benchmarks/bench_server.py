@@ -0,0 +1,168 @@
+"""Wall time of a deck build through the build server against a fresh process.
+
+Starts ``generate_slides.py serve`` on a temporary socket, then times:
+
+* the plain CLI building in-process (``--local``), which pays for the
+  interpreter, python-pptx and the template on every run;
+* the same CLI handing the build to the warm server;
+* requests sent straight from this process, one at a time and
+  ``--concurrency`` at once, with and without the slide cache;
+* a 1 MB inline ``deck`` request, over asyncio's default line limit;
+* a burst larger than the server's queue, which must be refused as busy
+  rather than piling up.
+
+Every deck the server writes must match the in-process build part for part
+(exit status 1 otherwise).  The server's own latency metrics are printed at
+the end.
+
+    python benchmarks/bench_server.py [--runs 10] [--workers 2] [--concurrency 8]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, "..")
+SCRIPT = os.path.join(ROOT, "generate_slides.py")
+sys.path.insert(0, ROOT)
+
+from slides.client import ServerError, request  # noqa: E402
+
+
+def start_server(address, workers, max_queue):
+    proc = subprocess.Popen([sys.executable, SCRIPT, "serve", "--listen", address, "--workers", str(workers),
+                             "--max-queue", str(max_queue)], cwd=ROOT, stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline()
+    if "build server" not in line:
+        proc.kill()
+        sys.exit(f"server did not start: {line!r}")
+    return proc
+
+
+def cli(args):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, SCRIPT] + args, cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+    return (time.perf_counter() - start) * 1000
+
+
+def parts(path):
+    with zipfile.ZipFile(path) as z:
+        return {name: z.read(name) for name in z.namelist()}
+
+
+def concurrent(address, messages):
+    """Send every message at once from its own thread; (wall ms, responses or errors)."""
+    results = [None] * len(messages)
+
+    def send(i):
+        try:
+            results[i] = request(address, messages[i])
+        except ServerError as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=send, args=(i,)) for i in range(len(messages))]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return (time.perf_counter() - start) * 1000, results
+
+
+def summary(values):
+    ordered = sorted(values)
+    return (f"median {statistics.median(ordered):7.1f}  p90 {ordered[int(0.9 * (len(ordered) - 1))]:7.1f}  "
+            f"max {ordered[-1]:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="builds per sequential measurement")
+    parser.add_argument("--workers", type=int, default=2, help="server worker processes")
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight at once")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        address = os.path.join(tmp, "server.sock")
+        cache = os.path.join(tmp, "cache")
+        reference = os.path.join(tmp, "local.pptx")
+        server = start_server(address, args.workers, args.concurrency)
+        failures = []
+        try:
+            print(f"server: {args.workers} workers, queue {args.concurrency}")
+            local = [cli(["build", "--local", "--no-cache", "-o", reference]) for _ in range(args.runs)]
+            print(f"{'CLI, in-process':28} {summary(local)}")
+            served = [cli(["build", "--server", address, "--no-cache", "-o", os.path.join(tmp, "served.pptx")])
+                      for _ in range(args.runs)]
+            print(f"{'CLI, via server':28} {summary(served)}")
+            if parts(os.path.join(tmp, "served.pptx")) != parts(reference):
+                failures.append("deck built by the server differs from the in-process build")
+
+            expected = parts(reference)
+            for label, cache_dir in (("request, no cache", None), ("request, cached", cache)):
+                message = {"op": "build", "spec": os.path.join(ROOT, "slides", "deck.json"), "cache_dir": cache_dir}
+                request(address, dict(message, output=os.path.join(tmp, "warm.pptx")))
+                totals = [request(address, dict(message, output=os.path.join(tmp, "one.pptx")))["total_ms"]
+                          for _ in range(args.runs)]
+                print(f"{label:28} {summary(totals)}")
+                outputs = [os.path.join(tmp, f"c{i}.pptx") for i in range(args.concurrency)]
+                wall, results = concurrent(address, [dict(message, output=out) for out in outputs])
+                errors = [r for r in results if isinstance(r, Exception)]
+                failures += [f"concurrent {label}: {e}" for e in errors[:3]]
+                totals = [r["total_ms"] for r in results if not isinstance(r, Exception)]
+                print(f"{'  x' + str(args.concurrency) + ' concurrent':28} {summary(totals)}  "
+                      f"({args.concurrency / wall * 1000:.1f} decks/s)")
+                failures += [f"concurrent {label}: {out} differs" for out in outputs if parts(out) != expected]
+
+            # An inline deck far over asyncio's 64 KiB default line limit; the padding var is never referenced
+            with open(os.path.join(ROOT, "slides", "deck.json"), encoding="utf-8") as f:
+                deck = json.load(f)
+            deck["vars"] = dict(deck.get("vars", {}), padding="x" * (1 << 20))
+            inline = os.path.join(tmp, "inline.pptx")
+            try:
+                total = request(address, {"op": "build", "deck": deck, "output": inline, "cache_dir": None})["total_ms"]
+                print(f"{'request, 1 MB inline deck':28} {total:7.1f} ms")
+                if parts(inline) != expected:
+                    failures.append("inline deck differs from the in-process build")
+            except (ServerError, OSError) as e:
+                failures.append(f"1 MB inline deck: {e}")
+
+            burst = 2 * (args.workers + args.concurrency)
+            message = {"op": "build", "spec": os.path.join(ROOT, "slides", "deck.json"), "cache_dir": None}
+            _, results = concurrent(address, [dict(message, output=os.path.join(tmp, f"b{i}.pptx"))
+                                              for i in range(burst)])
+            busy = sum(isinstance(r, ServerError) and str(r).startswith("busy") for r in results)
+            built = sum(not isinstance(r, Exception) for r in results)
+            print(f"burst of {burst}: {built} built, {busy} refused as busy")
+            if busy == 0 or built + busy != burst:
+                failures.append(f"burst of {burst}: expected some busy refusals, got {built} built, {busy} busy")
+
+            metrics = request(address, {"op": "metrics"})
+            print(f"\nserver metrics: {metrics['requests']} requests, {metrics['errors']} errors, "
+                  f"{metrics['refused']} refused")
+            for field in ("queue", "build", "total"):
+                ms = metrics[field + "_ms"]
+                print(f"  {field:5} p50 {ms['p50']:7.1f}  p90 {ms['p90']:7.1f}  p99 {ms['p99']:7.1f}  "
+                      f"max {ms['max']:7.1f} ms")
+            request(address, {"op": "shutdown"})
+            server.wait(timeout=30)
+        finally:
+            if server.poll() is None:
+                server.terminate()
+                server.wait()
+
+    for failure in failures:
+        print(f"  FAILED {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
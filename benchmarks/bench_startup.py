@@ -0,0 +1,89 @@
+"""Startup time of the generate_slides.py commands that don't render.
+
+Runs each command under ``python -X importtime`` and reports wall time and
+the import time on top of a bare interpreter, with the slowest top-level
+imports.  Exits with status 1 if a non-rendering command imports a
+rendering dependency (python-pptx, lxml, NumPy, ...) or its imports take
+longer than ``--budget`` milliseconds, so it can guard pre-commit hooks
+and watch loops against startup regressions.  The import cost of a real
+build is shown for comparison.
+
+    python benchmarks/bench_startup.py [--runs 5] [--budget 60]
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, "..")
+SCRIPT = os.path.join(ROOT, "generate_slides.py")
+
+COMMANDS = (["--help"], ["validate"], ["list-slides"], ["build", "--help"])
+# Never needed before a slide is rendered
+HEAVY = ("pptx", "lxml", "numpy", "PIL", "xlsxwriter", "yaml", "concurrent.futures")
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def run(args):
+    """(wall ms, {top-level module: cumulative ms}, every module imported)."""
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime"] + args, cwd=ROOT, capture_output=True, text=True)
+    wall = (time.perf_counter() - start) * 1000
+    if proc.returncode:
+        sys.exit(f"{' '.join(args)} failed:\n{proc.stderr[-2000:]}")
+    top, modules = {}, set()
+    for match in LINE.finditer(proc.stderr):
+        _, cumulative, indent, name = match.groups()
+        modules.add(name)
+        if not indent:
+            top[name] = top.get(name, 0) + int(cumulative) / 1000
+    return wall, top, modules
+
+
+def measure(args, runs):
+    results = [run(args) for _ in range(runs)]
+    wall = statistics.median(r[0] for r in results)
+    imports = statistics.median(sum(r[1].values()) for r in results)
+    return wall, imports, results[-1][1], results[-1][2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="runs per command (medians are reported)")
+    parser.add_argument("--budget", type=float, default=60.0,
+                        help="max import ms on top of a bare interpreter for non-rendering commands")
+    args = parser.parse_args()
+
+    base_wall, base_imports, _, base_modules = measure(["-c", "pass"], args.runs)
+    print(f"bare interpreter: {base_wall:.0f} ms wall, {base_imports:.1f} ms imports")
+    print(f"{'command':22} {'wall ms':>8} {'import ms':>10}  slowest imports")
+    failures = []
+    for command in COMMANDS:
+        wall, imports, top, modules = measure([SCRIPT] + command, args.runs)
+        extra = imports - base_imports
+        slowest = sorted(((ms, name) for name, ms in top.items() if name not in base_modules), reverse=True)[:3]
+        label = " ".join(command)
+        print(f"{label:22} {wall:8.0f} {extra:10.1f}  " + ", ".join(f"{name} {ms:.1f}" for ms, name in slowest))
+        heavy = sorted(m for m in modules if m.split(".")[0] in HEAVY or m in HEAVY)
+        if heavy:
+            failures.append(f"{label}: imports {', '.join(heavy[:5])}")
+        if extra > args.budget:
+            failures.append(f"{label}: {extra:.1f} ms of imports, budget {args.budget:g} ms")
+
+    _, imports, top, _ = measure(["-c", "import slides.build, slides.render"], 1)
+    print(f"{'(a real build)':22} {'':8} {imports - base_imports:10.1f}  "
+          + ", ".join(f"{name} {ms:.1f}" for name, ms in sorted(top.items(), key=lambda kv: -kv[1])[:3]))
+
+    for failure in failures:
+        print(f"  REGRESSION {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
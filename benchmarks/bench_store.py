@@ -0,0 +1,204 @@
+"""Ingest rate and query latency of the columnar telemetry store (``corridor.store``).
+
+Writes an archive of ``--days`` of ``smart-corridor/monitor`` envelopes
+(one per room every ``--interval`` seconds, statuses from the ESP32 rules
+of ``corridor.controller``) and the ``/commands`` the sketch publishes on
+every status change.  The archive is ingested, then queried from a freshly
+opened store:
+
+* a one-hour range scan;
+* per-room PM2.5 aggregates over a day and over the whole archive;
+* every CRITICAL window of the kitchen in the last 30 days.
+
+Each answer must equal the one found by re-parsing the JSON lines, which
+is timed as well (exit status 1 on any mismatch), and bare payloads must be
+filed by their fields: the twin's sensors, which carry a ``status`` too, in
+no table.
+
+    python benchmarks/bench_store.py [--days 30] [--interval 15] [--repeat 20]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, "..")
+sys.path.insert(0, ROOT)
+
+from corridor.controller import ESP32, evaluate  # noqa: E402
+from corridor.sensors import ROOMS  # noqa: E402
+from corridor.store import Store, table_of  # noqa: E402
+
+START = 1_717_200_000.0  # 2024-06-01 00:00 UTC
+# Indexed by the deciding rule; SAFE (-1) is the last entry
+STATUSES = np.array([rule.status for rule in ESP32.rules] + ["SAFE"], dtype=object)
+
+
+def readings(count, rng):
+    """Background levels with hazard episodes; (count,) per metric."""
+    episode = np.zeros(count)
+    for start in rng.integers(0, count, max(count // 2000, 1)):
+        length = int(rng.integers(5, 120))
+        episode[start:start + length] = rng.uniform(20, 100)
+    return {"smoke": np.round(episode + rng.exponential(2, count)),
+            "co2": np.round(450 + 300 * rng.random(count) + 8 * episode),
+            "pm25": np.round(15 + 20 * rng.random(count) + episode),
+            "temp": np.round(21 + 3 * rng.random(count) + episode / 8, 1)}
+
+
+def write_archive(path, days, interval, rng):
+    steps = int(days * 86400 / interval)
+    ts = START + np.arange(steps) * interval
+    lines = 0
+    with open(path, "w") as f:
+        data = {room: readings(steps, rng) for room in ROOMS}
+        status = {room: STATUSES[evaluate(ESP32, data[room])] for room in ROOMS}
+        for i in range(steps):
+            for room in ROOMS:
+                values = data[room]
+                now = status[room][i]
+                payload = {"pm25": int(values["pm25"][i]), "co2": int(values["co2"][i]),
+                           "smoke": int(values["smoke"][i]), "temp": float(values["temp"][i]),
+                           "ventilation": now != "SAFE", "status": now, "source": "combined"}
+                f.write(json.dumps({"topic": "smart-corridor/monitor", "ts": round(ts[i], 3), "room": room,
+                                    "payload": payload}) + "\n")
+                lines += 1
+                if i and now != status[room][i - 1]:
+                    alarm = now != "SAFE"
+                    command = {"action": "ACTIVATE_VENT" if alarm else "DEACTIVATE_VENT", "room": room,
+                               "level": "HIGH" if alarm else "OFF", "alarm": alarm, "timestamp": i * 1000}
+                    f.write(json.dumps({"topic": "smart-corridor/commands", "ts": round(ts[i] + 0.05, 3),
+                                        "payload": command}) + "\n")
+                    lines += 1
+    return lines
+
+
+def from_json(path, start, end):
+    """Monitor rows in [start, end) by re-parsing the archive: (ts, room, pm25, status) lists."""
+    rows = []
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            if record["topic"] == "smart-corridor/monitor" and start <= record["ts"] < end:
+                p = record["payload"]
+                rows.append((record["ts"], record["room"], p["pm25"], p["status"]))
+    return rows
+
+
+def json_aggregate(rows):
+    out = {}
+    for _, room, pm25, _ in rows:
+        count, total, low, high = out.get(room, (0, 0.0, float("inf"), float("-inf")))
+        out[room] = (count + 1, total + pm25, min(low, pm25), max(high, pm25))
+    return out
+
+
+def json_windows(rows, room):
+    spells, current = [], None
+    for ts, r, _, status in rows:
+        if r != room:
+            continue
+        if status.startswith("CRITICAL"):
+            if current is None:
+                current = [ts, ts, 0]
+                spells.append(current)
+            current[1] = ts
+            current[2] += 1
+        elif current is not None:
+            current[1] = ts
+            current = None
+    return spells
+
+
+def timed(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return result, samples[len(samples) // 2], samples[min(len(samples) - 1, int(0.99 * len(samples)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=float, default=30)
+    parser.add_argument("--interval", type=float, default=15, help="seconds between monitor messages per room")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per query")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = os.path.join(tmp, "archive.jsonl")
+        lines = write_archive(archive, args.days, args.interval, rng)
+        size = os.path.getsize(archive)
+        print(f"archive: {lines:,} lines, {size / 1e6:.0f} MB of JSON over {args.days:g} days")
+
+        root = os.path.join(tmp, "store")
+        start = time.perf_counter()
+        with Store(root) as store, open(archive, "rb") as f:
+            added = store.ingest(f)
+        seconds = time.perf_counter() - start
+        disk = sum(os.path.getsize(os.path.join(d, name)) for d, _, names in os.walk(root) for name in names)
+        print(f"ingest: {added:,} rows in {seconds:.2f} s ({added / seconds / 1e3:,.0f} k rows/s, "
+              f"{size / seconds / 1e6:.0f} MB/s of JSON); {disk / 1e6:.0f} MB on disk "
+              f"({size / disk:.1f}x smaller), {len(store['monitor'].segments)} monitor segments")
+
+        store = Store(root)
+        end = START + args.days * 86400
+        hour = (START + args.days * 43200, START + args.days * 43200 + 3600)
+        day = (end - 86400, end)
+        month = (end - 30 * 86400, end)
+        queries = [
+            ("range scan, 1 hour", hour, lambda: store.scan("monitor", *hour),
+             lambda rows: len(rows)),
+            ("per-room PM2.5, 1 day", day, lambda: store.aggregate("monitor", "pm25", "room", *day),
+             json_aggregate),
+            ("per-room PM2.5, archive", (START, end), lambda: store.aggregate("monitor", "pm25", "room", START, end),
+             json_aggregate),
+            ("kitchen CRITICAL windows, 30 days", month, lambda: store.windows(*month, room="kitchen"),
+             lambda rows: json_windows(rows, "kitchen")),
+        ]
+        failures = []
+        print(f"\n{'query':34} {'p50 ms':>8} {'p99 ms':>8} {'JSON s':>8}  result")
+        for label, (lo, hi), query, reference in queries:
+            result, p50, p99 = timed(query, args.repeat)
+            begin = time.perf_counter()
+            expected = reference(from_json(archive, lo, hi))
+            parsed = time.perf_counter() - begin
+            if label.startswith("range"):
+                found, summary = len(result["ts"]), f"{len(result['ts']):,} rows"
+            elif label.startswith("per-room"):
+                found = {room: (result.count[room], result.sum[room], result.min[room], result.max[room])
+                         for room in result.count}
+                summary = f"{len(found)} rooms, {sum(result.count.values()):,} rows"
+            else:
+                found = [[w.start, w.end, w.rows] for w in result]
+                summary = f"{len(found)} windows, {sum(w.end - w.start for w in result) / 3600:.1f} h"
+            if found != expected:
+                failures.append(label)
+            print(f"{label:34} {p50:8.2f} {p99:8.2f} {parsed:8.2f}  {summary}")
+
+    # Bare payloads: the twin's sensors carry a status too, but are not the sketch's monitor
+    bare = {"sensors": {"smoke": 10, "co2": 500, "pm25": 15, "temp": 28, "status": "SAFE", "timestamp": START * 1000},
+            "monitor": {"pm25": 15, "co2": 500, "smoke": 10, "temp": 28, "ventilation": False, "status": "SAFE",
+                        "source": "combined"},
+            "commands": {"action": "SET_ALERT", "room": "kitchen", "level": "normal", "alarm": False, "timestamp": 0}}
+    tables = {name: table_of(payload) for name, payload in bare.items()}
+    misfiled = tables != {"sensors": None, "monitor": "monitor", "commands": "commands"}
+    if misfiled:
+        print(f"  FAILED bare payloads filed as {tables}")
+    for failure in failures:
+        print(f"  FAILED {failure}: differs from the JSON lines")
+    if failures or misfiled:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
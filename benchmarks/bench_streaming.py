@@ -0,0 +1,134 @@
+"""Peak memory of streamed deck builds (one slide per sensor event).
+
+Streams an incident-report deck through slides.build.DeckWriter and checks
+that peak RSS stays under a fixed ceiling; exits non-zero if it does not.
+With --baseline the same deck is also built the old way, as one in-memory
+python-pptx presentation saved at the end, in a child process so both peaks
+are measured independently.
+
+--check-only skips the full-size build: it streams a small and a five times
+larger deck in fresh processes and checks both stay under the ceiling and
+that the larger one's peak grew by no more than --max-growth-mb.  It takes a
+few seconds, for CI.
+
+    python benchmarks/bench_streaming.py [--slides 10000] [--max-rss-mb 150] [--check-only]
+"""
+import argparse
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks._common import check  # noqa: E402
+
+ROOMS = ["kitchen", "living-room", "dining-room", "guest-bedroom", "master-bedroom", "children-room", "home-office"]
+STATUS = [("SAFE", "ACCENT_GREEN"), ("WARNING: HIGH PM2.5", "ACCENT_YELLOW"), ("CRITICAL: SMOKE DETECTED", "ACCENT_RED")]
+
+
+def incident_slide(n, rng):
+    room = rng.choice(ROOMS)
+    status, color = rng.choice(STATUS)
+    readings = {"smoke": rng.randint(0, 100), "co2": rng.randint(400, 2000),
+                "pm25": rng.randint(15, 200), "temp": rng.randint(18, 60)}
+    return {"name": f"event-{n}", "elements": [
+        {"type": "title", "text": f"Sensor event #{n}: {room}"},
+        {"type": "shape", "shape": "rounded_rectangle", "box": [1, 1.8, 11.3, 0.8], "fill": "CARD_BG",
+         "line": color, "anchor": "middle",
+         "paragraphs": [{"text": status, "size": 20, "bold": True, "color": color, "align": "center"}]},
+        {"type": "text", "text": "Readings", "box": [1, 3, 5, 3], "size": 22, "color": "ACCENT_BLUE",
+         "bullets": [f"{key}: {value}" for key, value in readings.items()]},
+        {"type": "text", "text": f"t = {n} s", "box": [7, 3, 5, 0.5], "size": 14},
+    ]}
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def build_streaming(path, count):
+    from slides.build import DeckWriter
+
+    rng = random.Random(0)
+    with DeckWriter(path) as deck:
+        for n in range(count):
+            deck.add_slide(incident_slide(n, rng))
+    return deck.stats.slides
+
+
+def build_in_memory(path, count):
+    # The pre-streaming approach: every slide stays in the object graph until save()
+    from slides.render import ELEMENTS, rgb, new_presentation
+    from slides.spec import slide_resolver
+
+    rng = random.Random(0)
+    resolve = slide_resolver({})
+    prs = new_presentation([13.333, 7.5])
+    layout = prs.slide_layouts[6]
+    for n in range(count):
+        spec = resolve(incident_slide(n, rng))
+        slide = prs.slides.add_slide(layout)
+        slide.background.fill.solid()
+        slide.background.fill.fore_color.rgb = rgb(spec["background"])
+        for element in spec["elements"]:
+            ELEMENTS[element["type"]](slide, element)
+    prs.save(path)
+    return count
+
+
+def child_peak_mb(count, max_rss_mb):
+    """Stream ``count`` slides in a fresh process; returns (under the ceiling, peak RSS of any child so far)."""
+    done = subprocess.run([sys.executable, __file__, "--slides", str(count), "--max-rss-mb", str(max_rss_mb)],
+                          stdout=subprocess.DEVNULL)
+    return done.returncode == 0, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+
+def check_only(max_rss_mb, slides=200, max_growth_mb=5.0):
+    # RUSAGE_CHILDREN keeps the largest child's peak, so the small deck goes first
+    small_ok, small = child_peak_mb(slides, max_rss_mb)
+    large_ok, large = child_peak_mb(slides * 5, max_rss_mb)
+    print("checks")
+    ok = check(f"{slides} and {slides * 5} slides under {max_rss_mb:.0f} MB", small_ok and large_ok,
+               f"{small:.1f} / {large:.1f} MB")
+    ok &= check(f"peak grows by at most {max_growth_mb:g} MB over {slides * 4} more slides",
+                large - small <= max_growth_mb, f"{large - small:+.1f} MB")
+    return 0 if ok else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--slides", type=int, default=10000)
+    parser.add_argument("--max-rss-mb", type=float, default=150.0, help="peak RSS ceiling for the streamed build")
+    parser.add_argument("--baseline", action="store_true", help="also measure the in-memory build")
+    parser.add_argument("--check-only", action="store_true", help="only the quick flat-memory checks, no full build")
+    parser.add_argument("--max-growth-mb", type=float, default=5.0, help="peak RSS growth allowed by --check-only")
+    parser.add_argument("--mode", choices=["streaming", "in-memory"], default="streaming", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.check_only:
+        return check_only(args.max_rss_mb, max_growth_mb=args.max_growth_mb)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, "incidents.pptx")
+        start = time.perf_counter()
+        build = build_streaming if args.mode == "streaming" else build_in_memory
+        count = build(path, args.slides)
+        seconds = time.perf_counter() - start
+        size_mb = os.path.getsize(path) / 1e6
+    print(f"{args.mode:<10} {count} slides in {seconds:.1f} s ({count / seconds:.0f} slides/s), "
+          f"{size_mb:.1f} MB file, peak RSS {peak_rss_mb():.1f} MB")
+
+    if args.mode != "streaming":
+        return 0
+    if args.baseline:
+        subprocess.run([sys.executable, __file__, "--slides", str(args.slides), "--mode", "in-memory"], check=True)
+    print("checks")
+    ok = check(f"peak RSS under {args.max_rss_mb:.0f} MB", peak_rss_mb() <= args.max_rss_mb, f"{peak_rss_mb():.1f} MB")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""Shapes created per second: property-by-property styling vs. the style registry.
+
+The "before" helpers below are the original generate_slides.py helpers,
+which set font size, color, name and bold one property at a time and build
+every card through add_shape + fill + line.  The "after" run uses the
+helpers in slides.render, backed by slides.styles.STYLES.
+
+    python benchmarks/bench_styles.py [--slides 300]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lxml import etree  # noqa: E402
+from pptx.dml.color import RGBColor  # noqa: E402
+from pptx.enum.shapes import MSO_SHAPE  # noqa: E402
+from pptx.enum.text import PP_ALIGN  # noqa: E402
+from pptx.util import Inches, Pt  # noqa: E402
+
+from slides import render  # noqa: E402
+
+TEXT_MAIN = RGBColor(255, 255, 255)
+TEXT_SEC = RGBColor(160, 160, 176)
+ACCENTS = [RGBColor(68, 136, 255), RGBColor(255, 68, 102), RGBColor(0, 255, 136), RGBColor(153, 102, 255)]
+
+
+# --- BEFORE: original helpers ---
+def legacy_add_title(slide, text, font_size=40, top=Inches(0.5)):
+    title_box = slide.shapes.add_textbox(Inches(0.5), top, Inches(12.333), Inches(1))
+    p = title_box.text_frame.paragraphs[0]
+    p.text = text
+    p.font.size = Pt(font_size)
+    p.font.color.rgb = TEXT_MAIN
+    p.font.name = "Arial"
+    p.font.bold = True
+    return title_box
+
+
+def legacy_add_text_box(slide, text, left, top, width, height, font_size=18, color=TEXT_SEC, bold=False):
+    tb = slide.shapes.add_textbox(left, top, width, height)
+    tf = tb.text_frame
+    tf.word_wrap = True
+    p = tf.paragraphs[0]
+    p.text = text
+    p.font.size = Pt(font_size)
+    p.font.color.rgb = color
+    p.font.name = "Arial"
+    p.font.bold = bold
+    return tf
+
+
+def legacy_add_bullet(tf, text, level=0):
+    p = tf.add_paragraph()
+    p.text = text
+    p.level = level
+    p.font.size = Pt(18)
+    p.font.color.rgb = TEXT_SEC
+    p.font.name = "Arial"
+
+
+def legacy_add_card(slide, left, top, width, height, line):
+    card = slide.shapes.add_shape(MSO_SHAPE.ROUNDED_RECTANGLE, left, top, width, height)
+    card.fill.solid()
+    card.fill.fore_color.rgb = RGBColor(20, 20, 30)
+    card.line.color.rgb = line
+    return card
+
+
+def legacy_add_code_block(slide, code_text, left, top, width, height):
+    shape = slide.shapes.add_shape(MSO_SHAPE.ROUNDED_RECTANGLE, left, top, width, height)
+    shape.fill.solid()
+    shape.fill.fore_color.rgb = RGBColor(26, 26, 46)
+    shape.line.color.rgb = RGBColor(50, 50, 60)
+    tf = shape.text_frame
+    tf.margin_left = Inches(0.2)
+    tf.margin_top = Inches(0.2)
+    p = tf.paragraphs[0]
+    p.text = code_text
+    p.font.name = "Courier New"
+    p.font.size = Pt(12)
+    p.font.color.rgb = RGBColor(200, 200, 200)
+    p.alignment = PP_ALIGN.LEFT
+
+
+LEGACY = (legacy_add_title, legacy_add_text_box, legacy_add_bullet, legacy_add_card, legacy_add_code_block)
+REGISTRY = (
+    render.add_title, render.add_text_box, render.add_bullet,
+    lambda slide, left, top, width, height, line: render.STYLES.add_card(
+        slide, left, top, width, height, RGBColor(20, 20, 30), line),
+    render.add_code_block,
+)
+
+
+def draw(slide, helpers, n):
+    """A typical content slide: 1 title, 2 bullet boxes, 4 cards with labels, 1 code block."""
+    add_title, add_text_box, add_bullet, add_card, add_code_block = helpers
+    add_title(slide, f"Slide {n}: Sensor Thresholds")
+    for col in range(2):
+        tf = add_text_box(slide, "Checks", Inches(1 + col * 6), Inches(1.6), Inches(5), Inches(2),
+                          font_size=22, color=ACCENTS[col])
+        for b in ("Smoke > 30 %", "Temperature > 35 C", "PM2.5 > 80", "CO2 > 800 ppm"):
+            add_bullet(tf, b)
+    for i, color in enumerate(ACCENTS):
+        left = Inches(1 + i * 3)
+        add_card(slide, left, Inches(4), Inches(2.8), Inches(1.2), color)
+        add_text_box(slide, f"Room {i}", left, Inches(4.2), Inches(2.8), Inches(0.5),
+                     font_size=16, color=TEXT_MAIN, bold=True)
+    add_code_block(slide, "li t2, 100\nbgt a1, t2, unsafe_mode", Inches(1), Inches(5.5), Inches(11), Inches(1.5))
+    return 12
+
+
+def run(helpers, count):
+    renderer = render.SlideRenderer([13.333, 7.5])
+    shapes = 0
+    xml = []
+    start = time.perf_counter()
+    for n in range(count):
+        slide = renderer.prs.slides.add_slide(renderer.layout)
+        shapes += draw(slide, helpers, n)
+        if n == 0:
+            xml.append(etree.tostring(slide._element, method="c14n"))
+        renderer._discard_slides()
+    return shapes, time.perf_counter() - start, xml[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--slides", type=int, default=300)
+    args = parser.parse_args()
+
+    run(REGISTRY, 5)  # warm the registry's template caches
+    before_shapes, before_s, before_xml = run(LEGACY, args.slides)
+    after_shapes, after_s, after_xml = run(REGISTRY, args.slides)
+    assert before_xml == after_xml, "style registry output differs from the property-by-property helpers"
+
+    print(f"{'helpers':<22}{'shapes':>8}{'seconds':>10}{'shapes/s':>12}")
+    print(f"{'before (per property)':<22}{before_shapes:>8}{before_s:>10.3f}{before_shapes / before_s:>12.0f}")
+    print(f"{'after (style registry)':<22}{after_shapes:>8}{after_s:>10.3f}{after_shapes / after_s:>12.0f}")
+    print(f"speedup: {before_s / after_s:.2f}x (identical slide XML)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Ingest throughput for recorded telemetry -> chart slides.
+
+Writes a synthetic capture (per-room sensor envelopes every 2 s, ESP32
+monitor payloads every second, the odd command), then times streaming it
+into downsampled series and building the resulting telemetry slide.
+
+First it checks (exit status 1 on failure) that a 40,000-line capture
+reads to the same line count on 1, 2 and 4 workers, and when split into
+byte ranges whose edges fall exactly on line starts or inside lines.
+
+    python benchmarks/bench_telemetry.py                  # 2M lines (~200 MB)
+    python benchmarks/bench_telemetry.py --lines 20000000 --workers 8
+    python benchmarks/bench_telemetry.py --capture week.jsonl   # existing file
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from benchmarks._common import check  # noqa: E402
+from slides.build import build_deck  # noqa: E402
+from slides.telemetry import _lines, _scan_range, read_telemetry, telemetry_slides  # noqa: E402
+
+ROOMS = ("kitchen", "living", "dining", "guest", "master", "bedroom2", "bathroom")
+
+
+def write_capture(path, lines, seed=0):
+    rng = random.Random(seed)
+    t = 1718000000.0
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(lines):
+            phase = math.sin(i / 50000.0)
+            kind = i % 10
+            if kind < len(ROOMS):
+                room = ROOMS[kind]
+                smoke = max(0, round(40 * phase + rng.gauss(0, 3))) if room == "kitchen" else rng.randint(0, 5)
+                payload = {"smoke": smoke, "co2": 400 + rng.randint(0, 300), "pm25": 15 + rng.randint(0, 40),
+                           "temp": 22 + rng.randint(0, 6)}
+                f.write(json.dumps({"topic": "smart-corridor/sensors", "ts": round(t, 3), "room": room,
+                                    "payload": payload}) + "\n")
+            elif kind < 9:
+                f.write(json.dumps({"pm25": rng.randint(10, 90), "co2": rng.randint(400, 900),
+                                    "smoke": rng.randint(0, 60), "temp": rng.randint(20, 36), "ventilation": False,
+                                    "status": "SAFE", "source": "combined"}) + "\n")
+            else:
+                f.write(json.dumps({"action": "SET_ALERT", "room": "kitchen", "level": "normal", "alarm": False,
+                                    "timestamp": int(t * 1000)}) + "\n")
+                t += 2.0
+
+
+def parity(tmp, lines=40_000):
+    path = os.path.join(tmp, "parity.jsonl")
+    write_capture(path, lines)
+    size = os.path.getsize(path)
+    counts = {workers: read_telemetry(path, workers=workers).lines for workers in (1, 2, 4)}
+    ok = check(f"{lines:,} lines read on 1, 2 and 4 workers", set(counts.values()) == {lines},
+               ", ".join(f"{workers}: {count:,}" for workers, count in counts.items()))
+    starts = [offset for offset, _ in _lines(path, 0, size)][::lines // 7]
+    for label, edges in (("on line starts", starts), ("inside lines", [start + 3 for start in starts])):
+        edges = [0] + edges[1:] + [size]
+        read = sum(_scan_range(path, a, b, None, None, 64)[2] for a, b in zip(edges, edges[1:]))
+        ok &= check(f"{len(edges) - 1} byte ranges with edges {label} read every line once", read == lines,
+                    f"{read:,} lines")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=2_000_000)
+    parser.add_argument("--capture", help="benchmark an existing capture instead of a synthetic one")
+    parser.add_argument("--workers", type=int, help="scan processes (default: CPU count)")
+    parser.add_argument("--points", type=int, default=400, help="points per chart line")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print("checks")
+        if not parity(tmp):
+            sys.exit(1)
+        capture = args.capture
+        if not capture:
+            capture = os.path.join(tmp, "capture.jsonl")
+            start = time.perf_counter()
+            write_capture(capture, args.lines)
+            print(f"wrote {args.lines:,} lines in {time.perf_counter() - start:.1f} s")
+        size_mb = os.path.getsize(capture) / 1e6
+
+        start = time.perf_counter()
+        telemetry = read_telemetry(capture, workers=args.workers)
+        ingest = time.perf_counter() - start
+        kept = sum(len(t) for t, _ in telemetry.series.values())
+        print(f"ingest   {size_mb:8.1f} MB, {telemetry.lines:,} lines in {ingest:.2f} s "
+              f"({size_mb / ingest:.0f} MB/s, {telemetry.lines / ingest:,.0f} lines/s); "
+              f"{len(telemetry.series)} series, {kept:,} bucket points")
+
+        start = time.perf_counter()
+        deck = {"slides": telemetry_slides(telemetry, points=args.points)}
+        stats = build_deck(deck, os.path.join(tmp, "telemetry.pptx"))
+        print(f"charts   {stats.slides} slide(s) in {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
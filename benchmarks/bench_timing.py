@@ -0,0 +1,115 @@
+"""Static pipeline timing of ripes/ripes.s (``corridor.riscv.timing``) against the machine.
+
+Checks (exit status 1 on any failure):
+
+* every path of ``main_loop`` takes as many cycles as the machine counts
+  for a switch setting that takes it, for each pipeline model, and the
+  switch settings cover every path;
+* the cycles from ``lw s0`` to the end of the first LED store match the
+  machine's, stopped at the two drawing loops;
+* the same holds for variants of the source: another ``PIXEL_COUNT``, and a
+  load whose result the next instruction uses inside ``g_loop`` (flagged
+  as a load-use stall);
+* a loop counted from the switches has no bound, and ``bounds`` supplies it.
+
+Then it reports how long an analysis takes.
+
+    python benchmarks/bench_timing.py [--source ripes/ripes.s] [--repeat 50]
+"""
+import argparse
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+from benchmarks._common import check  # noqa: E402
+from corridor.riscv import FIVE_STAGE, SINGLE_CYCLE, Machine, assemble  # noqa: E402
+from corridor.riscv.timing import TimingError, analyze, format_report  # noqa: E402
+
+# name: (switch bank 0, switch bank 1)
+SCENARIOS = {
+    "safe": (0, 0),
+    "smoke": (1, 0),
+    "pm25>100": (101 << 1, 0),
+    "co2>100": (0, 101),
+}
+
+
+def measured(program, model, switches):
+    """(cycles of a main_loop iteration, cycles from the first sensor load to the end of the first LED store)."""
+    machine = Machine(program, model)
+    machine.set_switches(0, switches[0])
+    machine.set_switches(1, switches[1])
+    machine.run(until="main_loop")  # _start
+    machine.run(until="main_loop")  # warm-up iteration
+    iteration = machine.run(until="main_loop").cycles
+    machine.run(until=next(i for i, ins in enumerate(program.instructions) if ins.op == "lw") * 4)
+    for label in ("g_loop", "r_loop"):
+        machine.add_breakpoint(program.symbols[label])
+    # The run stops before the store, which takes one more cycle
+    return iteration, machine.run().cycles + 1
+
+
+def compare(name, source, bounds=None):
+    ok, reports = True, {}
+    program = assemble(source)
+    for model in (FIVE_STAGE, SINGLE_CYCLE):
+        report = reports[model] = analyze(program, model, bounds=bounds)
+        paths = {(path.cycles, path.latency) for path in report.paths}
+        runs = {scenario: measured(program, model, switches) for scenario, switches in SCENARIOS.items()}
+        missing = [scenario for scenario, run in runs.items() if run not in paths]
+        ok &= check(f"{name}, {model.name}: {len(report.paths)} paths match the machine",
+                    not missing and set(runs.values()) == paths,
+                    ", ".join(f"{scenario} {runs[scenario]}" for scenario in missing)
+                    or f"iterations {sorted(cycles for cycles, _ in paths)}, "
+                       f"read -> LED {sorted(latency for _, latency in paths)}")
+    return ok, reports[FIVE_STAGE]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default=os.path.join(HERE, "..", "ripes", "ripes.s"))
+    parser.add_argument("--repeat", type=int, default=50, help="analyses to time")
+    args = parser.parse_args()
+    with open(args.source) as f:
+        source = f.read()
+
+    print("checks")
+    ok, report = compare("ripes.s", source)
+    smaller, _ = compare("PIXEL_COUNT 100", source.replace(".equ PIXEL_COUNT,   875", ".equ PIXEL_COUNT,   100"))
+    ok &= smaller
+    stalled = source.replace("g_loop:\n    sw t1, 0(t0)", "g_loop:\n    sw t1, 0(t0)\n    lw t3, 0(t0)\n"
+                             "    or t1, t3, t3")
+    same, stalled_report = compare("load-use in g_loop", stalled)
+    ok &= same
+    g_loop = next(loop for loop in stalled_report.loops if loop.label == "g_loop")
+    ok &= check("load-use stall flagged in g_loop", any(kind == "load-use" for _, _, kind, _ in g_loop.stalls),
+                f"{g_loop.cycles} cycles per iteration")
+
+    unbounded = source.replace("    li t2, PIXEL_COUNT           # Loop 875 times\ng_loop:",
+                               "    li t2, SW1_BASE\n    lw t2, 0(t2)\ng_loop:")
+    try:
+        analyze(assemble(unbounded))
+        ok &= check("loop counted from the switches has no bound", False)
+    except TimingError as e:
+        ok &= check("loop counted from the switches has no bound", "g_loop" in str(e), str(e))
+    bounded = analyze(assemble(unbounded), bounds={"g_loop": 255})
+    loop = next(loop for loop in bounded.loops if loop.label == "g_loop")
+    ok &= check("bounds supply it", loop.iterations == 255, f"{loop.iterations} iterations")
+
+    print()
+    print(format_report(report))
+    program = assemble(source)
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        analyze(program)
+    elapsed = (time.perf_counter() - start) / args.repeat
+    print(f"\nanalysis: {elapsed * 1e3:.2f} ms ({len(program.instructions)} instructions, {len(report.paths)} paths)")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""Accuracy and throughput of the loop latency tracer (``corridor.tracing``).
+
+Streams a synthetic capture of the sensor -> decision -> command loop with
+known timings: the simulation publishes a reading a second, stamped with
+a skewed ``Date.now()``; the ESP32 consumes the latest one at the top of
+a ~1 s ``loop()``, publishes ``/commands`` stamped with ``millis()`` when
+the status of ``corridor.controller``'s rules changes, then ``/monitor``
+with the fused values.  The ESP32 reboots halfway, restarting ``millis()``.
+
+Checks (exit status 1 on any failure):
+
+* histogram percentiles are within a bucket of ``np.percentile`` and
+  survive ``to_dict`` / ``from_dict`` unchanged;
+* monitors are traced to the reading their pass consumed;
+* clock offsets are found within the fastest message's delay, and the
+  reboot as one reset;
+* every hop's p50/p90/p99 is the true one within the histogram's
+  precision and that delay;
+* a capture of bare payloads, timed by the sensors' own ``timestamp``,
+  is traced too;
+* pending readings stay bounded.
+
+Then it reports messages traced per second.
+
+    python benchmarks/bench_tracing.py [--messages 1000000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, "..")
+sys.path.insert(0, ROOT)
+
+from benchmarks._common import check  # noqa: E402
+from corridor.controller import ESP32, evaluate, fuse  # noqa: E402
+from corridor.tracing import HOPS, PENDING, Histogram, Tracer  # noqa: E402
+
+START = 1_717_200_000.0  # capture clock, 2024-06-01 00:00 UTC
+SIM_SKEW = 1.75  # the simulation's Date.now() runs ahead of the capture by this
+BASE = 0.001  # every delivery takes at least this; the rest is exponential
+# Indexed by the deciding rule; SAFE (-1) is the last entry
+STATUSES = np.array([rule.status for rule in ESP32.rules] + ["SAFE"], dtype=object)
+LOCAL = {"smoke": 0, "co2": 400, "pm25": 10}  # the sketch's potentiometers, left alone
+
+
+def boots(seconds):
+    """Capture time of millis() == 0: an hour before the capture, and 3 s before the reboot halfway."""
+    return START - 3600.0, START + seconds / 2 - 3.0
+
+
+def delays(rng, count, scale):
+    return BASE + rng.exponential(scale, count)
+
+
+def loop(seconds, rng):
+    """``seconds`` of the loop: (records, true latencies per hop, monitor received -> reading received)."""
+    readings = int(seconds)
+    sent = START + np.arange(readings) + rng.uniform(0, 0.02, readings)
+    seen = sent + delays(rng, readings, 0.006)  # received by the capture
+    delivered = np.maximum.accumulate(sent + delays(rng, readings, 0.006))  # by the ESP32
+    episode = np.zeros(readings)
+    for start in rng.integers(0, readings, max(readings // 300, 1)):
+        episode[start:start + int(rng.integers(5, 60))] = rng.uniform(20, 100)
+    sim = {"smoke": np.round(episode * rng.random(readings)).astype(int),
+           "co2": np.round(450 + 300 * rng.random(readings) + 8 * episode).astype(int),
+           "pm25": np.round(5 + 20 * rng.random(readings) + episode).astype(int),
+           "temp": np.round(20 + 8 * rng.random(readings) + episode / 3).astype(int)}
+
+    passes = START + 0.5 + np.cumsum(1.0 + rng.uniform(0.002, 0.03, readings))
+    passes = passes[passes < sent[-1]]
+    consumed = np.searchsorted(delivered, passes) - 1
+    fresh = consumed >= 0
+    fresh[1:] &= consumed[1:] != consumed[:-1]
+    index = np.maximum(consumed, 0)
+    effective = fuse(LOCAL, {key: values[index] for key, values in sim.items()})
+    effective["temp"] = sim["temp"][index]
+    status = STATUSES[evaluate(ESP32, effective)]
+    status[~(consumed >= 0)] = "SAFE"
+    changed = np.r_[False, status[1:] != status[:-1]]
+
+    decided = passes + rng.uniform(0.001, 0.005, len(passes))
+    monitor = decided + 0.002 + delays(rng, len(passes), 0.01)
+    first, second = boots(seconds)
+    boot = np.where(passes < START + seconds / 2, first, second)
+
+    records = [(seen[i], "smart-corridor/sensors",
+                {"smoke": int(sim["smoke"][i]), "co2": int(sim["co2"][i]), "pm25": int(sim["pm25"][i]),
+                 "temp": int(sim["temp"][i]), "timestamp": int((sent[i] + SIM_SKEW) * 1000)})
+               for i in range(readings)]
+    truth = {hop: [] for hop in HOPS}
+    truth["publish"] = seen - sent
+    traced = {}  # monitor received -> sensor received
+    for j in np.flatnonzero(changed):
+        alarm = status[j] != "SAFE"
+        actions = ("ACTIVATE_VENT", "SET_ALERT") if alarm else ("DEACTIVATE_VENT", "SET_ALERT")
+        first = recv = None
+        for k, action in enumerate(actions):
+            at = decided[j] + k * 0.0005
+            # One connection: the broker passes messages on in the order they were published
+            recv = max(at + delays(rng, 1, 0.008)[0], recv + 0.0002 if recv else 0.0)
+            first = recv if first is None else first
+            records.append((recv, "smart-corridor/commands",
+                            {"action": action, "room": "kitchen", "level": "HIGH" if alarm else "OFF",
+                             "alarm": bool(alarm), "timestamp": int((at - boot[j]) * 1000)}))
+        monitor[j] = max(monitor[j], recv + 0.0002)
+        if fresh[j]:
+            reading = consumed[j]
+            truth["decision"].append(decided[j] - seen[reading])
+            truth["command"].append(first - decided[j])
+            truth["round_trip"].append(first - seen[reading])
+            truth["end_to_end"].append(first - sent[reading])
+    for j in range(len(passes)):
+        if fresh[j]:
+            truth["monitor"].append(monitor[j] - seen[consumed[j]])
+            traced[round(monitor[j], 6)] = round(seen[consumed[j]], 6)
+        records.append((monitor[j], "smart-corridor/monitor",
+                        {**{key: int(values[j]) for key, values in effective.items()}, "status": status[j],
+                         "ventilation": status[j] != "SAFE", "source": "combined"}))
+    records.sort(key=lambda record: record[0])
+    return records, {hop: np.asarray(values) for hop, values in truth.items()}, traced
+
+
+def lines(records):
+    for recv, topic, payload in records:
+        yield json.dumps({"topic": topic, "ts": round(recv, 6), "payload": payload})
+
+
+def bare_check(records, count=2_000):
+    # The payloads alone: sensors keep their Date.now() stamp, the rest take the last time seen
+    tracer = Tracer()
+    fed = [tracer.feed_line(json.dumps(payload)) for _, _, payload in records[:count]]
+    hops = tracer.report()["hops"]
+    return check("a capture of bare payloads is traced", all(fed) and hops["monitor"]["count"] > 0
+                 and hops["round_trip"]["count"] > 0,
+                 f"{sum(fed):,}/{len(fed):,} lines, {hops['monitor']['count']:,} monitors, "
+                 f"{hops['round_trip']['count']:,} decisions")
+
+
+class Watched(Tracer):
+    """A Tracer noting which reading each monitor was traced to, and the longest pending queue."""
+
+    def __init__(self):
+        super().__init__()
+        self.traced = {}
+        self.longest = 0
+
+    def _monitor(self, recv, payload):
+        before = list(self.pending)
+        self.longest = max(self.longest, len(before))
+        super()._monitor(recv, payload)
+        popped = len(before) - len(self.pending)
+        if popped:
+            self.traced[round(recv, 6)] = round(before[popped - 1].recv, 6)
+
+
+def histogram_checks(rng):
+    ok = True
+    samples = {"exponential": rng.exponential(20_000, 200_000), "lognormal": rng.lognormal(10, 1.5, 200_000),
+               "small": rng.integers(0, 300, 50_000)}
+    for name, values in samples.items():
+        values = np.round(values).astype(np.int64)
+        histogram = Histogram()
+        histogram.record(values[:len(values) // 2])
+        for value in values[len(values) // 2:len(values) // 2 + 5000]:
+            histogram.add(int(value))
+        histogram.record(values[len(values) // 2 + 5000:])
+        worst = 0.0
+        for q in (1, 50, 90, 99, 99.9, 100):
+            exact = float(np.percentile(values, q, method="inverted_cdf"))
+            worst = max(worst, abs(histogram.percentile(q) - exact) / max(exact, 1))
+        ok &= check(f"{name}: percentiles within a bucket", worst <= 1 / histogram.half,
+                    f"worst {worst:.4f} relative, bucket {1 / histogram.half:.4f}")
+        copy = Histogram.from_dict(json.loads(json.dumps(histogram.to_dict())))
+        same = copy.to_dict() == histogram.to_dict() and copy.summary() == histogram.summary()
+        ok &= check(f"{name}: to_dict / from_dict round trip", same)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1_000_000, help="about this many capture lines")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    print("histograms")
+    ok = histogram_checks(rng)
+
+    # About two messages a second: a reading and a monitor, and the occasional command
+    seconds = args.messages / 2.05
+    records, truth, traced = loop(seconds, rng)
+    captured = list(lines(records))
+    size = sum(len(line) + 1 for line in captured)
+    print(f"\ncapture: {len(captured):,} lines, {size / 1e6:.0f} MB, "
+          f"{(records[-1][0] - records[0][0]) / 86400:.1f} days")
+    tracer = Watched()
+    start = time.perf_counter()
+    for line in captured:
+        tracer.feed_line(line)
+    report = tracer.report()
+    elapsed = time.perf_counter() - start
+
+    print("tracing")
+    right = sum(tracer.traced.get(monitor) == reading for monitor, reading in traced.items())
+    ok &= check("monitors traced to the reading their pass consumed", right >= 0.995 * len(traced),
+                f"{right:,}/{len(traced):,}, {len(tracer.traced) - right:,} traced elsewhere")
+    offsets = report["clock_offsets"]
+    ok &= check("simulation clock offset", abs(offsets["simulation"] + SIM_SKEW) < BASE + 0.002,
+                f"{offsets['simulation']:+.4f} s, true {-SIM_SKEW:+.4f} s")
+    ok &= check("device clock offset after the reboot", abs(offsets["device"] - boots(seconds)[1]) < BASE + 0.002,
+                f"{offsets['device'] - boots(seconds)[1]:+.4f} s off, {offsets['device_resets']} reset(s)")
+    ok &= check("one device clock reset", offsets["device_resets"] == 1)
+    for hop in HOPS:
+        hops = report["hops"][hop]
+        expected = truth[hop] * 1e3
+        ok &= check(f"{hop}: count", hops["count"] >= 0.995 * len(expected),
+                    f"{hops['count']:,} traced of {len(expected):,}")
+        for q in (50, 90, 99):
+            exact = float(np.percentile(expected, q))
+            found = hops[f"p{q}"]
+            # A bucket, plus the fastest message's delay the offsets absorb (3 ms for two clocks and rounding)
+            ok &= check(f"{hop}: p{q}", abs(found - exact) <= exact / 64 + 3.0,
+                        f"{found:.2f} ms, true {exact:.2f} ms")
+    ok &= bare_check(records)
+    ok &= check("pending readings bounded", tracer.longest <= PENDING and len(tracer.pending) <= PENDING,
+                f"at most {tracer.longest} awaiting a monitor, {len(tracer.burst)} commands held")
+    for claim in report["claims"]:
+        print(f"  {claim['claim']}: p99 {claim['p99_ms']:.1f} ms of {claim['limit_ms']:g} ms")
+    print(f"\n{len(captured):,} lines traced in {elapsed:.2f} s ({len(captured) / elapsed / 1e3:,.0f} k lines/s)")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Tick cost and publish rate of the sharded digital twin (``corridor.twin``).
+
+Checks (exit status 1 on any failure):
+
+* a shard ticked ``--rate`` times a second for ``--steps`` seconds has the
+  ``smokeLevel``, burning items and readings of ``corridor.sensors.simulate``
+  after every second, for random hazards and vents;
+* it publishes exactly the rooms whose readings changed, and the last
+  message of each room holds its final readings;
+* vent commands reach the building's shard only, and ``DEACTIVATE_VENT``
+  waits for the smoke to clear;
+* ``--buildings`` buildings on worker processes keep the tick rate;
+* ``--broker-buildings`` publishing to a local broker keep it too, and a
+  subscriber receives every room published.  The broker and subscriber run
+  in this process, on the same CPUs as the shards, so this run is smaller.
+
+Then it reports tick duration percentiles and rooms published per second
+for both runs.  --check-only runs the shard checks on 500 buildings and
+only the broker run, with 200 buildings for 4 s, for CI.
+
+    python benchmarks/bench_twin.py [--buildings 10000] [--broker-buildings 2000] [--rate 10] [--seconds 20]
+                                    [--check-only]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, "..")
+sys.path.insert(0, ROOT)
+
+from benchmarks._common import check  # noqa: E402
+from corridor.mqtt import Broker, Client  # noqa: E402
+from corridor.sensors import METRICS, ROOMS, VENT_LEVELS, random_hazards, simulate  # noqa: E402
+from corridor.twin import TOPIC_COMMANDS, TOPIC_SENSORS, Shard, State, format_metrics, payloads, run  # noqa: E402
+
+
+def parity(buildings, rate, steps, rng):
+    ok = True
+    hazards = random_hazards(buildings, rng)
+    vents = np.where(rng.random((buildings, len(ROOMS))) < 0.3, rng.integers(1, len(VENT_LEVELS),
+                                                                           (buildings, len(ROOMS))), 0)
+    trace = simulate(hazards, vents, steps + 1)
+    sensors = np.stack([trace.sensors[metric] for metric in METRICS], axis=-1)  # (buildings, rooms, t, metrics)
+
+    state = State(buildings)
+    state.set_hazards(slice(None), hazards)
+    state.vents[:] = vents
+    shard = Shard(state, rate=rate)
+    same, published, last = True, 0, {}
+    for tick in range(1, rate * steps + 1):
+        messages = payloads(*shard.tick(tick), tick * 100)
+        published += len(messages)
+        for message in messages:
+            payload = json.loads(message)
+            last[payload["building"], payload["room"]] = [payload[metric] for metric in METRICS]
+        if tick % rate == 0:
+            t = tick // rate
+            same &= np.array_equal(state.smoke_level, trace.smoke_level[:, t])
+            same &= np.array_equal(state.burning, trace.burning[:, t])
+            same &= np.array_equal(state.sensors, sensors[:, :, t])
+    ok &= check(f"{buildings:,} buildings x {steps} s at {rate} Hz match simulate() every second", same)
+
+    # Published: every room at tick 1, then each room whose readings changed at a step after that
+    changed = (sensors[:, :, 1:] != sensors[:, :, :-1]).any(axis=-1)  # step s -> [:, :, s - 1]
+    first_tick = np.arange(buildings) % rate == 1 % rate
+    expected = buildings * len(ROOMS) + changed[:, :, 1:].sum() + changed[~first_tick, :, 0].sum()
+    ok &= check("only changed rooms published", published == expected, f"{published:,} of {expected:,} expected")
+    final = {(b, room): sensors[b, r, steps].tolist() for b in range(buildings) for r, room in enumerate(ROOMS)}
+    ok &= check("last message of each room holds its readings", last == final)
+
+    smoky = int(np.flatnonzero(state.smoke_level > 0)[0]) if (state.smoke_level > 0).any() else None
+    clear = int(np.flatnonzero(state.smoke_level == 0)[0])
+    other = Shard(state, lo=0, hi=buildings // 2)
+    outcomes = [other.apply({"action": "ACTIVATE_VENT", "building": clear, "room": "kitchen", "level": "LOW"}),
+                state.vents[clear, 0] == 1,
+                not other.apply({"action": "ACTIVATE_VENT", "building": buildings - 1, "room": "kitchen"}),
+                other.apply({"action": "DEACTIVATE_VENT", "building": clear, "room": "kitchen"}),
+                state.vents[clear, 0] == 0]
+    if smoky is not None and smoky < buildings // 2:
+        state.vents[smoky, 0] = 3
+        outcomes += [not other.apply({"action": "DEACTIVATE_VENT", "building": smoky, "room": "kitchen"}),
+                     state.vents[smoky, 0] == 3]
+    ok &= check("vent commands", all(outcomes))
+    del shard, other
+    state.close()
+    state.unlink()
+    return ok
+
+
+async def fleet(buildings, rate, seconds, churn, seed):
+    """(metrics, messages received, commands sent) of a run publishing to a local broker."""
+    broker = await Broker(port=0).start()
+    port = broker.ports[0]
+    received = 0
+
+    def on_message(topic, payload):
+        nonlocal received
+        received += topic == TOPIC_SENSORS
+
+    watcher = await Client.connect("127.0.0.1", port, "bench-watcher", on_message=on_message)
+    await watcher.subscribe(TOPIC_SENSORS)
+    operator = await Client.connect("127.0.0.1", port, "bench-operator")
+    commands = [{"action": "ACTIVATE_VENT", "building": b, "room": "kitchen", "level": "HIGH"}
+                for b in range(0, buildings, max(buildings // 100, 1))]
+
+    async def command():
+        await asyncio.sleep(min(2.0, seconds / 2))
+        for payload in commands:
+            operator.publish(TOPIC_COMMANDS, json.dumps(payload))
+        await operator.drain()
+
+    sender = asyncio.create_task(command())
+    metrics = await run(buildings, rate=rate, seconds=seconds, host="127.0.0.1", port=port, churn=churn, seed=seed)
+    await sender
+    for _ in range(50):
+        if received >= metrics["rooms"]:
+            break
+        await asyncio.sleep(0.1)
+    for client in (watcher, operator):
+        await client.close()
+    await broker.close()
+    return metrics, received, len(commands)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--buildings", type=int, default=10_000)
+    parser.add_argument("--broker-buildings", type=int, default=2_000, help="buildings of the run with a broker")
+    parser.add_argument("--rate", type=int, default=10, help="ticks per second")
+    parser.add_argument("--seconds", type=float, default=20.0, help="length of each fleet run")
+    parser.add_argument("--steps", type=int, default=40, help="seconds of the parity run")
+    parser.add_argument("--churn", type=float, default=0.01, help="chance per building and second of new hazards")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--check-only", action="store_true", help="small parity and broker runs, no timing")
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+    if args.check_only:
+        args.broker_buildings, args.seconds, args.steps = 200, 4.0, min(args.steps, 20)
+
+    print("checks")
+    ok = parity(500 if args.check_only else 2_000, args.rate, args.steps, rng)
+
+    print(f"\n{args.rate} Hz, one shard per CPU ({os.cpu_count()})")
+    runs = []
+    if not args.check_only:
+        runs.append(("ticking", asyncio.run(run(args.buildings, rate=args.rate, seconds=args.seconds,
+                                                churn=args.churn, seed=args.seed))))
+    published, received, sent = asyncio.run(fleet(args.broker_buildings, args.rate, args.seconds, args.churn,
+                                                  args.seed))
+    runs.append(("publishing", published))
+    for name, m in runs:
+        rate = m["ticks_per_s"] / m["shards"]
+        kept = rate >= 0.98 * args.rate and m["late"] <= 0.01 * m["ticks"]
+        ok &= check(f"{name}, {m['buildings']:,} buildings: keeps {args.rate} Hz", kept,
+                    f"{rate:.2f} ticks/s per shard, {m['late']:,} late of {m['ticks']:,}")
+    ok &= check("every room published is received", received == published["rooms"],
+                f"{received:,} of {published['rooms']:,}")
+    ok &= check("commands applied by their shard", published["commands"] == sent,
+                f"{published['commands']} of {sent}")
+
+    for name, m in runs:
+        print(f"  {name:10} {m['buildings']:7,} buildings: {format_metrics(m)}")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
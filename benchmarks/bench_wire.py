@@ -0,0 +1,245 @@
+"""Bytes per message and encode/decode rate of the binary wire codec (``corridor.wire``) against JSON.
+
+Streams ``--messages`` payloads of each topic the way ``corridor.mqtt.load``
+builds them (sketch.ino's monitor string and command bursts, the
+simulation's sensors JSON, from a random walk of readings).
+
+Checks (exit status 1 on any failure):
+
+* every payload decodes back from its key frame, and from the delta frames
+  of an ``Encoder`` read by a ``Decoder``;
+* random JSON objects (unknown keys, floats, out-of-range numbers, unknown
+  enum strings) survive the round trip through the EXTRA field;
+* truncated frames, another version and a delta without its reference
+  frame raise ``WireError``;
+* ``describe()`` matches the packed layout, and a command with any level
+  the controllers send (vent levels and alert levels) packs into it with
+  no escaped string;
+* ``bridge`` on a local broker turns JSON into frames and frames into JSON.
+
+    python benchmarks/bench_wire.py [--messages 100000]
+"""
+import argparse
+import asyncio
+import copy
+import json
+import os
+import random
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, "..")
+sys.path.insert(0, ROOT)
+
+from benchmarks._common import check  # noqa: E402
+from corridor.controller import ESP32  # noqa: E402
+from corridor.mqtt import Broker, Client  # noqa: E402
+from corridor.mqtt.load import Readings, command_burst, decide, monitor_payload, sensors_payload  # noqa: E402
+from corridor.wire import (  # noqa: E402
+    BINARY_TOPICS, ENUMS, KINDS, LAYOUTS, TOPICS, VERSION, Decoder, Encoder, WireError, bridge, decode, describe,
+    encode,
+)
+from corridor.sensors import VENT_LEVELS  # noqa: E402
+
+
+def stream(count, rng):
+    """{kind: [JSON text]} of ``count`` loop passes of one ESP32 and one simulation tab."""
+    esp, sim = Readings(rng), Readings(rng)
+    out = {kind: [] for kind in KINDS}
+    millis, now, previous = 5_000, 1_717_200_000_000, None
+    for _ in range(count):
+        smoke, co2, pm25, temp = sim.step()
+        status = "CRITICAL" if smoke > 50 else "WARNING" if smoke > 30 or pm25 > 80 else "SAFE"
+        out["sensors"].append(sensors_payload(smoke, co2, pm25, temp, status, now))
+        local = esp.step()
+        readings = (max(local[0], smoke), max(local[1], co2), max(local[2], pm25), temp)
+        ventilation, status, alert_level = decide(*readings)
+        if (ventilation, status) != previous:
+            out["commands"] += command_burst(ventilation, alert_level, millis)
+            previous = (ventilation, status)
+        out["monitor"].append(monitor_payload(readings[2], readings[1], readings[0], readings[3], ventilation,
+                                              status))
+        millis += 1000 + rng.randint(0, 30)
+        now += 1000 + rng.randint(-5, 5)
+    return out
+
+
+def random_payload(kind, rng):
+    layout = LAYOUTS[kind]
+    payload = {}
+    for name, field in zip(layout.names, layout.types):
+        roll = rng.random()
+        if roll < 0.1:
+            continue
+        if field == "enum":
+            payload[name] = rng.choice(ENUMS[name]) if roll < 0.7 else rng.choice(["", "é" * 3, "x" * 300, 7, None])
+        elif field == "bool":
+            payload[name] = rng.random() < 0.5 if roll < 0.8 else rng.choice([0, "true", None])
+        else:
+            low, high = layout.ranges[layout.names.index(name)]
+            payload[name] = rng.randint(low, high) if roll < 0.7 else rng.choice(
+                [high + 1, low - 1, 2.5, -0.0, "12", [1], {"a": None}])
+    for _ in range(rng.randint(0, 2)):
+        payload[rng.choice(["room", "uptime", "rssi", "nested"])] = rng.choice([1, "a", [1, 2], {"b": 1.5}])
+    return payload
+
+
+def checks(texts, rng):
+    ok = True
+    for kind in KINDS:
+        payloads = [json.loads(text) for text in texts[kind]]
+        same = all(decode(encode(kind, p)) == (kind, p) for p in payloads)
+        ok &= check(f"{kind}: {len(payloads):,} key frames decode", same)
+        encoder, decoder = Encoder(), Decoder()
+        same = all(decoder.decode(encoder.encode(kind, p)) == (kind, p) for p in payloads)
+        ok &= check(f"{kind}: {len(payloads):,} delta frames decode", same)
+
+    encoder, decoder = Encoder(keyframe=8), Decoder()
+    same = True
+    for _ in range(20_000):
+        kind = rng.choice(KINDS)
+        payload = random_payload(kind, rng)
+        same &= decode(encode(kind, payload))[1] == payload
+        same &= decoder.decode(encoder.encode(kind, payload))[1] == payload
+    ok &= check("20,000 random objects round trip", same)
+
+    errors = []
+    encoder = Encoder()
+    frames = [encoder.encode("monitor", json.loads(text)) for text in texts["monitor"][:50]]
+    frames += [encode("commands", {"action": "VENT", "room": "attic", "level": "x", "n": 1})]
+    decoder = Decoder()
+    for frame in frames:
+        for end in range(len(frame)):
+            try:
+                copy.deepcopy(decoder).decode(frame[:end])
+                errors.append(f"{len(frame)}-byte frame cut to {end} decoded")
+            except WireError:
+                pass
+        decoder.decode(frame)
+    try:
+        decode(bytes([(VERSION + 1) << 4]) + frames[0][1:])
+        errors.append("another version decoded")
+    except WireError:
+        pass
+    decoder = Decoder()
+    decoder.decode(frames[0])
+    try:
+        decoder.decode(frames[2])
+        errors.append("delta after a missed frame decoded")
+    except WireError:
+        pass
+    ok &= check("bad frames raise WireError", not errors, "; ".join(errors[:3]))
+
+    layout = describe()
+    same = True
+    for kind in KINDS:
+        fields = layout["kinds"][kind]["fields"]
+        payload = json.loads(texts[kind][0])
+        frame = encode(kind, payload)
+        same &= len(frame) == layout["kinds"][kind]["key_frame_bytes"]
+        last = fields[-1]
+        same &= int.from_bytes(frame[last["offset"]:last["offset"] + last["size"]], "little") == (
+            payload[last["name"]] if not isinstance(payload[last["name"]], str)
+            else ENUMS[last["name"]].index(payload[last["name"]]))
+    ok &= check("describe() offsets match the frames", same)
+    size = layout["kinds"]["commands"]["key_frame_bytes"]
+    levels = VENT_LEVELS + ("normal",) + tuple(sorted({rule.level for rule in ESP32.rules}))
+    escaped = [level for level in levels if len(encode("commands", {
+        "action": "SET_ALERT", "room": "kitchen", "level": level, "alarm": True, "timestamp": 1000})) != size]
+    ok &= check(f"{len(levels)} controller levels pack into {size}-byte frames", not escaped,
+                f"escaped: {', '.join(escaped)}" if escaped else "")
+    return ok
+
+
+async def bridged(texts, count=200):
+    """(frames decoded from the JSON published, JSON received from the frames published)."""
+    broker = await Broker(port=0).start()
+    port = broker.ports[0]
+    task = asyncio.create_task(bridge(port=port))
+    binary = await Client.connect("127.0.0.1", port, "bench-binary")
+    await binary.subscribe(*BINARY_TOPICS.values())
+    plain = await Client.connect("127.0.0.1", port, "bench-json")
+    await plain.subscribe(*TOPICS)
+    await asyncio.sleep(0.2)
+
+    topic = {kind: t for t, kind in TOPICS.items()}
+    sent = [json.loads(text) for text in texts["monitor"][:count]]
+    for payload in sent:
+        plain.publish(topic["monitor"], json.dumps(payload))
+    encoder = Encoder()
+    frames = [encoder.encode("commands", json.loads(text)) for text in texts["commands"][:count]]
+    for frame in frames:
+        binary.publish(BINARY_TOPICS["commands"], frame)
+    await asyncio.sleep(0.5)
+
+    decoder, from_json, from_binary = Decoder(), [], []
+    while not binary.messages.empty():
+        t, payload = binary.messages.get_nowait()
+        if t == BINARY_TOPICS["monitor"]:
+            from_json.append(decoder.decode(payload)[1])
+    while not plain.messages.empty():
+        t, payload = plain.messages.get_nowait()
+        if t == topic["commands"]:
+            from_binary.append(json.loads(payload))
+    task.cancel()
+    for client in (binary, plain):
+        await client.close()
+    await broker.close()
+    return (from_json == sent, len(from_json), len(sent)), (
+        from_binary == [json.loads(text) for text in texts["commands"][:count]], len(from_binary), len(frames))
+
+
+def rate(function, items):
+    start = time.perf_counter()
+    for item in items:
+        function(item)
+    return len(items) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100_000, help="loop passes to stream")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    texts = stream(args.messages, rng)
+
+    print("checks")
+    ok = checks(texts, rng)
+    (same, got, sent), (back, got_back, sent_back) = asyncio.run(bridged(texts))
+    ok &= check("bridge: JSON monitor -> frames", same, f"{got}/{sent} decoded equal")
+    ok &= check("bridge: command frames -> JSON", back, f"{got_back}/{sent_back} equal")
+
+    print(f"\n{'topic':9} {'messages':>9} {'JSON B':>7} {'key B':>6} {'delta B':>8}   ops/s (k):"
+          f" {'JSON enc':>8} {'JSON dec':>8} {'key enc':>8} {'key dec':>8} {'delta enc':>9} {'delta dec':>9}")
+    for kind in KINDS:
+        lines = texts[kind]
+        payloads = [json.loads(text) for text in lines]
+        keys = [encode(kind, p) for p in payloads]
+        encoder = Encoder()
+        deltas = [encoder.encode(kind, p) for p in payloads]
+        # What the sender does today: sketch.ino's String for the monitor, a JSON serializer otherwise
+        if kind == "monitor":
+            json_encode = lambda p: monitor_payload(p["pm25"], p["co2"], p["smoke"], p["temp"],  # noqa: E731
+                                                    p["ventilation"], p["status"], p["source"])
+        else:
+            json_encode = lambda p: json.dumps(p, separators=(",", ":"))  # noqa: E731
+        rates = [rate(json_encode, payloads), rate(json.loads, lines), rate(lambda p: encode(kind, p), payloads),
+                 rate(decode, keys), rate(_encoder(kind), payloads),
+                 rate(Decoder().decode, deltas)]
+        size = [sum(map(len, items)) / len(items) for items in (lines, keys, deltas)]
+        print(f"{kind:9} {len(lines):9,} {size[0]:7.1f} {size[1]:6.1f} {size[2]:8.1f}   {'':10}"
+              + f" {rates[0] / 1e3:8.0f} {rates[1] / 1e3:8.0f} {rates[2] / 1e3:8.0f} {rates[3] / 1e3:8.0f}"
+              + f" {rates[4] / 1e3:9.0f} {rates[5] / 1e3:9.0f}")
+    if not ok:
+        sys.exit(1)
+
+
+def _encoder(kind):
+    encoder = Encoder()
+    return lambda payload: encoder.encode(kind, payload)
+
+
+if __name__ == "__main__":
+    main()
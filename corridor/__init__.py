@@ -0,0 +1 @@
+"""Headless models of the smart corridor controller, sensors and network."""
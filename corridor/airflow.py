@@ -0,0 +1,202 @@
+"""Zonal airflow: smoke, CO2 and PM2.5 moving between the twin's rooms.
+
+``SimulationContext.jsx`` treats every room on its own; the only shared
+term is the global ``smokeLevel``.  Here each room of ``ROOMS`` is a
+well-mixed zone of known volume, joined to its neighbours by open plan,
+doors and the stairs.  Every connection exchanges ``flow`` m^3/s of air
+both ways (scaled by how far open it is), a running vent extracts room air
+at its LOW/MED/HIGH rate (``corridor.sensors.VENT_FACTORS``, room volumes
+per second) and replaces it with outdoor air, and every species is lost to
+the outside at its own slow rate besides.  Per tick, for all buildings at
+once:
+
+    c[t + h] = diag * c[t] + exchange @ c[t] + inflow + h * sources / volume
+
+``exchange`` is the graph's off-diagonal part in CSR form with one sparsity
+pattern shared by every building and one row of values per building, so
+door states can differ between buildings; ``diag`` and ``inflow`` carry
+what stays in each zone and the outdoor air drawn in, per building, zone
+and species.  Ticks are split into sub-steps short enough that no
+coefficient goes negative, which keeps concentrations bounded by their
+inputs and conserves the pollutant in a closed building exactly.
+
+Arrays follow ``corridor.sensors``: (buildings, rooms, timesteps) per
+metric.
+"""
+import collections
+
+import numpy as np
+
+from corridor.sensors import BASE_SENSORS, NATURAL_DECAY, ROOMS, VENT_FACTORS
+
+SPECIES = ("smoke", "co2", "pm25")
+# Floor of each room, as ROOMS in SimulationContext.jsx
+FLOORS = (0, 0, 0, 0, 1, 1, 1)
+# 12 x 10 x 3.5 m, the rooms' smoke overlays in House.jsx
+ROOM_VOLUME = 420.0
+
+# Both-way air exchange (m^3/s) of a fully open connection of each kind
+FLOWS = {"open": 2.0, "door": 0.4, "stair": 0.8}
+# a, b: room indices; kind: a key of FLOWS; flow: m^3/s when fully open
+Connection = collections.namedtuple("Connection", "a b kind flow")
+
+
+def connect(a, b, kind, flow=None):
+    """A connection between rooms named ``a`` and ``b``."""
+    return Connection(ROOMS.index(a), ROOMS.index(b), kind, FLOWS[kind] if flow is None else flow)
+
+
+# The villa of simulation-room/house.md: kitchen, dining and living room
+# open plan, the guest bedroom off the hallway, stairs from the foyer to
+# the landing by the home office, bedrooms off the landing
+CONNECTIONS = (
+    connect("kitchen", "dining-room", "open"),
+    connect("dining-room", "living-room", "open"),
+    connect("living-room", "guest-bedroom", "door"),
+    connect("living-room", "home-office", "stair"),
+    connect("home-office", "master-bedroom", "door"),
+    connect("home-office", "children-room", "door"),
+)
+
+# First-order loss to the outside, 1/s: smoke at the twin's natural decay;
+# CO2 by infiltration (0.5 air changes an hour); PM2.5 by infiltration and
+# deposition (about 1.5 an hour)
+LOSS = {"smoke": 1 - NATURAL_DECAY, "co2": 0.5 / 3600, "pm25": 1.5 / 3600}
+OUTDOOR = {metric: float(BASE_SENSORS[metric]) for metric in SPECIES}
+
+Building = collections.namedtuple("Building", "rooms floors volumes connections")
+# Shared CSR pattern of the exchange matrix; ``edge`` is the connection and
+# ``rows`` the row of each stored value
+Pattern = collections.namedtuple("Pattern", "indptr indices edge rows")
+# Coefficients of one sub-step, buildings on the last axis: diag, inflow
+# (rooms, species, buildings); exchange (nnz, buildings), CSR values
+Operator = collections.namedtuple("Operator", "substeps diag exchange inflow")
+# sensors: {metric: (buildings, rooms, timesteps)}; final: (buildings, rooms, species)
+Trace = collections.namedtuple("Trace", "sensors final")
+
+
+def building(connections=CONNECTIONS, volumes=ROOM_VOLUME, rooms=ROOMS, floors=FLOORS):
+    """The zones and their connections; ``volumes`` is a scalar or one per room (m^3)."""
+    volumes = np.broadcast_to(np.asarray(volumes, float), (len(rooms),)).copy()
+    return Building(tuple(rooms), tuple(floors), volumes, tuple(connections))
+
+
+HOUSE = building()
+
+
+def pattern(house):
+    """CSR structure of the exchange matrix: row a has a column b for every connection a-b."""
+    rows = [[] for _ in house.rooms]
+    for e, c in enumerate(house.connections):
+        rows[c.a].append((c.b, e))
+        rows[c.b].append((c.a, e))
+    indptr = np.cumsum([0] + [len(row) for row in rows])
+    indices = np.array([b for row in rows for b, _ in row], dtype=np.intp)
+    edge = np.array([e for row in rows for _, e in row], dtype=np.intp)
+    owner = np.repeat(np.arange(len(rows)), np.diff(indptr))
+    return Pattern(indptr, indices, edge, owner)
+
+
+def operator(house, vents, openness=1.0, dt=1.0, loss=LOSS, outdoor=OUTDOOR):
+    """Update coefficients of one tick of ``dt`` seconds.
+
+    ``vents``: level codes (see ``VENT_LEVELS``), (buildings, rooms);
+    ``openness``: 0..1 per connection, a scalar, (connections,) or
+    (buildings, connections).
+    """
+    vents = np.asarray(vents)
+    count = len(vents)
+    pat = pattern(house)
+    flows = np.array([c.flow for c in house.connections], float)
+    open_flow = np.broadcast_to(np.asarray(openness, float) * flows, (count, len(flows)))
+    rate = (open_flow[:, pat.edge] / house.volumes[pat.rows]).T  # (nnz, buildings), 1/s
+    leaving = np.zeros((len(house.rooms), count))
+    np.add.at(leaving, pat.rows, rate)
+    extract = VENT_FACTORS[vents].T  # (rooms, buildings), room volumes per second
+    loss = np.array([loss[metric] for metric in SPECIES])[:, None]
+    outdoor = np.array([outdoor[metric] for metric in SPECIES])[:, None]
+    total = (leaving + extract)[:, None, :] + loss  # (rooms, species, buildings)
+    # Sub-steps short enough that every coefficient stays non-negative
+    substeps = max(1, int(np.ceil(dt * total.max(initial=0.0))))
+    h = dt / substeps
+    return Operator(substeps, 1 - h * total, h * rate, h * (extract[:, None, :] + loss) * outdoor)
+
+
+def step(pat, op, c, out, source=None):
+    """One sub-step from ``c`` into ``out``, both (rooms, species, buildings); ``source`` is h * S / V.
+
+    The exchange term walks the stored values of the shared pattern, each a
+    multiply-add over all buildings at once; with the buildings axis
+    contiguous this beats both a gather-and-reduce over the CSR rows and a
+    dense per-building matrix product.
+    """
+    np.multiply(op.diag, c, out=out)
+    out += op.inflow
+    if source is not None:
+        out += source
+    scratch = np.empty_like(c[0])
+    for value, row, column in zip(op.exchange, pat.rows.tolist(), pat.indices.tolist()):
+        np.multiply(c[column], value, out=scratch)
+        out[row] += scratch
+    return out
+
+
+def initial(count, house=HOUSE, **levels):
+    """(buildings, rooms, species) at outdoor levels, overridden by ``levels`` ({metric: array})."""
+    c = np.empty((count, len(house.rooms), len(SPECIES)))
+    for i, metric in enumerate(SPECIES):
+        c[..., i] = np.broadcast_to(levels.get(metric, OUTDOOR[metric]), (count, len(house.rooms)))
+    return c
+
+
+def _emission(sources, house, count, steps):
+    # S / V laid out (timesteps or 1, rooms, species, buildings)
+    varying = any(np.ndim(value) == 3 for value in sources.values())
+    emission = np.zeros((steps if varying else 1, len(house.rooms), len(SPECIES), count))
+    for i, metric in enumerate(SPECIES):
+        if metric in sources:
+            value = np.asarray(sources[metric], float)
+            if value.ndim < 3:
+                value = value[..., None]
+            emission[:, :, i] = np.broadcast_to(value, (count, len(house.rooms), len(emission))).transpose(2, 1, 0)
+    return emission / house.volumes[None, :, None, None]
+
+
+def simulate(c0, steps, vents, openness=1.0, sources=None, house=HOUSE, dt=1.0, loss=LOSS, record=True):
+    """Run ``steps`` ticks of ``dt`` s from ``c0`` (buildings, rooms, species).
+
+    ``vents`` is (buildings, rooms) or (buildings, rooms, steps) of level
+    codes; with a time-varying ``vents`` the coefficients are rebuilt
+    whenever it changes.  ``sources``: emission in concentration x m^3 per
+    second, {metric: array broadcastable to (buildings, rooms) or
+    (buildings, rooms, steps)}.  With ``record`` the readings after every
+    tick are kept, as ``corridor.sensors`` lays them out.
+    """
+    c0 = np.asarray(c0, float)
+    count = len(c0)
+    c = np.ascontiguousarray(c0.transpose(1, 2, 0))
+    out = np.empty_like(c)
+    vents = np.asarray(vents)
+    varying = vents.ndim == 3
+    pat = pattern(house)
+    sensors = {metric: np.empty((count, len(house.rooms), steps)) for metric in SPECIES} if record else None
+    emission = _emission(sources, house, count, steps) if sources else None
+    op, current, source = None, None, None
+    for t in range(steps):
+        now = vents[..., t] if varying else vents
+        rebuilt = op is None or (varying and not np.array_equal(now, current))
+        if rebuilt:
+            op, current = operator(house, now, openness, dt, loss), now
+        if emission is not None and (rebuilt or len(emission) > 1):
+            source = emission[min(t, len(emission) - 1)] * (dt / op.substeps)
+        for _ in range(op.substeps):
+            c, out = step(pat, op, c, out, source), c
+        if record:
+            for i, metric in enumerate(SPECIES):
+                sensors[metric][:, :, t] = c[:, i].T
+    return Trace(sensors, c.transpose(2, 0, 1).copy())
+
+
+def amounts(c, house=HOUSE):
+    """Total of each species in each building: sum of concentration x volume, (buildings, species)."""
+    return (np.asarray(c) * house.volumes[None, :, None]).sum(axis=1)
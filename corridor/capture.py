@@ -0,0 +1,73 @@
+"""Lines of a recorded MQTT capture of the ``smart-corridor/#`` topics.
+
+A capture is a JSON-lines file.  Each line is a bare payload as published,
+or an envelope wrapping one with the topic, the receive time and the room:
+
+    {"topic": "smart-corridor/sensors", "ts": 1718000000.25, "room": "kitchen",
+     "payload": {"smoke": 12, "co2": 640, "pm25": 31, "temp": 24, "timestamp": 1718000000150}}
+
+The payload may also be a JSON string.  A line's time is the envelope's
+``ts`` (or ``time``) if it has one, else the payload's ``timestamp`` when
+that is an epoch time, as the simulation's ``Date.now()`` is, rather than
+the ESP32's ``millis()``.  A line with neither takes the last time seen
+before it.  ``slides.telemetry`` and the corridor modules that read
+captures share these parsers.
+"""
+import datetime
+import json
+
+_decode = json.JSONDecoder().decode
+# The C scanner behind JSONDecoder.decode, minus its whitespace regexes;
+# trailing bytes (a "\r" from CRLF captures) are ignored
+_scan = json.JSONDecoder().scan_once
+
+
+def parse_time(value):
+    """Epoch seconds from epoch seconds, epoch milliseconds or an ISO 8601 string."""
+    if isinstance(value, str):
+        try:
+            return parse_time(float(value))
+        except ValueError:
+            pass
+        parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+        return parsed.timestamp()
+    value = float(value)
+    return value / 1000.0 if value > 1e11 else value
+
+
+def parse_record(line):
+    """The JSON object on one capture line (str or bytes), or None."""
+    if line.__class__ is not str:
+        line = line.decode("utf-8", "replace")
+    try:
+        record = _scan(line, 0)[0]
+    except (StopIteration, ValueError):
+        try:
+            record = _decode(line)
+        except ValueError:
+            return None
+    return record if record.__class__ is dict else None
+
+
+def payload_of(record):
+    """The payload of a record (the record itself when bare), decoded if it is a JSON string; None if no object."""
+    payload = record.get("payload", record)
+    if isinstance(payload, (str, bytes)):
+        try:
+            payload = json.loads(payload)
+        except ValueError:
+            return None
+    return payload if isinstance(payload, dict) else None
+
+
+def timestamp_of(record, payload, last=None):
+    """Epoch seconds of a record: its envelope's ``ts``/``time``, its payload's epoch ``timestamp`` or ``last``."""
+    stamp = record.get("ts", record.get("time"))
+    if stamp is not None:
+        return parse_time(stamp)
+    stamp = payload.get("timestamp")
+    if isinstance(stamp, (int, float)) and not isinstance(stamp, bool) and stamp > 1e11:
+        return stamp / 1000.0
+    return last
@@ -0,0 +1,180 @@
+"""Reference controller: each layer's alarm rules as data, evaluated in batch.
+
+A ``RuleSet`` is the priority chain of one layer -- the first rule whose
+reading is above its threshold decides, none means SAFE -- plus the
+``Field`` encoding that turns a physical reading into the number that layer
+actually compares:
+
+* ``ESP32``: wokvi/sketch.ino ``loop()``, on the max()-fused readings
+  (``fuse``).
+* ``RISCV``: ripes/ripes.s ``main_loop``.  Smoke is switch bit 0, PM2.5 the
+  7-bit field above it and CO2 the low byte of bank 1; a reading too large
+  for its field wraps, as the program masks it.  CO2 is taken to be set in
+  units of 10 ppm, so its raw threshold of 100 means 1000 ppm.
+* ``README``: the "System Logic" section of Readme.md.
+
+``evaluate`` decides millions of readings at once: the comparisons of a
+rule set are packed into one bit per rule and a lookup table keyed by those
+bits gives the first rule that fires.  ``decision_map`` splits the sensor
+ranges into the boxes inside which no rule of any set changes its verdict,
+so ``disagreements`` is exact over the whole input space, not sampled.
+"""
+import collections
+import itertools
+
+import numpy as np
+
+from corridor.sensors import LIMITS, METRICS
+
+# Fires when the encoded reading of ``metric`` is above ``threshold``
+Rule = collections.namedtuple("Rule", "metric threshold level status")
+# native = (reading // scale) masked to ``bits`` (None: no mask); scale None
+# is a detector flag, 1 for any non-zero reading
+Field = collections.namedtuple("Field", "scale bits")
+RuleSet = collections.namedtuple("RuleSet", "name source rules fields")
+
+ESP32 = RuleSet("esp32", "wokvi/sketch.ino", (
+    Rule("smoke", 30, "critical", "CRITICAL: SMOKE DETECTED"),
+    Rule("temp", 35, "danger", "DANGER: HIGH TEMPERATURE"),
+    Rule("pm25", 80, "warning", "WARNING: HIGH PM2.5"),
+    Rule("co2", 800, "warning", "WARNING: HIGH CO2"),
+), {})
+
+RISCV = RuleSet("riscv", "ripes/ripes.s", (
+    Rule("smoke", 0, "alarm", "smoke bit"),
+    Rule("pm25", 100, "alarm", "PM2.5 > THRESH_PM25"),
+    Rule("co2", 100, "alarm", "CO2 > THRESH_CO2"),
+), {"smoke": Field(None, 1), "pm25": Field(1, 7), "co2": Field(10, 8)})
+
+README = RuleSet("readme", "Readme.md", (
+    Rule("smoke", 0, "alarm", "Smoke is detected"),
+    Rule("pm25", 100, "alarm", "PM2.5 > 100"),
+    Rule("co2", 1000, "alarm", "CO2 > 1000 ppm"),
+), {})
+
+RULE_SETS = (ESP32, RISCV, README)
+
+# Integer sensor ranges the layers see: sketch.ino's map() ranges and the
+# simulation's clamps
+DOMAIN = {"smoke": (0, LIMITS["smoke"]), "co2": (400, LIMITS["co2"]), "pm25": (0, LIMITS["pm25"]),
+          "temp": (0, LIMITS["temp"])}
+
+SAFE = -1
+
+# bounds: {metric: (lo, hi)} inclusive; verdicts: index of the deciding rule
+# per rule set (SAFE if none); points: integer readings in the box
+Region = collections.namedtuple("Region", "bounds verdicts points")
+
+
+def encode(field, values):
+    """Physical readings -> the numbers a layer compares, per ``field``."""
+    values = np.asarray(values)
+    if field.scale is None:
+        return (values != 0).astype(values.dtype)
+    if field.scale != 1:
+        values = values // field.scale
+    return values & ((1 << field.bits) - 1) if field.bits else values
+
+
+def _table(count):
+    # bits of the firing rules -> index of the first (lowest bit) one
+    table = np.full(1 << count, SAFE, np.int8)
+    for bits in range(1, 1 << count):
+        table[bits] = (bits & -bits).bit_length() - 1
+    return table
+
+
+def evaluate(rule_set, readings):
+    """Index of the deciding rule per reading (SAFE = -1); ``readings`` maps metric -> array."""
+    code = None
+    for i, rule in enumerate(rule_set.rules):
+        value = readings[rule.metric]
+        field = rule_set.fields.get(rule.metric)
+        if field is not None:
+            value = encode(field, value)
+        fired = np.asarray(value > rule.threshold).view(np.uint8)
+        if code is None:
+            code = fired.copy()
+        else:
+            code |= fired << np.uint8(i)
+    return _table(len(rule_set.rules))[code]
+
+
+def alarm(rule_set, readings):
+    """True where the layer would ventilate / show the alarm."""
+    return evaluate(rule_set, readings) != SAFE
+
+
+def fuse(local, sim):
+    """sketch.ino's effective readings: max of local and simulation, local smoke switch = 100, temp from sim."""
+    return {"smoke": np.maximum(np.asarray(local["smoke"]) * 100, sim["smoke"]),
+            "co2": np.maximum(local["co2"], sim["co2"]),
+            "pm25": np.maximum(local["pm25"], sim["pm25"]),
+            "temp": np.asarray(sim["temp"])}
+
+
+def _intervals(metric, rule_sets, domain):
+    # Split [lo, hi] wherever some rule on ``metric`` changes its verdict
+    lo, hi = domain[metric]
+    values = np.arange(lo, hi + 1)
+    rows = [np.zeros(len(values), bool)]
+    for rule_set in rule_sets:
+        field = rule_set.fields.get(metric)
+        native = values if field is None else encode(field, values)
+        rows += [native > rule.threshold for rule in rule_set.rules if rule.metric == metric]
+    changes = np.flatnonzero((np.diff(np.array(rows), axis=1) != 0).any(axis=0)) + 1
+    starts = np.concatenate([[0], changes])
+    ends = np.concatenate([changes - 1, [len(values) - 1]])
+    return [(int(values[s]), int(values[e])) for s, e in zip(starts, ends)]
+
+
+def _merge(cells):
+    # Join neighbouring boxes with the same verdicts, one axis at a time
+    for axis in range(len(METRICS)):
+        groups = collections.defaultdict(list)
+        for bounds, verdicts in cells:
+            rest = bounds[:axis] + bounds[axis + 1:]
+            groups[rest, verdicts].append(bounds)
+        cells = []
+        for (_, verdicts), boxes in groups.items():
+            boxes.sort(key=lambda b: b[axis])
+            current = boxes[0]
+            for box in boxes[1:]:
+                if box[axis][0] == current[axis][1] + 1:
+                    current = current[:axis] + ((current[axis][0], box[axis][1]),) + current[axis + 1:]
+                else:
+                    cells.append((current, verdicts))
+                    current = box
+            cells.append((current, verdicts))
+    return cells
+
+
+def decision_map(rule_sets=RULE_SETS, domain=DOMAIN):
+    """Regions covering ``domain`` inside which every rule set's verdict is constant."""
+    axes = [_intervals(metric, rule_sets, domain) for metric in METRICS]
+    cells = list(itertools.product(*axes))
+    # Any point of a cell decides for all of it; take the low corner
+    corners = {metric: np.array([cell[i][0] for cell in cells]) for i, metric in enumerate(METRICS)}
+    verdicts = np.stack([evaluate(rule_set, corners) for rule_set in rule_sets], axis=1)
+    merged = _merge([(cell, tuple(int(v) for v in row)) for cell, row in zip(cells, verdicts)])
+    regions = []
+    for bounds, verdict in merged:
+        points = int(np.prod([hi - lo + 1 for lo, hi in bounds]))
+        regions.append(Region(dict(zip(METRICS, bounds)), verdict, points))
+    regions.sort(key=lambda r: tuple(r.bounds[m] for m in METRICS))
+    return regions
+
+
+def disagreements(rule_sets=RULE_SETS, domain=DOMAIN):
+    """Regions of ``decision_map`` where the rule sets don't agree on raising the alarm."""
+    return [region for region in decision_map(rule_sets, domain)
+            if len({verdict != SAFE for verdict in region.verdicts}) > 1]
+
+
+def describe(region, rule_sets=RULE_SETS):
+    """One line: the box and what each layer decides in it."""
+    box = ", ".join(f"{metric} {lo}" if lo == hi else f"{metric} {lo}-{hi}"
+                    for metric, (lo, hi) in region.bounds.items())
+    decided = ", ".join(f"{rule_set.name}: " + ("safe" if verdict == SAFE else rule_set.rules[verdict].status)
+                        for rule_set, verdict in zip(rule_sets, region.verdicts))
+    return f"{box} -> {decided}"
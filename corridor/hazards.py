@@ -0,0 +1,349 @@
+"""Rolling-window hazard state per room, updated one sample at a time.
+
+``aggregatedSensors`` takes a fresh ``Math.max`` over the rooms on every
+render and ``sketch.ino`` decides on one sample a second, so a single noisy
+reading flips the fan.  ``Aggregator`` keeps, per stream (a room of a
+corridor) and per metric of ``corridor.sensors.METRICS``:
+
+* the max and min over the last ``window`` seconds, from monotonic deques:
+  a new sample pops the entries it dominates off the back, expired ones
+  leave from the front, so each sample is pushed and popped at most once;
+* an EWMA with time constant ``tau``, for irregular sample times;
+* the rate of change per second, the same EWMA of sample-to-sample slopes.
+
+The alert status uses the thresholds of a ``corridor.controller`` rule set
+(the ESP32's by default) with a time debounce.  A rule raises the status
+once every sample for at least ``window`` seconds has been above its
+threshold: each stream keeps, per rule, the time of the first sample of
+the current run of samples that fire it.  A stream's first sample, and the
+first after a gap longer than the window, start every run afresh, so a
+one-sample spike never raises the status, however it arrives.  A raised
+status clears only when no sample in the window is above its threshold any
+more, so the window max no longer fires it.  The status then drops to
+whatever rule has held for a whole window.  ``window=0`` gives the stateless
+behaviour of today.
+
+Streams are rows of NumPy arrays, and ``update`` takes a batch of samples
+of distinct streams at once, so the deque, EWMA and debounce work is
+vectorised over thousands of corridors.  ``feed`` adds a single sample
+through the same arrays, so it pays their per-call overhead (a few
+thousand samples a second): it is a convenience for tests and small tools,
+and live ingest must batch, as ``ingest`` does.  Deques are rings of
+``capacity`` entries: a stream sampled more than ``capacity`` times within
+a window keeps only its last ``capacity`` samples.  ``state`` /
+``from_state`` (and ``save`` / ``load``) checkpoint every stream.
+"""
+import argparse
+import collections
+import json
+import os
+
+import numpy as np
+
+from corridor.capture import parse_record, payload_of, timestamp_of
+from corridor.controller import ESP32, SAFE, encode
+from corridor.sensors import BASE_SENSORS, METRICS
+
+# rows: stream indices; ts: sample times; before/after: deciding rule index (SAFE = -1)
+Transitions = collections.namedtuple("Transitions", "rows ts before after")
+# (streams, metrics) arrays, in METRICS order; status: (streams,) rule index
+Stats = collections.namedtuple("Stats", "max min ewma rate status")
+
+WINDOW = 5.0  # seconds a rule must hold before the status follows
+TAU = 10.0
+CAPACITY = 16
+# Deques: hi keeps the window max at its head, lo the min
+_QUEUES = (("hi", np.less_equal), ("lo", np.greater_equal))
+_ARRAYS = ("count", "last_t", "last", "ewma", "rate", "status", "since") + tuple(
+    f"{queue}_{part}" for queue, _ in _QUEUES for part in ("number", "time", "value", "head", "tail"))
+
+
+class Aggregator:
+    """Windowed max/min, EWMA, rate and debounced status of many sensor streams."""
+
+    def __init__(self, window=WINDOW, tau=TAU, capacity=CAPACITY, rules=ESP32, metrics=METRICS):
+        self.window = float(window)
+        self.tau = float(tau)
+        self.capacity = int(capacity)
+        if self.capacity < 1 or self.capacity & (self.capacity - 1):
+            raise ValueError(f"capacity must be a power of two, not {capacity}")
+        self.rules = rules
+        self.metrics = tuple(metrics)
+        self._rule_metric = np.array([self.metrics.index(rule.metric) for rule in rules.rules])
+        self.keys = []
+        self.index = {}
+        self._allocate(0)
+
+    def _allocate(self, size):
+        m, c = len(self.metrics), self.capacity
+        fresh = {
+            "count": np.zeros(size, np.int64),  # samples seen; the next sample's number
+            "last_t": np.zeros(size),
+            "last": np.zeros((size, m)),
+            "ewma": np.zeros((size, m)),
+            "rate": np.zeros((size, m)),
+            "status": np.full(size, SAFE, np.int8),
+            # Per rule: time its current run of firing samples started, inf while it does not fire
+            "since": np.full((size, len(self.rules.rules)), np.inf),
+        }
+        for queue, _ in _QUEUES:
+            # Rings of the entries' sample number, time and value; head and tail
+            # count up, the slot is counter % capacity
+            fresh.update({f"{queue}_number": np.zeros((size, m, c), np.int64), f"{queue}_time": np.zeros((size, m, c)),
+                          f"{queue}_value": np.zeros((size, m, c)), f"{queue}_head": np.zeros((size, m), np.int64),
+                          f"{queue}_tail": np.zeros((size, m), np.int64)})
+        for name, array in fresh.items():
+            old = getattr(self, name, None)
+            if old is not None:
+                array[:len(old)] = old
+            setattr(self, name, array)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def rows(self, keys):
+        """Row of each stream key, adding new streams."""
+        out = np.empty(len(keys), np.int64)
+        for i, key in enumerate(keys):
+            row = self.index.get(key)
+            if row is None:
+                row = self.index[key] = len(self.keys)
+                self.keys.append(key)
+            out[i] = row
+        if len(self.keys) > len(self.count):
+            self._allocate(max(len(self.keys), 2 * len(self.count), 64))
+        return out
+
+    def _deque(self, queue):
+        """Flat views of one kind of deque: number, time, value, head, tail."""
+        return [getattr(self, f"{queue}_{part}").reshape(-1) for part in ("number", "time", "value", "head", "tail")]
+
+    def _slide(self, queue, dominated, ids, ts, values, number):
+        """Expire the front entries of deques ``ids`` that left the window, then push the new sample."""
+        numbers, times, entries, head, tail = self._deque(queue)
+        c = self.capacity
+        mask = c - 1
+        heads = head[ids]
+        tails = tail[ids]
+        start = ids * c
+        limit = ts - self.window
+        oldest = number - c + 1
+        live = np.flatnonzero(heads < tails)
+        while live.size:
+            front = start[live] + (heads[live] & mask)
+            live = live[(numbers[front] < oldest[live]) | (times[front] < limit[live])]
+            heads[live] += 1
+            live = live[heads[live] < tails[live]]
+        live = np.flatnonzero(tails > heads)
+        while live.size:
+            live = live[dominated(entries[start[live] + ((tails[live] - 1) & mask)], values[live])]
+            tails[live] -= 1
+            live = live[tails[live] > heads[live]]
+        slot = start + (tails & mask)
+        numbers[slot] = number
+        times[slot] = ts
+        entries[slot] = values
+        head[ids] = heads
+        tail[ids] = tails + 1
+
+    def update(self, ts, rows, values):
+        """Add one sample per stream: ``rows`` distinct, ``values`` (len(rows), metrics), ``ts`` scalar or per row.
+
+        Each stream's samples must come in time order.  Returns the status ``Transitions`` the batch caused.
+        """
+        rows = np.asarray(rows, np.int64)
+        m = len(self.metrics)
+        values = np.asarray(values, np.float64).reshape(len(rows), m)
+        ts = np.broadcast_to(np.asarray(ts, np.float64), rows.shape)
+        if not len(rows):
+            return Transitions(rows, ts, self.status[:0], self.status[:0])
+        number = self.count[rows]
+
+        first = (number == 0)[:, None]
+        dt = np.maximum(ts - self.last_t[rows], 0.0)[:, None]
+        alpha = np.where(first, 1.0, -np.expm1(-dt / self.tau))
+        ewma = self.ewma[rows]
+        slope = np.divide(values - self.last[rows], dt, out=np.zeros_like(values), where=(dt > 0) & ~first)
+        rate = self.rate[rows]
+        self.rate[rows] = np.where(first, 0.0, rate + alpha * (slope - rate))
+        self.ewma[rows] = ewma + alpha * (values - ewma)
+        self.last_t[rows] = ts
+        self.last[rows] = values
+        self.count[rows] = number + 1
+        restart = first | (dt > self.window)
+        since = np.where(restart, np.inf, self.since[rows])
+        self.since[rows] = np.where(self._fires(values), np.minimum(since, ts[:, None]), np.inf)
+
+        ids = (rows[:, None] * m + np.arange(m)).ravel()
+        flat_ts, flat_number = np.repeat(ts, m), np.repeat(number, m)
+        for queue, dominated in _QUEUES:
+            self._slide(queue, dominated, ids, flat_ts, values.ravel(), flat_number)
+        return self._decide(ts, rows)
+
+    def _front(self, queue, rows):
+        _, _, entries, head, _ = self._deque(queue)
+        m = len(self.metrics)
+        ids = (rows[:, None] * m + np.arange(m)).ravel()
+        return entries[ids * self.capacity + (head[ids] & (self.capacity - 1))].reshape(len(rows), m)
+
+    def _fires(self, readings):
+        """(rows, rules): rule i fires on ``readings`` (rows, metrics)."""
+        out = np.empty((len(readings), len(self.rules.rules)), bool)
+        for i, rule in enumerate(self.rules.rules):
+            value = readings[:, self._rule_metric[i]]
+            field = self.rules.fields.get(rule.metric)
+            out[:, i] = (encode(field, value) if field is not None else value) > rule.threshold
+        return out
+
+    def _decide(self, ts, rows):
+        highs = self._front("hi", rows)
+        # The first rule, in priority order, that has fired on every sample for a whole window
+        covered = self.since[rows] <= (ts - self.window)[:, None]
+        sustained = np.where(covered.any(axis=1), covered.argmax(axis=1), SAFE)
+        before = self.status[rows]
+        rank = len(self.rules.rules)
+        current = np.where(before == SAFE, rank, before)
+        # The current rule still fires on some sample of the window: hold it
+        held = (before != SAFE) & self._fires(highs)[np.arange(len(rows)), np.minimum(current, rank - 1)]
+        after = np.where((np.where(sustained == SAFE, rank, sustained) < current) | ~held, sustained, before)
+        after = after.astype(np.int8)
+        self.status[rows] = after
+        changed = np.flatnonzero(after != before)
+        return Transitions(rows[changed], ts[changed], before[changed], after[changed])
+
+    def stats(self, rows=None):
+        """Windowed max and min, EWMA, rate and status of ``rows`` (every stream by default)."""
+        rows = np.arange(len(self.keys)) if rows is None else np.asarray(rows, np.int64)
+        return Stats(self._front("hi", rows), self._front("lo", rows),
+                     self.ewma[rows].copy(), self.rate[rows].copy(), self.status[rows].copy())
+
+    def status_of(self, index):
+        """The status string of a rule index (SAFE for -1)."""
+        return "SAFE" if index == SAFE else self.rules.rules[index].status
+
+    def feed(self, key, ts, payload):
+        """One sample from a payload; a missing or non-numeric metric reads as ``BASE_SENSORS``.
+
+        A convenience: a one-row ``update`` costs about as much as one of
+        thousands of rows, so anything sampling many streams must batch.
+        """
+        return self.update(ts, self.rows([key]), [readings(payload, self.metrics)])
+
+    def state(self):
+        """Everything needed to carry on elsewhere: settings, stream keys and arrays."""
+        n = len(self.keys)
+        return {"window": self.window, "tau": self.tau, "capacity": self.capacity, "rules": self.rules.name,
+                "metrics": list(self.metrics), "keys": [list(k) if isinstance(k, tuple) else k for k in self.keys],
+                "arrays": {name: getattr(self, name)[:n].copy() for name in _ARRAYS}}
+
+    @classmethod
+    def from_state(cls, state, rules=None):
+        """An aggregator continuing from ``state``; ``rules`` must be the set it was saved with."""
+        rules = ESP32 if rules is None else rules
+        if rules.name != state["rules"]:
+            raise ValueError(f"state was saved with rule set {state['rules']!r}, not {rules.name!r}")
+        self = cls(state["window"], state["tau"], state["capacity"], rules, state["metrics"])
+        self.keys = [tuple(k) if isinstance(k, list) else k for k in state["keys"]]
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        for name in _ARRAYS:
+            setattr(self, name, np.array(state["arrays"][name]))
+        return self
+
+    def save(self, path):
+        """Checkpoint to ``path`` (.npz)."""
+        state = self.state()
+        arrays = state.pop("arrays")
+        meta = np.frombuffer(json.dumps(state).encode(), np.uint8)
+        with open(path, "wb") as f:
+            np.savez(f, meta=meta, **arrays)
+
+    @classmethod
+    def load(cls, path, rules=None):
+        with np.load(path) as data:
+            state = json.loads(data["meta"].tobytes())
+            state["arrays"] = {name: data[name] for name in _ARRAYS}
+        return cls.from_state(state, rules)
+
+
+def readings(payload, metrics=METRICS):
+    """``metrics`` of a payload as floats; a missing or non-numeric one reads as ``BASE_SENSORS``."""
+    values = []
+    for metric in metrics:
+        try:
+            values.append(float(payload.get(metric, BASE_SENSORS[metric])))
+        except (TypeError, ValueError):
+            values.append(float(BASE_SENSORS[metric]))
+    return values
+
+
+def ingest(aggregator, lines, batch=4096):
+    """Feed the sensors / monitor lines of a capture, one stream per topic and room; yields Transitions.
+
+    Lines are timed as ``corridor.capture`` reads them: the envelope's
+    ``ts``, the payload's epoch ``timestamp``, or the last time seen.  They
+    are batched until a stream repeats (or ``batch`` lines), so each
+    ``update`` covers many streams.
+    """
+    keys, ts, values = [], [], []
+    pending = set()
+    last = None
+    for line in lines:
+        record = parse_record(line)
+        payload = payload_of(record) if record is not None else None
+        if payload is None or not any(m in payload for m in aggregator.metrics):
+            continue
+        last = timestamp_of(record, payload, last)
+        if last is None:
+            continue
+        key = (record.get("topic", ""), record.get("room") or payload.get("room") or "")
+        if key in pending or len(keys) >= batch:
+            transitions = aggregator.update(ts, aggregator.rows(keys), values)
+            if len(transitions.rows):
+                yield transitions
+            keys, ts, values = [], [], []
+            pending.clear()
+        pending.add(key)
+        keys.append(key)
+        ts.append(last)
+        values.append(readings(payload, aggregator.metrics))
+    if keys:
+        transitions = aggregator.update(ts, aggregator.rows(keys), values)
+        if len(transitions.rows):
+            yield transitions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m corridor.hazards", description=__doc__.split("\n")[0])
+    parser.add_argument("capture", help="JSON-lines capture of the sensors / monitor topics")
+    parser.add_argument("--window", type=float, default=WINDOW, help="debounce window, seconds")
+    parser.add_argument("--tau", type=float, default=TAU, help="EWMA time constant, seconds")
+    parser.add_argument("--checkpoint", help="resume from this .npz if it exists, and save to it at the end")
+    args = parser.parse_args(argv)
+
+    if args.checkpoint and os.path.exists(args.checkpoint):
+        debounced = Aggregator.load(args.checkpoint)
+    else:
+        debounced = Aggregator(args.window, args.tau)
+    stateless = Aggregator(0.0, args.tau)
+    counts = collections.Counter()
+    for name, aggregator in (("debounced", debounced), ("stateless", stateless)):
+        with open(args.capture, "rb") as f:
+            for transitions in ingest(aggregator, f):
+                counts[name] += len(transitions.rows)
+                if name == "debounced":
+                    for row, ts, before, after in zip(*transitions):
+                        print(f"{ts:.3f} {'/'.join(filter(None, aggregator.keys[row]))}: "
+                              f"{aggregator.status_of(before)} -> {aggregator.status_of(after)}")
+    print(f"{counts['debounced']:,} transitions with a {debounced.window:g} s window, "
+          f"{counts['stateless']:,} deciding on each sample")
+    stats = debounced.stats()
+    for row, key in enumerate(debounced.keys):
+        cells = ", ".join(f"{metric} {stats.min[row, i]:g}..{stats.max[row, i]:g} ewma {stats.ewma[row, i]:.1f} "
+                          f"{stats.rate[row, i]:+.2f}/s" for i, metric in enumerate(debounced.metrics))
+        print(f"{'/'.join(filter(None, key))}: {debounced.status_of(stats.status[row])}; {cells}")
+    if args.checkpoint:
+        debounced.save(args.checkpoint)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""Frames of the ripes.s LED matrix, rendered in batch with NumPy.
+
+Every pass of ripes.s ``main_loop`` redraws all 35x25 pixels from the two
+switch words it has just read -- all GREEN, or all RED with the 2x2 BLUE fan
+at byte offsets 0/4/140/144 -- so a frame depends on nothing but the switch
+state, and only on the bits the program masks out of it (smoke bit and
+7-bit PM2.5 of bank 0, 8-bit CO2 of bank 1).  ``LedRenderer`` runs the
+program on the headless machine once per decision it can take, captures
+the matrix, and checks the picture does not depend on the frame before.
+Rendering a sequence of switch states is then a lookup into a 65,536-entry
+table (the ``RISCV`` rule set of ``corridor.controller``) and a gather of
+those few images into a (frames, 25, 35, 3) uint8 array.
+
+Animations are encoded with one GIF frame per run of identical frames and
+memoized, in memory and optionally on disk, by a hash of the frame sequence
+and the captured images, since scenario animations mostly repeat.
+``LedRenderer.save`` writes a ``.png`` of one state or a ``.gif`` of a
+sequence.
+
+    python -m corridor.leds alarm.gif --smoke 0 0 60 60 0 --pm25 20 --co2 500 [--fps 10] [--scale 8]
+"""
+import argparse
+import collections
+import hashlib
+import io
+import os
+
+import numpy as np
+
+from corridor.controller import RISCV, SAFE, encode, evaluate
+from corridor.sensors import BASE_SENSORS
+from corridor.riscv import Machine
+from corridor.riscv.machine import LED_HEIGHT, LED_WIDTH
+
+RIPES_S = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ripes", "ripes.s")
+# The switch bits ripes.s reads: (SW0 & 0xFF) << 8 | (SW1 & 0xFF) indexes the table
+STATES = 1 << 16
+BACKGROUND = (12, 12, 18)
+# Longest GIF frame delay, ms (the format stores centiseconds in 16 bits);
+# longer holds are cut to this
+MAX_DELAY = 60_000
+
+
+def switch_words(smoke, pm25, co2):
+    """(SW0, SW1) for raw switch fields: smoke bit, 7-bit PM2.5, 8-bit CO2."""
+    smoke, pm25, co2 = (np.asarray(v, dtype=np.int64) for v in (smoke, pm25, co2))
+    return (smoke != 0) | (pm25 & 0x7F) << 1, co2 & 0xFF
+
+
+def from_readings(readings):
+    """(SW0, SW1) for physical readings ({metric: array}), encoded as ``RISCV.fields``."""
+    fields = {metric: encode(RISCV.fields[metric], readings[metric]) for metric in ("smoke", "pm25", "co2")}
+    return switch_words(**fields)
+
+
+def _state_index(sw0, sw1):
+    return (np.asarray(sw0, dtype=np.int64) & 0xFF) << 8 | (np.asarray(sw1, dtype=np.int64) & 0xFF)
+
+
+def _rgb(pixels):
+    # 0x00RRGGBB words -> (..., 3) uint8
+    words = np.asarray(pixels, dtype=np.uint32)
+    return np.stack([(words >> 16) & 0xFF, (words >> 8) & 0xFF, words & 0xFF], axis=-1).astype(np.uint8)
+
+
+def upscale(frames, scale=8, background=BACKGROUND):
+    """Draw each LED as a round dot of ``scale`` pixels on ``background``; works on one frame or many.
+
+    Any number of channels works, e.g. one of palette indices.
+    """
+    frames = np.asarray(frames, dtype=np.uint8)
+    if scale == 1:
+        return frames
+    centre = (scale - 1) / 2
+    yy, xx = np.mgrid[:scale, :scale]
+    dot = (yy - centre) ** 2 + (xx - centre) ** 2 <= (0.42 * scale) ** 2
+    *lead, height, width, channels = frames.shape
+    big = np.broadcast_to(frames[..., :, None, :, None, :], (*lead, height, scale, width, scale, channels))
+    big = np.where(dot[:, None, :, None], big, np.asarray(background, dtype=np.uint8))
+    return big.reshape(*lead, height * scale, width * scale, channels)
+
+
+def runs(keys):
+    """(key, length) of each run of equal consecutive entries of ``keys``."""
+    keys = np.asarray(keys)
+    if not len(keys):
+        return keys[:0], np.zeros(0, np.int64)
+    starts = np.concatenate([[0], np.flatnonzero(keys[1:] != keys[:-1]) + 1])
+    return keys[starts], np.diff(np.append(starts, len(keys)))
+
+
+class LedRenderer:
+    """The images ripes.s can draw and which switch states draw which.
+
+    ``images`` is (K, 25, 35, 3) uint8 in the order first captured;
+    ``table`` maps a switch state index to its image.
+    """
+
+    def __init__(self, path=RIPES_S, memo=64):
+        self.path = path
+        machine = Machine.from_file(path)
+        machine.run(until="main_loop")
+        states = np.arange(STATES)
+        raw = {"smoke": (states >> 8) & 1, "pm25": (states >> 9) & 0x7F, "co2": states & 0xFF}
+        verdicts = evaluate(RISCV._replace(fields={}), raw)
+        # One machine pass per decision, from a state that takes it
+        decided = [SAFE] + list(range(len(RISCV.rules)))
+        shown = {}
+        for verdict in decided:
+            taken = np.flatnonzero(verdicts == verdict)
+            if len(taken):
+                shown[verdict] = self._draw(machine, int(taken[0]))
+        images, image_of = [], {}
+        for verdict, pixels in shown.items():
+            for i, image in enumerate(images):
+                if np.array_equal(image, pixels):
+                    image_of[verdict] = i
+                    break
+            else:
+                image_of[verdict] = len(images)
+                images.append(pixels)
+        # Drawn over every other image, each decision must leave the same picture
+        for verdict, pixels in shown.items():
+            for before in shown:
+                self._draw(machine, int(np.flatnonzero(verdicts == before)[0]))
+                if not np.array_equal(self._draw(machine, int(np.flatnonzero(verdicts == verdict)[0])), pixels):
+                    raise ValueError(f"{path}: the LED matrix keeps pixels of the previous frame")
+        self.images = _rgb(np.stack(images)).reshape(len(images), LED_HEIGHT, LED_WIDTH, 3)
+        lookup = np.zeros(len(decided), np.uint8)
+        for verdict, i in image_of.items():
+            lookup[verdict + 1] = i
+        self.table = lookup[verdicts + 1]
+        self.digest = hashlib.sha256(self.images.tobytes()).digest()
+        self._memo = collections.OrderedDict()
+        self._memo_size = memo
+
+    @staticmethod
+    def _draw(machine, state):
+        machine.set_switches(0, state >> 8)
+        machine.set_switches(1, state & 0xFF)
+        machine.run(until="main_loop")
+        return np.array(machine.leds.pixels, dtype=np.uint32)
+
+    def keys(self, sw0, sw1):
+        """Image index of every frame for switch words ``sw0``, ``sw1`` (broadcast together)."""
+        return self.table[_state_index(sw0, sw1)]
+
+    def frames(self, sw0, sw1):
+        """(frames, 25, 35, 3) uint8 RGB of the LED matrix after each pass of ``main_loop``."""
+        return self.images[self.keys(sw0, sw1)]
+
+    def png(self, sw0, sw1, scale=8):
+        """PNG of the matrix for one switch state."""
+        from PIL import Image  # Pillow comes with python-pptx
+
+        out = io.BytesIO()
+        Image.fromarray(upscale(self.images[int(self.keys(sw0, sw1))], scale)).save(out, "PNG", optimize=True)
+        return out.getvalue()
+
+    def animation(self, sw0, sw1, fps=10, scale=8, cache_dir=None):
+        """Animated GIF of the frame sequence, one GIF frame per run of identical frames."""
+        keys, lengths = runs(self.keys(sw0, sw1))
+        if not len(keys):
+            raise ValueError("no frames to animate")
+        key = hashlib.sha256(self.digest + keys.astype(np.uint8).tobytes() + lengths.astype(np.int64).tobytes()
+                             + f"{fps}:{scale}".encode()).hexdigest()
+        data = self._memo.get(key)
+        if data is not None:
+            self._memo.move_to_end(key)
+            return data
+        path = os.path.join(cache_dir, key + ".gif") if cache_dir else None
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                data = f.read()
+        else:
+            data = self._encode_gif(keys, lengths, fps, scale)
+            if path:
+                os.makedirs(cache_dir, exist_ok=True)
+                tmp = f"{path}.{os.getpid()}.tmp"
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+        self._memo[key] = data
+        if len(self._memo) > self._memo_size:
+            self._memo.popitem(last=False)
+        return data
+
+    def save(self, path, sw0, sw1, fps=10, scale=8):
+        """Write a PNG of one switch state, or a GIF of a sequence, by the extension of ``path``; the bytes written."""
+        extension = os.path.splitext(path)[1].lower()
+        if extension == ".png":
+            data = self.png(sw0, sw1, scale)
+        elif extension == ".gif":
+            data = self.animation(np.atleast_1d(sw0), np.atleast_1d(sw1), fps, scale)
+        else:
+            raise ValueError(f"{path}: expected a .png or .gif file name")
+        with open(path, "wb") as f:
+            f.write(data)
+        return len(data)
+
+    def _encode_gif(self, keys, lengths, fps, scale):
+        from PIL import Image
+
+        # Exact colours: a shared palette of the LED colours and the background
+        colors, indexed = np.unique(self.images.reshape(-1, 3), axis=0, return_inverse=True)
+        colors = np.vstack([colors, BACKGROUND]).astype(np.uint8)
+        indexed = indexed.reshape(*self.images.shape[:3], 1)
+        indexed = upscale(indexed, scale, background=(len(colors) - 1,))[..., 0]
+        pictures = {}
+        for key in np.unique(keys).tolist():
+            picture = Image.fromarray(indexed[key], "P")
+            picture.putpalette(colors.ravel().tolist())
+            pictures[key] = picture
+        sequence = [pictures[key] for key in keys.tolist()]
+        delays = [min(round(length * 1000 / fps), MAX_DELAY) for length in lengths.tolist()]
+        out = io.BytesIO()
+        sequence[0].save(out, "GIF", save_all=True, append_images=sequence[1:], duration=delays, loop=0,
+                         disposal=1, optimize=False)
+        return out.getvalue()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m corridor.leds", description=__doc__.split("\n")[0])
+    parser.add_argument("output", help="a .png (one frame) or .gif (one frame per reading)")
+    for metric in ("smoke", "pm25", "co2"):
+        parser.add_argument(f"--{metric}", type=int, nargs="+", default=[BASE_SENSORS[metric]],
+                            help=f"{metric} readings, one per frame (one value holds for every frame)")
+    parser.add_argument("--fps", type=float, default=10)
+    parser.add_argument("--scale", type=int, default=8, help="pixels per LED")
+    parser.add_argument("--ripes", default=RIPES_S, help="program to capture the images from")
+    args = parser.parse_args(argv)
+
+    readings = dict(zip(("smoke", "pm25", "co2"), np.broadcast_arrays(args.smoke, args.pm25, args.co2)))
+    frames = len(readings["smoke"])
+    extension = os.path.splitext(args.output)[1].lower()
+    if extension not in (".png", ".gif"):
+        parser.error(f"{args.output}: expected a .png or .gif file name")
+    if extension == ".png" and frames > 1:
+        parser.error("a .png holds one frame; give one reading per metric or write a .gif")
+    sw0, sw1 = from_readings(readings)
+    if frames == 1:
+        sw0, sw1 = sw0[0], sw1[0]
+    size = LedRenderer(args.ripes).save(args.output, sw0, sw1, args.fps, args.scale)
+    print(f"wrote {args.output}: {frames} frame(s), {size:,} bytes")
+
+
+if __name__ == "__main__":
+    main()
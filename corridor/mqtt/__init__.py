@@ -0,0 +1,7 @@
+"""Local MQTT 3.1.1 broker, client and load generator for the smart-corridor topics."""
+from corridor.mqtt.broker import Broker, BrokerStats
+from corridor.mqtt.client import Client
+from corridor.mqtt.load import LoadStats, run_load
+from corridor.mqtt.packets import ProtocolError, topic_matches
+
+__all__ = ["Broker", "BrokerStats", "Client", "LoadStats", "run_load", "ProtocolError", "topic_matches"]
@@ -0,0 +1,3 @@
+from corridor.mqtt.broker import main
+
+main()
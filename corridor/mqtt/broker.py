@@ -0,0 +1,261 @@
+"""Local MQTT 3.1.1 broker stand-in for broker.hivemq.com (QoS 0, TCP and WebSocket).
+
+Enough of the protocol for sketch.ino (PubSubClient over TCP) and the
+simulation's useRiscvCommunication (mqtt.js over ``ws://host:port/mqtt``):
+CONNECT, PUBLISH, SUBSCRIBE, UNSUBSCRIBE, PINGREQ, DISCONNECT, retained
+messages and wills.  Everything is delivered at QoS 0; a QoS 1 PUBLISH is
+acknowledged and then forwarded at QoS 0, QoS 2 closes the connection.
+Only topics under ``topics`` (default ``smart-corridor/#``) are accepted.
+
+Each PUBLISH is encoded once and the bytes are written to every matching
+subscriber; the subscriber list of a topic is cached until a subscription
+changes.  A subscriber whose socket buffer is past ``max_buffer`` is
+skipped, as QoS 0 allows, instead of stalling the publisher.
+
+    python -m corridor.mqtt [--port 1883] [--ws-port 8884]
+"""
+import argparse
+import asyncio
+import collections
+import itertools
+
+from corridor.mqtt import packets
+from corridor.mqtt.streams import HandshakeError, TcpStream, WebSocketStream, server_handshake
+
+# Counters since the broker started
+BrokerStats = collections.namedtuple("BrokerStats", "connections clients received delivered dropped")
+
+
+class Session:
+    """One connected client."""
+
+    __slots__ = ("stream", "transport", "client_id", "filters", "will", "keepalive")
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.transport = stream.transport
+        self.client_id = None
+        self.filters = set()
+        self.will = None
+        self.keepalive = 0
+
+
+class Broker:
+    """QoS 0 broker; ``await start()`` then ``await serve_forever()`` or ``close()``."""
+
+    def __init__(self, host="127.0.0.1", port=1883, ws_port=None, ws_path="/mqtt", topics="smart-corridor/#",
+                 max_buffer=1 << 20):
+        self.host, self.port, self.ws_port, self.ws_path = host, port, ws_port, ws_path
+        self.topics = topics
+        self.max_buffer = max_buffer
+        self.sessions = {}                              # client_id -> Session
+        self.subscriptions = collections.defaultdict(set)  # filter -> {Session}
+        self.retained = {}                              # topic -> PUBLISH bytes with the retain flag
+        self._routes = {}                               # topic -> (Session, ...)
+        self._servers = []
+        self._handlers = set()
+        self._ids = itertools.count(1)
+        self.connections = self.received = self.delivered = self.dropped = 0
+
+    async def start(self):
+        """Listen on the TCP (and WebSocket) ports; port 0 picks a free one, see ``ports``."""
+        self._servers.append(await asyncio.start_server(self._serve_tcp, self.host, self.port))
+        if self.ws_port is not None:
+            self._servers.append(await asyncio.start_server(self._serve_ws, self.host, self.ws_port))
+        return self
+
+    @property
+    def ports(self):
+        """Bound (tcp, websocket) ports; websocket is None when not enabled."""
+        ports = [server.sockets[0].getsockname()[1] for server in self._servers]
+        return ports[0], ports[1] if len(ports) > 1 else None
+
+    async def serve_forever(self):
+        await asyncio.gather(*(server.serve_forever() for server in self._servers))
+
+    async def close(self):
+        for server in self._servers:
+            server.close()
+        for session in list(self.sessions.values()):
+            session.stream.close()
+        # Let the connection handlers see their streams end rather than be cancelled
+        if self._handlers:
+            await asyncio.wait(self._handlers, timeout=5)
+        for server in self._servers:
+            await server.wait_closed()
+
+    def stats(self):
+        return BrokerStats(self.connections, len(self.sessions), self.received, self.delivered, self.dropped)
+
+    def allowed(self, topic):
+        return self.topics is None or packets.topic_matches(self.topics, topic)
+
+    def _allowed_filter(self, topic_filter):
+        # A filter is accepted when everything it can match lies under ``topics``
+        if self.topics is None:
+            return True
+        prefix = self.topics[:-1] if self.topics.endswith("#") else None
+        if prefix is None:
+            return topic_filter == self.topics
+        return topic_filter.startswith(prefix) or topic_filter == prefix.rstrip("/")
+
+    # -- routing --------------------------------------------------------------
+
+    def _subscribers(self, topic):
+        route = self._routes.get(topic)
+        if route is None:
+            matched = set()
+            for topic_filter, sessions in self.subscriptions.items():
+                if packets.topic_matches(topic_filter, topic):
+                    matched |= sessions
+            route = self._routes[topic] = tuple(matched)
+        return route
+
+    def route(self, topic, data):
+        """Write encoded PUBLISH ``data`` for ``topic`` to every subscriber."""
+        limit = self.max_buffer
+        for session in self._subscribers(topic):
+            if session.transport.get_write_buffer_size() > limit:
+                self.dropped += 1
+                continue
+            session.stream.write(data)
+            self.delivered += 1
+
+    def _publish(self, topic, payload, retain):
+        if not self.allowed(topic):
+            return
+        self.received += 1
+        data = packets.publish(topic, payload)
+        if retain:
+            if payload:
+                self.retained[topic] = packets.publish(topic, payload, retain=True)
+            else:
+                self.retained.pop(topic, None)
+        self.route(topic, data)
+
+    def _subscribe(self, session, topic_filter):
+        self.subscriptions[topic_filter].add(session)
+        session.filters.add(topic_filter)
+        self._routes.clear()
+        for topic, data in self.retained.items():
+            if packets.topic_matches(topic_filter, topic):
+                session.stream.write(data)
+
+    def _unsubscribe(self, session, topic_filter):
+        sessions = self.subscriptions.get(topic_filter)
+        if sessions is not None:
+            sessions.discard(session)
+            if not sessions:
+                del self.subscriptions[topic_filter]
+        session.filters.discard(topic_filter)
+        self._routes.clear()
+
+    # -- connections ----------------------------------------------------------
+
+    async def _serve_tcp(self, reader, writer):
+        await self._serve(TcpStream(reader, writer))
+
+    async def _serve_ws(self, reader, writer):
+        try:
+            await server_handshake(reader, writer, self.ws_path)
+        except (HandshakeError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            return
+        await self._serve(WebSocketStream(reader, writer))
+
+    async def _serve(self, stream):
+        self.connections += 1
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        task.add_done_callback(self._handlers.discard)
+        session = Session(stream)
+        clean_exit = False
+        try:
+            kind, _, body = await asyncio.wait_for(packets.read_packet(stream), 10)
+            if kind != packets.CONNECT:
+                return
+            try:
+                connect = packets.parse_connect(body)
+            except packets.ProtocolError:
+                stream.write(packets.connack(packets.BAD_PROTOCOL))
+                return
+            client_id = connect["client_id"] or f"auto-{next(self._ids)}"
+            previous = self.sessions.get(client_id)
+            if previous is not None:
+                previous.stream.close()  # a second CONNECT with the same id takes over
+            session.client_id, session.will, session.keepalive = client_id, connect["will"], connect["keepalive"]
+            self.sessions[client_id] = session
+            stream.write(packets.connack())
+            # The spec allows one and a half keep-alive periods of silence
+            timeout = session.keepalive * 1.5 or None
+            while True:
+                kind, flags, body = await asyncio.wait_for(packets.read_packet(stream), timeout)
+                if kind == packets.PUBLISH:
+                    topic, payload, qos, retain, packet_id = packets.parse_publish(flags, body)
+                    if qos == 2:
+                        return
+                    if qos == 1:
+                        stream.write(packets.puback(packet_id))
+                    self._publish(topic, payload, retain)
+                elif kind == packets.SUBSCRIBE:
+                    packet_id, filters = packets.parse_subscribe(body)
+                    codes = []
+                    for topic_filter, _ in filters:
+                        if packets.valid_filter(topic_filter) and self._allowed_filter(topic_filter):
+                            codes.append(0)
+                        else:
+                            codes.append(packets.SUBACK_FAILURE)
+                    stream.write(packets.suback(packet_id, codes))
+                    for (topic_filter, _), code in zip(filters, codes):
+                        if code == 0:
+                            self._subscribe(session, topic_filter)
+                elif kind == packets.UNSUBSCRIBE:
+                    packet_id, filters = packets.parse_unsubscribe(body)
+                    for topic_filter in filters:
+                        self._unsubscribe(session, topic_filter)
+                    stream.write(packets.unsuback(packet_id))
+                elif kind == packets.PINGREQ:
+                    stream.write(packets.PINGRESP_PACKET)
+                elif kind == packets.DISCONNECT:
+                    clean_exit = True
+                    return
+                else:
+                    return  # CONNECT twice or a packet a QoS 0 broker never expects
+                if session.transport.get_write_buffer_size() > self.max_buffer:
+                    await stream.drain()
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError, packets.ProtocolError):
+            pass
+        finally:
+            self._disconnect(session, clean_exit)
+
+    def _disconnect(self, session, clean_exit):
+        for topic_filter in list(session.filters):
+            self._unsubscribe(session, topic_filter)
+        if session.client_id is not None and self.sessions.get(session.client_id) is session:
+            del self.sessions[session.client_id]
+        if session.will and not clean_exit:
+            self._publish(*session.will)
+        session.stream.close()
+
+
+async def serve(host, port, ws_port):
+    broker = await Broker(host, port, ws_port).start()
+    tcp, ws = broker.ports
+    print(f"MQTT broker on {host}:{tcp} (tcp)" + (f", ws://{host}:{ws}{broker.ws_path}" if ws else ""), flush=True)
+    await broker.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local MQTT 3.1.1 broker (QoS 0) for the smart-corridor topics.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--ws-port", type=int, default=8884, help="WebSocket port (path /mqtt); -1 to disable")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, None if args.ws_port < 0 else args.ws_port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Small asyncio MQTT 3.1.1 client (QoS 0) over TCP or WebSocket.
+
+Used by the load generator; also handy to poke the local broker:
+
+    client = await Client.connect("127.0.0.1", 1883, "probe")
+    await client.subscribe("smart-corridor/#")
+    topic, payload = await client.messages.get()
+"""
+import asyncio
+import itertools
+
+from corridor.mqtt import packets
+from corridor.mqtt.streams import TcpStream, WebSocketStream, client_handshake
+
+
+class Client:
+    """A connected client; incoming PUBLISHes go to ``on_message(topic, payload)`` or the ``messages`` queue."""
+
+    def __init__(self, stream, client_id, on_message=None):
+        self.stream = stream
+        self.client_id = client_id
+        self.messages = asyncio.Queue() if on_message is None else None
+        self.on_message = on_message or (lambda topic, payload: self.messages.put_nowait((topic, payload)))
+        self._ids = itertools.count(1)
+        self._acks = {}
+        self._reader = None
+
+    @classmethod
+    async def connect(cls, host, port, client_id, websocket=False, path="/mqtt", keepalive=60, on_message=None):
+        reader, writer = await asyncio.open_connection(host, port)
+        if websocket:
+            await client_handshake(reader, writer, f"{host}:{port}", path)
+            stream = WebSocketStream(reader, writer, client=True)
+        else:
+            stream = TcpStream(reader, writer)
+        stream.write(packets.connect(client_id, keepalive))
+        kind, _, body = await packets.read_packet(stream)
+        if kind != packets.CONNACK or body[1] != packets.ACCEPTED:
+            writer.close()
+            raise ConnectionError(f"{client_id}: connection refused ({body[1] if len(body) > 1 else '?'})")
+        client = cls(stream, client_id, on_message)
+        client._reader = asyncio.create_task(client._read())
+        return client
+
+    async def _read(self):
+        try:
+            while True:
+                kind, flags, body = await packets.read_packet(self.stream)
+                if kind == packets.PUBLISH:
+                    topic, payload, _, _, _ = packets.parse_publish(flags, body)
+                    self.on_message(topic, payload)
+                elif kind in (packets.SUBACK, packets.UNSUBACK):
+                    future = self._acks.pop(int.from_bytes(body[:2], "big"), None)
+                    if future is not None and not future.done():
+                        future.set_result(body[2:])
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+    async def _request(self, build, filters):
+        packet_id = next(self._ids) & 0xFFFF or next(self._ids)
+        future = self._acks[packet_id] = asyncio.get_running_loop().create_future()
+        self.stream.write(build(packet_id, filters))
+        return await asyncio.wait_for(future, 10)
+
+    async def subscribe(self, *filters):
+        """Subscribe at QoS 0; returns the SUBACK codes (0x80 for refused filters)."""
+        return list(await self._request(packets.subscribe, filters))
+
+    async def unsubscribe(self, *filters):
+        await self._request(packets.unsubscribe, filters)
+
+    def publish(self, topic, payload, retain=False):
+        """Queue a QoS 0 PUBLISH; ``await drain()`` to apply back-pressure."""
+        self.stream.write(packets.publish(topic, payload, retain))
+
+    def write(self, data):
+        """Queue an already encoded packet."""
+        self.stream.write(data)
+
+    async def drain(self):
+        await self.stream.drain()
+
+    async def close(self):
+        try:
+            self.stream.write(packets.DISCONNECT_PACKET)
+            await self.stream.drain()
+        except ConnectionError:
+            pass
+        self.stream.close()
+        if self._reader is not None:
+            self._reader.cancel()
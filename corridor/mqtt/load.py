@@ -0,0 +1,203 @@
+"""Load generator: thousands of corridor nodes publishing the real payloads.
+
+Half the nodes behave like sketch.ino: once per period they publish the
+monitor status string on ``smart-corridor/monitor`` and, whenever their
+decision changes, the ACTIVATE_VENT / SET_ALERT / GLOBAL_ALARM (or
+DEACTIVATE_VENT / SET_ALERT) command burst on ``smart-corridor/commands``,
+byte for byte as ArduinoJson serializes it.  The other half behave like the
+simulation's publishSensorData and publish aggregated readings on
+``smart-corridor/sensors``.  Readings follow a random walk per node, so
+alarms come and go.
+
+Dashboard subscribers listen on ``smart-corridor/#`` and time every
+delivery against the moment its PUBLISH was written.  Payloads carry no
+extra fields for this: each subscriber keeps the send times of in-flight
+payloads by content, oldest first, and deliveries take the oldest match.
+Whatever is still in flight after the drain period counts as lost.
+"""
+import asyncio
+import collections
+import json
+import random
+import time
+
+import numpy as np
+
+from corridor.mqtt import packets
+from corridor.mqtt.client import Client
+
+TOPIC_MONITOR = "smart-corridor/monitor"
+TOPIC_COMMANDS = "smart-corridor/commands"
+TOPIC_SENSORS = "smart-corridor/sensors"
+
+# sketch.ino thresholds
+THRESH_SMOKE, THRESH_PM25, THRESH_CO2, THRESH_TEMP = 30, 80, 800, 35
+
+# seconds: publishing time, without the drain; latencies: seconds per
+# delivery; per_topic: {topic: deliveries}
+LoadStats = collections.namedtuple(
+    "LoadStats", "nodes subscribers published delivered lost seconds latencies per_topic")
+
+
+def decide(smoke, co2, pm25, temp):
+    """(need_ventilation, status_msg, alert_level) as sketch.ino's decision logic."""
+    if smoke > THRESH_SMOKE:
+        return True, "CRITICAL: SMOKE DETECTED", "critical"
+    if temp > THRESH_TEMP:
+        return True, "DANGER: HIGH TEMPERATURE", "danger"
+    if pm25 > THRESH_PM25:
+        return True, "WARNING: HIGH PM2.5", "warning"
+    if co2 > THRESH_CO2:
+        return True, "WARNING: HIGH CO2", "warning"
+    return False, "SAFE", "normal"
+
+
+def monitor_payload(pm25, co2, smoke, temp, ventilation, status, source="combined"):
+    """The status string sketch.ino builds for the monitor topic."""
+    return (f'{{"pm25": {pm25}, "co2": {co2}, "smoke": {smoke}, "temp": {temp}, '
+            f'"ventilation": {"true" if ventilation else "false"}, "status": "{status}", "source": "{source}"}}')
+
+
+def command_payload(action, room, level, alarm, millis):
+    """publishCommand's ArduinoJson document, serialized compactly."""
+    return json.dumps({"action": action, "room": room, "level": level, "alarm": alarm, "timestamp": millis},
+                      separators=(",", ":"))
+
+
+def command_burst(ventilation, alert_level, millis):
+    """Commands sketch.ino sends when its decision changes."""
+    if not ventilation:
+        return [command_payload("DEACTIVATE_VENT", "kitchen", "OFF", False, millis),
+                command_payload("SET_ALERT", "kitchen", "normal", False, millis)]
+    burst = [command_payload("ACTIVATE_VENT", "kitchen", "HIGH", True, millis),
+             command_payload("SET_ALERT", "kitchen", alert_level, True, millis)]
+    if alert_level == "critical":
+        burst.append(command_payload("GLOBAL_ALARM", "", "critical", True, millis))
+    return burst
+
+
+def sensors_payload(smoke, co2, pm25, temp, status, now_ms):
+    """JSON.stringify({...aggregatedSensors, timestamp: Date.now()})."""
+    return json.dumps({"smoke": smoke, "co2": co2, "pm25": pm25, "temp": temp, "status": status,
+                       "timestamp": now_ms}, separators=(",", ":"))
+
+
+class Readings:
+    """Random-walk readings of one node, clamped to the sensor ranges."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.smoke, self.co2, self.pm25, self.temp = 0, 400, 15, 22
+
+    def step(self):
+        rng = self.rng
+        self.co2 = min(2000, max(400, self.co2 + rng.randint(-60, 60)))
+        self.pm25 = min(200, max(0, self.pm25 + rng.randint(-8, 8)))
+        self.temp = min(60, max(15, self.temp + rng.randint(-1, 1)))
+        # The smoke switch: rarely flipped on, soon off again
+        if rng.random() < (0.1 if self.smoke else 0.01):
+            self.smoke = 100 - self.smoke
+        return self.smoke, self.co2, self.pm25, self.temp
+
+
+class Sink:
+    """Send times of in-flight payloads for one subscriber, and its measured latencies."""
+
+    def __init__(self):
+        self.pending = collections.defaultdict(collections.deque)
+        self.latencies = []
+        self.per_topic = collections.Counter()
+
+    def sent(self, topic, payload, when):
+        self.pending[topic, payload].append(when)
+
+    def received(self, topic, payload):
+        now = time.perf_counter()
+        sent = self.pending.get((topic, payload))
+        if sent:
+            self.latencies.append(now - sent.popleft())
+            self.per_topic[topic] += 1
+            if not sent:
+                del self.pending[topic, payload]
+
+    def in_flight(self):
+        return sum(len(times) for times in self.pending.values())
+
+
+async def _connect_all(host, port, ids, websocket, batch=200, on_message=None):
+    clients = []
+    for start in range(0, len(ids), batch):
+        clients += await asyncio.gather(*(Client.connect(host, port, client_id, websocket, on_message=on_message)
+                                          for client_id in ids[start:start + batch]))
+    return clients
+
+
+async def _node(client, kind, rng, period, deadline, sinks, counter):
+    readings = Readings(rng)
+    prev = None
+    boot = time.perf_counter() - rng.random() * 3600
+    await asyncio.sleep(rng.random() * period)  # stagger the nodes
+    next_tick = time.perf_counter()
+    while next_tick < deadline:
+        smoke, co2, pm25, temp = readings.step()
+        ventilation, status, alert = decide(smoke, co2, pm25, temp)
+        if kind == "esp32":
+            messages = []
+            if (ventilation, status) != prev:
+                millis = int((time.perf_counter() - boot) * 1000)
+                messages += [(TOPIC_COMMANDS, p) for p in command_burst(ventilation, alert, millis)]
+                prev = ventilation, status
+            messages.append((TOPIC_MONITOR, monitor_payload(pm25, co2, smoke, temp, ventilation, status)))
+        else:
+            aggregate = "CRITICAL" if smoke > 50 else "WARNING" if smoke > 30 or pm25 > 80 else "SAFE"
+            messages = [(TOPIC_SENSORS, sensors_payload(smoke, co2, pm25, temp, aggregate, int(time.time() * 1000)))]
+        for topic, payload in messages:
+            data = payload.encode()
+            now = time.perf_counter()
+            for sink in sinks:
+                sink.sent(topic, data, now)
+            client.write(packets.publish(topic, data))
+            counter[0] += 1
+        await client.drain()
+        next_tick += period
+        delay = next_tick - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+async def run_load(host, port, nodes=1000, rate=1.0, duration=10.0, subscribers=4, websocket=False, drain=2.0,
+                   seed=0):
+    """Connect ``nodes`` publishers and ``subscribers`` dashboards, publish for ``duration`` s, return LoadStats.
+
+    ``rate`` is publish periods per node per second (sketch.ino loops once a
+    second).  ``websocket`` connects every client over WebSocket instead of
+    TCP; ``port`` must then be the broker's WebSocket port.
+    """
+    rng = random.Random(seed)
+    sinks = [Sink() for _ in range(subscribers)]
+    dashboards = []
+    for i, sink in enumerate(sinks):
+        dashboard = await Client.connect(host, port, f"dashboard-{i}", websocket, on_message=sink.received)
+        await dashboard.subscribe("smart-corridor/#")
+        dashboards.append(dashboard)
+    kinds = ["esp32" if i % 2 == 0 else "simulation" for i in range(nodes)]
+    ids = [f"{'RISCV-Controller' if kind == 'esp32' else 'simulation'}-{i:05x}" for i, kind in enumerate(kinds)]
+    clients = await _connect_all(host, port, ids, websocket)
+
+    counter = [0]
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(_node(client, kind, random.Random(rng.random()), 1 / rate, deadline, sinks, counter)
+                           for client, kind in zip(clients, kinds)))
+    published, seconds = counter[0], time.perf_counter() - start
+    # Let the last deliveries arrive
+    settle = time.perf_counter() + drain
+    while time.perf_counter() < settle and any(sink.in_flight() for sink in sinks):
+        await asyncio.sleep(0.05)
+
+    for client in clients + dashboards:
+        await client.close()
+    latencies = np.concatenate([np.asarray(sink.latencies) for sink in sinks]) if sinks else np.zeros(0)
+    per_topic = sum((sink.per_topic for sink in sinks), collections.Counter())
+    return LoadStats(nodes, subscribers, published, len(latencies), sum(sink.in_flight() for sink in sinks),
+                     seconds, latencies, dict(per_topic))
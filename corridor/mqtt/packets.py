@@ -0,0 +1,214 @@
+"""MQTT 3.1.1 control packets: the subset a QoS 0 broker and client need.
+
+Packets are read from anything with an asyncio ``readexactly`` (a
+``StreamReader`` or a ``WebSocketStream``) and encoded straight to bytes.
+A PUBLISH is encoded once and the same bytes are written to every
+subscriber.
+"""
+import struct
+
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+
+# CONNACK return codes
+ACCEPTED, BAD_PROTOCOL, ID_REJECTED = 0, 1, 2
+SUBACK_FAILURE = 0x80
+
+# "MQTT" level 4 is 3.1.1; PubSubClient and older clients may still send 3.1
+PROTOCOLS = {(b"MQTT", 4), (b"MQIsdp", 3)}
+MAX_REMAINING = 268_435_455
+
+PINGRESP_PACKET = bytes((PINGRESP << 4, 0))
+PINGREQ_PACKET = bytes((PINGREQ << 4, 0))
+DISCONNECT_PACKET = bytes((DISCONNECT << 4, 0))
+
+
+class ProtocolError(ValueError):
+    """A malformed or unsupported packet; the connection is closed."""
+
+
+def _length(n):
+    # Remaining Length: 7 bits per byte, high bit set on all but the last
+    if n < 128:
+        return bytes((n,))
+    out = bytearray()
+    while True:
+        n, digit = divmod(n, 128)
+        out.append(digit | 0x80 if n else digit)
+        if not n:
+            return bytes(out)
+
+
+def _string(value):
+    data = value.encode() if isinstance(value, str) else value
+    return struct.pack("!H", len(data)) + data
+
+
+def packet(kind, body=b"", flags=0):
+    """A control packet of ``kind`` with the fixed header in front of ``body``."""
+    if len(body) > MAX_REMAINING:
+        raise ProtocolError(f"packet body of {len(body)} bytes is too large")
+    return bytes((kind << 4 | flags,)) + _length(len(body)) + body
+
+
+async def read_packet(stream):
+    """(kind, flags, body) of the next packet; IncompleteReadError at end of stream."""
+    first = (await stream.readexactly(1))[0]
+    length = shift = 0
+    while True:
+        digit = (await stream.readexactly(1))[0]
+        length |= (digit & 0x7F) << shift
+        if not digit & 0x80:
+            break
+        shift += 7
+        if shift > 21:
+            raise ProtocolError("malformed remaining length")
+    body = await stream.readexactly(length) if length else b""
+    return first >> 4, first & 0x0F, body
+
+
+def _read_string(body, offset):
+    if offset + 2 > len(body):
+        raise ProtocolError("truncated string")
+    (n,) = struct.unpack_from("!H", body, offset)
+    end = offset + 2 + n
+    if end > len(body):
+        raise ProtocolError("truncated string")
+    return body[offset + 2:end], end
+
+
+def connect(client_id, keepalive=60, clean=True, username=None, password=None):
+    flags = (0x02 if clean else 0) | (0x80 if username is not None else 0) | (0x40 if password is not None else 0)
+    body = _string("MQTT") + bytes((4, flags)) + struct.pack("!H", keepalive) + _string(client_id)
+    if username is not None:
+        body += _string(username)
+    if password is not None:
+        body += _string(password)
+    return packet(CONNECT, body)
+
+
+def parse_connect(body):
+    """{client_id, keepalive, clean, will, username, password} of a CONNECT body.
+
+    ``will`` is (topic, message, retain) or None.  Raises ProtocolError for
+    protocols other than 3.1 / 3.1.1; the caller answers BAD_PROTOCOL.
+    """
+    name, offset = _read_string(body, 0)
+    if offset + 4 > len(body):
+        raise ProtocolError("truncated CONNECT")
+    level, flags = body[offset], body[offset + 1]
+    if (name, level) not in PROTOCOLS:
+        raise ProtocolError(f"unsupported protocol {name!r} level {level}")
+    (keepalive,) = struct.unpack_from("!H", body, offset + 2)
+    client_id, offset = _read_string(body, offset + 4)
+    will = None
+    if flags & 0x04:
+        topic, offset = _read_string(body, offset)
+        message, offset = _read_string(body, offset)
+        will = (topic.decode(), message, bool(flags & 0x20))
+    username = password = None
+    if flags & 0x80:
+        username, offset = _read_string(body, offset)
+    if flags & 0x40:
+        password, offset = _read_string(body, offset)
+    return {"client_id": client_id.decode(), "keepalive": keepalive, "clean": bool(flags & 0x02),
+            "will": will, "username": username, "password": password}
+
+
+def connack(code=ACCEPTED, session_present=False):
+    return packet(CONNACK, bytes((int(session_present), code)))
+
+
+def publish(topic, payload, retain=False):
+    """A QoS 0 PUBLISH of ``payload`` (bytes or str) on ``topic``."""
+    if isinstance(payload, str):
+        payload = payload.encode()
+    return packet(PUBLISH, _string(topic) + payload, flags=int(retain))
+
+
+def parse_publish(flags, body):
+    """(topic, payload, qos, retain, packet_id); packet_id is None at QoS 0."""
+    qos = (flags >> 1) & 0x03
+    if qos == 3:
+        raise ProtocolError("PUBLISH with QoS 3")
+    topic, offset = _read_string(body, 0)
+    packet_id = None
+    if qos:
+        (packet_id,) = struct.unpack_from("!H", body, offset)
+        offset += 2
+    return topic.decode(), body[offset:], qos, bool(flags & 0x01), packet_id
+
+
+def puback(packet_id):
+    return packet(PUBACK, struct.pack("!H", packet_id))
+
+
+def subscribe(packet_id, filters):
+    """SUBSCRIBE to ``filters`` at QoS 0."""
+    body = struct.pack("!H", packet_id) + b"".join(_string(f) + b"\x00" for f in filters)
+    return packet(SUBSCRIBE, body, flags=0x02)
+
+
+def parse_subscribe(body):
+    """(packet_id, [(filter, qos), ...])."""
+    (packet_id,) = struct.unpack_from("!H", body, 0)
+    offset, filters = 2, []
+    while offset < len(body):
+        name, offset = _read_string(body, offset)
+        if offset >= len(body):
+            raise ProtocolError("SUBSCRIBE without requested QoS")
+        filters.append((name.decode(), body[offset] & 0x03))
+        offset += 1
+    if not filters:
+        raise ProtocolError("SUBSCRIBE without topic filters")
+    return packet_id, filters
+
+
+def suback(packet_id, codes):
+    return packet(SUBACK, struct.pack("!H", packet_id) + bytes(codes))
+
+
+def unsubscribe(packet_id, filters):
+    body = struct.pack("!H", packet_id) + b"".join(_string(f) for f in filters)
+    return packet(UNSUBSCRIBE, body, flags=0x02)
+
+
+def parse_unsubscribe(body):
+    (packet_id,) = struct.unpack_from("!H", body, 0)
+    offset, filters = 2, []
+    while offset < len(body):
+        name, offset = _read_string(body, offset)
+        filters.append(name.decode())
+    return packet_id, filters
+
+
+def unsuback(packet_id):
+    return packet(UNSUBACK, struct.pack("!H", packet_id))
+
+
+def valid_filter(topic_filter):
+    """True if ``topic_filter`` is a well-formed filter ('#' last and alone, '+' alone in its level)."""
+    if not topic_filter:
+        return False
+    levels = topic_filter.split("/")
+    for i, level in enumerate(levels):
+        if "#" in level and (level != "#" or i != len(levels) - 1):
+            return False
+        if "+" in level and level != "+":
+            return False
+    return True
+
+
+def topic_matches(topic_filter, topic):
+    """True if ``topic`` matches ``topic_filter``; wildcards don't match '$' topics."""
+    if topic_filter == topic:
+        return True
+    if topic.startswith("$") and topic_filter[:1] in ("+", "#"):
+        return False
+    levels = topic.split("/")
+    for i, level in enumerate(topic_filter.split("/")):
+        if level == "#":
+            return True
+        if i >= len(levels) or (level != "+" and level != levels[i]):
+            return False
+    return len(levels) == i + 1
@@ -0,0 +1,169 @@
+"""Byte streams MQTT runs over: plain TCP and a minimal RFC 6455 WebSocket.
+
+``TcpStream`` and ``WebSocketStream`` both wrap an asyncio reader/writer
+pair and offer ``readexactly`` / ``write`` / ``drain`` / ``close`` and the
+``transport``, so the broker and client run one MQTT code path for both.
+Over WebSocket, MQTT packets may span frames and frames may hold several
+packets; the stream only sees a byte sequence.
+"""
+import asyncio
+import base64
+import hashlib
+import os
+import struct
+
+GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+SUBPROTOCOL = "mqtt"
+
+CONTINUATION, BINARY, CLOSE, PING, PONG = 0x0, 0x2, 0x8, 0x9, 0xA
+MAX_HEADER = 64 * 1024
+
+
+class HandshakeError(ValueError):
+    """The peer did not complete a WebSocket upgrade."""
+
+
+def accept_key(key):
+    return base64.b64encode(hashlib.sha1(key.encode() + GUID).digest()).decode()
+
+
+def frame(opcode, payload, mask=False):
+    """One final frame; clients must mask, servers must not."""
+    n = len(payload)
+    head = bytes((0x80 | opcode,))
+    bit = 0x80 if mask else 0
+    if n < 126:
+        head += bytes((bit | n,))
+    elif n < 1 << 16:
+        head += bytes((bit | 126,)) + struct.pack("!H", n)
+    else:
+        head += bytes((bit | 127,)) + struct.pack("!Q", n)
+    if not mask:
+        return head + payload
+    key = os.urandom(4)
+    return head + key + _mask(payload, key)
+
+
+def _mask(data, key):
+    # XOR as one big integer instead of byte by byte
+    n = len(data)
+    if not n:
+        return b""
+    repeated = (key * (n // 4 + 1))[:n]
+    return (int.from_bytes(data, "big") ^ int.from_bytes(repeated, "big")).to_bytes(n, "big")
+
+
+async def _read_headers(reader):
+    data = await reader.readuntil(b"\r\n\r\n")
+    if len(data) > MAX_HEADER:
+        raise HandshakeError("oversized HTTP header")
+    lines = data.decode("latin-1").split("\r\n")
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    return lines[0], headers
+
+
+async def server_handshake(reader, writer, path=None):
+    """Answer the HTTP upgrade on a new connection; returns the request path."""
+    request, headers = await _read_headers(reader)
+    parts = request.split()
+    key = headers.get("sec-websocket-key")
+    if len(parts) < 2 or parts[0] != "GET" or "websocket" not in headers.get("upgrade", "").lower() or not key:
+        writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+        raise HandshakeError(f"not a WebSocket upgrade: {request!r}")
+    if path is not None and parts[1].split("?")[0] != path:
+        writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+        raise HandshakeError(f"unknown path {parts[1]!r}")
+    response = ["HTTP/1.1 101 Switching Protocols", "Upgrade: websocket", "Connection: Upgrade",
+                f"Sec-WebSocket-Accept: {accept_key(key)}"]
+    offered = [p.strip() for p in headers.get("sec-websocket-protocol", "").split(",")]
+    if SUBPROTOCOL in offered:
+        response.append(f"Sec-WebSocket-Protocol: {SUBPROTOCOL}")
+    writer.write(("\r\n".join(response) + "\r\n\r\n").encode())
+    await writer.drain()
+    return parts[1]
+
+
+async def client_handshake(reader, writer, host, path="/mqtt"):
+    key = base64.b64encode(os.urandom(16)).decode()
+    request = (f"GET {path} HTTP/1.1\r\nHost: {host}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+               f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n"
+               f"Sec-WebSocket-Protocol: {SUBPROTOCOL}\r\n\r\n")
+    writer.write(request.encode())
+    await writer.drain()
+    status, headers = await _read_headers(reader)
+    if " 101 " not in status + " " or headers.get("sec-websocket-accept") != accept_key(key):
+        raise HandshakeError(f"upgrade refused: {status!r}")
+
+
+class TcpStream:
+    """An asyncio reader/writer pair as one stream."""
+
+    def __init__(self, reader, writer):
+        self.readexactly = reader.readexactly
+        self.write = writer.write
+        self.drain = writer.drain
+        self.wait_closed = writer.wait_closed
+        self.writer = writer
+        self.transport = writer.transport
+
+    def close(self):
+        self.writer.close()
+
+
+class WebSocketStream:
+    """Byte stream over WebSocket binary frames (``client=True`` masks outgoing frames)."""
+
+    def __init__(self, reader, writer, client=False):
+        self.reader, self.writer, self.client = reader, writer, client
+        self.transport = writer.transport
+        self._buffer = bytearray()
+        self._closed = False
+
+    async def _frame(self):
+        # Payload of the next data frame; control frames are answered here
+        while True:
+            b0, b1 = await self.reader.readexactly(2)
+            opcode, n = b0 & 0x0F, b1 & 0x7F
+            if n == 126:
+                (n,) = struct.unpack("!H", await self.reader.readexactly(2))
+            elif n == 127:
+                (n,) = struct.unpack("!Q", await self.reader.readexactly(8))
+            key = await self.reader.readexactly(4) if b1 & 0x80 else None
+            payload = await self.reader.readexactly(n) if n else b""
+            if key:
+                payload = _mask(payload, key)
+            if opcode == CLOSE:
+                if not self._closed:
+                    self._closed = True
+                    self.writer.write(frame(CLOSE, payload[:2], self.client))
+                raise asyncio.IncompleteReadError(bytes(self._buffer), None)
+            if opcode == PING:
+                self.writer.write(frame(PONG, payload, self.client))
+            elif opcode in (BINARY, CONTINUATION, 0x1):
+                return payload
+
+    async def readexactly(self, n):
+        while len(self._buffer) < n:
+            self._buffer += await self._frame()
+        data = bytes(self._buffer[:n])
+        del self._buffer[:n]
+        return data
+
+    def write(self, data):
+        self.writer.write(frame(BINARY, data, self.client))
+
+    async def drain(self):
+        await self.writer.drain()
+
+    def close(self):
+        if not self._closed and not self.writer.is_closing():
+            self._closed = True
+            self.writer.write(frame(CLOSE, struct.pack("!H", 1000), self.client))
+        self.writer.close()
+
+    async def wait_closed(self):
+        await self.writer.wait_closed()
@@ -0,0 +1,271 @@
+"""Smoke and spark particles of ``SmokeEffects.jsx``, baked into looping frame buffers.
+
+``SmokeEffect`` and ``ExplosionEffect`` integrate every particle on the
+main thread on every other ``useFrame``.  Between resets a particle moves by
+a constant step per update (its velocity times the smoke intensity for
+smoke; velocity minus a fixed fall for sparks), so its position is
+``reset + age * step`` and a whole clip is a closed-form gather over
+(frames, particles) instead of a time loop.  Each particle's life is a
+schedule of cycles: a smoke particle lives ``LIFETIME`` updates exactly; a
+spark lives until it leaves the unit sphere or drops below -0.5, which is
+found for all its reset positions at once.
+
+Clips loop: every particle's cycles fill the loop exactly and it starts at
+a random phase of its own schedule.  Smoke loops are a whole number of
+lifetimes and so seamless; a spark's last flight is cut short where its
+schedule wraps, which looks like any other reset.
+
+``write`` stores all clips in one little-endian buffer, (frames, particles,
+3) each, as int16 normalised to the clip's per-axis ``scale`` (or float16),
+with a JSON index next to it.  In the browser a frame is a typed-array view
+of the fetched buffer, with no decoding::
+
+    new Int16Array(buffer, clip.byte_offset + frame * clip.frame_bytes, clip.count * 3)
+
+used as a normalised ``BufferAttribute`` under ``points.scale = clip.scale``.
+``python -m corridor.particles`` bakes the house's emitters into
+``simulation-room/public/particles``.
+"""
+import argparse
+import collections
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OUTPUT = os.path.join(ROOT, "simulation-room", "public", "particles")
+
+# useFrame at 60 fps, particles moved on every other frame
+FRAME_RATE = 60
+FPS = FRAME_RATE // 2
+UPDATE_DELTA = 2 / FRAME_RATE  # adjustedDelta
+SPARK_FALL = UPDATE_DELTA * 0.5
+# Longest spark flight, updates: the slowest spark leaves the unit sphere in about 20
+MAX_FLIGHT = 64
+SMOKE_LEVELS = (25, 50, 75, 100)
+LIMIT = {"int16": 32767}
+
+
+def _lifetime():
+    # Updates from one reset to the next, with the JS float accumulation
+    lifetime, updates = 0.0, 0
+    while lifetime <= 1:
+        lifetime += UPDATE_DELTA * 0.3
+        updates += 1
+    return updates
+
+
+LIFETIME = _lifetime()
+
+# kind: "smoke" or "sparks"; position: of the <points> in the house;
+# intensity, spread: SmokeEffect props; size, color, opacity: pointsMaterial
+Emitter = collections.namedtuple("Emitter", "name kind position count intensity spread size color opacity")
+
+# House.jsx and the ExplosionEffect at the origin of its group
+EMITTERS = (
+    Emitter("living-room-smoke", "smoke", (-5.5, 0.5, -6.5), 80, 1.5, 4.0, 0.15, "#555555", 0.4),
+    Emitter("kitchen-smoke", "smoke", (-12.0, 1.0, -7.0), 80, 1.0, 3.0, 0.15, "#555555", 0.4),
+    Emitter("explosion-smoke", "smoke", (0.0, 0.5, 0.0), 80, 2.0, 0.5, 0.15, "#555555", 0.4),
+    Emitter("explosion-sparks", "sparks", (0.0, 0.0, 0.0), 25, 1.0, 0.0, 0.05, "#FF6600", 0.8),
+)
+
+# resets: (particles, cycles, 3) position at the start of each cycle;
+# lengths: (particles, cycles) updates per cycle, 0 past the last;
+# steps: (particles, 3) displacement per update; cut: (particles,) bool,
+# the last cycle is shorter than the particle's natural life
+Schedule = collections.namedtuple("Schedule", "resets lengths steps cut")
+# positions: (frames, particles, 3) float32 relative to the emitter;
+# level: smokeLevel baked (None for sparks); cut: sparks cut short at the seam
+Clip = collections.namedtuple("Clip", "emitter level positions cut")
+
+
+def velocities(emitter, rng):
+    """(particles, 3) initial velocities, drawn as ``SmokeEffects.jsx`` does."""
+    n = emitter.count
+    if emitter.kind == "smoke":
+        return np.stack([(rng.random(n) - 0.5) * 0.02, rng.random(n) * 0.02 + 0.01,
+                         (rng.random(n) - 0.5) * 0.02], axis=1)
+    angle = rng.random(n) * 2 * math.pi
+    speed = rng.random(n) * 0.1 + 0.05
+    return np.stack([np.cos(angle) * speed, rng.random(n) * 0.1, np.sin(angle) * speed], axis=1)
+
+
+def resets(emitter, shape, rng):
+    """Respawn positions, ``shape + (3,)``."""
+    if emitter.kind == "smoke":
+        return np.stack([(rng.random(shape) - 0.5) * emitter.spread, np.zeros(shape),
+                         (rng.random(shape) - 0.5) * emitter.spread], axis=-1)
+    return np.stack([(rng.random(shape) - 0.5) * 0.1, rng.random(shape) * 0.1,
+                     (rng.random(shape) - 0.5) * 0.1], axis=-1)
+
+
+def steps(emitter, level, velocity):
+    """Displacement per update of every particle at ``smokeLevel`` ``level``."""
+    if emitter.kind == "smoke":
+        return velocity * (level / 100 * emitter.intensity) * np.array([1.0, 2.0, 1.0])
+    return velocity - np.array([0.0, SPARK_FALL, 0.0])
+
+
+def flights(starts, step):
+    """Updates a spark shows from each of ``starts`` (particles, cycles, 3) before it resets."""
+    k = np.arange(1, MAX_FLIGHT + 1)[None, None, :, None]
+    path = starts[:, :, None, :] + k * step[:, None, None, :]
+    gone = (np.sqrt((path ** 2).sum(axis=-1)) > 1) | (path[..., 1] < -0.5)
+    if not gone.any(axis=2).all():
+        raise ValueError(f"a spark stays in flight for over {MAX_FLIGHT} updates")
+    return gone.argmax(axis=2) + 1
+
+
+def schedule(emitter, level, frames, rng, velocity=None):
+    """Cycles filling exactly ``frames`` updates for every particle; the last may be cut short."""
+    velocity = velocities(emitter, rng) if velocity is None else velocity
+    step = steps(emitter, level, velocity)
+    if emitter.kind == "smoke":
+        starts = resets(emitter, (emitter.count, -(-frames // LIFETIME)), rng)
+        lengths = np.full(starts.shape[:2], LIFETIME, np.int64)
+    else:
+        starts = np.empty((emitter.count, 0, 3))
+        lengths = np.empty((emitter.count, 0), np.int64)
+        while len(lengths[0]) == 0 or lengths.sum(axis=1).min() < frames:
+            more = resets(emitter, (emitter.count, frames // 8 + 1), rng)
+            starts = np.concatenate([starts, more], axis=1)
+            lengths = np.concatenate([lengths, flights(more, step)], axis=1)
+    # Cycles past the end get length 0 and the one crossing it is cut
+    before = np.cumsum(lengths, axis=1) - lengths
+    filled = np.clip(frames - before, 0, lengths)
+    return Schedule(starts, filled, step, ((filled != lengths) & (filled > 0)).any(axis=1))
+
+
+def play(sched, frames, phase=0):
+    """(frames, particles, 3) positions, update ``t`` showing ``(t + phase) % period`` of each schedule.
+
+    ``phase`` is a scalar or one per particle.
+    """
+    n = len(sched.lengths)
+    period = sched.lengths.sum(axis=1)
+    t = (np.arange(frames)[None, :] + np.asarray(phase)[..., None]) % period[:, None]  # (particles, frames)
+    # Per-particle searchsorted as one: row i lives in [i * stride, (i + 1) * stride)
+    stride = int(period.max()) + 1
+    base = np.arange(n)[:, None] * stride
+    first = np.cumsum(sched.lengths, axis=1) - sched.lengths
+    first = np.where(sched.lengths > 0, first, stride - 1) + base
+    t += base
+    # Index into the flattened (particles, cycles) arrays
+    cycle = np.searchsorted(first.ravel(), t.ravel(), side="right").reshape(n, frames) - 1
+    age = (t - first.ravel()[cycle]).astype(np.float32)
+    positions = sched.resets.reshape(-1, 3).astype(np.float32)[cycle]
+    positions += age[..., None] * sched.steps[:, None, :].astype(np.float32)
+    return positions.transpose(1, 0, 2)
+
+
+def loop_frames(seconds):
+    """Updates in a loop of about ``seconds``: a whole number of smoke lifetimes, at least one."""
+    return max(1, round(seconds * FPS / LIFETIME)) * LIFETIME
+
+
+def bake(emitter, level=100, seconds=10.0, rng=None):
+    """One loop of ``emitter`` at ``smokeLevel`` ``level``, about ``seconds`` long.
+
+    Every clip of the same ``seconds`` has the same length, so clips played
+    together stay in step.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    frames = loop_frames(seconds)
+    sched = schedule(emitter, level, frames, rng)
+    positions = play(sched, frames, rng.integers(0, frames, emitter.count))
+    return Clip(emitter, level if emitter.kind == "smoke" else None, positions, int(sched.cut.sum()))
+
+
+def quantize(positions, dtype="int16"):
+    """(little-endian array, per-axis scale): int16 is normalised, ``q / 32767 * scale``; float16 is as is."""
+    positions = np.asarray(positions, np.float64)
+    if dtype == "float16":
+        return positions.astype("<f2"), [1.0, 1.0, 1.0]
+    if dtype not in LIMIT:
+        raise ValueError(f"unknown dtype {dtype!r}; use int16 or float16")
+    scale = np.abs(positions).reshape(-1, 3).max(axis=0, initial=0.0)
+    scale = np.where(scale > 0, scale, 1.0).astype(np.float32)
+    q = np.rint(positions / scale * LIMIT[dtype])
+    return np.clip(q, -LIMIT[dtype], LIMIT[dtype]).astype("<i2"), scale.tolist()
+
+
+def dequantize(data, scale, dtype="int16"):
+    """Positions back from ``quantize`` output, as the browser reads them."""
+    data = np.asarray(data, np.float32)
+    return data if dtype == "float16" else data / LIMIT[dtype] * np.asarray(scale, np.float32)
+
+
+def write(clips, directory=OUTPUT, name="particles", dtype="int16", align=16):
+    """``<name>.bin`` with every clip and the ``<name>.json`` index; returns the index.
+
+    Clip data starts on ``align``-byte boundaries, so typed-array views of
+    the fetched buffer need no copy.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}.bin")
+    tmp = f"{path}.{os.getpid()}.tmp"
+    entries, offset = [], 0
+    with open(tmp, "wb") as f:
+        for clip in clips:
+            data, scale = quantize(clip.positions, dtype)
+            pad = -offset % align
+            f.write(b"\0" * pad)
+            offset += pad
+            frames, count, _ = data.shape
+            emitter = clip.emitter
+            opacity = emitter.opacity * clip.level / 100 if clip.level is not None else emitter.opacity
+            entries.append({
+                "name": emitter.name if clip.level is None else f"{emitter.name}-{clip.level}",
+                "emitter": emitter.name, "kind": emitter.kind, "smoke_level": clip.level,
+                "position": list(emitter.position), "frames": frames, "count": count,
+                "byte_offset": offset, "frame_bytes": count * 3 * data.itemsize, "byte_length": data.nbytes,
+                "scale": scale, "seamless": clip.cut == 0,
+                "size": emitter.size, "color": emitter.color, "opacity": round(opacity, 4),
+            })
+            f.write(data.tobytes())
+            offset += data.nbytes
+    os.replace(tmp, path)
+    index = {"version": 1, "buffer": f"{name}.bin", "dtype": dtype, "normalized": dtype in LIMIT,
+             "byte_order": "little", "fps": FPS, "clips": entries}
+    path = os.path.join(directory, f"{name}.json")
+    with open(f"{path}.{os.getpid()}.tmp", "w") as f:
+        json.dump(index, f, indent=1)
+        f.write("\n")
+    os.replace(f"{path}.{os.getpid()}.tmp", path)
+    return index
+
+
+def bake_all(emitters=EMITTERS, levels=SMOKE_LEVELS, seconds=10.0, seed=None):
+    """Clips of every emitter: smoke at each of ``levels``, sparks once.
+
+    An emitter's clips share its particles, so switching level changes
+    their speed only.
+    """
+    seeds = np.random.SeedSequence(seed).spawn(len(emitters))
+    return [bake(emitter, level, seconds, np.random.default_rng(s)) for emitter, s in zip(emitters, seeds)
+            for level in (levels if emitter.kind == "smoke" else (None,))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m corridor.particles", description=__doc__.split("\n")[0])
+    parser.add_argument("-o", "--output", default=OUTPUT, help="directory for particles.bin and particles.json")
+    parser.add_argument("--seconds", type=float, default=10.0, help="loop length, rounded to smoke lifetimes")
+    parser.add_argument("--levels", type=int, nargs="+", default=list(SMOKE_LEVELS), help="smokeLevel values")
+    parser.add_argument("--dtype", choices=("int16", "float16"), default="int16")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+    start = time.perf_counter()
+    clips = bake_all(levels=args.levels, seconds=args.seconds, seed=args.seed)
+    index = write(clips, args.output, dtype=args.dtype)
+    seconds = time.perf_counter() - start
+    size = sum(clip["byte_length"] for clip in index["clips"])
+    frames = index["clips"][0]["frames"]
+    print(f"{len(clips)} clips of {frames} frames ({frames / FPS:.1f} s at {FPS} fps), {size / 1e3:.0f} kB "
+          f"in {os.path.join(args.output, index['buffer'])} ({seconds * 1e3:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
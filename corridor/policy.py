@@ -0,0 +1,376 @@
+"""Ventilation policies over the twin's LOW/MED/HIGH fan levels, optimised for time-to-safe and fan energy.
+
+sketch.ino answers every alarm with ``ACTIVATE_VENT`` kitchen HIGH.  In
+the twin's decay model the vents share one factor, summed over rooms and
+capped at 0.3 a second, and any vent clears burning items after 10 s.  A
+policy here is a schedule of level codes per room over the ``PHASES`` (in
+seconds since the alarm), and its cost over a set of hazards is
+
+    time weight * mean time-to-safe + energy weight * mean fan-seconds
+
+where a fan-second is one vent running for one second, at any level
+(``POWER``).  A HIGH fan thus buys five times the airflow of a LOW one
+for the same energy, and fans past the 0.3 cap buy none.  Fans run until
+the status is SAFE and the smoke level is 0: the twin ignores
+DEACTIVATE_VENT while there is smoke.  For the same reason a vent, once
+on, stays on (it may go down to LOW).  A hazard that is never safe within the horizon counts the
+whole horizon.  Hazards no policy can make safe -- a source the fans
+cannot remove, such as a blocked chimney or an overloaded heater, keeps
+a room above 30 -- are left out of the cost and counted as ``never``, as
+``benchmarks/bench_sensors.py`` does.
+
+Evaluation is exact but cheap.  The smoke level is the same for every room,
+so a hazard only enters through its initial level, whether items are
+burning, and the highest level at which the status is SAFE with and without
+them.  That level is 30.5 minus the highest other smoke of any room, or
+never safe for high PM2.5 or emergency mode.  Thousands of random hazards
+reduce to a few hundred such cases with counts.  The level trajectories of a
+batch of policies are stepped once per distinct initial level, with the
+arithmetic of ``corridor.sensors.simulate``, and every case is read off them.
+
+``optimize`` runs a cross-entropy search per alarm class.  It samples
+schedules from per-(phase, room) level distributions, keeps the cheapest
+tenth, and moves the distributions towards them.  The sketch's own policy
+is always a candidate.  Batches are split over worker processes in chunks
+of at least ``POOL_BATCH`` policies, smaller ones scored in-process.  The
+workers get every class's cases once, when they start, so only the
+policies go out with each batch.  The
+class is what the controller knows when it raises the alarm: the ESP32
+rule that fired and the band of the smoke reading (``BANDS``).
+
+The result is a ``PolicyTable``: per class, one string of level digits
+per phase, in ROOMS order.  Which room a fan is in does not change the
+twin's smoke, so the schedules are given to rooms in ROOMS order, kitchen
+first.  ``PolicyTable.levels`` gives the levels for a reading and the
+seconds since the alarm.  ``corridor.replay`` applies a table in place of
+the sketch's fixed answer (``--policy``).  The controller reacts a second or
+two after the hazard starts, so its phases run that much late.
+
+    python -m corridor.policy [--hazards 20000] [--generations 20] [--batch 1024] [--workers N] [--output policy.json]
+"""
+import argparse
+import collections
+import functools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from corridor.controller import ESP32, SAFE, evaluate
+from corridor.sensors import BURN_CLEAR_SECONDS, METRICS, NATURAL_DECAY, ROOMS, VENT_LEVELS, random_hazards, \
+    room_sensors, vent_decay
+
+PHASES = (0, 5, 10, 20, 40, 80)  # phase starts, seconds since the alarm
+POWER = np.array([0.0, 1.0, 1.0, 1.0])  # fan-seconds per second, per level code
+BANDS = (30, 50, 70, 90)  # upper bounds of the smoke bands below 100
+HORIZON = 300
+WEIGHTS = {"time": 1.0, "energy": 0.1}
+POOL_BATCH = 256  # policies per worker below which a chunk costs more to send than to score
+SAFE_SMOKE = 30.5  # a room reads above 30 (WARNING) from here
+NEVER = -1.0  # safe level of a case that is never SAFE
+# The sketch: kitchen HIGH for as long as the alarm lasts
+SKETCH = np.zeros((len(PHASES), len(ROOMS)), np.uint8)
+SKETCH[:, ROOMS.index("kitchen")] = 3
+
+# Distinct hazards of a class: initial smoke level, items burning, the
+# highest smoke level at which the status is SAFE without burning items
+# and with them (NEVER if none), and how many hazards each stands for;
+# never: hazards left out because no policy makes them safe
+Cases = collections.namedtuple("Cases", "level burning safe_clear safe_burning count never")
+# time_to_safe, fan_seconds: (policies, cases), the horizon if never safe
+Outcome = collections.namedtuple("Outcome", "time_to_safe fan_seconds")
+# Per class: the best schedule, its cost, mean time-to-safe and fan-seconds, the sketch's cost,
+# and the hazards counted and left out
+Result = collections.namedtuple("Result", "policy cost time_to_safe fan_seconds baseline hazards never")
+
+
+def classify(hazards):
+    """Class key per hazard (None where no rule fires) from the aggregated readings at the start."""
+    sensors = room_sensors(hazards)
+    aggregated = {metric: sensors[metric][:, :, 0].max(axis=1) for metric in METRICS}
+    rules = evaluate(ESP32, aggregated)
+    bands = np.searchsorted(BANDS, aggregated["smoke"])
+    return [None if rule == SAFE else f"{ESP32.rules[rule].metric}/{band}" for rule, band in zip(rules, bands)]
+
+
+def _safe_level(hazards, burning):
+    sensors = room_sensors(hazards._replace(smoke_level=0.0, burning=burning))
+    pm25_ok = (sensors["pm25"][:, :, 0] <= 80).all(axis=1)
+    level = SAFE_SMOKE - sensors["smoke"][:, :, 0].max(axis=1)
+    return np.where(pm25_ok & ~np.asarray(hazards.emergency, bool), np.maximum(level, NEVER), NEVER)
+
+
+def cases(hazards):
+    """The distinct ``Cases`` of ``hazards`` (a ``Hazards`` of (n,) / (n, rooms) arrays)."""
+    n = len(np.asarray(hazards.smoke_level))
+    burning = np.broadcast_to(np.asarray(hazards.burning), n)
+    rows = np.stack([np.broadcast_to(np.asarray(hazards.smoke_level, float), n), burning > 0,
+                     _safe_level(hazards, np.zeros(n, int)), _safe_level(hazards, burning)], axis=1)
+    fixable = rows[:, 2] > 0  # safe once the smoke level is 0 and burning items are gone
+    unique, count = np.unique(rows[fixable], axis=0, return_counts=True)
+    return Cases(unique[:, 0], unique[:, 1].astype(bool), unique[:, 2], unique[:, 3], count,
+                 int(n - fixable.sum()))
+
+
+def phase_of(horizon):
+    """Phase index of every second of the horizon."""
+    return np.searchsorted(PHASES, np.arange(horizon), side="right") - 1
+
+
+def outcomes(policies, cases, horizon=HORIZON):
+    """Time-to-safe and fan-seconds of ``policies`` (P, phases, rooms) level codes on every case."""
+    policies = np.asarray(policies)
+    steps = phase_of(horizon)
+    decay = 1 - vent_decay(policies)[:, steps]  # (P, T)
+    vented = (policies > 0).any(axis=2)[:, steps]
+    power = POWER[policies].sum(axis=2)[:, steps]
+    power[:, 0] = 0.0
+    fan_seconds = np.cumsum(power, axis=1)
+
+    levels, which = np.unique(cases.level, return_inverse=True)
+    level = np.broadcast_to(levels, (len(policies), len(levels))).copy()
+    trajectory = np.empty((len(policies), len(levels), horizon))
+    trajectory[:, :, 0] = level
+    for t in range(1, horizon):
+        on = vented[:, t, None]
+        level = np.where(on, level * decay[:, t, None], level * NATURAL_DECAY)
+        level = np.where(level < np.where(on, 1.0, 0.5), 0.0, level)
+        trajectory[:, :, t] = level
+
+    # Levels never rise, so the first second below a safe level is the count of seconds at or above it
+    safe_levels, where = np.unique(np.concatenate([cases.safe_clear, cases.safe_burning]), return_inverse=True)
+    first = np.empty((len(policies), len(levels), len(safe_levels)), np.int64)
+    for k, safe in enumerate(safe_levels):
+        first[:, :, k] = (trajectory >= safe).sum(axis=2)
+    clear_at, burning_at = first[:, which, where[:len(which)]], first[:, which, where[len(which):]]
+
+    late = np.arange(horizon) >= BURN_CLEAR_SECONDS
+    cleared = np.where((vented & late).any(axis=1), (vented & late).argmax(axis=1), horizon)[:, None]
+    time_to_safe = np.where(cases.burning & (burning_at >= cleared), np.maximum(clear_at, cleared), clear_at)
+    time_to_safe = np.where(cases.burning & (burning_at < cleared), burning_at, time_to_safe)
+    gone = (trajectory > 0).sum(axis=2)[:, which]
+    off = np.minimum(np.maximum(time_to_safe, gone), horizon - 1)
+    return Outcome(np.minimum(time_to_safe, horizon), np.take_along_axis(fan_seconds, off, axis=1))
+
+
+def policy_costs(policies, cases, horizon=HORIZON, weights=WEIGHTS):
+    """Mean cost per policy over ``cases``, weighted by their counts."""
+    result = outcomes(policies, cases, horizon)
+    cost = weights["time"] * result.time_to_safe + weights["energy"] * result.fan_seconds
+    # Row by row, so a policy costs the same whatever batch it is in
+    return (cost * cases.count).sum(axis=1) / cases.count.sum()
+
+
+def repair(policies):
+    """Keep every vent on from the phase it starts: a vent at OFF after it ran goes to LOW."""
+    started = np.maximum.accumulate(policies > 0, axis=1)
+    return np.where(started & (policies == 0), 1, policies).astype(np.uint8)
+
+
+def canonical(policy):
+    """``policy`` with its room schedules, highest levels first, given to rooms in ROOMS order."""
+    columns = sorted(policy.T.tolist(), key=lambda column: (-sum(column), [-c for c in column]))
+    return np.array(columns, np.uint8).T
+
+
+def canonical_batch(policies):
+    return np.stack([canonical(policy) for policy in policies])
+
+
+_worker = {}
+
+
+def _init_worker(by_class, horizon, weights):
+    # Runs once per worker process: the cases stay here for every batch after
+    _worker.update(by_class=by_class, horizon=horizon, weights=weights)
+
+
+def _worker_costs(key, policies):
+    return policy_costs(policies, _worker["by_class"][key], _worker["horizon"], _worker["weights"])
+
+
+class _Evaluator:
+    """Costs of a batch of policies on one class of ``by_class``, split over a process pool if large enough."""
+
+    def __init__(self, by_class, horizon=HORIZON, weights=WEIGHTS, workers=1, pool_batch=POOL_BATCH):
+        self.by_class, self.horizon, self.weights = by_class, horizon, weights
+        self.workers, self.pool_batch = workers, pool_batch
+        self.pool = None
+        if workers > 1:
+            self.pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                            initargs=(by_class, horizon, weights))
+        self.evaluated = 0
+
+    def __call__(self, key, policies):
+        self.evaluated += len(policies)
+        chunks = min(self.workers, len(policies) // max(self.pool_batch, 1)) if self.pool is not None else 1
+        if chunks < 2:
+            return policy_costs(policies, self.by_class[key], self.horizon, self.weights)
+        chunks = np.array_split(policies, chunks)
+        return np.concatenate(list(self.pool.map(functools.partial(_worker_costs, key), chunks)))
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+
+def search(key, evaluator, rng, batch=1024, generations=20, elite=0.1, smoothing=0.7):
+    """Cross-entropy search over schedules for class ``key``; (best policy, its cost, the sketch's cost)."""
+    shape = (len(PHASES), len(ROOMS))
+    probs = np.full(shape + (len(VENT_LEVELS),), 1.0 / len(VENT_LEVELS))
+    seeds = np.stack([SKETCH, np.zeros(shape, np.uint8), np.full(shape, 3, np.uint8)])
+    best, best_cost, baseline = None, np.inf, None
+    keep = max(2, int(batch * elite))
+    for generation in range(generations):
+        draws = rng.random((batch,) + shape + (1,))
+        policies = repair((draws > probs.cumsum(axis=-1)).sum(axis=-1).clip(0, len(VENT_LEVELS) - 1))
+        policies[:len(seeds)] = seeds
+        if best is not None:
+            policies[len(seeds)] = best
+        costs = evaluator(key, policies)
+        if baseline is None:
+            baseline = float(costs[0])
+        order = np.argsort(costs, kind="stable")
+        if costs[order[0]] < best_cost:
+            best, best_cost = policies[order[0]].copy(), float(costs[order[0]])
+        chosen = policies[order[:keep]]
+        frequency = (chosen[..., None] == np.arange(len(VENT_LEVELS))).mean(axis=0)
+        probs = smoothing * frequency + (1 - smoothing) * probs
+    return simplify(canonical(best), key, evaluator), best_cost, baseline
+
+
+def simplify(policy, key, evaluator):
+    """Lower one level at a time while the cost does not rise, so fans and levels that change nothing go."""
+    cost = evaluator(key, policy[None])[0]
+    while True:
+        phases, rooms = np.nonzero(policy)
+        if not len(phases):
+            return policy
+        lowered = np.repeat(policy[None], len(phases), axis=0)
+        lowered[np.arange(len(phases)), phases, rooms] -= 1
+        # A vent can only go off from its first phase, or repair() would put it back on
+        lowered = canonical_batch(repair(lowered))
+        lowered = lowered[lowered.sum(axis=(1, 2), dtype=int) < policy.sum(dtype=int)]
+        if not len(lowered):
+            return policy
+        costs = evaluator(key, lowered)
+        i = int(np.argmin(costs))
+        if costs[i] > cost:
+            return policy
+        policy, cost = lowered[i], costs[i]
+
+
+class PolicyTable:
+    """Per alarm class, the vent level codes per phase and room; ``levels`` looks one up."""
+
+    def __init__(self, policies, phases=PHASES, bands=BANDS, weights=WEIGHTS, stats=None):
+        self.policies = {key: np.asarray(policy, np.uint8) for key, policy in policies.items()}
+        self.phases, self.bands, self.weights = tuple(phases), tuple(bands), dict(weights)
+        self.stats = stats or {}
+
+    def key(self, readings):
+        """The class of ``readings`` (smoke, co2, pm25, temp); None if no rule fires."""
+        rule = next((rule for rule in ESP32.rules if readings[rule.metric] > rule.threshold), None)
+        if rule is None:
+            return None
+        return f"{rule.metric}/{int(np.searchsorted(self.bands, readings['smoke']))}"
+
+    def levels(self, key, seconds):
+        """Level codes per room (ROOMS order) ``seconds`` into an alarm of class ``key``; the sketch's if unknown."""
+        policy = self.policies.get(key, SKETCH)
+        return tuple(policy[max(int(np.searchsorted(self.phases, seconds, side="right")) - 1, 0)].tolist())
+
+    def to_dict(self):
+        return {"version": 1, "rooms": list(ROOMS), "levels": list(VENT_LEVELS), "phases": list(self.phases),
+                "bands": list(self.bands), "weights": self.weights,
+                "policies": {key: ["".join(map(str, row)) for row in policy.tolist()]
+                             for key, policy in sorted(self.policies.items())},
+                "stats": self.stats}
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("rooms", list(ROOMS)) != list(ROOMS):
+            raise ValueError(f"policy table for rooms {data['rooms']}, not {list(ROOMS)}")
+        policies = {key: [[int(c) for c in row] for row in rows] for key, rows in data["policies"].items()}
+        return cls(policies, data["phases"], data["bands"], data.get("weights", WEIGHTS), data.get("stats"))
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+def training_cases(n, seed=0):
+    """Cases per alarm class of ``n`` random hazards."""
+    hazards = random_hazards(n, np.random.default_rng(seed))
+    keys = np.array(classify(hazards), dtype=object)
+    by_class = {}
+    for key in sorted(set(keys) - {None}):
+        rows = np.flatnonzero(keys == key)
+        by_class[key] = cases(type(hazards)(*(np.asarray(field)[rows] for field in hazards)))
+    return by_class
+
+
+def optimize(by_class, horizon=HORIZON, weights=WEIGHTS, batch=1024, generations=20, workers=None, seed=0):
+    """(``PolicyTable``, {class: Result}, policies evaluated, seconds) for the cases of each class."""
+    workers = max(1, workers or os.cpu_count() or 1)
+    rng = np.random.default_rng(seed)
+    # A class with nothing the fans can help with is left out: the sketch's answer stands
+    by_class = {key: found for key, found in by_class.items() if len(found.count)}
+    evaluator = _Evaluator(by_class, horizon, weights, workers)
+    start = time.perf_counter()
+    results = {}
+    try:
+        for key, found in by_class.items():
+            policy, _, baseline = search(key, evaluator, rng, batch, generations)
+            cost = float(policy_costs(policy[None], found, horizon, weights)[0])
+            outcome = outcomes(policy[None], found, horizon)
+            n = found.count.sum()
+            results[key] = Result(policy, cost, float(outcome.time_to_safe[0] @ found.count / n),
+                                  float(outcome.fan_seconds[0] @ found.count / n), baseline, int(n), found.never)
+    finally:
+        evaluator.close()
+    seconds = time.perf_counter() - start
+    stats = {key: {"hazards": r.hazards, "never": r.never, "cost": round(r.cost, 3),
+                   "sketch_cost": round(r.baseline, 3), "time_to_safe": round(r.time_to_safe, 2),
+                   "fan_seconds": round(r.fan_seconds, 2)}
+             for key, r in results.items()}
+    table = PolicyTable({key: r.policy for key, r in results.items()}, weights=weights, stats=stats)
+    return table, results, evaluator.evaluated, seconds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m corridor.policy", description=__doc__.split("\n")[0])
+    parser.add_argument("--hazards", type=int, default=20_000, help="random hazards to train on")
+    parser.add_argument("--generations", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=1024, help="policies per generation")
+    parser.add_argument("--workers", type=int, help="processes (default: one per CPU)")
+    parser.add_argument("--horizon", type=int, default=HORIZON, help="seconds simulated per hazard")
+    parser.add_argument("--time-weight", type=float, default=WEIGHTS["time"], help="cost per second to safe")
+    parser.add_argument("--energy-weight", type=float, default=WEIGHTS["energy"], help="cost per fan-second")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="policy.json")
+    args = parser.parse_args(argv)
+
+    by_class = training_cases(args.hazards, args.seed)
+    weights = {"time": args.time_weight, "energy": args.energy_weight}
+    table, results, evaluated, seconds = optimize(by_class, args.horizon, weights, args.batch, args.generations,
+                                                  args.workers, args.seed)
+    print(f"{'class':9} {'hazards':>7} {'never':>6} {'cases':>5} {'sketch':>8} {'best':>8} {'to safe':>8} "
+          f"{'fan-s':>7}  policy per phase {PHASES}")
+    for key, r in results.items():
+        print(f"{key:9} {r.hazards:7,} {r.never:6,} {len(by_class[key].level):5} {r.baseline:8.1f} {r.cost:8.1f} "
+              f"{r.time_to_safe:7.1f}s {r.fan_seconds:7.1f}  {' '.join(table.to_dict()['policies'][key])}")
+    print(f"{evaluated:,} policies in {seconds:.1f} s ({evaluated / seconds:,.0f} policies/s)")
+    table.save(args.output)
+    print(f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,714 @@
+"""Deterministic replay of the twin, the ESP32 and the MQTT hops between them on a virtual clock.
+
+The twin (SimulationContext.jsx and SimulationController.jsx) runs on
+browser timers, and the sketch on ``delay(1000)``, so a ten-minute incident
+takes ten minutes to reproduce.  Here every timer is an entry of one heap
+keyed by (virtual ms, order of arming), and ``Clock.run`` jumps from one
+to the next:
+
+* the ventilation interval (1 s) of the vents active when it was armed:
+  their factors summed in ROOMS order, ``|| 0.05`` for an unknown level,
+  capped at 0.3; the smoke level snaps to 0 below 1; burning items expire
+  10 s after they were added; the alarm resets when the smoke is gone and
+  neither the chimney nor burning items were there when the interval was
+  armed (the closure's values, not the current ones);
+* the natural decay interval (1 s, x0.99, 0 below 0.5) while no vent runs;
+* the sensor publish interval (2 s, skipped within 1.9 s of the last
+  publish) of the aggregated readings;
+* the sketch's ``loop()``: at most one received message per pass (one
+  ``client.loop()``), the max() fusion with the local sensors, the ESP32
+  rules of ``corridor.controller``, commands when the decision changes,
+  and a monitor payload every pass.
+
+As in React, a state change re-runs the effects whose dependencies
+changed: the old interval is cleared and a new one starts from that
+moment.  That keeps the browser's quirks: the ventilation interval restarts
+whenever a command re-creates ``ventilationStates`` or a burning item
+expires.  The publish interval restarts whenever the aggregated readings
+change, so while they change every second (a decaying smoke level below
+the clamp of 100) nothing is published.
+Commands go through the same handler as ``handleRiscvCommand``:
+ACTIVATE_VENT, SET_ALERT and GLOBAL_ALARM apply; DEACTIVATE_VENT is
+ignored while there is smoke.
+
+Both topics have a fixed latency (``latency`` in ms) plus an optional
+seeded jitter, in order per topic as on one MQTT connection.  Ties on the
+clock fire in the order they were armed, so a scenario always gives the
+same trace.
+
+A scenario is JSON: ``name``, ``duration`` (s), ``latency`` ({"sensors":
+ms, "commands": ms}), ``jitter`` (ms) and ``seed``, ``controller`` (run
+the sketch, booted ``boot`` s in), ``publish`` (the twin publishes its readings) and ``events``,
+each ``{"at": s, "action": ...}`` with the arguments of ``ACTIONS``.
+``scenario_from_capture`` turns a recorded capture into one: its sensors
+messages are fed to the sketch at the times they were received.
+
+The trace is one record per user action, publish, command sent and
+applied, change of the twin's smoke / burning / alarm state and change of
+the monitor payload.  Golden traces are JSON lines after a
+``{"trace": 1, "scenario": name}`` header, and ``compare_traces`` gives
+the first line that differs.
+
+With ``--policy`` the sketch answers alarms from a ``corridor.policy``
+table, and each scenario reports its fan-seconds instead of comparing.
+
+    python -m corridor.replay corridor/scenarios/*.json [--update] [--print] [--repeat N] [--policy policy.json]
+"""
+import argparse
+import collections
+import glob
+import heapq
+import itertools
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+from corridor.capture import parse_record, payload_of, timestamp_of
+from corridor.controller import ESP32
+from corridor.sensors import BURN_CLEAR_SECONDS, MAX_VENT_DECAY, METRICS, ROOMS, STATUS, VENT_LEVELS, Hazards, \
+    aggregate_status, room_sensors
+from corridor.store import table_of
+from corridor.tracing import TOPICS
+
+TICK_MS = 1000  # both decay intervals
+PUBLISH_MS = 2000  # SENSOR_PUBLISH_INTERVAL
+PUBLISH_GUARD_MS = 100  # published if the last one is at least PUBLISH_MS - this old
+LOOP_MS = 1000  # delay(1000) at the end of loop()
+BURN_MS = BURN_CLEAR_SECONDS * 1000
+VENT_FACTORS = {"LOW": 0.02, "MED": 0.05, "HIGH": 0.1, "OFF": 0}
+APPLIANCES = ("tv-living", "tv-master", "stove", "fridge")
+HEATER_ROOMS = ROOMS[1:]
+# The sketch's globals before the first sensors message, and its potentiometers at rest
+SIM_DEFAULTS = {"smoke": 0, "co2": 400, "pm25": 15, "temp": 22}
+LOCAL_DEFAULTS = {"pm25": 0, "co2": 400, "smoke": 0}
+LATENCY = {"sensors": 50, "commands": 50}
+SCENARIOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenarios")
+TRACE_VERSION = 1
+
+# action -> (required arguments, optional arguments with their defaults)
+ACTIONS = {
+    "burners": (("lit",), {}),
+    "burn": ((), {"item": "item"}),
+    "overload": (("room",), {}),
+    "reset_heater": (("room",), {}),
+    "heater": (("room",), {"on": None, "level": None}),
+    "explode": (("appliance",), {}),
+    "reset_appliance": (("appliance",), {}),
+    "chimney": ((), {"blocked": True}),
+    "emergency": ((), {}),
+    "reset": ((), {}),
+    "vent": (("room",), {"level": "HIGH"}),
+    "command": (("payload",), {}),
+    "local": ((), {"pm25": None, "co2": None, "smoke": None}),
+    "sensors": (("payload",), {}),
+}
+
+# ms: virtual time; src: "user", "twin" or "esp32"; fields: dict of the event
+Record = collections.namedtuple("Record", "ms src event fields")
+
+
+class Clock:
+    """Virtual milliseconds and the timers due on them, fired by (time, order of arming)."""
+
+    def __init__(self):
+        self.now = 0
+        self.fired = 0
+        self._heap = []
+        self._order = itertools.count()
+
+    def call_at(self, ms, fn, *args, period=None):
+        """Call ``fn(*args)`` at ``ms`` (and every ``period`` ms after); the timer, for ``cancel``."""
+        timer = [max(ms, self.now), next(self._order), fn, args, period]
+        heapq.heappush(self._heap, timer)
+        return timer
+
+    def call_later(self, delay, fn, *args):
+        return self.call_at(self.now + delay, fn, *args)
+
+    def set_interval(self, period, fn, *args):
+        return self.call_at(self.now + period, fn, *args, period=period)
+
+    @staticmethod
+    def cancel(timer):
+        if timer is not None:
+            timer[2] = None
+
+    def run(self, until):
+        """Fire every timer due up to ``until`` ms, then stand at ``until``."""
+        heap = self._heap
+        while heap and heap[0][0] <= until:
+            timer = heapq.heappop(heap)
+            fn = timer[2]
+            if fn is None:
+                continue
+            self.now = timer[0]
+            if timer[4] is not None:
+                timer[0] += timer[4]
+                timer[1] = next(self._order)
+                heapq.heappush(heap, timer)
+            self.fired += 1
+            fn(*timer[3])
+        self.now = max(self.now, until)
+
+
+class Bus:
+    """The broker: per-topic latency plus seeded jitter, in order per topic."""
+
+    def __init__(self, clock, latency=None, jitter=0, seed=0):
+        self.clock = clock
+        self.latency = dict(LATENCY, **(latency or {}))
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.last = {}
+
+    def send(self, topic, payload, deliver):
+        at = self.clock.now + self.latency[topic]
+        if self.jitter:
+            at += self.rng.randint(0, self.jitter)
+        at = max(at, self.last.get(topic, at))
+        self.last[topic] = at
+        self.clock.call_at(at, deliver, payload)
+
+
+class Twin:
+    """SimulationProvider and SimulationController on the virtual clock.
+
+    ``commit`` follows every handler, as a render does: it recomputes the
+    readings if a hazard changed and re-runs the effects whose dependencies
+    changed.
+    """
+
+    def __init__(self, clock, bus, trace, publish=True):
+        self.clock, self.bus, self.trace, self.publishing = clock, bus, trace, publish
+        self.esp = None
+        self._reset()
+        self.last_publish = None
+        self.effects = {}
+        self._hazards = self._state = None
+        self.commit()
+
+    def _reset(self):
+        self.alarm = self.chimney = self.emergency = False
+        self.smoke = 0
+        self.burning = []  # (name, start ms)
+        self.burners = [False] * 4
+        self.heaters = {room: (False, 1, False) for room in HEATER_ROOMS}  # (on, level, overloaded)
+        self.exploded = dict.fromkeys(APPLIANCES, False)
+        self.vents = {room: (False, "OFF") for room in ROOMS}  # (active, level)
+        self.vents_version = getattr(self, "vents_version", -1) + 1  # a new ventilationStates object
+        self.alerts = dict.fromkeys(ROOMS, "normal")
+
+    # -- user actions (the context's callbacks) --
+
+    def set_burners(self, lit):
+        self.burners = [i < lit for i in range(4)] if isinstance(lit, int) else [bool(b) for b in lit]
+
+    def add_burning_item(self, item):
+        self.burning = self.burning + [(item, self.clock.now)]
+        self.alarm = True
+
+    def overload_heater(self, room):
+        on, level, overloaded = self.heaters[room]
+        if overloaded:
+            self.heaters[room] = (False, 1, False)
+        else:
+            self.alarm = True
+            self.smoke = min(self.smoke + 30, 100)
+            self.heaters[room] = (True, 3, True)
+
+    def reset_heater(self, room):
+        self.heaters[room] = (False, 1, False)
+
+    def set_heater(self, room, on=None, level=None):
+        current = self.heaters[room]
+        self.heaters[room] = (current[0] if on is None else bool(on), current[1] if level is None else level,
+                              current[2])
+
+    def trigger_explosion(self, appliance):
+        if self.exploded[appliance]:
+            self.exploded[appliance] = False
+        else:
+            self.alarm = True
+            self.smoke = min(self.smoke + 40, 100)
+            self.exploded[appliance] = True
+
+    def reset_appliance(self, appliance):
+        self.exploded[appliance] = False
+
+    def set_chimney(self, blocked=True):
+        self.chimney = bool(blocked)
+
+    def trigger_emergency(self):
+        self.emergency = self.alarm = self.chimney = True
+        self.smoke = 80
+        self.alerts = dict.fromkeys(ROOMS, "critical")
+
+    def reset(self):
+        self._reset()
+
+    def set_vent(self, room, level="HIGH"):
+        self.vents = dict(self.vents, **{room: (level != "OFF", level)})
+        self.vents_version += 1
+
+    # -- handleRiscvCommand --
+
+    def command(self, payload):
+        action, room, level = payload.get("action"), payload.get("room"), payload.get("level")
+        applied = False
+        if action == "ACTIVATE_VENT" and room:
+            self.vents = dict(self.vents, **{room: (True, level or "HIGH")})
+            self.vents_version += 1
+            applied = True
+        elif action == "DEACTIVATE_VENT" and room:
+            # Only once the smoke is gone; otherwise the vent keeps running
+            if self.smoke <= 0:
+                self.vents = dict(self.vents, **{room: (False, "OFF")})
+                self.vents_version += 1
+                applied = True
+        elif action == "SET_ALERT" and room:
+            self.alerts = dict(self.alerts, **{room: level or "normal"})
+            applied = True
+        elif action == "GLOBAL_ALARM":
+            self.alarm = payload.get("active") is not False
+            if level == "critical":
+                self.alerts = dict.fromkeys(self.alerts, "critical")
+            applied = True
+        self.trace.append(Record(self.clock.now, "twin", "apply", {"action": action, "room": room, "level": level,
+                                                                   "applied": applied}))
+        self.commit()
+
+    # -- readings and effects --
+
+    def hazards(self):
+        heaters = [self.heaters.get(room, (False, 1, False)) for room in ROOMS]
+        return Hazards(burners=sum(self.burners), burning=len(self.burning), stove=self.exploded["stove"],
+                       fridge=self.exploded["fridge"], tv_living=self.exploded["tv-living"],
+                       tv_master=self.exploded["tv-master"], chimney=self.chimney,
+                       heater_on=np.array([h[0] for h in heaters]), heater_level=np.array([h[1] for h in heaters]),
+                       heater_overloaded=np.array([h[2] for h in heaters]), smoke_level=self.smoke,
+                       emergency=self.emergency)
+
+    def aggregated(self):
+        """aggregatedSensors: the max of each metric over the rooms, and the status."""
+        key = (tuple(self.burners), len(self.burning), tuple(self.exploded.values()), self.chimney,
+               tuple(self.heaters.values()), self.smoke, self.emergency)
+        if key != self._hazards:
+            sensors = room_sensors(self.hazards())
+            self._aggregated = dict({metric: int(sensors[metric].max()) for metric in METRICS},
+                                    status=STATUS[int(aggregate_status(sensors)[0, 0])])
+            self._hazards = key
+        return self._aggregated
+
+    def _effect(self, name, deps, arm):
+        previous = self.effects.get(name)
+        if previous is not None and previous[0] == deps:
+            return
+        if previous is not None:
+            self.clock.cancel(previous[1])
+        self.effects[name] = (deps, arm())
+
+    def commit(self):
+        aggregated = self.aggregated()
+        # The controller is a child of the provider, so its effect runs first
+        self._effect("publish", (self.publishing, tuple(aggregated.values())), self._arm_publish)
+        self._effect("ventilation", (self.vents_version, self.chimney, len(self.burning)), self._arm_ventilation)
+        self._effect("natural", (self.smoke, self.vents_version), self._arm_natural)
+        state = (round(self.smoke, 6), len(self.burning), self.alarm)
+        if state != self._state:
+            self._state = state
+            self.trace.append(Record(self.clock.now, "twin", "state", dict(zip(("smoke", "burning", "alarm"), state))))
+
+    def _arm_publish(self):
+        if not self.publishing:
+            return None
+        return self.clock.set_interval(PUBLISH_MS, self._publish, dict(self.aggregated()))
+
+    def _publish(self, aggregated):
+        now = self.clock.now
+        if self.last_publish is not None and now - self.last_publish < PUBLISH_MS - PUBLISH_GUARD_MS:
+            return
+        self.last_publish = now
+        self.trace.append(Record(now, "twin", "publish", aggregated))
+        if self.esp is not None:
+            self.bus.send("sensors", dict(aggregated, timestamp=now), self.esp.receive)
+
+    def _arm_ventilation(self):
+        active = [level for on, level in self.vents.values() if on]
+        if not active:
+            return None
+        factor = 0
+        for level in active:
+            factor += VENT_FACTORS.get(level) or 0.05
+        return self.clock.set_interval(TICK_MS, self._ventilate, min(factor, MAX_VENT_DECAY), self.chimney,
+                                       len(self.burning))
+
+    def _ventilate(self, factor, chimney, burning):
+        if self.smoke > 0:
+            level = self.smoke * (1 - factor)
+            self.smoke = 0 if level < 1 else level
+        else:
+            self.smoke = 0
+        if self.burning:
+            now = self.clock.now
+            self.burning = [item for item in self.burning if now - item[1] < BURN_MS]
+        if self.smoke <= 0 and not chimney and not burning:
+            self.alarm = False
+        self.commit()
+
+    def _arm_natural(self):
+        if self.smoke <= 0 or any(on for on, _ in self.vents.values()):
+            return None
+        return self.clock.set_interval(TICK_MS, self._decay)
+
+    def _decay(self):
+        if self.smoke > 0:
+            level = self.smoke * 0.99
+            self.smoke = 0 if level < 0.5 else level
+        else:
+            self.smoke = 0
+        self.commit()
+
+
+def _int(value, default):
+    # ArduinoJson's ``doc[key] | default`` for an int
+    return value if isinstance(value, int) and not isinstance(value, bool) else default
+
+
+class Esp32:
+    """sketch.ino's ``loop()`` every ``loop_ms`` from ``boot_ms``.
+
+    With a ``corridor.policy.PolicyTable`` as ``policy``, an alarm sets the
+    vents the table gives for the readings that raised it, phase by phase,
+    instead of kitchen HIGH, and turns off the ones it turned on when the
+    alarm clears.
+    """
+
+    def __init__(self, clock, bus, trace, twin=None, boot_ms=0, loop_ms=LOOP_MS, policy=None):
+        self.clock, self.bus, self.trace, self.twin = clock, bus, trace, twin
+        self.boot_ms, self.loop_ms, self.policy = boot_ms, loop_ms, policy
+        self.alarm = None  # (class, ms) of the alarm the policy answers
+        self.vents = (0,) * len(ROOMS)  # level codes the policy has set
+        self.sim = dict(SIM_DEFAULTS)
+        self.local = dict(LOCAL_DEFAULTS)
+        self.received = False
+        self.inbox = collections.deque()
+        self.prev_ventilation, self.prev_status = False, ""
+        self.monitor = None
+        clock.call_at(boot_ms, self.loop)
+
+    def receive(self, payload):
+        self.inbox.append(payload)
+
+    def set_local(self, pm25=None, co2=None, smoke=None):
+        for metric, value in (("pm25", pm25), ("co2", co2), ("smoke", smoke)):
+            if value is not None:
+                self.local[metric] = int(value)
+
+    def _publish_command(self, action, room, level, alarm):
+        payload = {"action": action, "room": room, "level": level, "alarm": alarm,
+                   "timestamp": self.clock.now - self.boot_ms}
+        self.trace.append(Record(self.clock.now, "esp32", "command",
+                                 {"action": action, "room": room, "level": level, "alarm": alarm}))
+        if self.twin is not None:
+            self.bus.send("commands", payload, self.twin.command)
+
+    def loop(self):
+        if self.inbox:
+            payload = self.inbox.popleft()
+            for metric, default in SIM_DEFAULTS.items():
+                self.sim[metric] = _int(payload.get(metric), default)
+            self.received = True
+        local, sim = self.local, self.sim
+        effective = {"pm25": max(local["pm25"], sim["pm25"]), "co2": max(local["co2"], sim["co2"]),
+                     "smoke": max(local["smoke"] * 100, sim["smoke"]), "temp": sim["temp"]}
+        rule = next((rule for rule in ESP32.rules if effective[rule.metric] > rule.threshold), None)
+        ventilation, status = rule is not None, "SAFE" if rule is None else rule.status
+        changed = ventilation != self.prev_ventilation or status != self.prev_status
+        if self.policy is not None:
+            self._apply_policy(ventilation, effective)
+        if changed:
+            if ventilation:
+                if self.policy is None:
+                    self._publish_command("ACTIVATE_VENT", "kitchen", "HIGH", True)
+                self._publish_command("SET_ALERT", "kitchen", rule.level, True)
+                if rule.level == "critical":
+                    self._publish_command("GLOBAL_ALARM", "", "critical", True)
+            else:
+                if self.policy is None:
+                    self._publish_command("DEACTIVATE_VENT", "kitchen", "OFF", False)
+                self._publish_command("SET_ALERT", "kitchen", "normal", False)
+            self.prev_ventilation, self.prev_status = ventilation, status
+        monitor = dict(effective, ventilation=ventilation, status=status,
+                       source="combined" if self.received else "local")
+        if monitor != self.monitor:
+            self.monitor = monitor
+            self.trace.append(Record(self.clock.now, "esp32", "monitor", monitor))
+        self.clock.call_later(self.loop_ms, self.loop)
+
+    def _apply_policy(self, ventilation, effective):
+        """Commands for the vents whose level the policy changes this pass."""
+        if ventilation and self.alarm is None:
+            self.alarm = (self.policy.key(effective), self.clock.now)
+        if ventilation:
+            key, since = self.alarm
+            levels = self.policy.levels(key, (self.clock.now - since) / 1000)
+        else:
+            self.alarm, levels = None, (0,) * len(ROOMS)
+        for room, old, new in zip(ROOMS, self.vents, levels):
+            if new and new != old:
+                self._publish_command("ACTIVATE_VENT", room, VENT_LEVELS[new], True)
+            elif old and not new and not ventilation:
+                self._publish_command("DEACTIVATE_VENT", room, "OFF", False)
+        # A vent the policy has on stays on until the alarm clears
+        self.vents = levels if not ventilation else tuple(new or old for old, new in zip(self.vents, levels))
+
+
+def check_scenario(scenario):
+    """``scenario`` with its defaults filled in; ValueError for an unknown action or a missing argument."""
+    scenario = dict({"name": "scenario", "duration": 60, "latency": {}, "jitter": 0, "seed": 0, "controller": True,
+                     "publish": True, "boot": 0, "events": []}, **scenario)
+    events = []
+    for i, event in enumerate(scenario["events"]):
+        action = event.get("action")
+        if action not in ACTIONS:
+            raise ValueError(f"{scenario['name']}: event {i}: unknown action {action!r}")
+        required, optional = ACTIONS[action]
+        missing = [arg for arg in required if arg not in event]
+        unknown = set(event) - {"at", "action", *required, *optional}
+        if missing:
+            raise ValueError(f"{scenario['name']}: event {i} ({action}): missing {', '.join(missing)}")
+        if unknown:
+            raise ValueError(f"{scenario['name']}: event {i} ({action}): unknown {', '.join(sorted(unknown))}")
+        events.append(dict(optional, **event))
+    scenario["events"] = events
+    return scenario
+
+
+def load_scenario(path):
+    with open(path) as f:
+        scenario = json.load(f)
+    scenario.setdefault("name", os.path.splitext(os.path.basename(path))[0])
+    return check_scenario(scenario)
+
+
+class Replayer:
+    """One scenario on a virtual clock; ``run`` advances it, ``records`` is the trace so far."""
+
+    def __init__(self, scenario, policy=None):
+        self.scenario = scenario = check_scenario(scenario)
+        self.clock = Clock()
+        self.records = []
+        self.bus = Bus(self.clock, scenario["latency"], scenario["jitter"], scenario["seed"])
+        self.twin = Twin(self.clock, self.bus, self.records, scenario["publish"])
+        self.esp = None
+        if scenario["controller"]:
+            self.esp = Esp32(self.clock, self.bus, self.records, self.twin, round(scenario["boot"] * 1000),
+                             policy=policy)
+            self.twin.esp = self.esp
+        for event in scenario["events"]:
+            self.clock.call_at(round(event["at"] * 1000), self._event, event)
+
+    def _event(self, event):
+        twin, esp, action = self.twin, self.esp, event["action"]
+        fields = {key: value for key, value in event.items() if key not in ("at", "action")}
+        self.records.append(Record(self.clock.now, "user", action, fields))
+        if action == "sensors":
+            if esp is not None:
+                esp.receive(event["payload"])
+            return
+        if action == "local":
+            if esp is not None:
+                esp.set_local(event["pm25"], event["co2"], event["smoke"])
+            return
+        if action == "command":
+            twin.command(event["payload"])
+            return
+        if action == "burners":
+            twin.set_burners(event["lit"])
+        elif action == "burn":
+            twin.add_burning_item(event["item"])
+        elif action == "overload":
+            twin.overload_heater(event["room"])
+        elif action == "reset_heater":
+            twin.reset_heater(event["room"])
+        elif action == "heater":
+            twin.set_heater(event["room"], event["on"], event["level"])
+        elif action == "explode":
+            twin.trigger_explosion(event["appliance"])
+        elif action == "reset_appliance":
+            twin.reset_appliance(event["appliance"])
+        elif action == "chimney":
+            twin.set_chimney(event["blocked"])
+        elif action == "emergency":
+            twin.trigger_emergency()
+        elif action == "reset":
+            twin.reset()
+        elif action == "vent":
+            twin.set_vent(event["room"], event["level"])
+        twin.commit()
+
+    def run(self, seconds=None):
+        """Advance to ``seconds`` (the scenario's duration by default); the records."""
+        self.clock.run(round((self.scenario["duration"] if seconds is None else seconds) * 1000))
+        return self.records
+
+
+def replay(scenario, policy=None):
+    """The trace of ``scenario`` over its whole duration (its sketch answering alarms with ``policy``)."""
+    return Replayer(scenario, policy).run()
+
+
+def fan_seconds(records, until_ms):
+    """Seconds of vent running in the trace, summed over rooms, up to ``until_ms``."""
+    since, total = {}, 0
+    for record in records:
+        if record.ms > until_ms:
+            break
+        room, on = record.fields.get("room"), None
+        if record.event == "vent":
+            on = record.fields["level"] != "OFF"
+        elif record.event == "apply" and record.fields["applied"] and "VENT" in record.fields["action"]:
+            on = record.fields["action"] == "ACTIVATE_VENT"
+        if on is None:
+            continue
+        if room in since and not on:
+            total += record.ms - since.pop(room)
+        elif on and room not in since:
+            since[room] = record.ms
+    return (total + sum(until_ms - ms for ms in since.values())) / 1000
+
+
+def format_record(record):
+    return json.dumps(dict({"ms": record.ms, "src": record.src, "event": record.event}, **record.fields))
+
+
+def trace_lines(name, records):
+    """Golden-trace lines (without newlines) of ``records``."""
+    return [json.dumps({"trace": TRACE_VERSION, "scenario": name})] + [format_record(r) for r in records]
+
+
+def write_trace(path, name, records):
+    with open(path, "w") as f:
+        f.writelines(line + "\n" for line in trace_lines(name, records))
+
+
+def read_trace(path):
+    with open(path) as f:
+        return f.read().splitlines()
+
+
+def compare_traces(expected, actual):
+    """None if the line lists match, else (line number from 1, expected line, actual line); a missing line is None."""
+    for n, (want, got) in enumerate(itertools.zip_longest(expected, actual), 1):
+        if want != got:
+            return n, want, got
+    return None
+
+
+def golden_path(path):
+    return os.path.splitext(path)[0] + ".trace.jsonl"
+
+
+def scenario_from_capture(lines, name="capture"):
+    """A scenario feeding the sketch the sensors messages of a capture, at the times they were received.
+
+    Lines are bare payloads or topic/ts envelopes, timed as
+    ``corridor.capture`` reads them.  The twin does not publish: the capture holds what it did.
+    """
+    messages = []
+    last = None
+    for line in lines:
+        record = parse_record(line)
+        payload = payload_of(record) if record is not None else None
+        if payload is None:
+            continue
+        last = timestamp_of(record, payload, last)
+        if last is None:
+            continue
+        kind = TOPICS.get(record.get("topic")) or table_of(payload) or ("sensors" if "smoke" in payload else None)
+        messages.append((last, kind, payload))
+    start = min((ts for ts, _, _ in messages), default=0.0)
+    end = max((ts for ts, _, _ in messages), default=0.0)
+    events = [{"at": round(ts - start, 3), "action": "sensors", "payload": payload}
+              for ts, kind, payload in messages if kind == "sensors"]
+    return check_scenario({"name": name, "duration": round(end - start + 2, 3), "publish": False, "events": events})
+
+
+def random_scenario(rng, duration=600, events=20, name="random"):
+    """A scenario of ``events`` random user actions over ``duration`` seconds."""
+    choices = []
+    for _ in range(events):
+        action = rng.choice(("burners", "burn", "burn", "overload", "reset_heater", "heater", "explode",
+                             "reset_appliance", "chimney", "chimney", "vent", "local", "emergency", "reset"))
+        event = {"at": round(rng.uniform(0, duration), 3), "action": action}
+        if action == "burners":
+            event["lit"] = rng.randint(0, 4)
+        elif action == "burn":
+            event["item"] = rng.choice(("pan", "towel", "toast"))
+        elif action in ("overload", "reset_heater"):
+            event["room"] = rng.choice(HEATER_ROOMS)
+        elif action == "heater":
+            event.update(room=rng.choice(HEATER_ROOMS), on=rng.random() < 0.5, level=rng.randint(1, 3))
+        elif action in ("explode", "reset_appliance"):
+            event["appliance"] = rng.choice(APPLIANCES)
+        elif action == "chimney":
+            event["blocked"] = rng.random() < 0.5
+        elif action == "vent":
+            event.update(room=rng.choice(ROOMS), level=rng.choice(VENT_LEVELS))
+        elif action == "local":
+            event.update(pm25=rng.randint(0, 200), co2=rng.randint(400, 2000), smoke=int(rng.random() < 0.2))
+        choices.append(event)
+    choices.sort(key=lambda event: event["at"])
+    return check_scenario({"name": name, "duration": duration, "events": choices,
+                           "latency": {"sensors": rng.randint(10, 300), "commands": rng.randint(10, 300)},
+                           "jitter": rng.randint(0, 50), "seed": rng.getrandbits(32)})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m corridor.replay", description=__doc__.split("\n")[0])
+    parser.add_argument("scenarios", nargs="*", help=f"scenario JSON files (default: {SCENARIOS}/*.json)")
+    parser.add_argument("--update", action="store_true", help="write the golden traces instead of comparing")
+    parser.add_argument("--print", action="store_true", help="print each trace")
+    parser.add_argument("--repeat", type=int, default=1, help="replays to time each scenario over")
+    parser.add_argument("--policy", help="answer alarms with this corridor.policy table (no golden comparison)")
+    args = parser.parse_args(argv)
+    policy = None
+    if args.policy:
+        from corridor.policy import PolicyTable
+        policy = PolicyTable.load(args.policy)
+
+    failed = False
+    for path in args.scenarios or sorted(glob.glob(os.path.join(SCENARIOS, "*.json"))):
+        scenario = load_scenario(path)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            records = replay(scenario, policy)
+        seconds = (time.perf_counter() - start) / args.repeat
+        lines = trace_lines(scenario["name"], records)
+        if args.print:
+            print("\n".join(lines))
+        golden = golden_path(path)
+        if policy is not None:
+            verdict = f"{fan_seconds(records, scenario['duration'] * 1000):g} fan-s with {args.policy}"
+        elif args.update:
+            write_trace(golden, scenario["name"], records)
+            verdict = f"wrote {golden}"
+        elif os.path.exists(golden):
+            diff = compare_traces(read_trace(golden), lines)
+            verdict = "matches the golden trace" if diff is None else \
+                f"differs from the golden trace at line {diff[0]}:\n    want {diff[1]}\n    got  {diff[2]}"
+            failed |= diff is not None
+        else:
+            verdict = "no golden trace"
+        print(f"{scenario['name']}: {scenario['duration']:g} s in {seconds * 1e3:.1f} ms "
+              f"({scenario['duration'] / seconds:,.0f}x), {len(records)} records, {verdict}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""RV32I assembler and headless machine for the Ripes controller (ripes/ripes.s)."""
+from corridor.riscv.assembler import AssemblerError, Instruction, Program, assemble, assemble_file
+from corridor.riscv.machine import FIVE_STAGE, SINGLE_CYCLE, LedMatrix, Machine, PipelineModel, RunStats
+
+__all__ = ["AssemblerError", "Instruction", "Program", "assemble", "assemble_file", "FIVE_STAGE", "SINGLE_CYCLE",
+           "LedMatrix", "Machine", "PipelineModel", "RunStats"]
@@ -0,0 +1,381 @@
+"""Two-pass RV32I assembler for Ripes-style source files such as ripes/ripes.s.
+
+Understands ``.text``/``.data`` sections, ``.equ``/``.set`` constants,
+``.word``/``.half``/``.byte``/``.string``/``.asciz``/``.zero``/``.align``
+data, labels, the RV32I base instructions (plus ``ecall``/``ebreak``) and
+the usual pseudo-instructions.  The result is a list of decoded
+``Instruction`` records (operation name, register numbers, immediate), not
+machine words; ``corridor.riscv.machine`` turns them into handlers once.
+
+Like Ripes, ``.text`` starts at address 0 and ``.data`` at 0x10000000.
+``li`` always expands to ``lui`` + ``addi`` and ``la``/``call``/``tail``
+to ``auipc`` pairs, so instruction addresses never depend on operand values.
+"""
+import ast
+import collections
+import re
+
+TEXT_BASE = 0x00000000
+DATA_BASE = 0x10000000
+
+ABI_NAMES = ("zero ra sp gp tp t0 t1 t2 s0 s1 a0 a1 a2 a3 a4 a5 a6 a7 "
+             "s2 s3 s4 s5 s6 s7 s8 s9 s10 s11 t3 t4 t5 t6").split()
+REGISTERS = dict({f"x{i}": i for i in range(32)}, fp=8, **{name: i for i, name in enumerate(ABI_NAMES)})
+
+# Operand layouts of the base instructions
+R_TYPE = ("add", "sub", "sll", "slt", "sltu", "xor", "srl", "sra", "or", "and")
+I_TYPE = ("addi", "slti", "sltiu", "xori", "ori", "andi", "slli", "srli", "srai")
+LOADS = ("lb", "lh", "lw", "lbu", "lhu")
+STORES = ("sb", "sh", "sw")
+BRANCHES = ("beq", "bne", "blt", "bge", "bltu", "bgeu")
+UPPER = ("lui", "auipc")
+SYSTEM = ("ecall", "ebreak")
+
+# op: operation name; rd/rs1/rs2: register numbers (0 when unused); imm:
+# immediate, or the absolute target address for branches and jal; line:
+# 1-based source line; source: the source text it was assembled from
+Instruction = collections.namedtuple("Instruction", "op rd rs1 rs2 imm line source")
+
+# instructions: decoded text section, one per word from TEXT_BASE;
+# data: initial bytes of the data section; symbols: .equ constants and
+# label addresses
+Program = collections.namedtuple("Program", "instructions data symbols")
+
+
+class AssemblerError(ValueError):
+    def __init__(self, message, line=None):
+        super().__init__(f"line {line}: {message}" if line else message)
+        self.line = line
+
+
+# Directives accepted and ignored (in .text, alignment is always 4)
+_IGNORED = (".globl", ".global", ".section", ".type", ".size", ".align", ".p2align")
+
+_LABEL = re.compile(r"^\s*([A-Za-z_.$][\w.$]*)\s*:")
+_MEMORY_OPERAND = re.compile(r"^(.*)\(\s*(\w+)\s*\)$")
+
+
+def _strip_comment(line):
+    # '#' starts a comment unless it is inside a string or character literal
+    quote = None
+    for i, ch in enumerate(line):
+        if quote:
+            if ch == "\\":
+                continue
+            if ch == quote and line[i - 1] != "\\":
+                quote = None
+        elif ch in "\"'":
+            quote = ch
+        elif ch == "#":
+            return line[:i]
+    return line
+
+
+def _split_operands(text):
+    operands, depth, current, quote = [], 0, [], None
+    for ch in text:
+        if quote:
+            current.append(ch)
+            if ch == quote and (len(current) < 2 or current[-2] != "\\"):
+                quote = None
+        elif ch in "\"'":
+            quote = ch
+            current.append(ch)
+        elif ch == "," and depth == 0:
+            operands.append("".join(current).strip())
+            current = []
+        else:
+            depth += (ch == "(") - (ch == ")")
+            current.append(ch)
+    if "".join(current).strip():
+        operands.append("".join(current).strip())
+    return operands
+
+
+def _sign_extend(value, bits):
+    value &= (1 << bits) - 1
+    return value - (1 << bits) if value >> (bits - 1) else value
+
+
+def split_hi_lo(value):
+    """Split a 32-bit value into a ``lui`` upper part and a signed 12-bit ``addi`` part."""
+    value &= 0xFFFFFFFF
+    lo = _sign_extend(value, 12)
+    return ((value - lo) >> 12) & 0xFFFFF, lo
+
+
+class _Assembler:
+    def __init__(self, source):
+        self.lines = source.splitlines()
+        self.symbols = {}
+
+    # --- expressions ---
+    def value(self, text, line, symbols=None):
+        """Evaluate an integer expression of literals, symbols, + - * << >> & | ~ and ()."""
+        symbols = self.symbols if symbols is None else symbols
+        text = text.strip()
+        if text in symbols:
+            return symbols[text]
+        for func, shift in (("%hi", True), ("%lo", False)):
+            if text.startswith(func + "("):
+                hi, lo = split_hi_lo(self.value(text[len(func) + 1:-1], line, symbols))
+                return hi if shift else lo
+        try:
+            tree = ast.parse(text, mode="eval").body
+        except SyntaxError:
+            raise AssemblerError(f"bad expression {text!r}", line) from None
+        return self._eval(tree, text, line, symbols)
+
+    def _eval(self, node, text, line, symbols):
+        if isinstance(node, ast.Constant) and isinstance(node.value, int):
+            return node.value
+        if isinstance(node, ast.Constant) and isinstance(node.value, str) and len(node.value) == 1:
+            return ord(node.value)
+        if isinstance(node, ast.Name):
+            if node.id not in symbols:
+                raise AssemblerError(f"undefined symbol {node.id!r}", line)
+            return symbols[node.id]
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd, ast.Invert)):
+            value = self._eval(node.operand, text, line, symbols)
+            return {ast.USub: -value, ast.UAdd: value, ast.Invert: ~value}[type(node.op)]
+        if isinstance(node, ast.BinOp):
+            ops = {ast.Add: int.__add__, ast.Sub: int.__sub__, ast.Mult: int.__mul__,
+                   ast.LShift: int.__lshift__, ast.RShift: int.__rshift__, ast.BitAnd: int.__and__,
+                   ast.BitOr: int.__or__, ast.BitXor: int.__xor__}
+            if type(node.op) in ops:
+                return ops[type(node.op)](self._eval(node.left, text, line, symbols),
+                                          self._eval(node.right, text, line, symbols))
+        raise AssemblerError(f"bad expression {text!r}", line)
+
+    def register(self, text, line):
+        try:
+            return REGISTERS[text.strip()]
+        except KeyError:
+            raise AssemblerError(f"unknown register {text!r}", line) from None
+
+    def memory_operand(self, text, line):
+        match = _MEMORY_OPERAND.match(text.strip())
+        if not match:
+            raise AssemblerError(f"expected offset(register), got {text!r}", line)
+        offset = match.group(1).strip()
+        return (self.value(offset, line) if offset else 0), self.register(match.group(2), line)
+
+    # --- passes ---
+    def statements(self):
+        """Yield (line number, label list, mnemonic, operand list) per source line."""
+        for number, raw in enumerate(self.lines, start=1):
+            text = _strip_comment(raw).strip()
+            labels = []
+            while True:
+                match = _LABEL.match(text)
+                if not match:
+                    break
+                labels.append(match.group(1))
+                text = text[match.end():].strip()
+            if not text:
+                yield number, labels, None, []
+                continue
+            mnemonic, _, rest = text.partition(" ")
+            if "\t" in mnemonic:
+                mnemonic, _, more = mnemonic.partition("\t")
+                rest = more + " " + rest
+            yield number, labels, mnemonic.lower(), _split_operands(rest)
+
+    def assemble(self):
+        # Pass 1: constants and label addresses.  Every statement's size is
+        # known without evaluating operands.
+        section, addresses = "text", {"text": TEXT_BASE, "data": DATA_BASE}
+        for number, labels, mnemonic, operands in self.statements():
+            for label in labels:
+                self._define(label, addresses[section], number)
+            if mnemonic in (".text", ".data"):
+                section = mnemonic[1:]
+            elif mnemonic in (".equ", ".set"):
+                if len(operands) != 2:
+                    raise AssemblerError(f"{mnemonic} takes a name and a value", number)
+                self._define(operands[0], self.value(operands[1], number), number)
+            elif mnemonic is not None and not (section == "text" and mnemonic.startswith(".")):
+                addresses[section] += self._size(mnemonic, operands, addresses[section], number)
+
+        # Pass 2: emit
+        section = "text"
+        instructions, data = [], bytearray()
+        for number, _, mnemonic, operands in self.statements():
+            if mnemonic is None or mnemonic in (".equ", ".set"):
+                continue
+            if mnemonic in (".text", ".data"):
+                section = mnemonic[1:]
+            elif mnemonic.startswith("."):
+                if section == "text":
+                    if mnemonic not in _IGNORED:
+                        raise AssemblerError(f"{mnemonic} is only supported in .data", number)
+                    continue
+                data += self._data(mnemonic, operands, DATA_BASE + len(data), number)
+            else:
+                if section != "text":
+                    raise AssemblerError("instructions must be in .text", number)
+                address = TEXT_BASE + 4 * len(instructions)
+                source = self.lines[number - 1].strip()
+                for op, rd, rs1, rs2, imm in self._expand(mnemonic, operands, address, number):
+                    instructions.append(Instruction(op, rd, rs1, rs2, imm, number, source))
+        return Program(instructions, bytes(data), dict(self.symbols))
+
+    def _define(self, name, value, line):
+        if name in self.symbols:
+            raise AssemblerError(f"symbol {name!r} defined twice", line)
+        self.symbols[name] = value
+
+    def _size(self, mnemonic, operands, address, line):
+        if mnemonic.startswith("."):
+            return len(self._data(mnemonic, operands, address, line, sizing=True))
+        return 8 if mnemonic in ("li", "la", "call", "tail") else 4
+
+    def _data(self, mnemonic, operands, address, line, sizing=False):
+        widths = {".word": 4, ".half": 2, ".short": 2, ".byte": 1}
+        if mnemonic in widths:
+            width = widths[mnemonic]
+            out = bytearray()
+            for operand in operands:
+                value = 0 if sizing else self.value(operand, line)
+                out += (value & ((1 << (8 * width)) - 1)).to_bytes(width, "little")
+            return out
+        if mnemonic in (".string", ".asciz", ".ascii"):
+            out = bytearray()
+            for operand in operands:
+                out += ast.literal_eval(operand).encode("utf-8")
+                if mnemonic != ".ascii":
+                    out.append(0)
+            return out
+        if mnemonic in (".zero", ".space"):
+            return bytearray(self.value(operands[0], line))
+        if mnemonic in (".align", ".p2align"):
+            return bytearray(-address % (1 << self.value(operands[0], line)))
+        if mnemonic in _IGNORED:
+            return bytearray()
+        raise AssemblerError(f"unsupported directive {mnemonic}", line)
+
+    def _expand(self, mnemonic, operands, address, line):
+        """Yield (op, rd, rs1, rs2, imm) for one source instruction."""
+        reg = lambda i: self.register(operands[i], line)  # noqa: E731
+        val = lambda i: self.value(operands[i], line)  # noqa: E731
+
+        def expect(count):
+            if len(operands) != count:
+                raise AssemblerError(f"{mnemonic} takes {count} operands, got {len(operands)}", line)
+
+        if mnemonic in R_TYPE:
+            expect(3)
+            yield mnemonic, reg(0), reg(1), reg(2), 0
+        elif mnemonic in I_TYPE:
+            expect(3)
+            yield mnemonic, reg(0), reg(1), 0, self._immediate(mnemonic, val(2), line)
+        elif mnemonic in LOADS:
+            expect(2)
+            offset, base = self.memory_operand(operands[1], line)
+            yield mnemonic, reg(0), base, 0, self._immediate(mnemonic, offset, line)
+        elif mnemonic in STORES:
+            expect(2)
+            offset, base = self.memory_operand(operands[1], line)
+            yield mnemonic, 0, base, reg(0), self._immediate(mnemonic, offset, line)
+        elif mnemonic in BRANCHES:
+            expect(3)
+            yield mnemonic, 0, reg(0), reg(1), self._target(val(2), address, line)
+        elif mnemonic in UPPER:
+            expect(2)
+            yield mnemonic, reg(0), 0, 0, val(1) & 0xFFFFF
+        elif mnemonic == "jal":
+            if len(operands) == 1:
+                yield "jal", 1, 0, 0, self._target(val(0), address, line, 21)
+            else:
+                expect(2)
+                yield "jal", reg(0), 0, 0, self._target(val(1), address, line, 21)
+        elif mnemonic == "jalr":
+            if len(operands) == 1:
+                yield "jalr", 1, reg(0), 0, 0
+            elif len(operands) == 2 and operands[1].strip() in REGISTERS:
+                yield "jalr", reg(0), reg(1), 0, 0
+            elif len(operands) == 2:
+                offset, base = self.memory_operand(operands[1], line)
+                yield "jalr", reg(0), base, 0, self._immediate("jalr", offset, line)
+            else:
+                expect(3)
+                yield "jalr", reg(0), reg(1), 0, self._immediate("jalr", val(2), line)
+        elif mnemonic in SYSTEM or mnemonic in ("fence", "fence.i"):
+            yield ("addi" if mnemonic.startswith("fence") else mnemonic), 0, 0, 0, 0
+        else:
+            yield from self._pseudo(mnemonic, operands, address, line, reg, val, expect)
+
+    def _pseudo(self, mnemonic, operands, address, line, reg, val, expect):
+        if mnemonic == "nop":
+            yield "addi", 0, 0, 0, 0
+        elif mnemonic == "li":
+            expect(2)
+            hi, lo = split_hi_lo(val(1))
+            yield "lui", reg(0), 0, 0, hi
+            yield "addi", reg(0), reg(0), 0, lo
+        elif mnemonic == "la":
+            expect(2)
+            hi, lo = split_hi_lo(val(1) - address)
+            yield "auipc", reg(0), 0, 0, hi
+            yield "addi", reg(0), reg(0), 0, lo
+        elif mnemonic in ("call", "tail"):
+            # call links through ra, tail jumps through t1 without linking
+            expect(1)
+            scratch, link = (1, 1) if mnemonic == "call" else (6, 0)
+            hi, lo = split_hi_lo(val(0) - address)
+            yield "auipc", scratch, 0, 0, hi
+            yield "jalr", link, scratch, 0, lo
+        elif mnemonic in ("mv", "not", "neg", "seqz", "snez", "sltz", "sgtz"):
+            expect(2)
+            rd, rs = reg(0), reg(1)
+            yield {"mv": ("addi", rd, rs, 0, 0), "not": ("xori", rd, rs, 0, -1), "neg": ("sub", rd, 0, rs, 0),
+                   "seqz": ("sltiu", rd, rs, 0, 1), "snez": ("sltu", rd, 0, rs, 0),
+                   "sltz": ("slt", rd, rs, 0, 0), "sgtz": ("slt", rd, 0, rs, 0)}[mnemonic]
+        elif mnemonic in ("beqz", "bnez", "blez", "bgez", "bltz", "bgtz"):
+            expect(2)
+            rs, target = reg(0), self._target(val(1), address, line)
+            yield {"beqz": ("beq", 0, rs, 0, target), "bnez": ("bne", 0, rs, 0, target),
+                   "blez": ("bge", 0, 0, rs, target), "bgez": ("bge", 0, rs, 0, target),
+                   "bltz": ("blt", 0, rs, 0, target), "bgtz": ("blt", 0, 0, rs, target)}[mnemonic]
+        elif mnemonic in ("bgt", "ble", "bgtu", "bleu"):
+            # Swapped-operand forms of blt/bge
+            expect(3)
+            op = {"bgt": "blt", "ble": "bge", "bgtu": "bltu", "bleu": "bgeu"}[mnemonic]
+            yield op, 0, reg(1), reg(0), self._target(val(2), address, line)
+        elif mnemonic == "j":
+            expect(1)
+            yield "jal", 0, 0, 0, self._target(val(0), address, line, 21)
+        elif mnemonic == "jr":
+            expect(1)
+            yield "jalr", 0, reg(0), 0, 0
+        elif mnemonic == "ret":
+            yield "jalr", 0, 1, 0, 0
+        else:
+            raise AssemblerError(f"unknown instruction {mnemonic!r}", line)
+
+    @staticmethod
+    def _immediate(op, value, line):
+        if op in ("slli", "srli", "srai"):
+            if not 0 <= value < 32:
+                raise AssemblerError(f"shift amount {value} out of range", line)
+            return value
+        if not -2048 <= value <= 2047:
+            raise AssemblerError(f"immediate {value} does not fit in 12 bits", line)
+        return value
+
+    @staticmethod
+    def _target(target, address, line, bits=13):
+        offset = target - address
+        if offset % 2 or not -(1 << (bits - 1)) <= offset < (1 << (bits - 1)):
+            raise AssemblerError(f"branch target {target:#x} out of range", line)
+        return target
+
+
+def assemble(source):
+    """Assemble RISC-V source text into a ``Program``."""
+    return _Assembler(source).assemble()
+
+
+def assemble_file(path):
+    with open(path, encoding="utf-8") as f:
+        return assemble(f.read())
@@ -0,0 +1,518 @@
+"""Headless RV32I machine with the corridor's memory-mapped switches and LED matrix.
+
+Every instruction of an assembled ``Program`` is turned once into a handler
+in a dispatch table indexed by ``pc >> 2``; ``run`` then only fetches a
+handler and calls it with the pc, and the handler returns the next pc.
+Handlers are closures with the register list, the bus and the
+instruction's register numbers and immediate already bound, so no text is
+parsed and no opcode is switched on while running.  Stores to the LED
+matrix, the hot path of ripes.s, are mapped straight into ``sw``.
+
+Cycle accounting follows a ``PipelineModel``: one cycle per retired
+instruction, plus a penalty for every taken branch or jump and for every
+load whose result the next instruction uses.  Taken transfers are counted by
+the branch/jump handlers; load-use pairs are found statically when the
+table is built (loads never jump, so the next instruction always follows).
+"""
+import collections
+import time
+
+from corridor.riscv.assembler import DATA_BASE, assemble_file
+
+MASK = 0xFFFFFFFF
+
+# fill: cycles before the first instruction retires; taken_branch: bubbles
+# after a taken branch or jump; load_use: stall when an instruction reads the
+# register loaded by the one before it
+PipelineModel = collections.namedtuple("PipelineModel", "name fill taken_branch load_use")
+
+# Classic 5-stage pipeline with forwarding and branches resolved in EX
+FIVE_STAGE = PipelineModel("5-stage", 4, 2, 1)
+SINGLE_CYCLE = PipelineModel("single-cycle", 0, 0, 0)
+
+# Default memory map; a program's .equ constants of the same names override it
+DEFAULT_MMIO = {"SW0_BASE": 0xF0000000, "SW1_BASE": 0xF0000004, "LED_BASE": 0xF0000008}
+LED_WIDTH, LED_HEIGHT = 35, 25
+
+# Counters of one run(); cycles per the machine's PipelineModel
+RunStats = collections.namedtuple("RunStats", "instructions cycles taken load_use seconds stop")
+
+
+class Halt(Exception):
+    """Raised by ``ecall`` exit to stop ``run``."""
+
+
+class Breakpoint(Exception):
+    """Raised before the instruction at a breakpoint address executes."""
+
+
+class SwitchBank:
+    """A read-only word of switches; bit i is switch i."""
+
+    def __init__(self, value=0):
+        self.value = value
+
+    def load(self, offset):
+        return self.value & MASK
+
+    def store(self, offset, value):
+        pass  # writes to the switch register are ignored, as in Ripes
+
+
+class LedMatrix:
+    """``width`` x ``height`` pixels, one 0x00RRGGBB word each, row-major."""
+
+    def __init__(self, width=LED_WIDTH, height=LED_HEIGHT):
+        self.width, self.height = width, height
+        self.pixels = [0] * (width * height)
+
+    @property
+    def size(self):
+        return 4 * len(self.pixels)
+
+    def load(self, offset):
+        return self.pixels[offset >> 2]
+
+    def store(self, offset, value):
+        self.pixels[offset >> 2] = value & 0xFFFFFF
+
+    def rows(self):
+        return [self.pixels[y * self.width:(y + 1) * self.width] for y in range(self.height)]
+
+
+class Bus:
+    """Sparse word-addressed RAM with MMIO devices mapped over it.
+
+    ``devices`` holds ``(base, end, device)`` ranges; device registers are
+    accessed a whole word at a time, sub-word accesses to devices read or
+    replace bytes of that word.
+    """
+
+    def __init__(self):
+        self.ram = {}
+        self.devices = []
+
+    def map(self, base, size, device):
+        self.devices.append((base, base + size, device))
+        return device
+
+    def load_word(self, addr):
+        for base, end, device in self.devices:
+            if base <= addr < end:
+                return device.load(addr - base)
+        if addr & 3:
+            return self.load(addr, 4, False)
+        return self.ram.get(addr, 0)
+
+    def store_word(self, addr, value):
+        for base, end, device in self.devices:
+            if base <= addr < end:
+                return device.store(addr - base, value & MASK)
+        if addr & 3:
+            return self.store(addr, 4, value)
+        self.ram[addr] = value & MASK
+
+    def load(self, addr, size, signed):
+        """Load ``size`` bytes at any alignment."""
+        value = 0
+        for i in range(size):
+            byte_addr = (addr + i) & MASK
+            word = self.load_word(byte_addr & ~3) if byte_addr & 3 or size != 4 else self.load_word(byte_addr)
+            value |= ((word >> (8 * (byte_addr & 3))) & 0xFF) << (8 * i)
+        if signed and value >> (8 * size - 1):
+            value -= 1 << (8 * size)
+        return value & MASK
+
+    def store(self, addr, size, value):
+        for i in range(size):
+            byte_addr = (addr + i) & MASK
+            aligned, shift = byte_addr & ~3, 8 * (byte_addr & 3)
+            word = self.load_word(aligned)
+            word = (word & ~(0xFF << shift)) | (((value >> (8 * i)) & 0xFF) << shift)
+            self.store_word(aligned, word)
+
+    def write_bytes(self, addr, data):
+        for i, byte in enumerate(data):
+            self.store(addr + i, 1, byte)
+
+
+class Machine:
+    def __init__(self, program, model=FIVE_STAGE, mmio=None):
+        self.program = program
+        self.model = model
+        self.regs = [0] * 32
+        self.pc = 0
+        self.console = []
+        self.bus = Bus()
+        layout = dict(DEFAULT_MMIO, **{k: v for k, v in program.symbols.items() if k in DEFAULT_MMIO})
+        layout.update(mmio or {})
+        self.switches = [self.bus.map(layout["SW0_BASE"], 4, SwitchBank()),
+                         self.bus.map(layout["SW1_BASE"], 4, SwitchBank())]
+        self.leds = self.bus.map(layout["LED_BASE"], 4 * LED_WIDTH * LED_HEIGHT, LedMatrix())
+        self.bus.write_bytes(DATA_BASE, program.data)
+
+        self.instructions = self.cycles = self.taken_total = self.load_use_total = 0
+        self._taken = [0]
+        self._load_use = [0]
+        self._table = [self._decode(i, ins) for i, ins in enumerate(program.instructions)]
+        self._breakpoints = {}
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        return cls(assemble_file(path), **kwargs)
+
+    def set_switches(self, bank, value):
+        self.switches[bank].value = value
+
+    # --- breakpoints ---
+    def add_breakpoint(self, address):
+        index = address >> 2
+        if index not in self._breakpoints:
+            self._breakpoints[index] = self._table[index]
+            self._table[index] = _break
+
+    def remove_breakpoint(self, address):
+        entry = self._breakpoints.pop(address >> 2, None)
+        if entry is not None:
+            self._table[address >> 2] = entry
+
+    # --- execution ---
+    def step(self):
+        return self.run(1)
+
+    def run(self, max_instructions=10_000_000, until=None):
+        """Execute up to ``max_instructions``; returns ``RunStats`` for this call.
+
+        ``until`` (an address or label) stops the run before that
+        instruction next executes; the machine always makes progress, so
+        calling ``run(until=...)`` repeatedly walks loop iterations.
+        """
+        if isinstance(until, str):
+            until = self.program.symbols[until]
+        temporary = until is not None and (until >> 2) not in self._breakpoints
+        if temporary:
+            self.add_breakpoint(until)
+
+        table, pc, executed, stop = self._table, self.pc, 0, "limit"
+        taken, load_use = self._taken, self._load_use
+        taken[0] = load_use[0] = 0
+        start = time.perf_counter()
+        try:
+            if max_instructions and (pc >> 2) in self._breakpoints:
+                # Resuming from a breakpoint: execute the real instruction once
+                pc = self._breakpoints[pc >> 2](pc)
+                executed = 1
+            for executed in range(executed, max_instructions):
+                pc = table[pc >> 2](pc)
+            else:
+                executed = max_instructions
+        except Breakpoint:
+            stop = "breakpoint"
+        except Halt:
+            executed += 1
+            pc += 4
+            stop = "halt"
+        except IndexError:
+            stop = "end"  # ran off the end of .text, as Ripes does
+        finally:
+            seconds = time.perf_counter() - start
+            self.pc = pc
+            if temporary:
+                self.remove_breakpoint(until)
+
+        fill = self.model.fill if not self.instructions and executed else 0
+        cycles = (executed + fill + taken[0] * self.model.taken_branch + load_use[0] * self.model.load_use)
+        self.instructions += executed
+        self.cycles += cycles
+        self.taken_total += taken[0]
+        self.load_use_total += load_use[0]
+        return RunStats(executed, cycles, taken[0], load_use[0], seconds, stop)
+
+    # --- decoding ---
+    def _decode(self, index, ins):
+        op, rd, rs1, rs2, imm = ins.op, ins.rd, ins.rs1, ins.rs2, ins.imm
+        builder = _HANDLERS[op]
+        if op in ("lb", "lh", "lw", "lbu", "lhu"):
+            following = self.program.instructions[index + 1] if index + 1 < len(self.program.instructions) else None
+            if rd and following is not None and rd in _reads(following):
+                return builder(self, rd, rs1, rs2, imm, counted=True)
+        return builder(self, rd, rs1, rs2, imm)
+
+
+def _reads(ins):
+    if ins.op in ("lui", "auipc", "jal", "ecall", "ebreak"):
+        return ()
+    if ins.op in ("addi", "slti", "sltiu", "xori", "ori", "andi", "slli", "srli", "srai", "jalr",
+                  "lb", "lh", "lw", "lbu", "lhu"):
+        return (ins.rs1,)
+    return (ins.rs1, ins.rs2)
+
+
+def _break(pc):
+    raise Breakpoint(pc)
+
+
+def _nop(pc):
+    return pc + 4
+
+
+def _signed(value):
+    return value - 0x100000000 if value & 0x80000000 else value
+
+
+# --- handler builders: each returns the handler for one instruction ---
+def _r(expr):
+    # r[rd] = expr(r[rs1], r[rs2]); writes to x0 become nops
+    def build(machine, rd, rs1, rs2, imm):
+        if not rd:
+            return _nop
+        r = machine.regs
+
+        def handler(pc):
+            r[rd] = expr(r[rs1], r[rs2])
+            return pc + 4
+        return handler
+    return build
+
+
+def _i(expr):
+    # r[rd] = expr(r[rs1], imm)
+    def build(machine, rd, rs1, rs2, imm):
+        if not rd:
+            return _nop
+        r = machine.regs
+
+        def handler(pc):
+            r[rd] = expr(r[rs1], imm)
+            return pc + 4
+        return handler
+    return build
+
+
+def _build_add(machine, rd, rs1, rs2, imm):
+    if not rd:
+        return _nop
+    r = machine.regs
+
+    def add(pc):
+        r[rd] = (r[rs1] + r[rs2]) & 0xFFFFFFFF
+        return pc + 4
+    return add
+
+
+def _build_and(machine, rd, rs1, rs2, imm):
+    if not rd:
+        return _nop
+    r = machine.regs
+
+    def and_(pc):
+        r[rd] = r[rs1] & r[rs2]
+        return pc + 4
+    return and_
+
+
+def _build_addi(machine, rd, rs1, rs2, imm):
+    if not rd:
+        return _nop
+    r = machine.regs
+    if not rs1:
+        return _constant(r, rd, imm & MASK)
+
+    def addi(pc):
+        r[rd] = (r[rs1] + imm) & 0xFFFFFFFF
+        return pc + 4
+    return addi
+
+
+def _constant(r, rd, value):
+    def li(pc):
+        r[rd] = value
+        return pc + 4
+    return li
+
+
+def _build_lui(machine, rd, rs1, rs2, imm):
+    return _constant(machine.regs, rd, (imm << 12) & MASK) if rd else _nop
+
+
+def _build_auipc(machine, rd, rs1, rs2, imm):
+    if not rd:
+        return _nop
+    r, offset = machine.regs, (imm << 12) & MASK
+
+    def auipc(pc):
+        r[rd] = (pc + offset) & 0xFFFFFFFF
+        return pc + 4
+    return auipc
+
+
+def _build_load(size, signed):
+    def build(machine, rd, rs1, rs2, imm, counted=False):
+        r, bus, load_use = machine.regs, machine.bus, machine._load_use
+        load_word, load = bus.load_word, bus.load
+
+        if size == 4:
+            def handler(pc):
+                value = load_word((r[rs1] + imm) & 0xFFFFFFFF)
+                if rd:
+                    r[rd] = value
+                return pc + 4
+        else:
+            def handler(pc):
+                value = load((r[rs1] + imm) & 0xFFFFFFFF, size, signed)
+                if rd:
+                    r[rd] = value
+                return pc + 4
+        if not counted:
+            return handler
+
+        def counted_load(pc):
+            load_use[0] += 1
+            return handler(pc)
+        return counted_load
+    return build
+
+
+def _build_store(size):
+    def build(machine, rd, rs1, rs2, imm):
+        r, bus = machine.regs, machine.bus
+        if size != 4:
+            store = bus.store
+
+            def ssub(pc):
+                store((r[rs1] + imm) & 0xFFFFFFFF, size, r[rs2])
+                return pc + 4
+            return ssub
+
+        store_word, pixels = bus.store_word, machine.leds.pixels
+        led_base = next(base for base, _, device in bus.devices if device is machine.leds)
+        led_size = machine.leds.size
+
+        def sw(pc):
+            offset = ((r[rs1] + imm) & 0xFFFFFFFF) - led_base
+            if 0 <= offset < led_size and not offset & 3:
+                pixels[offset >> 2] = r[rs2] & 0xFFFFFF
+            else:
+                store_word((offset + led_base) & 0xFFFFFFFF, r[rs2])
+            return pc + 4
+        return sw
+    return build
+
+
+def _build_branch(test):
+    def build(machine, rd, rs1, rs2, target):
+        r, taken = machine.regs, machine._taken
+
+        def branch(pc):
+            if test(r[rs1], r[rs2]):
+                taken[0] += 1
+                return target
+            return pc + 4
+        return branch
+    return build
+
+
+def _build_bne(machine, rd, rs1, rs2, target):
+    # The LED loops' bnez: specialised to skip the test indirection
+    r, taken = machine.regs, machine._taken
+
+    def bne(pc):
+        if r[rs1] != r[rs2]:
+            taken[0] += 1
+            return target
+        return pc + 4
+    return bne
+
+
+def _build_jal(machine, rd, rs1, rs2, target):
+    r, taken = machine.regs, machine._taken
+
+    def jal(pc):
+        if rd:
+            r[rd] = pc + 4
+        taken[0] += 1
+        return target
+    return jal
+
+
+def _build_jalr(machine, rd, rs1, rs2, imm):
+    r, taken = machine.regs, machine._taken
+
+    def jalr(pc):
+        target = (r[rs1] + imm) & 0xFFFFFFFE
+        if rd:
+            r[rd] = pc + 4
+        taken[0] += 1
+        return target
+    return jalr
+
+
+def _build_ecall(machine, rd, rs1, rs2, imm):
+    # Ripes environment calls: a7 selects the service, a0 is the argument
+    r, console, bus = machine.regs, machine.console, machine.bus
+
+    def ecall(pc):
+        service = r[17]
+        if service in (10, 93):
+            raise Halt(r[10])
+        if service == 1:
+            console.append(str(_signed(r[10])))
+        elif service == 11:
+            console.append(chr(r[10] & 0xFF))
+        elif service == 4:
+            addr, chars = r[10], []
+            while len(chars) < 4096:
+                byte = bus.load(addr + len(chars), 1, False)
+                if not byte:
+                    break
+                chars.append(chr(byte))
+            console.append("".join(chars))
+        return pc + 4
+    return ecall
+
+
+def _build_ebreak(machine, rd, rs1, rs2, imm):
+    return _break
+
+
+_HANDLERS = {
+    "add": _build_add,
+    "sub": _r(lambda a, b: (a - b) & MASK),
+    "sll": _r(lambda a, b: (a << (b & 31)) & MASK),
+    "slt": _r(lambda a, b: int(_signed(a) < _signed(b))),
+    "sltu": _r(lambda a, b: int(a < b)),
+    "xor": _r(lambda a, b: a ^ b),
+    "srl": _r(lambda a, b: a >> (b & 31)),
+    "sra": _r(lambda a, b: (_signed(a) >> (b & 31)) & MASK),
+    "or": _r(lambda a, b: a | b),
+    "and": _build_and,
+    "addi": _build_addi,
+    "slti": _i(lambda a, imm: int(_signed(a) < imm)),
+    "sltiu": _i(lambda a, imm: int(a < (imm & MASK))),
+    "xori": _i(lambda a, imm: (a ^ imm) & MASK),
+    "ori": _i(lambda a, imm: (a | imm) & MASK),
+    "andi": _i(lambda a, imm: a & imm & MASK),
+    "slli": _i(lambda a, imm: (a << imm) & MASK),
+    "srli": _i(lambda a, imm: a >> imm),
+    "srai": _i(lambda a, imm: (_signed(a) >> imm) & MASK),
+    "lui": _build_lui,
+    "auipc": _build_auipc,
+    "lb": _build_load(1, True),
+    "lh": _build_load(2, True),
+    "lw": _build_load(4, False),
+    "lbu": _build_load(1, False),
+    "lhu": _build_load(2, False),
+    "sb": _build_store(1),
+    "sh": _build_store(2),
+    "sw": _build_store(4),
+    "beq": _build_branch(lambda a, b: a == b),
+    "bne": _build_bne,
+    "blt": _build_branch(lambda a, b: _signed(a) < _signed(b)),
+    "bge": _build_branch(lambda a, b: _signed(a) >= _signed(b)),
+    "bltu": _build_branch(lambda a, b: a < b),
+    "bgeu": _build_branch(lambda a, b: a >= b),
+    "jal": _build_jal,
+    "jalr": _build_jalr,
+    "ecall": _build_ecall,
+    "ebreak": _build_ebreak,
+}
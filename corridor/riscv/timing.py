@@ -0,0 +1,409 @@
+"""Static worst-case timing of an assembled program on a ``PipelineModel``.
+
+The same cycle rules as ``corridor.riscv.machine``: one cycle per
+instruction, ``taken_branch`` bubbles after every taken branch or jump,
+and a ``load_use`` stall when an instruction reads the register loaded by
+the one before it.  Here they are applied to every path of the program
+instead of the one a run takes, so the result holds for any switch setting.
+
+The analysis walks instructions from the outer loop's header (``main_loop``)
+until control comes back to it, tracking registers whose values are known
+(``li`` constants, ``jal`` return addresses), so addresses of loads and
+stores, calls and returns are resolved.  A conditional branch on an unknown
+value forks the walk.  A backward branch or jump marks a loop.  Inner loops
+are not unrolled: each is summarised once per entry state as ``(n - 1)``
+times its longest iteration plus its longest exit.  The bound ``n`` comes
+from a counter register stepped by one ``addi`` and compared against a known
+value at the back edge (``li t2, PIXEL_COUNT`` ... ``bnez t2, g_loop``), or
+from ``bounds``.
+
+Each path reports the cycles of one outer iteration and the cycles from the
+first sensor read (a load from a switch bank) to the end of the first LED
+matrix store.  Each inner loop reports its cycles per iteration and the
+stalls in them.
+"""
+import argparse
+import collections
+import json
+import sys
+
+from corridor.riscv.assembler import BRANCHES, LOADS, STORES, TEXT_BASE, assemble_file
+from corridor.riscv.machine import DEFAULT_MMIO, FIVE_STAGE, LED_HEIGHT, LED_WIDTH, MASK, SINGLE_CYCLE, _reads
+
+MODELS = {model.name: model for model in (FIVE_STAGE, SINGLE_CYCLE)}
+MAX_STEPS = 1_000_000  # instructions walked on one path before giving up
+
+# Counts along a path: instructions, taken transfers, load-use stalls
+Counts = collections.namedtuple("Counts", "instructions taken load_use")
+ZERO = Counts(0, 0, 0)
+
+# decisions: ((line, source, taken), ...) of the branches the inputs decide;
+# cycles/counts: the outer iteration; latency: first sensor read to the end
+# of the first LED store, or None; calls: labels called, in order
+Path = collections.namedtuple("Path", "decisions cycles counts latency calls")
+# label: the loop header's label; first_line/last_line: its source lines;
+# iterations: the bound; cycles/counts: longest iteration; total: cycles of
+# the whole loop; stalls: ((line, source, kind, cycles), ...) per iteration
+Loop = collections.namedtuple("Loop", "label first_line last_line iterations cycles counts total stalls")
+Report = collections.namedtuple("Report", "model header paths loops")
+
+_TESTS = {
+    "beq": lambda a, b: a == b,
+    "bne": lambda a, b: a != b,
+    "blt": lambda a, b: _signed(a) < _signed(b),
+    "bge": lambda a, b: _signed(a) >= _signed(b),
+    "bltu": lambda a, b: a < b,
+    "bgeu": lambda a, b: a >= b,
+}
+_ALU = {
+    "add": lambda a, b: a + b, "sub": lambda a, b: a - b, "and": lambda a, b: a & b, "or": lambda a, b: a | b,
+    "xor": lambda a, b: a ^ b, "sll": lambda a, b: a << (b & 31), "srl": lambda a, b: a >> (b & 31),
+    "addi": lambda a, b: a + b, "andi": lambda a, b: a & b, "ori": lambda a, b: a | b, "xori": lambda a, b: a ^ b,
+    "slli": lambda a, b: a << b, "srli": lambda a, b: a >> b,
+}
+
+
+class TimingError(ValueError):
+    def __init__(self, message, line=None):
+        super().__init__(f"line {line}: {message}" if line else message)
+        self.line = line
+
+
+def _signed(value):
+    return value - 0x100000000 if value & 0x80000000 else value
+
+
+def _add(a, b, times=1):
+    return Counts(*(x + times * y for x, y in zip(a, b)))
+
+
+# One walk ends with kind "back" (a transfer to the header), "exit" (control
+# left the loop's lines; index is where it went) or "return"; counts and
+# events ({"read"/"write": Counts}) are from the walk's start
+_End = collections.namedtuple("_End", "kind index regs counts events decisions calls stalls")
+
+
+class _Analysis:
+    def __init__(self, program, model, bounds):
+        self.program, self.model = program, model
+        self.ins = program.instructions
+        symbols = program.symbols
+        layout = dict(DEFAULT_MMIO, **{k: v for k, v in symbols.items() if k in DEFAULT_MMIO})
+        self.switches = [(layout[name], layout[name] + 4) for name in ("SW0_BASE", "SW1_BASE")]
+        self.leds = (layout["LED_BASE"], layout["LED_BASE"] + 4 * LED_WIDTH * LED_HEIGHT)
+        self.labels = {}
+        for name, value in symbols.items():
+            index = (value - TEXT_BASE) >> 2
+            if not (value - TEXT_BASE) & 3 and 0 <= index < len(self.ins):
+                self.labels.setdefault(index, name)
+        self.bounds = {self._index(key): n for key, n in (bounds or {}).items()}
+
+        # Loops: the lines from a backward transfer's target to the last transfer back to it
+        self.loops = {}
+        for i, ins in enumerate(self.ins):
+            if ins.op in BRANCHES or ins.op == "jal":
+                target = (ins.imm - TEXT_BASE) >> 2
+                if target <= i:
+                    self.loops[target] = max(self.loops.get(target, i), i)
+        self.summaries, self.reports = {}, {}
+
+    def _index(self, where):
+        address = self.program.symbols[where] if isinstance(where, str) else where
+        return (address - TEXT_BASE) >> 2
+
+    def cycles(self, counts):
+        return counts.instructions + counts.taken * self.model.taken_branch + counts.load_use * self.model.load_use
+
+    def label(self, index):
+        while index > 0 and index not in self.labels:
+            index -= 1
+        return self.labels.get(index, f"{TEXT_BASE + 4 * index:#x}")
+
+    def _stall(self, i):
+        # Same rule as the machine: a load read by the instruction after it in memory
+        ins = self.ins[i]
+        return bool(ins.op in LOADS and ins.rd and i + 1 < len(self.ins) and ins.rd in _reads(self.ins[i + 1]))
+
+    def walk(self, header, regs, stack=()):
+        """Every path from loop ``header`` (an instruction index) with known registers ``regs``, as ``_End``s."""
+        first, last = header, self.loops[header]
+        depth = len(stack)
+        todo = [(header, {**regs, 0: 0}, tuple(stack), ZERO, {}, (), (), (), 0)]
+        ends = []
+        while todo:
+            i, regs, stack, counts, events, decisions, calls, stalls, steps = todo.pop()
+            while True:
+                if len(stack) == depth and not first <= i <= last:
+                    ends.append(_End("exit", i, regs, counts, events, decisions, calls, stalls))
+                    break
+                if i != header and i in self.loops:
+                    # An inner loop, or one in a called function: go on from each of its exits
+                    for exit_index, (loop_counts, loop_events, out) in self.summary(i, regs).items():
+                        merged = dict(events)
+                        for name, offset in loop_events.items():
+                            merged.setdefault(name, _add(counts, offset))
+                        todo.append((exit_index, dict(out), stack, _add(counts, loop_counts), merged, decisions,
+                                     calls, stalls, steps))
+                    break
+                if not 0 <= i < len(self.ins):
+                    raise TimingError(f"control reaches {TEXT_BASE + 4 * i:#x}, outside .text")
+                steps += 1
+                if steps > MAX_STEPS:
+                    raise TimingError(f"no end after {MAX_STEPS:,} instructions from {self.label(header)}",
+                                      self.ins[header].line)
+                ins = self.ins[i]
+                op = ins.op
+                stall = self._stall(i)
+                if stall:
+                    stalls += ((i, "load-use"),)
+                # Sensor reads count from the start of the load, LED writes to the end of the store
+                if op in LOADS and "read" not in events and self._hits(regs, ins, self.switches):
+                    events = dict(events, read=counts)
+                counts = _add(counts, Counts(1, 0, int(stall)))
+                if op in STORES and "write" not in events and self._hits(regs, ins, [self.leds]):
+                    events = dict(events, write=counts)
+
+                if op in BRANCHES:
+                    target = (ins.imm - TEXT_BASE) >> 2
+                    a, b = regs.get(ins.rs1), regs.get(ins.rs2)
+                    known = a is not None and b is not None
+                    for taken in ((_TESTS[op](a, b),) if known else (True, False)):
+                        decided = decisions if known else decisions + ((i, taken),)
+                        if not taken:
+                            todo.append((i + 1, dict(regs), stack, counts, events, decided, calls, stalls, steps))
+                        elif target == header and len(stack) == depth:
+                            ends.append(_End("back", header, regs, _add(counts, Counts(0, 1, 0)), events, decided,
+                                             calls, stalls + ((i, "taken"),)))
+                        else:
+                            todo.append((target, dict(regs), stack, _add(counts, Counts(0, 1, 0)), events, decided,
+                                         calls, stalls + ((i, "taken"),), steps))
+                    break
+                if op in ("jal", "jalr"):
+                    if op == "jal":
+                        target = (ins.imm - TEXT_BASE) >> 2
+                    else:
+                        base = regs.get(ins.rs1)
+                        if base is None:
+                            raise TimingError(f"indirect jump through x{ins.rs1}", ins.line)
+                        target = (((base + ins.imm) & MASK & ~1) - TEXT_BASE) >> 2
+                    counts = _add(counts, Counts(0, 1, 0))
+                    stalls += ((i, "taken"),)
+                    if ins.rd:
+                        regs[ins.rd] = TEXT_BASE + 4 * (i + 1)
+                        stack += (i + 1,)
+                        calls += (self.label(target),)
+                    elif stack and target == stack[-1]:
+                        stack = stack[:-1]
+                    elif op == "jalr" and len(stack) == depth:
+                        ends.append(_End("return", target, regs, counts, events, decisions, calls, stalls))
+                        break
+                    if target == header and len(stack) == depth:
+                        ends.append(_End("back", header, regs, counts, events, decisions, calls, stalls))
+                        break
+                    i = target
+                    continue
+                self._execute(regs, ins, i)
+                i += 1
+        return ends
+
+    @staticmethod
+    def _hits(regs, ins, ranges):
+        base = regs.get(ins.rs1)
+        return base is not None and any(lo <= (base + ins.imm) & MASK < hi for lo, hi in ranges)
+
+    def _execute(self, regs, ins, i):
+        op, rd = ins.op, ins.rd
+        if not rd:
+            return
+        value = None
+        if op == "lui":
+            value = ins.imm << 12
+        elif op == "auipc":
+            value = TEXT_BASE + 4 * i + (ins.imm << 12)
+        elif op in _ALU:
+            a = regs.get(ins.rs1)
+            b = ins.imm if op.endswith("i") else regs.get(ins.rs2)
+            if a is not None and b is not None:
+                value = _ALU[op](a, b)
+        if value is None:
+            regs.pop(rd, None)
+        else:
+            regs[rd] = value & MASK
+
+    def variant(self, header):
+        """Registers an iteration of the loop at ``header`` may change (all of them if it calls out)."""
+        body = self.ins[header:self.loops[header] + 1]
+        if any(ins.op == "jal" and ins.rd or ins.op == "jalr" for ins in body):
+            return None
+        return {ins.rd for ins in body if ins.rd}
+
+    def bound(self, header, regs):
+        """Iterations of the loop at ``header`` entered with ``regs``."""
+        if header in self.bounds:
+            return self.bounds[header]
+        tail = self.ins[self.loops[header]]
+        if tail.op in _TESTS:
+            body = self.ins[header:self.loops[header] + 1]
+            for counter, limit in ((tail.rs1, tail.rs2), (tail.rs2, tail.rs1)):
+                steps = [ins for ins in body if ins.rd == counter]
+                if counter and len(steps) == 1 and steps[0].op == "addi" and steps[0].rs1 == counter \
+                        and steps[0].imm and (not limit or all(ins.rd != limit for ins in body)) \
+                        and counter in regs and limit in regs:
+                    n = self._count(tail.op, counter == tail.rs1, regs[counter], regs[limit], steps[0].imm)
+                    if n:
+                        return n
+        raise TimingError(f"no iteration bound for the loop at {self.label(header)}; pass bounds="
+                          f"{{{self.label(header)!r}: n}}", self.ins[header].line)
+
+    @staticmethod
+    def _count(op, counter_first, start, limit, step):
+        # Iterations of a bottom-tested loop: the body runs and steps the counter, then the test
+        value, test = start, _TESTS[op]
+        for n in range(1, MAX_STEPS):
+            value = (value + step) & MASK
+            if not (test(value, limit) if counter_first else test(limit, value)):
+                return n
+        return None
+
+    def summary(self, header, regs):
+        """{exit index: (counts, events, registers after)} of the loop at ``header`` entered with ``regs``."""
+        variant = self.variant(header)
+        known = {} if variant is None else {r: v for r, v in regs.items() if r not in variant}
+        key = (header, tuple(sorted(regs.items())))
+        if key in self.summaries:
+            return self.summaries[key]
+        n = self.bound(header, regs)
+        iteration, exits, stalls = None, {}, ()
+        for end in self.walk(header, known):
+            if end.kind == "back":
+                if iteration is None or self.cycles(end.counts) > self.cycles(iteration):
+                    iteration, stalls = end.counts, end.stalls
+            elif end.kind == "exit":
+                best = exits.get(end.index)
+                if best is None or self.cycles(end.counts) > self.cycles(best):
+                    exits[end.index] = end.counts
+            else:
+                raise TimingError(f"returns from inside the loop at {self.label(header)}", self.ins[header].line)
+        if not exits:
+            raise TimingError(f"the loop at {self.label(header)} has no exit", self.ins[header].line)
+        # Events of the first iteration, which runs with the entry registers
+        events = {}
+        for end in self.walk(header, regs):
+            for name, offset in end.events.items():
+                if name not in events or self.cycles(offset) > self.cycles(events[name]):
+                    events[name] = offset
+        iteration = iteration or ZERO
+        out = {index: (_add(counts, iteration, n - 1), events, dict(known)) for index, counts in exits.items()}
+        self.summaries[key] = out
+
+        total = max(self.cycles(counts) for counts, _, _ in out.values())
+        previous = self.reports.get(header)
+        if previous is None or total > previous.total:
+            sites = collections.Counter(stalls)  # (index, "taken" or "load-use") per iteration
+            per_site = tuple((self.ins[i].line, self.ins[i].source, kind,
+                              count * (self.model.taken_branch if kind == "taken" else self.model.load_use))
+                             for (i, kind), count in sorted(sites.items()))
+            self.reports[header] = Loop(self.label(header), self.ins[header].line, self.ins[self.loops[header]].line,
+                                        n, self.cycles(iteration), iteration, total, per_site)
+        return out
+
+
+def analyze(program, model=FIVE_STAGE, header="main_loop", bounds=None):
+    """Worst-case timing of every path through one iteration of the loop at ``header`` (a label or address).
+
+    ``bounds`` maps loop labels or addresses to iteration counts the
+    analysis cannot find itself.  Raises ``TimingError`` for what it cannot
+    bound: indirect jumps, loops without a bound, control leaving ``.text``.
+    """
+    analysis = _Analysis(program, model, bounds)
+    start = analysis._index(header)
+    if start not in analysis.loops:
+        raise TimingError(f"{header!r} is not the header of a loop")
+    paths = []
+    for end in analysis.walk(start, {}):
+        if end.kind != "back":
+            raise TimingError(f"a path leaves {analysis.label(start)} at {TEXT_BASE + 4 * end.index:#x}")
+        read, write = end.events.get("read"), end.events.get("write")
+        latency = analysis.cycles(write) - analysis.cycles(read) if read is not None and write is not None and \
+            analysis.cycles(write) > analysis.cycles(read) else None
+        decisions = tuple((analysis.ins[i].line, analysis.ins[i].source, taken) for i, taken in end.decisions)
+        paths.append(Path(decisions, analysis.cycles(end.counts), end.counts, latency, end.calls))
+    paths.sort(key=lambda path: [(line, not taken) for line, _, taken in path.decisions])
+    loops = sorted(analysis.reports.values(), key=lambda loop: loop.first_line)
+    return Report(model.name, analysis.label(start), paths, loops)
+
+
+def worst(report):
+    """(longest iteration, longest read-to-write latency, reaction bound) in cycles.
+
+    The reaction bound is for inputs that change just after the read: they
+    are seen on the next iteration, so it is a whole iteration plus the
+    latency.
+    """
+    iteration = max(path.cycles for path in report.paths)
+    latencies = [path.latency for path in report.paths if path.latency is not None]
+    latency = max(latencies) if latencies else None
+    return iteration, latency, None if latency is None else iteration + latency
+
+
+def format_report(report):
+    lines = [f"{report.header}, {report.model} pipeline: {len(report.paths)} path(s)"]
+    for path in report.paths:
+        decided = "; ".join(f"{line}: {source.split('#')[0].strip()} {'taken' if taken else 'not taken'}"
+                            for line, source, taken in path.decisions) or "always"
+        latency = "no LED write" if path.latency is None else f"read -> first LED write {path.latency:,} cycles"
+        lines.append(f"  {decided}\n    calls {', '.join(path.calls) or '-'}: iteration {path.cycles:,} cycles "
+                     f"({path.counts.instructions:,} instructions, {path.counts.taken:,} taken, "
+                     f"{path.counts.load_use:,} load-use), {latency}")
+    iteration, latency, reaction = worst(report)
+    lines.append(f"worst: iteration {iteration:,} cycles, read -> first LED write "
+                 f"{'-' if latency is None else f'{latency:,}'} cycles, input change -> LED "
+                 f"{'-' if reaction is None else f'{reaction:,}'} cycles")
+    for loop in report.loops:
+        stalled = sum(cycles for _, _, _, cycles in loop.stalls)
+        lines.append(f"loop {loop.label} (lines {loop.first_line}-{loop.last_line}): {loop.iterations:,} x "
+                     f"{loop.cycles} cycles = {loop.total:,}, {stalled} stall cycle(s) per iteration "
+                     f"({stalled / loop.cycles:.0%})")
+        for line, source, kind, cycles in loop.stalls:
+            if cycles:
+                lines.append(f"  line {line}: {source.split('#')[0].strip()}: {kind} {cycles} cycle(s)")
+    return "\n".join(lines)
+
+
+def to_dict(report):
+    iteration, latency, reaction = worst(report)
+    return {"model": report.model, "header": report.header,
+            "worst": {"iteration": iteration, "latency": latency, "reaction": reaction},
+            "paths": [dict(path._asdict(), counts=path.counts._asdict(),
+                           decisions=[{"line": line, "source": source, "taken": taken}
+                                      for line, source, taken in path.decisions]) for path in report.paths],
+            "loops": [dict(loop._asdict(), counts=loop.counts._asdict(),
+                           stalls=[{"line": line, "source": source, "kind": kind, "cycles": cycles}
+                                   for line, source, kind, cycles in loop.stalls]) for loop in report.loops]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m corridor.riscv.timing", description=__doc__.split("\n")[0])
+    parser.add_argument("source", nargs="?", default="ripes/ripes.s")
+    parser.add_argument("--model", choices=sorted(MODELS), default=FIVE_STAGE.name)
+    parser.add_argument("--header", default="main_loop", help="label of the outer loop")
+    parser.add_argument("--bound", action="append", default=[], metavar="LABEL=N",
+                        help="iterations of a loop the analysis cannot bound itself")
+    parser.add_argument("--max-latency", type=int, metavar="CYCLES",
+                        help="exit with status 1 if read -> first LED write can take longer")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    bounds = {label: int(n) for label, n in (item.split("=", 1) for item in args.bound)}
+    try:
+        report = analyze(assemble_file(args.source), MODELS[args.model], args.header, bounds)
+    except (TimingError, ValueError) as e:
+        sys.exit(f"{args.source}: {e}")
+    print(json.dumps(to_dict(report), indent=2) if args.json else format_report(report))
+    latency = worst(report)[1]
+    if args.max_latency is not None and (latency is None or latency > args.max_latency):
+        sys.exit(f"{args.source}: read -> first LED write takes up to {latency} cycles, over {args.max_latency}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""Vectorized port of the digital twin's room sensor model (SimulationContext.jsx).
+
+``room_sensors`` reproduces the ``sensorData`` useMemo exactly: base
+readings, kitchen burners / burning items / stove and fridge explosions,
+the living-room chimney and TV, the master-bedroom TV, heaters, the global
+smoke level and the emergency floor, then JS ``Math.round`` and the clamps.
+``simulate`` adds the once-a-second ``smokeLevel`` decay (ventilation
+factors summed over rooms and capped at 0.3, or 1% natural decay when no
+vent runs) and the 10 s burning-item expiry under ventilation.
+
+Everything is NumPy over arrays shaped (scenarios, rooms, timesteps).
+Scenario-wide inputs are a scalar, (scenarios,) or (scenarios, timesteps);
+per-room inputs are (rooms,), (scenarios, rooms) or (scenarios, rooms,
+timesteps).  Shorter shapes are constant over the missing axes.
+"""
+import collections
+
+import numpy as np
+
+# In the key order of ROOMS in SimulationContext.jsx; index = room axis
+ROOMS = ("kitchen", "living-room", "dining-room", "guest-bedroom", "master-bedroom", "children-room", "home-office")
+KITCHEN, LIVING, MASTER = 0, 1, 4
+# Every room but the kitchen has a heater
+HAS_HEATER = np.array([room != "kitchen" for room in ROOMS])
+
+# Room masks shaped to broadcast over (scenarios, rooms, timesteps)
+_IS_KITCHEN, _IS_LIVING, _IS_MASTER = ((np.arange(len(ROOMS)) == i)[None, :, None] for i in (KITCHEN, LIVING, MASTER))
+_HAS_HEATER = HAS_HEATER[None, :, None]
+
+BASE_SENSORS = {"smoke": 0, "co2": 400, "pm25": 15, "temp": 22}
+LIMITS = {"smoke": 100, "co2": 2000, "pm25": 200, "temp": 60}
+METRICS = tuple(BASE_SENSORS)
+
+# Ventilation level codes; 0 is an inactive vent
+VENT_LEVELS = ("OFF", "LOW", "MED", "HIGH")
+VENT_FACTORS = np.array([0.0, 0.02, 0.05, 0.1])
+MAX_VENT_DECAY = 0.3
+NATURAL_DECAY = 0.99
+BURN_CLEAR_SECONDS = 10
+
+STATUS = ("SAFE", "WARNING", "CRITICAL")
+SAFE, WARNING, CRITICAL = range(3)
+
+# burners: lit stove burners (0-4); burning: items burning on the stove;
+# stove/fridge/tv_living/tv_master: exploded appliances; chimney: blocked;
+# smoke_level: global smokeLevel; emergency: emergency mode -- all
+# scenario-wide.  heater_on/heater_level/heater_overloaded: per room.
+Hazards = collections.namedtuple(
+    "Hazards", "burners burning stove fridge tv_living tv_master chimney heater_on heater_level "
+               "heater_overloaded smoke_level emergency",
+    defaults=(0, 0, False, False, False, False, False, False, 1, False, 0.0, False))
+
+# smoke_level, burning: (scenarios, timesteps) state after each tick;
+# sensors: {metric: (scenarios, rooms, timesteps)}; status: (scenarios, timesteps)
+Trace = collections.namedtuple("Trace", "smoke_level burning sensors status")
+
+
+def js_round(x):
+    """JavaScript ``Math.round``: halves round towards +infinity."""
+    return np.floor(np.asarray(x, dtype=float) + 0.5)
+
+
+def _scenario(x):
+    # scalar, (scenarios,) or (scenarios, timesteps) -> broadcastable to (scenarios, rooms, timesteps)
+    x = np.asarray(x)
+    if x.ndim == 1:
+        return x[:, None, None]
+    return x[:, None, :] if x.ndim == 2 else x
+
+
+def _room(x):
+    # scalar, (rooms,), (scenarios, rooms) or (scenarios, rooms, timesteps)
+    x = np.asarray(x)
+    if x.ndim == 1:
+        return x[None, :, None]
+    return x[:, :, None] if x.ndim == 2 else x
+
+
+def room_sensors(hazards):
+    """Per-room readings {metric: int array (scenarios, rooms, timesteps)} for ``hazards``."""
+    h = hazards
+    kitchen, living, master = _IS_KITCHEN, _IS_LIVING, _IS_MASTER
+    burners, burning = _scenario(h.burners), _scenario(h.burning)
+    stove, fridge = _scenario(h.stove), _scenario(h.fridge)
+    chimney, tv_living, tv_master = _scenario(h.chimney), _scenario(h.tv_living), _scenario(h.tv_master)
+
+    # Terms other than burning items and the global smoke level are usually
+    # constant over time, so they are summed before broadcasting to timesteps
+    smoke = BASE_SENSORS["smoke"] + kitchen * (burners * 5 + stove * 80 + fridge * 30) \
+        + living * (chimney * 70 + tv_living * 40) + master * (tv_master * 40)
+    co2 = BASE_SENSORS["co2"] + kitchen * (burners * 50 + fridge * 200) + living * (chimney * 300)
+    pm25 = BASE_SENSORS["pm25"] + kitchen * (stove * 60) + living * (chimney * 50 + tv_living * 35) \
+        + master * (tv_master * 35)
+    temp = BASE_SENSORS["temp"] + kitchen * (burners * 3 + stove * 15)
+
+    # An overloaded heater overrides the "on" contribution
+    overloaded = _room(h.heater_overloaded).astype(bool) & _HAS_HEATER
+    on = _room(h.heater_on).astype(bool) & _HAS_HEATER & ~overloaded
+    smoke = smoke + overloaded * 50
+    pm25 = pm25 + overloaded * 40
+    temp = temp + overloaded * 25 + on * (_room(h.heater_level) * 4)
+
+    smoke = smoke + kitchen * (burning * 40) + _scenario(h.smoke_level)
+    co2 = co2 + kitchen * (burning * 150)
+    pm25 = pm25 + kitchen * (burning * 30)
+    emergency = _scenario(h.emergency).astype(bool)
+    smoke = np.where(emergency, np.maximum(smoke, 60), smoke)
+    co2 = np.where(emergency, np.maximum(co2, 800), co2)
+
+    readings = dict(zip(METRICS, (smoke, co2, pm25, temp)))
+    shape = np.broadcast_shapes(*(value.shape for value in readings.values()))
+    return {metric: np.broadcast_to(np.minimum(js_round(value), LIMITS[metric]).astype(np.int16), shape).copy()
+            for metric, value in readings.items()}
+
+
+def aggregate_status(sensors):
+    """aggregatedSensors.status per (scenario, timestep) as SAFE/WARNING/CRITICAL codes."""
+    smoke, pm25 = sensors["smoke"], sensors["pm25"]
+    critical = (smoke > 50).any(axis=-2)
+    warning = ((smoke > 30) | (pm25 > 80)).any(axis=-2)
+    return np.where(critical, CRITICAL, np.where(warning, WARNING, SAFE)).astype(np.int8)
+
+
+def vent_decay(vents):
+    """Per-second decay factor from vent level codes (..., rooms) -> (...).
+
+    Summed room by room in ROOMS order, as the JS forEach does, so the
+    floating-point result (and the 0.3 cap) match exactly.
+    """
+    factors = VENT_FACTORS[vents]
+    total = np.zeros(factors.shape[:-1])
+    for room in range(factors.shape[-1]):
+        total = total + factors[..., room]
+    return np.minimum(total, MAX_VENT_DECAY)
+
+
+def simulate(hazards, vents, steps):
+    """Run ``steps`` one-second ticks from the state described by ``hazards``.
+
+    ``hazards.smoke_level`` and ``hazards.burning`` are the state at tick 0
+    (shape (scenarios,)); the burning items are taken to have started then.
+    ``vents`` holds level codes (see VENT_LEVELS), shape (scenarios, rooms)
+    or (scenarios, rooms, steps).  Other hazards are held for the whole run.
+    """
+    vents = np.asarray(vents)
+    if vents.ndim == 2:
+        vents = vents[..., None]
+    active = np.broadcast_to((vents > 0).any(axis=1), (len(vents), steps))
+    decay = np.broadcast_to(1 - vent_decay(np.moveaxis(vents, 1, -1)), (len(vents), steps))
+
+    level = np.array(np.broadcast_to(np.asarray(hazards.smoke_level, float), vents.shape[:1]))
+    burning = np.array(np.broadcast_to(np.asarray(hazards.burning), vents.shape[:1]))
+    smoke_level = np.empty((len(level), steps))
+    burning_trace = np.empty((len(level), steps), dtype=burning.dtype)
+    for t in range(steps):
+        if t:
+            vented = active[:, t]
+            level = np.where(vented, level * decay[:, t], level * NATURAL_DECAY)
+            level = np.where(level < np.where(vented, 1.0, 0.5), 0.0, level)
+            if t >= BURN_CLEAR_SECONDS:
+                burning = np.where(vented, 0, burning)
+        smoke_level[:, t] = level
+        burning_trace[:, t] = burning
+
+    sensors = room_sensors(hazards._replace(smoke_level=smoke_level, burning=burning_trace))
+    return Trace(smoke_level, burning_trace, sensors, aggregate_status(sensors))
+
+
+def time_to_safe(status, dt=1.0):
+    """Seconds until the aggregated status first reads SAFE; inf if it never does."""
+    safe = status == SAFE
+    first = safe.argmax(axis=-1).astype(float)
+    return np.where(safe.any(axis=-1), first * dt, np.inf)
+
+
+def hazard_smoke_level(overloaded_heaters=0, exploded_appliances=0, emergency=False):
+    """smokeLevel after overloading heaters (+30 each) and exploding appliances (+40), capped at 100.
+
+    triggerEmergency sets it to 80 outright.
+    """
+    level = np.minimum(30 * np.asarray(overloaded_heaters) + 40 * np.asarray(exploded_appliances), 100)
+    return np.where(emergency, 80, level).astype(float)
+
+
+def random_hazards(n, rng):
+    """``n`` random hazard combinations, each with the smokeLevel its triggers would leave."""
+    rooms = len(ROOMS)
+    appliances = rng.random((n, 4)) < 0.03
+    overloaded = (rng.random((n, rooms)) < 0.05) & HAS_HEATER
+    emergency = rng.random(n) < 0.01
+    return Hazards(
+        burners=rng.integers(0, 5, n),
+        burning=rng.poisson(0.2, n),
+        stove=appliances[:, 0], fridge=appliances[:, 1], tv_living=appliances[:, 2], tv_master=appliances[:, 3],
+        chimney=(rng.random(n) < 0.05) | emergency,
+        heater_on=(rng.random((n, rooms)) < 0.3) | overloaded,
+        heater_level=np.where(overloaded, 3, rng.integers(1, 4, (n, rooms))),
+        heater_overloaded=overloaded,
+        smoke_level=hazard_smoke_level(overloaded.sum(axis=1), appliances.sum(axis=1), emergency),
+        emergency=emergency,
+    )
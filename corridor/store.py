@@ -0,0 +1,453 @@
+"""Append-only columnar store for ``smart-corridor/monitor`` and ``/commands``.
+
+Each topic is a table with a fixed schema: the ESP32's monitor payload
+(``loop()`` in sketch.ino) and the commands of ``publishCommand``, plus
+the receive time and the room, taken from the archive envelope (see
+``corridor.capture``).  Numbers are stored as typed arrays.  Status,
+action, level, source and room strings are dictionary-encoded as uint16
+codes; each table keeps one append-only dictionary per column.
+
+Rows are buffered in memory and flushed into immutable segments, never
+rewritten:
+
+    <root>/<table>/<YYYY-MM-DD>/seg-000001/ts.npy, room.npy, ..., meta.json
+
+A segment holds one UTC day, sorted by time.  Each column is a ``.npy``
+file that is memory-mapped on first use.  ``meta.json`` has the row count,
+the time range and a sparse index of every ``INDEX_STRIDE``-th timestamp.
+A range scan reads the manifests, skips segments outside the range, and
+bisects the sparse index to a ``INDEX_STRIDE``-row block of the ``ts``
+column.  It then slices the other columns to the rows found.  Only the
+pages of those rows are read; filters compare integer codes, and per-room
+aggregates are ``bincount``s.
+
+``where`` filters map a column to a value, a sequence of values, or a
+predicate on the value.  A string value may be an ``fnmatch`` pattern, such
+as ``status="CRITICAL*"``.
+"""
+import argparse
+import asyncio
+import bisect
+import collections
+import datetime
+import fnmatch
+import json
+import math
+import os
+import shutil
+import time
+
+import numpy as np
+
+from corridor.capture import parse_record, parse_time, payload_of, timestamp_of
+
+TOPICS = {"smart-corridor/monitor": "monitor", "smart-corridor/commands": "commands"}
+
+# Column -> dtype; "dict" columns hold uint16 codes into the table's dictionary
+SCHEMAS = {
+    "monitor": {"ts": "<f8", "room": "dict", "pm25": "<f4", "co2": "<f4", "smoke": "<f4", "temp": "<f4",
+                "ventilation": "u1", "status": "dict", "source": "dict"},
+    # device_ms: the payload's millis() (-1 when absent)
+    "commands": {"ts": "<f8", "room": "dict", "action": "dict", "level": "dict", "alarm": "u1",
+                 "device_ms": "<i8"},
+}
+# Columns stored under another name than their payload field
+PAYLOAD_KEYS = {"device_ms": "timestamp"}
+CODE = np.dtype("<u2")
+SEGMENT_ROWS = 1 << 20  # buffered rows that trigger a flush
+INDEX_STRIDE = 4096
+
+# start/end: epoch seconds of the first matching row and of the first row
+# after it that does not match (the last matching row's at the end of the range)
+Window = collections.namedtuple("Window", "start end rows")
+# count, sum, min, max, mean: {group: value}
+Aggregate = collections.namedtuple("Aggregate", "count sum min max mean")
+
+
+def table_of(payload):
+    """The table a bare payload belongs to, from its fields; None for other topics.
+
+    The twin's sensors payload carries a ``status`` too, but also its
+    ``Date.now()`` ``timestamp``, which the sketch's monitor never has.
+    """
+    if "action" in payload:
+        return "commands"
+    if "source" in payload or ("status" in payload and "timestamp" not in payload):
+        return "monitor"
+    return None
+
+
+def _number(value, default=math.nan):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class Segment:
+    """One immutable segment; columns are memory-mapped on first use."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        self.rows, self.start, self.end = meta["rows"], meta["start"], meta["end"]
+        self.index = meta["index"]
+        self._columns = {}
+
+    def column(self, name):
+        array = self._columns.get(name)
+        if array is None:
+            array = self._columns[name] = np.load(os.path.join(self.path, name + ".npy"), mmap_mode="r")
+        return array
+
+    def bounds(self, start=None, end=None):
+        """Rows ``lo:hi`` with ``start <= ts < end``."""
+        return (0 if start is None or start <= self.start else self._row(start),
+                self.rows if end is None or end > self.end else self._row(end))
+
+    def _row(self, t):
+        # The sparse index narrows the search to one block of the ts column
+        block = max(bisect.bisect_left(self.index, t) - 1, 0)
+        lo = block * INDEX_STRIDE
+        ts = self.column("ts")[lo:lo + INDEX_STRIDE + 1]
+        return lo + int(np.searchsorted(ts, t, side="left"))
+
+
+class Table:
+    """Buffered rows, dictionaries and segments of one topic."""
+
+    def __init__(self, root, name):
+        self.name = name
+        self.path = os.path.join(root, name)
+        self.schema = SCHEMAS[name]
+        os.makedirs(self.path, exist_ok=True)
+        try:
+            with open(os.path.join(self.path, "dictionary.json")) as f:
+                values = json.load(f)
+        except FileNotFoundError:
+            values = {}
+        self.dictionary = {column: list(values.get(column, [])) for column, kind in self.schema.items()
+                           if kind == "dict"}
+        self.codes = {column: {value: i for i, value in enumerate(values)}
+                      for column, values in self.dictionary.items()}
+        self._reset()
+        self.segments = []
+        for day in sorted(os.listdir(self.path)):
+            folder = os.path.join(self.path, day)
+            if os.path.isdir(folder):
+                self.segments += [Segment(os.path.join(folder, s)) for s in sorted(os.listdir(folder))
+                                  if s.startswith("seg-")]
+
+    def __len__(self):
+        return sum(s.rows for s in self.segments) + len(self.buffer["ts"])
+
+    def code(self, column, value):
+        value = "" if value is None else str(value)
+        codes = self.codes[column]
+        code = codes.get(value)
+        if code is None:
+            if len(codes) > np.iinfo(CODE).max:
+                raise ValueError(f"{self.name}.{column}: more than {np.iinfo(CODE).max + 1} distinct values")
+            code = codes[value] = len(codes)
+            self.dictionary[column].append(value)
+        return code
+
+    def _converter(self, column, kind):
+        if kind == "dict":
+            codes = self.codes[column]
+
+            def convert(value):
+                code = codes.get(value)
+                return self.code(column, value) if code is None else code
+            return convert
+        if kind == "u1":
+            return lambda value: 1 if value is True or value in (1, "true", "ON") else 0
+        if kind == "<i8":
+            return lambda value: int(_number(value, -1))
+        return _number
+
+    def _reset(self):
+        self.buffer = {column: [] for column in self.schema}
+        # (payload key, converter, list.append) of every column but ts and room
+        self._writers = [(PAYLOAD_KEYS.get(column, column), self._converter(column, kind), self.buffer[column].append)
+                         for column, kind in self.schema.items() if column not in ("ts", "room")]
+
+    def append(self, ts, row, room=None):
+        """Buffer one payload; ``room`` overrides the payload's own."""
+        self.buffer["ts"].append(ts)
+        self.buffer["room"].append(self.code("room", row.get("room") if room is None else room))
+        for key, convert, add in self._writers:
+            add(convert(row.get(key)))
+
+    def flush(self):
+        """Write the buffered rows as one segment per UTC day."""
+        if not self.buffer["ts"]:
+            return 0
+        self._write_dictionary()
+        columns = {column: np.asarray(values, CODE if kind == "dict" else kind)
+                   for (column, kind), values in zip(self.schema.items(), self.buffer.values())}
+        order = np.argsort(columns["ts"], kind="stable")
+        columns = {column: values[order] for column, values in columns.items()}
+        days = np.floor(columns["ts"] / 86400).astype(np.int64)
+        cuts = np.flatnonzero(np.diff(days)) + 1
+        for lo, hi in zip(np.r_[0, cuts], np.r_[cuts, len(days)]):
+            self._write_segment({column: values[lo:hi] for column, values in columns.items()})
+        self._reset()
+        return len(order)
+
+    def _write_dictionary(self):
+        path = os.path.join(self.path, "dictionary.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.dictionary, f)
+        os.replace(path + ".tmp", path)
+
+    def _write_segment(self, columns):
+        ts = columns["ts"]
+        day = datetime.datetime.fromtimestamp(float(ts[0]), datetime.timezone.utc).strftime("%Y-%m-%d")
+        folder = os.path.join(self.path, day)
+        os.makedirs(folder, exist_ok=True)
+        number = 1 + sum(name.startswith("seg-") for name in os.listdir(folder))
+        path = os.path.join(folder, f"seg-{number:06d}")
+        tmp = os.path.join(folder, f".tmp-{number:06d}-{os.getpid()}")
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for column, values in columns.items():
+            np.save(os.path.join(tmp, column + ".npy"), values)
+        meta = {"rows": len(ts), "start": float(ts[0]), "end": float(ts[-1]),
+                "index": ts[::INDEX_STRIDE].tolist()}
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        os.rename(tmp, path)
+        self.segments.append(Segment(path))
+
+    def matcher(self, column, value):
+        """Boolean mask function for one ``where`` entry."""
+        if self.schema[column] != "dict":
+            if callable(value):
+                return value
+            if isinstance(value, (list, tuple, set, frozenset)):
+                return lambda values: np.isin(values, list(value))
+            return lambda values: values == value
+        if callable(value):
+            test = value
+        elif isinstance(value, str):
+            test = lambda s: fnmatch.fnmatchcase(s, value)  # noqa: E731
+        else:
+            wanted = {str(v) for v in value}
+            test = wanted.__contains__
+        matching = np.zeros(max(len(self.dictionary[column]), 1), bool)
+        matching[[i for i, s in enumerate(self.dictionary[column]) if test(s)]] = True
+        return lambda codes: matching[codes]
+
+    def chunks(self, start=None, end=None, columns=None, where=None):
+        """{column: array} per segment overlapping ``[start, end)``, rows matching ``where`` only.
+
+        Unfiltered chunks are views of the memory-mapped columns.
+        """
+        columns = list(self.schema) if columns is None else list(columns)
+        where = where or {}
+        needed = list(dict.fromkeys(columns + list(where)))
+        tests = {column: self.matcher(column, value) for column, value in where.items()}
+        for segment in self.segments:
+            if (end is not None and segment.start >= end) or (start is not None and segment.end < start):
+                continue
+            lo, hi = segment.bounds(start, end)
+            if lo >= hi:
+                continue
+            chunk = {column: segment.column(column)[lo:hi] for column in needed}
+            if tests:
+                mask = np.ones(hi - lo, bool)
+                for column, test in tests.items():
+                    mask &= test(chunk[column])
+                chunk = {column: chunk[column][mask] for column in columns}
+            yield chunk
+
+    def scan(self, start=None, end=None, columns=None, where=None):
+        """{column: array} of the flushed rows with ``start <= ts < end`` matching ``where``, by time."""
+        columns = list(self.schema) if columns is None else list(columns)
+        needed = list(dict.fromkeys(["ts"] + columns))
+        parts = list(self.chunks(start, end, needed, where))
+        out = {column: (np.concatenate([part[column] for part in parts]) if parts else
+                        np.empty(0, CODE if self.schema[column] == "dict" else self.schema[column]))
+               for column in needed}
+        ts = out["ts"]
+        if len(ts) > 1 and (ts[1:] < ts[:-1]).any():  # late segments overlap earlier ones
+            order = np.argsort(ts, kind="stable")
+            out = {column: values[order] for column, values in out.items()}
+        return {column: out[column] for column in columns}
+
+    def decode(self, column, codes):
+        """Strings of dictionary codes, as an object array."""
+        return np.array(self.dictionary[column] + [None], dtype=object)[np.asarray(codes, np.int64)]
+
+
+class Store:
+    """The monitor and commands tables under ``root``; use as a context manager to flush on exit."""
+
+    def __init__(self, root, segment_rows=SEGMENT_ROWS):
+        self.root = root
+        self.segment_rows = segment_rows
+        self.tables = {name: Table(root, name) for name in SCHEMAS}
+        self.last_ts = None
+        self.skipped = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+    def __getitem__(self, name):
+        return self.tables[name]
+
+    def append(self, table, payload, ts=None, room=None):
+        """Add one payload (dict, JSON bytes or str) to ``table``; ``ts`` defaults to now."""
+        if not isinstance(payload, dict):
+            payload = json.loads(payload)
+        target = self.tables[table]
+        target.append(time.time() if ts is None else ts, payload, room)
+        if len(target.buffer["ts"]) >= self.segment_rows:
+            target.flush()
+
+    def append_message(self, topic, payload, ts=None):
+        """Add a message received on ``topic``; False for topics this store does not keep."""
+        table = TOPICS.get(topic)
+        if table is None:
+            return False
+        self.append(table, payload, ts)
+        return True
+
+    def ingest(self, lines):
+        """Add archived JSON lines (bare payloads or ``topic``/``ts``/``room`` envelopes); returns rows added.
+
+        A line without a timestamp takes the last one seen before it; a
+        payload's own ``timestamp`` counts only when it is an epoch time,
+        not the ESP32's ``millis()``.
+        """
+        added = 0
+        for line in lines:
+            record = parse_record(line)
+            if record is None:
+                self.skipped += 1
+                continue
+            payload = payload_of(record)
+            table = TOPICS.get(record.get("topic")) if "topic" in record else None
+            if payload is None or (table or table_of(payload)) is None:
+                self.skipped += 1
+                continue
+            self.last_ts = timestamp_of(record, payload, self.last_ts)
+            self.append(table or table_of(payload), payload, self.last_ts if self.last_ts is not None else 0.0,
+                        record.get("room", payload.get("room")))
+            added += 1
+        return added
+
+    def flush(self):
+        return sum(table.flush() for table in self.tables.values())
+
+    def scan(self, table, start=None, end=None, columns=None, **where):
+        """Rows of ``table`` in ``[start, end)`` matching ``where``; see ``Table.scan``."""
+        return self.tables[table].scan(start, end, columns, where)
+
+    def aggregate(self, table, column, by="room", start=None, end=None, **where):
+        """Count, sum, min, max and mean of ``column`` per value of ``by``, NaNs left out.
+
+        Reduced a segment at a time, straight from the mapped columns.
+        """
+        target = self.tables[table]
+        size = len(target.dictionary[by]) if target.schema[by] == "dict" else 0
+        count, total = np.zeros(size, np.int64), np.zeros(size)
+        low, high = np.full(size, np.inf), np.full(size, -np.inf)
+        for chunk in target.chunks(start, end, [by, column], where):
+            # ufunc.at takes its fast path on native index and value types only
+            groups, values = chunk[by].astype(np.intp), chunk[column].astype(np.float64)
+            known = ~np.isnan(values)
+            if not known.all():
+                groups, values = groups[known], values[known]
+            if target.schema[by] != "dict" and len(groups) and groups.max() >= size:
+                grow = int(groups.max()) + 1 - size
+                count, total = np.r_[count, np.zeros(grow, np.int64)], np.r_[total, np.zeros(grow)]
+                low, high = np.r_[low, np.full(grow, np.inf)], np.r_[high, np.full(grow, -np.inf)]
+                size += grow
+            count += np.bincount(groups, minlength=size)
+            total += np.bincount(groups, values, minlength=size)
+            np.minimum.at(low, groups, values)
+            np.maximum.at(high, groups, values)
+        present = np.flatnonzero(count)
+        names = target.dictionary[by] if target.schema[by] == "dict" else range(size)
+        keys = [names[i] for i in present]
+        return Aggregate(dict(zip(keys, count[present].tolist())), dict(zip(keys, total[present].tolist())),
+                         dict(zip(keys, low[present].tolist())), dict(zip(keys, high[present].tolist())),
+                         dict(zip(keys, (total[present] / count[present]).tolist())))
+
+    def windows(self, start=None, end=None, status="CRITICAL*", table="monitor", column="status", **where):
+        """Spells of consecutive rows whose ``column`` matches ``status``, among the rows matching ``where``."""
+        target = self.tables[table]
+        rows = target.scan(start, end, ["ts", column], where)
+        hit = target.matcher(column, status)(rows[column])
+        ts = rows["ts"]
+        edges = np.diff(np.r_[0, hit.view(np.int8), 0])
+        first, after = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+        ends = np.where(after < len(ts), ts[np.minimum(after, len(ts) - 1)], ts[after - 1])
+        return [Window(float(a), float(b), int(n)) for a, b, n in zip(ts[first], ends, after - first)]
+
+
+async def record(store, host="127.0.0.1", port=1883, flush_every=60.0):
+    """Archive the live topics from a broker until cancelled, flushing every ``flush_every`` s."""
+    from corridor.mqtt import Client
+
+    def on_message(topic, payload):
+        try:
+            store.append_message(topic, payload)
+        except ValueError:
+            store.skipped += 1
+
+    client = await Client.connect(host, port, f"corridor-store-{os.getpid()}", on_message=on_message)
+    await client.subscribe(*TOPICS)
+    try:
+        while True:
+            await asyncio.sleep(flush_every)
+            store.flush()
+    finally:
+        store.flush()
+        await client.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m corridor.store", description=__doc__.split("\n")[0])
+    parser.add_argument("--root", default="telemetry-store", help="store directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest = commands.add_parser("ingest", help="add archived JSON-lines captures")
+    ingest.add_argument("captures", nargs="+")
+    live = commands.add_parser("record", help="archive the live topics from a broker")
+    live.add_argument("--host", default="127.0.0.1")
+    live.add_argument("--port", type=int, default=1883)
+    spells = commands.add_parser("windows", help="print the spells of a status")
+    spells.add_argument("--status", default="CRITICAL*", help="status pattern (fnmatch)")
+    spells.add_argument("--room")
+    spells.add_argument("--since", help="start, ISO 8601 or epoch seconds")
+    spells.add_argument("--until", help="end, ISO 8601 or epoch seconds")
+    args = parser.parse_args(argv)
+
+    with Store(args.root) as store:
+        if args.command == "ingest":
+            for capture in args.captures:
+                with open(capture, "rb") as f:
+                    added = store.ingest(f)
+                print(f"{capture}: {added:,} rows ({store.skipped:,} lines skipped so far)")
+        elif args.command == "record":
+            try:
+                asyncio.run(record(store, args.host, args.port))
+            except KeyboardInterrupt:
+                pass
+        else:
+            where = {} if args.room is None else {"room": args.room}
+            start = parse_time(args.since) if args.since else None
+            end = parse_time(args.until) if args.until else None
+            for window in store.windows(start, end, args.status, **where):
+                since = datetime.datetime.fromtimestamp(window.start, datetime.timezone.utc).isoformat()
+                print(f"{since}  {window.end - window.start:9.1f} s  {window.rows:7,} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+"""Latency of the sensor -> decision -> command loop, traced from captured MQTT traffic.
+
+The simulation publishes ``smart-corridor/sensors`` stamped with
+``Date.now()``.  The ESP32 picks the latest reading up at the top of its
+``loop()``, which runs about once a second (``delay(1000)``).  When the
+status changes it publishes ``smart-corridor/commands`` stamped with
+``millis()``, and it publishes ``smart-corridor/monitor`` (no stamp) on
+every pass.  A capture records each message with the time it was received;
+its lines are read with ``corridor.capture``, as ``corridor.store`` and
+``slides.telemetry`` read them.
+
+``Tracer`` follows the loop one message at a time, in bounded memory.  A
+monitor payload reflects the sensor reading consumed in its pass: the
+temperature is the simulation's, and every other value is at least the
+simulation's (``fuse`` in ``corridor.controller``).  The newest pending
+reading consistent with a monitor is matched to it, and older ones count
+as superseded.  Commands are published before the monitor of the same
+pass, so they are held until that monitor arrives and then charged to its
+reading.  Commands from a pass with no new reading came from the local
+sensors.
+
+The simulation's and the ESP32's clocks are put on the capture's clock by
+``ClockOffset``, a running lower envelope of (received - stamped).  This
+assumes the fastest message of a window had no delay, so the ``publish``
+hop and the split of ``round_trip`` into ``decision`` + ``command`` are
+relative to the fastest message seen.  Hops, all in the capture's clock:
+
+    publish     sensor stamped  -> sensor received
+    monitor     sensor received -> first monitor reflecting it received
+    decision    sensor received -> ESP32 decision (commands' millis())
+    command     ESP32 decision  -> command received
+    round_trip  sensor received -> command received
+    end_to_end  sensor stamped  -> command received
+
+Latencies go into ``Histogram``s, log-linear like HdrHistogram, per hop
+and per alert level of the monitor status.
+"""
+import argparse
+import collections
+import json
+import math
+
+import numpy as np
+
+from corridor.capture import parse_record, parse_time, payload_of, timestamp_of
+from corridor.store import table_of
+
+HOPS = ("publish", "monitor", "decision", "command", "round_trip", "end_to_end")
+LEVELS = ("SAFE", "WARNING", "DANGER", "CRITICAL")
+TOPICS = {"smart-corridor/sensors": "sensors", "smart-corridor/monitor": "monitor",
+          "smart-corridor/commands": "commands"}
+PERCENTILES = (50, 90, 99, 99.9)
+PENDING = 256  # sensor readings awaiting a monitor
+# The deck's claims: slide "conclusion" (<100ms Safety Response) and
+# "testing" (MQTT Round-Trip (<500ms)), in seconds
+CLAIMS = (("Safety response", "decision", 0.1), ("MQTT round trip", "round_trip", 0.5))
+
+# recv, sent: capture-clock seconds (sent None without a stamp); values: (temp, smoke, co2, pm25)
+Reading = collections.namedtuple("Reading", "recv sent values")
+
+
+class Histogram:
+    """Counts of non-negative integer values in log-linear buckets (HdrHistogram's layout).
+
+    Values below ``2 * half`` are counted exactly; above, each power of two
+    is split into ``half`` buckets, so a bucket is at most ``1 / half`` of
+    its value wide.  ``digits`` significant decimal digits choose ``half``.
+    ``add`` buffers single values; ``record`` counts arrays at once.
+    """
+
+    def __init__(self, digits=2, highest=1 << 40):
+        self.sub_bits = max(1, math.ceil(math.log2(2 * 10 ** digits)))
+        self.half = 1 << (self.sub_bits - 1)
+        self.highest = highest
+        self.counts = np.zeros(self.index(highest) + 1, np.int64)
+        self.total = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+        self._pending = []
+
+    def index(self, values):
+        """Bucket of each value (clipped to ``highest``)."""
+        values = np.minimum(np.asarray(values, np.int64), self.highest)
+        shift = np.maximum(np.frexp(values.astype(np.float64))[1] - self.sub_bits, 0)
+        return (values >> shift) + shift * self.half
+
+    def lower(self, index):
+        """Smallest value of each bucket."""
+        index = np.asarray(index, np.int64)
+        shift = np.maximum(index // self.half - 1, 0)
+        return (index - shift * self.half) << shift
+
+    def add(self, value):
+        self._pending.append(value)
+        if len(self._pending) >= 4096:
+            self._drain()
+
+    def _drain(self):
+        if self._pending:
+            pending, self._pending = self._pending, []
+            self.record(pending)
+
+    def record(self, values):
+        values = np.asarray(values, np.int64).ravel()
+        if not len(values):
+            return
+        self.counts += np.bincount(self.index(values), minlength=len(self.counts))
+        self.total += len(values)
+        self.sum += int(values.sum())
+        low, high = int(values.min()), int(values.max())
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+    def merge(self, other):
+        other._drain()
+        self._drain()
+        self.counts += other.counts
+        self.total += other.total
+        self.sum += other.sum
+        for name, pick in (("min", min), ("max", max)):
+            theirs = getattr(other, name)
+            if theirs is not None:
+                mine = getattr(self, name)
+                setattr(self, name, theirs if mine is None else pick(mine, theirs))
+        return self
+
+    @property
+    def count(self):
+        self._drain()
+        return self.total
+
+    def percentile(self, q):
+        """Upper edge of the bucket holding the ``q``-th percentile (nearest rank), capped at ``max``."""
+        self._drain()
+        if not self.total:
+            return None
+        rank = max(1, math.ceil(q / 100 * self.total))
+        bucket = int(np.searchsorted(np.cumsum(self.counts), rank))
+        return min(int(self.lower(bucket + 1)) - 1, self.max)
+
+    def cdf(self):
+        """(bucket upper edges, cumulative fraction) of the non-empty buckets."""
+        self._drain()
+        filled = np.flatnonzero(self.counts)
+        return np.minimum(self.lower(filled + 1) - 1, self.max), np.cumsum(self.counts[filled]) / self.total
+
+    def summary(self, scale=1.0):
+        """count, mean, min, max and ``PERCENTILES`` as a dict, values times ``scale``."""
+        self._drain()
+        if not self.total:
+            return {"count": 0}
+        out = {"count": self.total, "mean": self.sum / self.total * scale, "min": self.min * scale,
+               "max": self.max * scale}
+        out.update({f"p{q:g}": self.percentile(q) * scale for q in PERCENTILES})
+        return out
+
+    def to_dict(self):
+        """The non-empty buckets and totals, JSON-ready."""
+        self._drain()
+        filled = np.flatnonzero(self.counts)
+        return {"sub_bits": self.sub_bits, "highest": self.highest, "buckets": filled.tolist(),
+                "counts": self.counts[filled].tolist(), "sum": self.sum, "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(highest=data["highest"])
+        histogram.sub_bits = data["sub_bits"]
+        histogram.half = 1 << (histogram.sub_bits - 1)
+        histogram.counts = np.zeros(histogram.index(histogram.highest) + 1, np.int64)
+        histogram.counts[data["buckets"]] = data["counts"]
+        histogram.total = int(histogram.counts.sum())
+        histogram.sum, histogram.min, histogram.max = data["sum"], data["min"], data["max"]
+        return histogram
+
+
+class ClockOffset:
+    """Offset from a sender's clock to the capture's: the lower envelope of received - stamped.
+
+    The minimum is kept per ``window`` seconds of capture time and the
+    estimate is the lower of the current and previous window's, so slow
+    drift is followed.  A delta more than ``step`` above the estimate is
+    a clock reset (an ESP32 reboot restarts ``millis()``), so estimation
+    starts over.
+    """
+
+    def __init__(self, window=300.0, step=5.0):
+        self.window = window
+        self.step = step
+        self.resets = 0
+        self._start = None
+        self._current = self._previous = math.inf
+
+    def update(self, recv, stamp):
+        """Feed one message; returns the offset to add to ``stamp``."""
+        delta = recv - stamp
+        if self._start is None or recv - self._start >= self.window:
+            self._start, self._previous, self._current = recv, self._current, math.inf
+        estimate = min(self._current, self._previous)
+        if delta > estimate + self.step:
+            self.resets += 1
+            self._previous = self._current = math.inf
+        self._current = min(self._current, delta)
+        return min(self._current, self._previous)
+
+    @property
+    def offset(self):
+        value = min(self._current, self._previous)
+        return None if value == math.inf else value
+
+
+def level_of(status):
+    """SAFE, WARNING, DANGER or CRITICAL for a monitor status such as "CRITICAL: SMOKE DETECTED"."""
+    head = str(status).split(":", 1)[0].strip().upper()
+    return head if head in LEVELS else "SAFE"
+
+
+def _values(payload, defaults=(22, 0, 400, 15)):
+    out = []
+    for key, default in zip(("temp", "smoke", "co2", "pm25"), defaults):
+        try:
+            out.append(int(float(payload.get(key, default))))
+        except (TypeError, ValueError):
+            out.append(default)
+    return tuple(out)
+
+
+class Tracer:
+    """Streaming correlation of sensor, monitor and command messages; see the module docstring."""
+
+    def __init__(self, digits=2, window=300.0):
+        self.hops = {hop: Histogram(digits) for hop in HOPS}
+        self.levels = {(hop, level): Histogram(digits) for hop in HOPS for level in LEVELS}
+        self.sim_clock = ClockOffset(window)
+        self.device_clock = ClockOffset(window)
+        self.counts = collections.Counter()
+        self.pending = collections.deque()
+        self.burst = []
+        self.last_ts = None  # capture time of the last line, for lines without one
+
+    def _add(self, hop, level, seconds):
+        micros = round(seconds * 1e6)
+        if micros < 0:
+            self.counts["negative " + hop] += 1
+            micros = 0
+        self.hops[hop].add(micros)
+        if level is not None:
+            self.levels[hop, level].add(micros)
+
+    def feed(self, kind, recv, payload):
+        """One message of ``kind`` ("sensors", "monitor" or "commands") received at ``recv`` s."""
+        self.counts[kind] += 1
+        if kind == "sensors":
+            sent = None
+            if payload.get("timestamp") is not None:
+                stamp = parse_time(payload["timestamp"])
+                sent = stamp + self.sim_clock.update(recv, stamp)
+                self._add("publish", None, recv - sent)
+            if len(self.pending) >= PENDING:
+                self.pending.popleft()
+                self.counts["dropped"] += 1
+            self.pending.append(Reading(recv, sent, _values(payload)))
+        elif kind == "commands":
+            device = payload.get("timestamp")
+            decided = None
+            if isinstance(device, (int, float)):
+                decided = device / 1000.0 + self.device_clock.update(recv, device / 1000.0)
+            self.burst.append((recv, decided))
+        elif kind == "monitor":
+            self._monitor(recv, payload)
+
+    def _monitor(self, recv, payload):
+        temp, *rest = _values(payload)
+        reading = None
+        for i in range(len(self.pending) - 1, -1, -1):
+            candidate = self.pending[i]
+            if candidate.values[0] == temp and all(m >= s for m, s in zip(rest, candidate.values[1:])):
+                reading = candidate
+                self.counts["superseded"] += i
+                for _ in range(i + 1):
+                    self.pending.popleft()
+                break
+        level = level_of(payload.get("status"))
+        if reading is not None:
+            self.counts["matched"] += 1
+            self._add("monitor", level, recv - reading.recv)
+        if not self.burst:
+            return
+        if reading is None:
+            self.counts["local commands"] += len(self.burst)
+        else:
+            self.counts["decisions"] += 1
+            first, decided = self.burst[0]
+            self._add("round_trip", level, first - reading.recv)
+            if decided is not None:
+                self._add("decision", level, decided - reading.recv)
+                self._add("command", level, first - decided)
+            if reading.sent is not None:
+                self._add("end_to_end", level, first - reading.sent)
+        self.burst = []
+
+    def feed_line(self, line):
+        """One capture line (a bare payload or a topic/ts envelope); False if it was not traced.
+
+        Lines are timed as ``corridor.capture`` reads them: the envelope's
+        ``ts``, the payload's epoch ``timestamp``, or the last time seen.
+        """
+        record = parse_record(line)
+        payload = payload_of(record) if record is not None else None
+        if payload is None:
+            self.counts["skipped"] += 1
+            return False
+        self.last_ts = timestamp_of(record, payload, self.last_ts)
+        kind = TOPICS.get(record.get("topic")) or _kind(payload)
+        if kind is None or self.last_ts is None:
+            self.counts["skipped"] += 1
+            return False
+        self.feed(kind, self.last_ts, payload)
+        return True
+
+    def report(self):
+        """Counts, clock offsets, per-hop and per-level summaries (ms), claims and histograms."""
+        ms = 1e-3
+        hops = {hop: histogram.summary(ms) for hop, histogram in self.hops.items()}
+        levels = {level: {hop: self.levels[hop, level].summary(ms) for hop in HOPS
+                          if self.levels[hop, level].count}
+                  for level in LEVELS}
+        claims = []
+        for label, hop, limit in CLAIMS:
+            p99 = hops[hop].get("p99")
+            claims.append({"claim": label, "hop": hop, "limit_ms": limit * 1e3, "p99_ms": p99,
+                           "met": None if p99 is None else p99 < limit * 1e3})
+        return {"counts": dict(self.counts),
+                "clock_offsets": {"simulation": self.sim_clock.offset, "device": self.device_clock.offset,
+                                  "device_resets": self.device_clock.resets},
+                "hops": hops, "levels": {level: value for level, value in levels.items() if value},
+                "claims": claims,
+                "histograms": {hop: histogram.to_dict() for hop, histogram in self.hops.items()}}
+
+
+def _kind(payload):
+    table = table_of(payload)
+    if table is not None:
+        return table
+    return "sensors" if "timestamp" in payload and ("smoke" in payload or "temp" in payload) else None
+
+
+def trace(lines, tracer=None):
+    """Feed every capture line to ``tracer`` (a new one by default) and return it."""
+    tracer = Tracer() if tracer is None else tracer
+    for line in lines:
+        tracer.feed_line(line)
+    return tracer
+
+
+def format_report(report):
+    """Plain-text table of a ``Tracer.report()``."""
+    lines = [f"{'hop':12} {'count':>9} {'p50':>9} {'p90':>9} {'p99':>9} {'p99.9':>9} {'max':>9}  ms"]
+    for hop, summary in report["hops"].items():
+        if summary["count"]:
+            lines.append(f"{hop:12} {summary['count']:9,} " + " ".join(
+                f"{summary[key]:9.1f}" for key in ("p50", "p90", "p99", "p99.9", "max")))
+    for level, hops in report["levels"].items():
+        cells = ", ".join(f"{hop} p99 {summary['p99']:.1f}" for hop, summary in hops.items())
+        lines.append(f"  {level:9} {cells}")
+    offsets = report["clock_offsets"]
+    for name in ("simulation", "device"):
+        if offsets[name] is not None:
+            lines.append(f"clock offset, {name}: {offsets[name]:+.3f} s")
+    for claim in report["claims"]:
+        verdict = {True: "met", False: "NOT met", None: "no data"}[claim["met"]]
+        p99 = "-" if claim["p99_ms"] is None else f"{claim['p99_ms']:.1f} ms"
+        lines.append(f"{claim['claim']} (<{claim['limit_ms']:g} ms, {claim['hop']} p99 {p99}): {verdict}")
+    counts = report["counts"]
+    lines.append(", ".join(f"{key} {value:,}" for key, value in sorted(counts.items())))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m corridor.tracing", description=__doc__.split("\n")[0])
+    parser.add_argument("capture", help="JSON-lines capture of the sensors, monitor and commands topics")
+    parser.add_argument("--json", metavar="REPORT", help="also write the report (with histograms) here")
+    args = parser.parse_args(argv)
+    with open(args.capture, "rb") as f:
+        report = trace(f).report()
+    print(format_report(report))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
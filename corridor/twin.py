@@ -0,0 +1,362 @@
+"""Digital twin of many buildings, sharded over processes in shared memory.
+
+``SimulationProvider`` keeps one house in React ``useState`` hooks.  Here
+the hazards, ``smokeLevel``, burning clock, vents and readings of every
+building are struct-of-arrays: one NumPy array per field, rows are
+buildings, all laid out in one ``multiprocessing.shared_memory`` block
+(``State``).  Each worker process attaches to it and owns a contiguous
+slice of buildings (``Shard``), so nothing is copied between processes
+and the coordinator reads metrics straight from the block.
+
+Shards tick ``rate`` times a second on a common schedule.  A building
+takes its once-a-second step (the smoke decay and 10 s burning expiry of
+``corridor.sensors.simulate``) on the ticks whose number matches it modulo
+``rate``, so a tenth of the buildings step on each tick at 10 Hz.  Only
+buildings that stepped or changed get their readings recomputed with
+``room_sensors``, and only rooms whose readings differ from the last ones
+published go out on ``smart-corridor/sensors``, one message per room with
+its ``building`` and ``room``.  ``ACTIVATE_VENT`` / ``DEACTIVATE_VENT``
+commands carrying a ``building`` are applied the way the twin applies
+them.  A shard that falls behind runs the missed ticks back to back and
+counts them as late.
+
+Per shard, the block also holds counters (ticks, late ticks, rooms and
+bytes published, commands) and a log-linear histogram of tick durations
+(``corridor.tracing.Histogram``'s buckets), which ``metrics`` merges.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from corridor.sensors import (
+    BURN_CLEAR_SECONDS, METRICS, NATURAL_DECAY, ROOMS, STATUS, VENT_LEVELS, Hazards, aggregate_status, random_hazards,
+    room_sensors, vent_decay,
+)
+from corridor.tracing import Histogram
+
+RATE = 10  # ticks per second
+TOPIC_SENSORS = "smart-corridor/sensors"
+TOPIC_COMMANDS = "smart-corridor/commands"
+
+# name: (dtype, shape per building)
+FIELDS = {
+    "burners": (np.int32, ()),
+    "burning": (np.int32, ()),
+    "stove": (np.bool_, ()),
+    "fridge": (np.bool_, ()),
+    "tv_living": (np.bool_, ()),
+    "tv_master": (np.bool_, ()),
+    "chimney": (np.bool_, ()),
+    "emergency": (np.bool_, ()),
+    "smoke_level": (np.float64, ()),
+    "burn_seconds": (np.uint16, ()),  # seconds since the burning items started
+    "heater_on": (np.bool_, (len(ROOMS),)),
+    "heater_level": (np.int32, (len(ROOMS),)),
+    "heater_overloaded": (np.bool_, (len(ROOMS),)),
+    "vents": (np.uint8, (len(ROOMS),)),  # VENT_LEVELS codes
+    "sensors": (np.int16, (len(ROOMS), len(METRICS))),
+    "published": (np.int16, (len(ROOMS), len(METRICS))),  # -1 until first published
+}
+COUNTERS = ("ticks", "late", "rooms", "bytes", "commands", "busy_us", "max_us")
+# Tick durations in microseconds, up to 100 s
+TICK_HISTOGRAM = Histogram(highest=100_000_000)
+
+
+class State:
+    """The twin's arrays for ``buildings`` buildings and ``shards`` shards, over one shared-memory block.
+
+    Without ``name`` the block is created (and ``unlink`` frees it);
+    with one, an existing block is attached.
+    """
+
+    def __init__(self, buildings, shards=1, name=None):
+        self.buildings, self.shards = buildings, shards
+        buckets = len(TICK_HISTOGRAM.counts)
+        layout = [(field, dtype, (buildings, *shape)) for field, (dtype, shape) in FIELDS.items()]
+        # control: start time (epoch s), stop flag
+        layout += [("counters", np.int64, (shards, len(COUNTERS))), ("tick_counts", np.int64, (shards, buckets)),
+                   ("control", np.float64, (2,))]
+        offsets, size = [], 0
+        for _, dtype, shape in layout:
+            size = -(-size // 8) * 8
+            offsets.append(size)
+            size += int(np.prod(shape)) * np.dtype(dtype).itemsize
+        self.shm = shared_memory.SharedMemory(name=name, create=name is None, size=max(size, 1))
+        self.name = self.shm.name
+        self._fields = [field for field, _, _ in layout]
+        for (field, dtype, shape), offset in zip(layout, offsets):
+            setattr(self, field, np.ndarray(shape, dtype, buffer=self.shm.buf, offset=offset))
+        if name is None:
+            self.published.fill(-1)
+            self.heater_level.fill(1)
+
+    def hazards(self, rows):
+        """The ``Hazards`` of buildings ``rows``, ready for ``room_sensors``."""
+        return Hazards(**{field: getattr(self, field)[rows] for field in Hazards._fields})
+
+    def set_hazards(self, rows, hazards):
+        """Replace the hazards of buildings ``rows``; burning items restart their clock."""
+        for field, value in zip(Hazards._fields, hazards):
+            getattr(self, field)[rows] = value
+        self.burn_seconds[rows] = 0
+
+    def close(self):
+        for field in self._fields:
+            delattr(self, field)
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+class Shard:
+    """Buildings ``lo:hi`` of a ``State``, ticked ``rate`` times a second.
+
+    ``churn`` is the chance per building and second of new random hazards
+    (a synthetic portfolio; 0 leaves the hazards to whoever sets them).
+    """
+
+    def __init__(self, state, index=0, lo=0, hi=None, rate=RATE, churn=0.0, seed=0):
+        self.state, self.index = state, index
+        self.lo, self.hi = lo, state.buildings if hi is None else hi
+        self.rate, self.churn = rate, churn
+        self.rng = np.random.default_rng([seed, index])
+        self.counters = state.counters[index]
+        self.tick_counts = state.tick_counts[index]
+        # Buildings to recompute on the next tick besides the ones stepping; all of them at first
+        self.dirty = np.ones(self.hi - self.lo, bool)
+
+    def due(self, tick):
+        """Buildings taking their one-second step on ``tick``."""
+        return np.arange(self.lo + (tick - self.lo) % self.rate, self.hi, self.rate)
+
+    def step(self, rows):
+        """One second of ``simulate`` for buildings ``rows``."""
+        s = self.state
+        vents = s.vents[rows]
+        vented = (vents > 0).any(axis=1)
+        level = s.smoke_level[rows]
+        level = np.where(vented, level * (1 - vent_decay(vents)), level * NATURAL_DECAY)
+        s.smoke_level[rows] = np.where(level < np.where(vented, 1.0, 0.5), 0.0, level)
+        seconds = np.minimum(s.burn_seconds[rows].astype(np.int32) + 1, np.iinfo(np.uint16).max)
+        s.burn_seconds[rows] = seconds
+        s.burning[rows] = np.where(vented & (seconds >= BURN_CLEAR_SECONDS), 0, s.burning[rows])
+
+    def tick(self, tick):
+        """Advance to ``tick``; (buildings, rooms, readings (n, metrics)) of the rooms that changed."""
+        s = self.state
+        if self.churn:
+            count = self.rng.binomial(self.hi - self.lo, min(self.churn / self.rate, 1.0))
+            if count:
+                rows = self.lo + self.rng.choice(self.hi - self.lo, count, replace=False)
+                s.set_hazards(rows, random_hazards(count, self.rng))
+                self.dirty[rows - self.lo] = True
+        due = self.due(tick)
+        self.step(due)
+        self.dirty[due - self.lo] = True
+        rows = self.lo + np.flatnonzero(self.dirty)
+        self.dirty[:] = False
+
+        sensors = room_sensors(s.hazards(rows))
+        readings = np.stack([sensors[metric][..., 0] for metric in METRICS], axis=-1)
+        s.sensors[rows] = readings
+        changed = (readings != s.published[rows]).any(axis=-1)
+        s.published[rows] = readings
+        buildings, rooms = np.nonzero(changed)
+        return rows[buildings], rooms, readings[buildings, rooms]
+
+    def apply(self, command):
+        """Apply a command of ``smart-corridor/commands`` if it is for one of this shard's buildings."""
+        building, room = command.get("building"), command.get("room")
+        if not isinstance(building, int) or not self.lo <= building < self.hi or room not in ROOMS:
+            return False
+        room = ROOMS.index(room)
+        action = command.get("action")
+        if action == "ACTIVATE_VENT":
+            level = command.get("level") or "HIGH"
+            if level not in VENT_LEVELS:
+                return False
+            self.state.vents[building, room] = VENT_LEVELS.index(level)
+        elif action == "DEACTIVATE_VENT":
+            # The twin keeps the vent running until the smoke has cleared
+            if self.state.smoke_level[building] > 0:
+                return False
+            self.state.vents[building, room] = 0
+        else:
+            return False
+        self.counters[COUNTERS.index("commands")] += 1
+        return True
+
+    def record(self, seconds, late, rooms, size):
+        """Count one tick that took ``seconds``."""
+        us = int(seconds * 1e6)
+        counters = self.counters
+        counters[0] += 1
+        counters[1] += late
+        counters[2] += rooms
+        counters[3] += size
+        counters[5] += us
+        counters[6] = max(counters[6], us)
+        self.tick_counts[int(TICK_HISTOGRAM.index(us))] += 1
+
+
+def payloads(buildings, rooms, readings, now_ms):
+    """The ``smart-corridor/sensors`` message of each changed room."""
+    # Each room on its own: (rooms, 1 room, 1 timestep)
+    status = aggregate_status({metric: readings[:, i].reshape(-1, 1, 1) for i, metric in enumerate(METRICS)})[:, 0]
+    return [f'{{"building":{b},"room":"{ROOMS[r]}","smoke":{smoke},"co2":{co2},"pm25":{pm25},"temp":{temp},'
+            f'"status":"{STATUS[level]}","timestamp":{now_ms}}}'
+            for b, r, (smoke, co2, pm25, temp), level in
+            zip(buildings.tolist(), rooms.tolist(), readings.tolist(), status.tolist())]
+
+
+async def serve(shard, host=None, port=1883):
+    """Tick ``shard`` on the state's schedule until its stop flag is set; publish to a broker if ``host``."""
+    state, client = shard.state, None
+    if host:
+        from corridor.mqtt import Client
+
+        def on_message(topic, payload):
+            try:
+                command = json.loads(payload)
+            except ValueError:
+                return
+            if isinstance(command, dict):
+                shard.apply(command)
+
+        client = await Client.connect(host, port, f"corridor-twin-{shard.index}-{os.getpid()}", on_message=on_message)
+        await client.subscribe(TOPIC_COMMANDS)
+    period = 1.0 / shard.rate
+    tick = 1
+    try:
+        while not state.control[1]:
+            scheduled = state.control[0] + tick * period
+            delay = scheduled - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif client is not None:
+                await asyncio.sleep(0)  # let commands in while catching up
+            start = time.perf_counter()
+            messages = payloads(*shard.tick(tick), int(scheduled * 1000))
+            if client is not None:
+                for message in messages:
+                    client.publish(TOPIC_SENSORS, message)
+                await client.drain()
+            shard.record(time.perf_counter() - start, delay < -period, len(messages), sum(map(len, messages)))
+            tick += 1
+    finally:
+        if client is not None:
+            await client.close()
+
+
+def _worker(name, buildings, shards, index, lo, hi, rate, churn, seed, host, port):
+    state = State(buildings, shards, name)
+    try:
+        asyncio.run(serve(Shard(state, index, lo, hi, rate, churn, seed), host, port))
+    finally:
+        state.close()
+
+
+def metrics(state, seconds=None):
+    """Ticks, late ticks, rooms and bytes published, commands, and tick duration percentiles (ms), over all shards.
+
+    With ``seconds``, the counts are per second as well.
+    """
+    counters = state.counters.copy()
+    totals = dict(zip(COUNTERS, counters.sum(axis=0).tolist()))
+    counts = state.tick_counts.sum(axis=0)
+    filled = np.flatnonzero(counts)
+    low = int(TICK_HISTOGRAM.lower(filled[0])) if len(filled) else None
+    histogram = Histogram.from_dict({"sub_bits": TICK_HISTOGRAM.sub_bits, "highest": TICK_HISTOGRAM.highest,
+                                     "buckets": filled.tolist(), "counts": counts[filled].tolist(),
+                                     "sum": totals["busy_us"], "min": low, "max": int(counters[:, 6].max())})
+    out = {"shards": state.shards, "buildings": state.buildings,
+           **{name: totals[name] for name in ("ticks", "late", "rooms", "bytes", "commands")},
+           "tick_ms": histogram.summary(scale=1e-3)}
+    if seconds:
+        out.update({f"{name}_per_s": totals[name] / seconds for name in ("ticks", "rooms", "bytes")})
+        # Share of each shard's time spent ticking
+        out["busy"] = totals["busy_us"] / 1e6 / seconds / state.shards
+    return out
+
+
+def format_metrics(m):
+    tick = m["tick_ms"]
+    if not tick["count"]:
+        return "no ticks yet"
+    line = (f"tick p50 {tick['p50']:.2f} ms p99 {tick['p99']:.2f} ms max {tick['max']:.1f} ms, "
+            f"{m['late']:,} late of {m['ticks']:,}")
+    if "ticks_per_s" in m:
+        line += (f"; {m['ticks_per_s'] / m['shards']:.1f} ticks/s per shard, {m['rooms_per_s']:,.0f} rooms/s "
+                 f"({m['bytes_per_s'] / 1e6:.2f} MB/s), {m['busy']:.0%} busy")
+    return line
+
+
+async def run(buildings, shards=None, rate=RATE, seconds=None, host=None, port=1883, churn=0.0, seed=0, report=None,
+              hazards=None):
+    """Run the twin for ``seconds`` (or until cancelled) on ``shards`` worker processes; the final ``metrics``.
+
+    The buildings start from ``hazards`` (``Hazards`` of arrays shaped
+    (buildings,) / (buildings, rooms)), or random ones.  ``report`` prints
+    ``format_metrics`` every that many seconds.
+    """
+    shards = max(1, min(shards or os.cpu_count() or 1, buildings))
+    state = State(buildings, shards)
+    try:
+        state.set_hazards(slice(None), random_hazards(buildings, np.random.default_rng(seed))
+                          if hazards is None else hazards)
+        state.control[0] = time.time() + 0.5  # time for the workers to start
+        edges = np.linspace(0, buildings, shards + 1).astype(int)
+        context = multiprocessing.get_context()
+        workers = [context.Process(target=_worker, daemon=True,
+                                   args=(state.name, buildings, shards, i, int(edges[i]), int(edges[i + 1]), rate,
+                                         churn, seed, host, port)) for i in range(shards)]
+        for worker in workers:
+            worker.start()
+        deadline = None if seconds is None else time.time() + seconds
+        try:
+            while deadline is None or time.time() < deadline:
+                wait = report or 1.0
+                await asyncio.sleep(max(0.0, wait if deadline is None else min(wait, deadline - time.time())))
+                if report:
+                    print(format_metrics(metrics(state, max(time.time() - state.control[0], 1e-9))), flush=True)
+        finally:
+            state.control[1] = 1
+            for worker in workers:
+                worker.join(5)
+                if worker.is_alive():
+                    worker.terminate()
+        return metrics(state, time.time() - state.control[0])
+    finally:
+        state.close()
+        state.unlink()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m corridor.twin", description=__doc__.split("\n")[0])
+    parser.add_argument("--buildings", type=int, default=10_000)
+    parser.add_argument("--shards", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--rate", type=int, default=RATE, help="ticks per second")
+    parser.add_argument("--seconds", type=float, help="stop after this long (default: run until interrupted)")
+    parser.add_argument("--churn", type=float, default=0.01, help="chance per building and second of new hazards")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--host", help="broker to publish to (default: tick without publishing)")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--report", type=float, default=5.0, help="print metrics every this many seconds")
+    args = parser.parse_args(argv)
+    try:
+        final = asyncio.run(run(args.buildings, args.shards, args.rate, args.seconds, args.host, args.port,
+                                args.churn, args.seed, args.report))
+    except KeyboardInterrupt:
+        return
+    print(json.dumps(final, indent=2))
+
+
+if __name__ == "__main__":
+    main()
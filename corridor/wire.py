@@ -0,0 +1,465 @@
+"""Compact binary encoding of the smart-corridor MQTT payloads, and a JSON bridge.
+
+The sketch builds its monitor payload by ``String`` concatenation every
+second, the simulation sends ``JSON.stringify`` output, and the ESP32 parses
+it into a ``StaticJsonDocument<256>``.  A frame carries the same fields in
+fixed-width little-endian integers, with strings of known vocabularies
+(``action``, ``level``, ``status``, ``source``, ``room``) as one-byte codes:
+
+    byte 0      VERSION << 4 | kind (0 sensors, 1 monitor, 2 commands)
+    byte 1      flags: DELTA, EXTRA
+    byte 2      sequence number of the frame in its kind, mod 256
+    byte 3      field mask: bit i set if field i of ``SCHEMAS[kind]`` follows
+    ...         the fields, in schema order
+    ...         escaped strings: u8 length + UTF-8, for each enum coded ESCAPE
+    ...         EXTRA: u16 length + compact JSON of every other key
+
+A key frame (no DELTA) holds each present field at its fixed width; with
+every field present the layout is fixed, e.g. a monitor frame is always 15
+bytes, at the offsets of ``describe()``.  A delta frame's mask holds the
+fields that changed since the previous frame of its kind, numbers as
+zigzag varints of the difference and codes as single bytes, so it decodes
+only after that frame (its sequence number minus one).  ``Encoder`` sends a
+key frame whenever the set of fields changes, and every ``keyframe`` frames
+so a receiver that joins late or misses a frame catches up.
+
+Nothing is lost: a value that does not fit its field (a float, a number out
+of range, a string longer than 255 bytes) and any key outside the schema
+travels in the EXTRA JSON, so ``decode(encode(p)) == p`` for any JSON object.
+Enum codes are append-only; changing the meaning of one needs a new VERSION.
+
+``bridge`` republishes every JSON topic on its binary twin under
+``smart-corridor/bin/`` and back, so JSON and binary clients can share a
+broker while the fleet moves over.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import struct
+
+from corridor.sensors import ROOMS
+
+VERSION = 1
+KINDS = ("sensors", "monitor", "commands")
+TOPICS = {"smart-corridor/sensors": "sensors", "smart-corridor/monitor": "monitor",
+          "smart-corridor/commands": "commands"}
+BINARY_TOPICS = {kind: "smart-corridor/bin/" + kind for kind in KINDS}
+# Field -> struct code; "enum" and "bool" are one byte
+TYPES = {"u2": "H", "i2": "h", "u4": "I", "u8": "Q", "bool": "B", "enum": "B"}
+# Field order is the wire order; fields may only be appended
+SCHEMAS = {
+    # JSON.stringify({...aggregatedSensors, timestamp: Date.now()}) in useRiscvCommunication.js
+    "sensors": (("smoke", "u2"), ("co2", "u2"), ("pm25", "u2"), ("temp", "i2"), ("status", "enum"),
+                ("timestamp", "u8")),
+    # The String sketch.ino publishes at the end of loop()
+    "monitor": (("pm25", "u2"), ("co2", "u2"), ("smoke", "u2"), ("temp", "i2"), ("ventilation", "bool"),
+                ("status", "enum"), ("source", "enum")),
+    # publishCommand(); timestamp is millis()
+    "commands": (("action", "enum"), ("room", "enum"), ("level", "enum"), ("alarm", "bool"), ("timestamp", "u4")),
+}
+# Codes of each enum field; append only
+ENUMS = {
+    "status": ("SAFE", "WARNING", "DANGER", "CRITICAL", "WARNING: HIGH CO2", "WARNING: HIGH PM2.5",
+               "DANGER: HIGH TEMPERATURE", "CRITICAL: SMOKE DETECTED"),
+    "source": ("combined", "local"),
+    "action": ("ACTIVATE_VENT", "SET_ALERT", "GLOBAL_ALARM", "DEACTIVATE_VENT"),
+    # New levels go at the end, so the codes of frames already sent keep their meaning
+    "level": ("OFF", "HIGH", "normal", "warning", "danger", "critical", "LOW", "MED"),
+    "room": ("",) + ROOMS,
+}
+ESCAPE = 255  # enum code: the string follows the fields
+DELTA, EXTRA = 1, 2
+HEADER = struct.Struct("<BBBB")
+KEYFRAME = 32
+
+
+class WireError(ValueError):
+    """A frame that cannot be decoded: truncated, another version, or a delta without its reference."""
+
+
+class _Layout:
+    """Packing of one kind: field names, kinds, ranges and codes, with a Struct per field mask."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.code = KINDS.index(kind)
+        self.names = tuple(name for name, _ in SCHEMAS[kind])
+        self.types = tuple(field for _, field in SCHEMAS[kind])
+        self.ranges = []
+        for field in self.types:
+            size = struct.calcsize(TYPES[field])
+            signed = TYPES[field].islower()
+            self.ranges.append((-(1 << (8 * size - 1)), (1 << (8 * size - 1)) - 1) if signed
+                               else (0, (1 << (8 * size)) - 1))
+        self.codes = [{value: i for i, value in enumerate(ENUMS[name])} if field == "enum" else None
+                      for name, field in SCHEMAS[kind]]
+        # Decoding: the enum's strings, bool, or None for numbers
+        self.tables = [ENUMS[name] if field == "enum" else bool if field == "bool" else None
+                       for name, field in SCHEMAS[kind]]
+        self._structs = {}
+        self._fields = {}
+
+    def struct(self, mask):
+        packer = self._structs.get(mask)
+        if packer is None:
+            packer = self._structs[mask] = struct.Struct(
+                "<" + "".join(TYPES[field] for i, field in enumerate(self.types) if mask >> i & 1))
+        return packer
+
+    def fields(self, mask):
+        """Indices of the fields in ``mask``."""
+        fields = self._fields.get(mask)
+        if fields is None:
+            fields = self._fields[mask] = tuple(i for i in range(len(self.names)) if mask >> i & 1)
+        return fields
+
+    def fit(self, i, value):
+        """The integer carrying ``value`` in field ``i``; None if it does not fit (it goes in EXTRA)."""
+        field = self.types[i]
+        if field == "bool":
+            return int(value) if isinstance(value, bool) else None
+        if field == "enum":
+            if not isinstance(value, str):
+                return None
+            code = self.codes[i].get(value)
+            if code is None and len(value.encode()) <= 255:
+                return ESCAPE
+            return code
+        if type(value) is not int:
+            return None
+        low, high = self.ranges[i]
+        return value if low <= value <= high else None
+
+
+LAYOUTS = {kind: _Layout(kind) for kind in KINDS}
+_BY_CODE = [LAYOUTS[kind] for kind in KINDS]
+
+
+def _varint(n, out):
+    n = n << 1 if n >= 0 else (-n << 1) - 1  # zigzag
+    while n > 0x7F:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(frame, offset):
+    n = shift = 0
+    while True:
+        if offset >= len(frame):
+            raise WireError("truncated varint")
+        byte = frame[offset]
+        offset += 1
+        n |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return (n >> 1) ^ -(n & 1), offset
+        shift += 7
+
+
+def _split(layout, payload):
+    """(mask, numbers, values, escapes, extras) of a payload."""
+    mask = 0
+    numbers, values, escapes = [], [], []
+    for i, name in enumerate(layout.names):
+        value = payload.get(name, _split)
+        if value is _split:
+            continue
+        number = layout.fit(i, value)
+        if number is None:
+            continue
+        mask |= 1 << i
+        numbers.append(number)
+        values.append(value)
+        if number == ESCAPE and layout.types[i] == "enum":
+            escapes.append(value)
+    extras = {key: value for key, value in payload.items() if key not in layout.names}
+    if len(payload) - len(extras) != len(numbers):
+        for i, name in enumerate(layout.names):
+            if not mask >> i & 1 and name in payload:
+                extras[name] = payload[name]
+    return mask, numbers, values, escapes, extras
+
+
+def _tail(escapes, extras):
+    out = bytearray()
+    for value in escapes:
+        data = value.encode()
+        out.append(len(data))
+        out += data
+    if extras:
+        data = json.dumps(extras, separators=(",", ":")).encode()
+        if len(data) > 0xFFFF:
+            raise ValueError(f"{len(data)} bytes of fields outside the schema")
+        out += struct.pack("<H", len(data)) + data
+    return bytes(out)
+
+
+def _key_frame(layout, sequence, mask, numbers, escapes, extras):
+    head = HEADER.pack(VERSION << 4 | layout.code, EXTRA if extras else 0, sequence & 0xFF, mask)
+    return head + layout.struct(mask).pack(*numbers) + (_tail(escapes, extras) if escapes or extras else b"")
+
+
+def encode(kind, payload, sequence=0):
+    """A key frame of ``payload`` (a dict) as ``kind``; decodes without any other frame."""
+    layout = LAYOUTS[kind]
+    mask, numbers, _, escapes, extras = _split(layout, payload)
+    return _key_frame(layout, sequence, mask, numbers, escapes, extras)
+
+
+def _parse(frame):
+    if len(frame) < HEADER.size:
+        raise WireError(f"{len(frame)}-byte frame is shorter than its header")
+    first, flags, sequence, mask = HEADER.unpack_from(frame)
+    if first >> 4 != VERSION:
+        raise WireError(f"frame version {first >> 4}, this codec reads {VERSION}")
+    if first & 0x0F >= len(KINDS):
+        raise WireError(f"unknown kind {first & 0x0F}")
+    return _BY_CODE[first & 0x0F], flags, sequence, mask
+
+
+def _values(layout, frame, offset, fields, numbers):
+    """Values of ``fields`` coded as ``numbers``, reading escaped strings from ``offset``: (values, offset)."""
+    values = []
+    tables = layout.tables
+    for i, number in zip(fields, numbers):
+        table = tables[i]
+        if table is None:
+            values.append(number)
+        elif table is bool:
+            values.append(bool(number))
+        elif number != ESCAPE:
+            if number >= len(table):
+                raise WireError(f"unknown {layout.names[i]} code {number}")
+            values.append(table[number])
+        else:
+            end = offset + 1 + frame[offset] if offset < len(frame) else len(frame) + 1
+            if end > len(frame):
+                raise WireError("truncated escaped string")
+            values.append(bytes(frame[offset + 1:end]).decode())
+            offset = end
+    return values, offset
+
+
+def _extras(frame, offset):
+    if offset + 2 > len(frame):
+        raise WireError("truncated extra fields")
+    (size,) = struct.unpack_from("<H", frame, offset)
+    if offset + 2 + size > len(frame):
+        raise WireError("truncated extra fields")
+    return json.loads(bytes(frame[offset + 2:offset + 2 + size]))
+
+
+def _key(layout, frame, flags, mask):
+    """(fields, numbers, values, payload) of a key frame."""
+    packer = layout.struct(mask)
+    if len(frame) < HEADER.size + packer.size:
+        raise WireError(f"truncated {layout.kind} frame")
+    numbers = packer.unpack_from(frame, HEADER.size)
+    fields = layout.fields(mask)
+    values, offset = _values(layout, frame, HEADER.size + packer.size, fields, numbers)
+    names = layout.names
+    payload = {names[i]: value for i, value in zip(fields, values)}
+    if flags & EXTRA:
+        payload.update(_extras(frame, offset))
+    return fields, numbers, values, payload
+
+
+def decode(frame):
+    """(kind, payload) of a key frame."""
+    layout, flags, _, mask = _parse(frame)
+    if flags & DELTA:
+        raise WireError("delta frame: decode it with the Decoder that read its reference")
+    return layout.kind, _key(layout, frame, flags, mask)[3]
+
+
+class Encoder:
+    """Frames of one publisher, delta-encoded against its previous frame of the same kind when ``delta``."""
+
+    def __init__(self, delta=True, keyframe=KEYFRAME):
+        self.delta = delta
+        self.keyframe = keyframe
+        self._last = {}  # kind -> (sequence, frames since the key frame, mask, numbers, values)
+
+    def encode(self, kind, payload):
+        layout = LAYOUTS[kind]
+        mask, numbers, values, escapes, extras = _split(layout, payload)
+        last = self._last.get(kind)
+        sequence = 0 if last is None else (last[0] + 1) & 0xFF
+        if not self.delta or last is None or last[2] != mask or last[1] + 1 >= self.keyframe:
+            self._last[kind] = (sequence, 0, mask, numbers, values)
+            return _key_frame(layout, sequence, mask, numbers, escapes, extras)
+
+        changed = 0
+        body = bytearray()
+        escapes = []
+        fields = layout.fields(mask)
+        for i, number, value, old, old_value in zip(fields, numbers, values, last[3], last[4]):
+            if number == old and value == old_value:
+                continue
+            changed |= 1 << i
+            if layout.types[i] in ("enum", "bool"):
+                body.append(number)
+                if number == ESCAPE and layout.types[i] == "enum":
+                    escapes.append(value)
+            else:
+                _varint(number - old, body)
+        self._last[kind] = (sequence, last[1] + 1, mask, numbers, values)
+        head = HEADER.pack(VERSION << 4 | layout.code, DELTA | (EXTRA if extras else 0), sequence, changed)
+        return head + bytes(body) + (_tail(escapes, extras) if escapes or extras else b"")
+
+
+class Decoder:
+    """Reads the frames of one ``Encoder``, in order; raises WireError on a delta whose reference it missed."""
+
+    def __init__(self):
+        self._last = {}  # kind -> (sequence, fields, numbers, values)
+
+    def decode(self, frame):
+        layout, flags, sequence, mask = _parse(frame)
+        if not flags & DELTA:
+            fields, numbers, values, payload = _key(layout, frame, flags, mask)
+            self._last[layout.kind] = (sequence, fields, numbers, values)
+            return layout.kind, payload
+
+        last = self._last.pop(layout.kind, None)
+        if last is None or (last[0] + 1) & 0xFF != sequence:
+            raise WireError(f"{layout.kind} delta frame {sequence} without its reference frame")
+        _, fields, numbers, values = last
+        if mask & ~sum(1 << i for i in fields):
+            raise WireError(f"{layout.kind} delta frame changes a field its reference lacks")
+        numbers = list(numbers)
+        changed = []
+        offset = HEADER.size
+        for k, i in enumerate(fields):
+            if not mask >> i & 1:
+                continue
+            changed.append(k)
+            if layout.types[i] in ("enum", "bool"):
+                if offset >= len(frame):
+                    raise WireError(f"truncated {layout.kind} delta frame")
+                numbers[k] = frame[offset]
+                offset += 1
+            else:
+                difference, offset = _read_varint(frame, offset)
+                numbers[k] += difference
+        news, offset = _values(layout, frame, offset, [fields[k] for k in changed], [numbers[k] for k in changed])
+        values = list(values)
+        for k, value in zip(changed, news):
+            values[k] = value
+        payload = {layout.names[i]: value for i, value in zip(fields, values)}
+        if flags & EXTRA:
+            payload.update(_extras(frame, offset))
+        self._last[layout.kind] = (sequence, fields, numbers, values)
+        return layout.kind, payload
+
+
+def describe():
+    """The schema as JSON-ready data: enum tables and each kind's fields with their key-frame offsets."""
+    kinds = {}
+    for kind in KINDS:
+        layout = LAYOUTS[kind]
+        offset = HEADER.size
+        fields = []
+        for name, field in SCHEMAS[kind]:
+            size = struct.calcsize(TYPES[field])
+            fields.append({"name": name, "type": field, "offset": offset, "size": size})
+            offset += size
+        kinds[kind] = {"code": layout.code, "topic": next(t for t, k in TOPICS.items() if k == kind),
+                       "binary_topic": BINARY_TOPICS[kind], "fields": fields, "key_frame_bytes": offset}
+    return {"version": VERSION, "byte_order": "little", "header": ["version << 4 | kind", "flags", "sequence", "mask"],
+            "flags": {"delta": DELTA, "extra": EXTRA}, "escape": ESCAPE, "enums": ENUMS, "kinds": kinds}
+
+
+async def bridge(host="127.0.0.1", port=1883, to_binary=True, to_json=True, delta=True, keyframe=KEYFRAME):
+    """Republish JSON topics as binary frames and binary frames as JSON, until cancelled.
+
+    The bridge's own messages come back through its subscriptions; they are
+    recognised by topic and payload and not translated again.  Counts of
+    translated messages are printed every minute.
+    """
+    from corridor.mqtt import Client
+
+    encoder, decoder = Encoder(delta, keyframe), Decoder()
+    echoes = collections.Counter()
+    counts = collections.Counter()
+
+    def on_message(topic, payload):
+        key = (topic, bytes(payload))
+        if echoes[key]:
+            echoes[key] -= 1
+            if not echoes[key]:
+                del echoes[key]
+            return
+        try:
+            if topic in TOPICS:
+                kind = TOPICS[topic]
+                out, data = BINARY_TOPICS[kind], encoder.encode(kind, json.loads(payload))
+            else:
+                kind, message = decoder.decode(payload)
+                out, data = next(t for t, k in TOPICS.items() if k == kind), json.dumps(
+                    message, separators=(",", ":")).encode()
+        except (ValueError, AttributeError):
+            counts["skipped"] += 1
+            return
+        counts[kind] += 1
+        echoes[(out, data)] += 1
+        client.publish(out, data)
+
+    client = await Client.connect(host, port, f"corridor-wire-{os.getpid()}", on_message=on_message)
+    await client.subscribe(*(list(TOPICS) if to_binary else []) + (list(BINARY_TOPICS.values()) if to_json else []))
+    try:
+        while True:
+            await asyncio.sleep(60)
+            print(", ".join(f"{key} {value:,}" for key, value in sorted(counts.items())) or "idle", flush=True)
+    finally:
+        await client.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m corridor.wire", description=__doc__.split("\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("schema", help="print the frame layout and enum codes as JSON")
+    sizes = commands.add_parser("sizes", help="bytes per message of a JSON-lines capture, as JSON and as frames")
+    sizes.add_argument("capture")
+    live = commands.add_parser("bridge", help="translate between the JSON and binary topics of a broker")
+    live.add_argument("--host", default="127.0.0.1")
+    live.add_argument("--port", type=int, default=1883)
+    live.add_argument("--direction", choices=("both", "to-binary", "to-json"), default="both")
+    live.add_argument("--no-delta", action="store_true", help="send key frames only")
+    args = parser.parse_args(argv)
+
+    if args.command == "schema":
+        print(json.dumps(describe(), indent=1))
+    elif args.command == "sizes":
+        totals = collections.defaultdict(lambda: [0, 0, 0, 0])
+        encoder = Encoder()
+        with open(args.capture, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                payload = record.get("payload", record) if isinstance(record, dict) else None
+                kind = TOPICS.get(record.get("topic")) if isinstance(record, dict) else None
+                if kind is None or not isinstance(payload, dict):
+                    continue
+                total = totals[kind]
+                total[0] += 1
+                total[1] += len(json.dumps(payload, separators=(",", ":")))
+                total[2] += len(encode(kind, payload))
+                total[3] += len(encoder.encode(kind, payload))
+        print(f"{'topic':9} {'messages':>9} {'JSON B':>7} {'key B':>6} {'delta B':>8}")
+        for kind, (count, text, key, delta) in sorted(totals.items()):
+            print(f"{kind:9} {count:9,} {text / count:7.1f} {key / count:6.1f} {delta / count:8.1f}")
+    else:
+        try:
+            asyncio.run(bridge(args.host, args.port, args.direction != "to-json", args.direction != "to-binary",
+                               not args.no_delta))
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
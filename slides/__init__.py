@@ -0,0 +1,23 @@
+"""Data-driven slide deck generation with per-slide cached rebuilds.
+
+The exports are loaded on first use, so importing ``slides`` (or one of its
+light modules such as ``slides.spec``) does not pull in python-pptx.
+"""
+import importlib
+
+_EXPORTS = {"BuildStats": "slides.build", "build_deck": "slides.build", "load_deck": "slides.spec"}
+
+__all__ = ["BuildStats", "build_deck", "load_deck"]
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,85 @@
+"""Build many deck variants in parallel from a manifest.
+
+A manifest lists variants of one base spec:
+
+    {
+      "spec": "slides/deck.json",          # relative to the manifest
+      "output_dir": "build/decks",
+      "variants": [
+        {"name": "lahore-en",
+         "members": [{"name": "...", "id": "...", "role": "...", "color": "ACCENT_BLUE"}],
+         "palette": {"ACCENT_GREEN": [0, 200, 120]},
+         "vars": {"thresh_pm25": 60}},
+        ...
+      ]
+    }
+
+``members`` replaces the members of every team element, ``palette`` and
+``vars`` are merged over the base spec, and ``output`` optionally overrides
+the default ``<output_dir>/<name>.pptx``.  Builds fan out over a process
+pool; each one is saved atomically by ``write_deck``.
+"""
+import collections
+import copy
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from slides.build import build_deck
+from slides.spec import load_deck
+
+DeckResult = collections.namedtuple("DeckResult", "name output stats error")
+BatchResult = collections.namedtuple("BatchResult", "decks seconds workers")
+
+
+def load_manifest(path):
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    manifest["spec"] = os.path.normpath(os.path.join(base, manifest.get("spec", "deck.json")))
+    manifest["output_dir"] = os.path.normpath(os.path.join(base, manifest.get("output_dir", ".")))
+    return manifest
+
+
+def apply_variant(deck, variant):
+    """Return a copy of ``deck`` with the variant's overrides applied."""
+    deck = copy.deepcopy(deck)
+    deck["palette"] = dict(deck.get("palette", {}), **variant.get("palette", {}))
+    deck["vars"] = dict(deck.get("vars", {}), **variant.get("vars", {}))
+    if "members" in variant:
+        for slide in deck["slides"]:
+            for element in slide["elements"]:
+                if element["type"] == "team":
+                    element["members"] = copy.deepcopy(variant["members"])
+    return deck
+
+
+def _build_one(name, deck, output, cache_dir):
+    # Runs in a worker process; failures are reported, not raised, so one bad
+    # variant does not take the rest of the batch down with it
+    try:
+        return DeckResult(name, output, build_deck(deck, output, cache_dir=cache_dir), None)
+    except Exception:
+        return DeckResult(name, output, None, traceback.format_exc())
+
+
+def build_batch(manifest, workers=None, cache_dir=None, on_result=None):
+    """Build every variant in ``manifest``; ``on_result`` is called as decks finish."""
+    start = time.perf_counter()
+    base = load_deck(manifest["spec"])
+    os.makedirs(manifest["output_dir"], exist_ok=True)
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        for variant in manifest["variants"]:
+            output = variant.get("output") or os.path.join(manifest["output_dir"], variant["name"] + ".pptx")
+            futures.append(pool.submit(_build_one, variant["name"], apply_variant(base, variant),
+                                       output, cache_dir))
+        for future in as_completed(futures):
+            if on_result:
+                on_result(future.result())
+    # Report in manifest order regardless of completion order
+    return BatchResult([f.result() for f in futures], time.perf_counter() - start, workers)
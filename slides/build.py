@@ -0,0 +1,106 @@
+"""Incremental deck builds: re-render only slides whose content hash changed."""
+import collections
+import os
+import time
+
+from slides.cache import SlideCache, renderer_fingerprint
+from slides.layout import FontMetrics
+from slides.package import DeckTemplate, PackageWriter
+from slides.render import SlideRenderer
+from slides.spec import DEFAULT_SIZE, slide_digest, slide_resolver
+
+BuildStats = collections.namedtuple("BuildStats", "slides rendered cached seconds overflows")
+# overflows: slides.layout.Overflow of each fitted text too long for its box, in the slides rendered
+
+
+class BuildContext:
+    """A warm renderer and package template for one slide size.
+
+    Creating them -- python-pptx's default template parse in
+    ``Presentation()``, the blank layout lookup and the template snapshot --
+    is most of the fixed cost of a small build.  A long-lived process
+    (``slides.server``) keeps one per size and passes it to every build;
+    each build copies the template parts into its own package.  One build
+    at a time: the renderer's scratch presentation is shared.  Font metrics
+    parsed for text fitting are kept in ``font_cache`` if given.
+    """
+
+    def __init__(self, size=DEFAULT_SIZE, font_cache=None):
+        self.size = list(size)
+        self.renderer = SlideRenderer(self.size, metrics=FontMetrics(font_cache))
+        self.template = DeckTemplate.from_presentation(self.renderer.prs)
+        # Of the renderer as loaded, even if render.py changes on disk later
+        self.salt = renderer_fingerprint()
+
+
+class DeckWriter:
+    """Stream slides into a .pptx one at a time.
+
+    Each slide is resolved, rendered (or fetched from the cache), written into
+    the output zip and dropped before the next one is accepted, so memory
+    stays flat however many slides are added.  ``settings`` holds the
+    deck-level spec keys (size, background, palette, vars); the "slides" key,
+    if present, is ignored.  ``context`` reuses a warm ``BuildContext`` of
+    the same size instead of creating one.
+
+        with DeckWriter("incidents.pptx", {"palette": {...}}) as deck:
+            for event in events:
+                deck.add_slide({"elements": [...]})
+    """
+
+    def __init__(self, output_file, settings=None, cache_dir=None, context=None):
+        settings = settings or {}
+        self.start = time.perf_counter()
+        self.size = settings.get("size", DEFAULT_SIZE)
+        self.resolve = slide_resolver(settings)
+        if context is None or context.size != list(self.size):
+            context = BuildContext(self.size, font_cache=os.path.join(cache_dir, "fonts") if cache_dir else None)
+        self.renderer = context.renderer
+        self.cache = SlideCache(cache_dir) if cache_dir else None
+        self.salt = context.salt
+        self.rendered = self.cached = 0
+        self.overflows = []
+        self.stats = None
+        self.writer = PackageWriter(output_file, context.template)
+
+    def add_slide(self, slide):
+        spec = self.resolve(slide)
+        key = slide_digest(spec, self.size, self.salt) if self.cache else None
+        parts = self.cache.get(key) if self.cache else None
+        if parts is None:
+            parts = self.renderer.render(spec, self.overflows)
+            self.rendered += 1
+            if self.cache:
+                self.cache.put(key, parts)
+        else:
+            self.cached += 1
+        self.writer.add_slide(parts)
+
+    def close(self):
+        count = self.writer.close()
+        return BuildStats(count, self.rendered, self.cached, time.perf_counter() - self.start, tuple(self.overflows))
+
+    def abort(self):
+        self.writer.abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.stats = self.close()
+        else:
+            self.abort()
+
+
+def build_deck(deck, output_file, cache_dir=None, context=None):
+    """Build ``deck`` (a loaded spec) into ``output_file``.
+
+    With ``cache_dir`` set, slides whose hash is already cached are spliced in
+    from disk and only new or changed slides go through python-pptx.
+    ``deck["slides"]`` may be any iterable, including a generator.
+    """
+    with DeckWriter(output_file, deck, cache_dir=cache_dir, context=context) as writer:
+        for slide in deck["slides"]:
+            writer.add_slide(slide)
+    return writer.stats
@@ -0,0 +1,113 @@
+"""On-disk cache of rendered slide parts, keyed by slide content hash.
+
+Each entry is a small uncompressed zip holding the slide XML, its
+relationships and any related parts (images, charts) it references.  Entries are written to a
+temporary file and renamed into place, so concurrent builds sharing a cache
+directory never observe a half-written entry.
+
+Nothing here imports python-pptx or lxml, and the zip modules are loaded on
+first read or write, so commands that only look up keys
+(``generate_slides.py list-slides``) start quickly.
+"""
+import glob
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import re
+import stat
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Whatever decides what a rendered slide looks like: every module of slides/, so a new render dependency
+# cannot be left out, and the LED frames' sources -- ripes.s run on corridor.riscv, with the rules of
+# corridor.controller
+RENDER_SOURCES = tuple(sorted(glob.glob(os.path.join(ROOT, "slides", "*.py")))) + (
+    os.path.join(ROOT, "corridor", "leds.py"), os.path.join(ROOT, "corridor", "controller.py"),
+    *sorted(glob.glob(os.path.join(ROOT, "corridor", "riscv", "*.py"))), os.path.join(ROOT, "ripes", "ripes.s"))
+
+
+def renderer_fingerprint():
+    """Hash of ``RENDER_SOURCES`` and the python-pptx version; part of every slide cache key.
+
+    The version is read from the pptx package source rather than by
+    importing it.
+    """
+    source = b""
+    for path in RENDER_SOURCES:
+        with open(path, "rb") as f:
+            source += f.read()
+    spec = importlib.util.find_spec("pptx")
+    version = b""
+    if spec is not None and spec.origin:
+        with open(spec.origin, "rb") as f:
+            found = re.search(rb"""^__version__ = ["']([^"']+)["']""", f.read(), re.M)
+        version = found.group(1) if found else b""
+    return hashlib.sha256(source + version).hexdigest()[:16]
+
+
+def _umask():
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+UMASK = _umask()
+
+
+def replace_file(tmp_path, path):
+    """Rename ``tmp_path`` over ``path``, with the mode a plain ``open`` would have given it.
+
+    ``mkstemp`` files are 0600; the result keeps the mode of the file it
+    replaces, or gets 0666 less the umask.
+    """
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = 0o666 & ~UMASK
+    os.chmod(tmp_path, mode)
+    os.replace(tmp_path, path)
+
+
+class SlideCache:
+    def __init__(self, root, create=True):
+        self.root = root
+        if create:
+            os.makedirs(root, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key + ".zip")
+
+    def __contains__(self, key):
+        return os.path.exists(self._path(key))
+
+    def get(self, key):
+        import zipfile
+
+        from slides.package import SlideParts
+
+        try:
+            with zipfile.ZipFile(self._path(key)) as zf:
+                related = tuple((name, content_type, zf.read("related/" + name))
+                                for name, content_type in json.loads(zf.read("related.json")))
+                return SlideParts(zf.read("slide.xml"), zf.read("slide.xml.rels"), related)
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            return None
+
+    def put(self, key, parts):
+        import tempfile
+        import zipfile
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as zf:
+            zf.writestr("slide.xml", parts.xml)
+            zf.writestr("slide.xml.rels", parts.rels)
+            zf.writestr("related.json", json.dumps([[name, ct] for name, ct, _ in parts.related]))
+            for name, _, blob in parts.related:
+                zf.writestr("related/" + name, blob)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(buf.getvalue())
+        replace_file(tmp_path, path)
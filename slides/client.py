@@ -0,0 +1,58 @@
+"""Thin client for the slide build server (``slides.server``).
+
+Requests and responses are single JSON lines over a Unix socket (or
+``host:port`` TCP).  Only the standard library's socket and json are
+imported here, so a client call starts as fast as the interpreter does.
+"""
+import json
+import os
+import socket
+
+# Seconds to wait on the server (to connect, or between bytes of the answer) before giving up;
+# generate_slides.py then builds in-process
+TIMEOUT = 120.0
+
+
+class ServerError(RuntimeError):
+    """The server answered but could not carry out the request."""
+
+
+def parse_address(address):
+    """("unix", path) or ("tcp", (host, port)) for a socket path or ``host:port``."""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and os.sep not in address:
+        return "tcp", (host or "127.0.0.1", int(port))
+    return "unix", address
+
+
+def connect(address, timeout=None):
+    kind, target = parse_address(address)
+    if kind == "tcp":
+        return socket.create_connection(target, timeout=timeout)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(target)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def request(address, message, timeout=TIMEOUT):
+    """Send one request and return the decoded response; raises ServerError if it failed.
+
+    ``OSError`` (no server listening, or ``TimeoutError`` from one that
+    does not answer within ``timeout`` seconds) propagates, so callers can
+    fall back to building in-process.
+    """
+    with connect(address, timeout) as sock:
+        sock.sendall(json.dumps(message).encode() + b"\n")
+        with sock.makefile("rb") as f:
+            line = f.readline()
+    if not line:
+        raise ServerError("server closed the connection")
+    response = json.loads(line)
+    if not response.get("ok"):
+        raise ServerError(response.get("error", "request failed"))
+    return response
@@ -0,0 +1,68 @@
+"""Traced loop latency (``corridor.tracing``) -> a slide for the deck.
+
+The slide puts the latency distribution of each hop, as cumulative
+percentages read off its histogram, next to the deck's own claims
+("<100ms Safety Response", "MQTT Round-Trip (<500ms)") and the p99 each
+alert level reached.  It takes a capture or a report saved with
+``python -m corridor.tracing CAPTURE --json REPORT``.
+"""
+import json
+
+from slides.telemetry import SERIES_COLORS, lttb
+
+
+def load_report(path):
+    """A tracing report: read from a saved ``.json`` report, or traced from a JSON-lines capture."""
+    if path.endswith(".json"):
+        with open(path) as f:
+            return json.load(f)
+    from corridor.tracing import trace
+
+    with open(path, "rb") as f:
+        return trace(f).report()
+
+
+def latency_slides(report, points=200, title="Measured Loop Latency"):
+    """One slide: CDF chart per hop, the claims checked and p99 per alert level."""
+    from corridor.tracing import HOPS, Histogram
+
+    hops = report["hops"]
+    series = []
+    # Cut the x axis at the slowest hop's p99, so the tails don't flatten the rest
+    limit = max((hops[hop]["p99"] for hop in HOPS if hops[hop]["count"]), default=1.0)
+    for i, hop in enumerate(HOPS):
+        if not hops[hop]["count"]:
+            continue
+        x, y = Histogram.from_dict(report["histograms"][hop]).cdf()
+        x, y = x / 1e3, y * 100
+        keep = x <= limit
+        x, y = lttb(x[keep], y[keep], points)
+        series.append({"name": hop.replace("_", " "), "color": SERIES_COLORS[i % len(SERIES_COLORS)],
+                       "x": [round(float(v), 3) for v in x], "y": [round(float(v), 3) for v in y]})
+
+    claims = []
+    for claim in report["claims"]:
+        if claim["p99_ms"] is None:
+            claims.append(f"{claim['claim']} <{claim['limit_ms']:g} ms: no data")
+        else:
+            verdict = "met" if claim["met"] else "not met"
+            claims.append(f"{claim['claim']} <{claim['limit_ms']:g} ms: p99 {claim['p99_ms']:,.0f} ms, {verdict}")
+    levels = [f"{level}: round trip p99 {values['round_trip']['p99']:,.0f} ms" for level, values in
+              report["levels"].items() if "round_trip" in values]
+    counts = report["counts"]
+    summary = (f"{counts.get('sensors', 0):,} sensor readings, {counts.get('matched', 0):,} traced to a monitor, "
+               f"{counts.get('decisions', 0):,} to a decision")
+
+    elements = [
+        {"type": "title", "text": title},
+        {"type": "text", "text": summary, "box": [0.5, 1.25, 12.333, 0.4], "size": 14},
+        {"type": "chart", "box": [0.5, 1.8, 7.6, 5.2], "title": "Share of messages within (%)",
+         "x_title": "latency (ms)", "series": series},
+        {"type": "text", "text": "Deck claims", "box": [8.4, 1.8, 4.4, 2.4], "size": 20, "color": "ACCENT_PURPLE",
+         "bullets": claims},
+    ]
+    if levels:
+        elements.append({"type": "text", "text": "By alert level", "box": [8.4, 4.3, 4.4, 2.7], "size": 20,
+                         "color": "ACCENT_YELLOW", "bullets": levels})
+    return [{"name": "latency", "elements": elements}]
+
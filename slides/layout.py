@@ -0,0 +1,501 @@
+"""Layout containers and text fitting from font metrics, without a renderer.
+
+Slides used to place every shape by hand (``Inches(1 + i * 3)`` for team
+cards, a fixed 11 x 4.5 in box for code), and text longer than its box
+silently ran over the edge.  This module computes boxes and font sizes
+before python-pptx sees the slide:
+
+* ``stack`` and ``grid`` elements hold other elements and hand each child a
+  box: a stack splits its box along one axis (``basis`` fixes a child's
+  length, the rest share what is left), a grid cuts it into equal cells
+  row by row.  Containers nest.
+* Elements with ``"fit": true`` (text, shape, code) get the largest font
+  size, in half points down to ``MIN_SIZE``, at which their word-wrapped
+  text fits the box; text that doesn't fit even then is reported as an
+  overflow.
+
+Widths come from glyph advances, the way PowerPoint lays out a line
+(advances summed, no kerning).  ``FontMetrics`` finds each (font, bold)
+face's TrueType file -- Arial and Courier New, or their metric-compatible
+Liberation fonts -- and reads the ``cmap``/``hmtx`` tables into a table of
+advances per BMP code point, in 1/1000 em.  Advances scale linearly, so one
+table serves every size of a face: a run at any size is one table lookup
+per character and a multiply.  Parsed tables are kept in a cache directory
+(``.npy`` per face, checked against the font file's size and mtime), so a
+process never parses a font file twice.  With no file installed the
+Helvetica AFM widths (Arial shares them) and Courier's fixed 600 are
+built in.
+
+``FontMetrics.measure`` takes a batch of runs: they are joined into one
+array of code points, looked up and summed with a cumulative sum, which
+measures thousands of runs per millisecond (``benchmarks/bench_layout.py``).
+Nothing here imports python-pptx.
+"""
+import collections
+import json
+import math
+import os
+import re
+import struct
+
+import numpy as np
+
+MIN_SIZE = 8  # pt, the smallest size "fit" shrinks text to
+STEP = 0.5  # pt between the sizes "fit" tries
+GAP = 0.2  # in, between the children of a stack or grid without "gap"
+
+# Text frame insets python-pptx leaves at PowerPoint's defaults: left, top, right, bottom (in)
+INSETS = (0.1, 0.05, 0.1, 0.05)
+CODE_INSETS = (0.2, 0.2, 0.1, 0.05)  # slides.render.add_code_block
+THEME_FONT = "Calibri"  # text set without a font takes the theme's
+
+FONT_DIRS = ("/usr/share/fonts", "/usr/local/share/fonts", "~/.fonts", "~/.local/share/fonts",
+             "/Library/Fonts", "/System/Library/Fonts", "~/Library/Fonts",
+             os.path.join(os.environ.get("WINDIR", "C:\\Windows"), "Fonts"))
+
+# File names of a face, in order of preference; the Liberation fonts have the same advances
+FONT_FILES = {
+    ("Arial", False): ("arial.ttf", "LiberationSans-Regular.ttf"),
+    ("Arial", True): ("arialbd.ttf", "Arial Bold.ttf", "LiberationSans-Bold.ttf"),
+    ("Courier New", False): ("cour.ttf", "Courier New.ttf", "LiberationMono-Regular.ttf"),
+    ("Courier New", True): ("courbd.ttf", "Courier New Bold.ttf", "LiberationMono-Bold.ttf"),
+    ("Calibri", False): ("calibri.ttf", "Carlito-Regular.ttf"),
+    ("Calibri", True): ("calibrib.ttf", "Carlito-Bold.ttf"),
+}
+
+# Helvetica AFM advances of U+0020..U+007E (Arial's are the same), with Arial's quotesingle and grave
+HELVETICA = (
+    "278 278 355 556 556 889 667 191 333 333 389 584 278 333 278 278 556 556 556 556 556 556 556 556 556 556 "
+    "278 278 584 584 584 556 1015 667 667 722 722 667 611 778 722 278 500 667 556 833 722 778 667 778 722 667 "
+    "611 722 667 944 667 667 611 278 278 278 469 556 333 556 556 500 556 556 278 556 556 222 222 500 222 833 "
+    "556 556 556 556 333 500 278 556 500 722 500 500 500 334 260 334 584")
+HELVETICA_BOLD = (
+    "278 333 474 556 556 889 722 238 333 333 389 584 278 333 278 278 556 556 556 556 556 556 556 556 556 556 "
+    "333 333 584 584 584 611 975 722 722 722 722 667 611 778 722 278 556 722 611 833 722 778 667 778 722 667 "
+    "611 722 667 944 667 667 611 333 278 333 584 556 333 556 611 556 611 556 333 611 611 278 278 556 278 889 "
+    "611 611 611 611 389 556 333 611 556 778 556 556 500 389 280 389 584")
+# A few punctuation marks decks use: bullet, dashes, degree, multiplication sign, <=, >=, arrow
+HELVETICA_EXTRA = {0x2022: 350, 0x2013: 556, 0x2014: 1000, 0x00B0: 400, 0x00D7: 584, 0x2264: 549, 0x2265: 549,
+                   0x2192: 1000}
+# Line height in em (hhea ascender - descender + line gap) of the built-in faces
+BUILTIN_LINES = {"Arial": 1.149, "Courier New": 1.133}
+
+Face = collections.namedtuple("Face", "family bold advances line source")
+# advances: float32 advance of each BMP code point in 1/1000 em (unmapped ones get the .notdef width);
+# line: line height in em; source: the font file, or "builtin"
+
+Overflow = collections.namedtuple("Overflow", "slide element text needed height")
+# slide name, element type, start of its text, and the height it needs at MIN_SIZE against the box's (in)
+
+
+def builtin_face(family, bold=False):
+    """The built-in advances of ``family``: Courier's fixed pitch for monospace names, else Helvetica's."""
+    mono = re.search(r"courier|mono|consol", family, re.I) is not None
+    advances = np.full(0x10000, 1000.0 if not mono else 600.0, np.float32)
+    if mono:
+        return Face(family, bold, advances, BUILTIN_LINES["Courier New"], "builtin")
+    advances[:0x2E80] = 611 if bold else 556  # Latin and the like; CJK and beyond stay 1 em
+    advances[:0x20] = 0
+    advances[0x20:0x7F] = [int(w) for w in (HELVETICA_BOLD if bold else HELVETICA).split()]
+    for code, width in HELVETICA_EXTRA.items():
+        advances[code] = width
+    advances[0xA0] = advances[0x20]
+    return Face(family, bold, advances, BUILTIN_LINES["Arial"], "builtin")
+
+
+def read_truetype(path):
+    """(advances per BMP code point in 1/1000 em, line height in em) of a TrueType/OpenType file."""
+    with open(path, "rb") as f:
+        data = f.read()
+    offset = struct.unpack_from(">I", data, 12)[0] if data[:4] == b"ttcf" else 0  # first font of a collection
+    count = struct.unpack_from(">H", data, offset + 4)[0]
+    tables = {}
+    for at in range(offset + 12, offset + 12 + 16 * count, 16):
+        tables[data[at:at + 4].decode("latin-1")] = struct.unpack_from(">I", data, at + 8)[0]
+    units = struct.unpack_from(">H", data, tables["head"] + 18)[0]
+    ascender, descender, line_gap = struct.unpack_from(">hhh", data, tables["hhea"] + 4)
+    metrics = struct.unpack_from(">H", data, tables["hhea"] + 34)[0]
+    glyph_advances = np.frombuffer(data, ">u2", metrics * 2, tables["hmtx"])[::2].astype(np.float32)
+
+    glyphs = np.zeros(0x10000, np.int64)  # .notdef
+    cmap = tables["cmap"]
+    subtables = {}
+    for at in range(cmap + 4, cmap + 4 + 8 * struct.unpack_from(">H", data, cmap + 2)[0], 8):
+        platform, encoding, sub = struct.unpack_from(">HHI", data, at)
+        subtables[platform, encoding] = cmap + sub
+    sub = next((subtables[key] for key in ((3, 1), (0, 3), (0, 1), (0, 0))
+                if key in subtables and struct.unpack_from(">H", data, subtables[key])[0] == 4), None)
+    if sub is None:
+        raise ValueError(f"{path}: no Unicode BMP (format 4) cmap")
+    segments = struct.unpack_from(">H", data, sub + 6)[0] // 2
+    ends = np.frombuffer(data, ">u2", segments, sub + 14).astype(np.int64)
+    starts = np.frombuffer(data, ">u2", segments, sub + 16 + 2 * segments).astype(np.int64)
+    deltas = np.frombuffer(data, ">i2", segments, sub + 16 + 4 * segments).astype(np.int64)
+    range_at = sub + 16 + 6 * segments
+    ranges = np.frombuffer(data, ">u2", segments, range_at).astype(np.int64)
+    for i in range(segments):
+        if starts[i] > ends[i] or starts[i] == 0xFFFF:
+            continue
+        codes = np.arange(starts[i], ends[i] + 1)
+        if ranges[i] == 0:
+            glyphs[codes] = (codes + deltas[i]) & 0xFFFF
+        else:
+            # idRangeOffset counts bytes from its own slot into glyphIdArray
+            ids = np.frombuffer(data, ">u2", len(codes), range_at + 2 * i + ranges[i]).astype(np.int64)
+            glyphs[codes] = np.where(ids != 0, (ids + deltas[i]) & 0xFFFF, 0)
+    # Glyphs past the last long metric share its advance
+    advances = glyph_advances[np.minimum(glyphs, metrics - 1)] * (1000.0 / units)
+    return advances.astype(np.float32), (ascender - descender + line_gap) / units
+
+
+class FontMetrics:
+    """Glyph advances of (font, bold) faces, parsed once and kept in ``cache_dir`` if given.
+
+    ``measure`` and ``width`` give run widths in points at any size;
+    ``words`` remembers the advance of every word it has measured, since
+    words repeat far more often than text does.
+    """
+
+    MAX_WORDS = 200_000  # remembered per face before starting over
+
+    def __init__(self, cache_dir=None, font_dirs=FONT_DIRS):
+        self.cache_dir = cache_dir
+        self.font_dirs = font_dirs
+        self.parsed = 0  # font files read, rather than loaded from the cache
+        self._faces = {}
+        self._words = {}
+        self._files = None
+
+    def face(self, family, bold=False):
+        key = (family, bool(bold))
+        face = self._faces.get(key)
+        if face is None:
+            face = self._faces[key] = self._load(family, bool(bold))
+        return face
+
+    def measure(self, texts, family, size, bold=False):
+        """Widths in points of each string of ``texts`` set in ``family`` at ``size`` pt, as a float array."""
+        if not texts:
+            return np.zeros(0)
+        advances = self.face(family, bold).advances
+        lengths = np.fromiter(map(len, texts), np.intp, len(texts))
+        joined = "".join(texts)
+        codes = np.frombuffer(joined.encode("utf-16-le"), np.uint16)
+        if len(codes) != len(joined):
+            # Characters beyond the BMP take two UTF-16 units; they all get the width of U+FFFF
+            codes = np.minimum(np.frombuffer(joined.encode("utf-32-le"), np.uint32), 0xFFFF)
+        # One extra zero so that runs ending the batch, empty ones included, have a valid start
+        glyphs = np.zeros(len(codes) + 1, np.float32)
+        advances.take(codes, out=glyphs[:-1])
+        starts = np.zeros(len(texts), np.intp)
+        np.cumsum(lengths[:-1], out=starts[1:])
+        widths = np.add.reduceat(glyphs, starts).astype(np.float64)
+        widths[lengths == 0] = 0  # reduceat gives an empty run the advance at its start
+        return widths * (size / 1000)
+
+    def width(self, text, family, size, bold=False):
+        return float(self.measure([text], family, size, bold)[0])
+
+    def words(self, words, family, bold=False):
+        """Advances of each of ``words`` in 1/1000 em, as a list; new ones are measured in one batch."""
+        known = self._words.setdefault((family, bool(bold)), {})
+        new = [w for w in set(words) if w not in known]
+        if new:
+            if len(known) + len(new) > self.MAX_WORDS:
+                known.clear()
+            known.update(zip(new, self.measure(new, family, 1000, bold).tolist()))
+        return [known[w] for w in words]
+
+    def _load(self, family, bold):
+        path = self._find(family, bold)
+        if path is None:
+            return builtin_face(family, bold)
+        stat = os.stat(path)
+        stamp = {"source": path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        name = re.sub(r"[^\w]+", "-", f"{family}-{'bold' if bold else 'regular'}").lower()
+        index = self._index()
+        entry = index.get(name)
+        if entry is not None and {key: entry.get(key) for key in stamp} == stamp:
+            try:
+                return Face(family, bold, np.load(os.path.join(self.cache_dir, name + ".npy")), entry["line"], path)
+            except (OSError, ValueError):
+                pass
+        advances, line = read_truetype(path)
+        self.parsed += 1
+        if self.cache_dir:
+            self._store(name, advances, dict(stamp, line=line))
+        return Face(family, bold, advances, line, path)
+
+    def _find(self, family, bold):
+        if self._files is None:
+            # Every font file under the font directories, by lower-case file name
+            self._files = {}
+            for root in self.font_dirs:
+                for folder, _, files in os.walk(os.path.expanduser(root)):
+                    for file in files:
+                        if file.lower().endswith((".ttf", ".otf")):
+                            self._files.setdefault(file.lower(), os.path.join(folder, file))
+        plain = family.replace(" ", "")
+        names = FONT_FILES.get((family, bold), ()) + (
+            (f"{family} Bold.ttf", f"{plain}-Bold.ttf", f"{plain}bd.ttf") if bold
+            else (f"{family}.ttf", f"{plain}.ttf", f"{plain}-Regular.ttf"))
+        return next((self._files[n.lower()] for n in names if n.lower() in self._files), None)
+
+    def _index(self):
+        if not self.cache_dir:
+            return {}
+        try:
+            with open(os.path.join(self.cache_dir, "index.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _store(self, name, advances, entry):
+        # Each file is written aside and renamed into place, as slides.cache does
+        import tempfile
+
+        from slides.cache import replace_file
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, advances)
+        replace_file(tmp_path, os.path.join(self.cache_dir, name + ".npy"))
+        index = dict(self._index(), **{name: entry})
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+        with os.fdopen(fd, "w") as f:
+            json.dump(index, f, indent=1, sort_keys=True)
+        replace_file(tmp_path, os.path.join(self.cache_dir, "index.json"))
+
+
+METRICS = FontMetrics()
+
+
+# --- containers ---
+def _gaps(gap):
+    # (between columns, between rows) of a "gap" value
+    return (gap, gap) if isinstance(gap, (int, float)) else tuple(gap)
+
+
+def stack(box, bases, gap=GAP, direction="vertical"):
+    """Boxes of a stack's children; ``bases`` holds each child's fixed length or None to share the rest."""
+    left, top, width, height = box
+    along = height if direction == "vertical" else width
+    fixed = sum(b for b in bases if b is not None)
+    flexible = sum(b is None for b in bases)
+    share = (along - fixed - gap * (len(bases) - 1)) / flexible if flexible else 0
+    boxes, at = [], top if direction == "vertical" else left
+    for basis in bases:
+        length = share if basis is None else basis
+        boxes.append([left, at, width, length] if direction == "vertical" else [at, top, length, height])
+        at += length + gap
+    return boxes
+
+
+def grid(box, count, columns, gap=GAP):
+    """Boxes of ``count`` equal cells filling ``box`` row by row, ``columns`` to a row."""
+    left, top, width, height = box
+    column_gap, row_gap = _gaps(gap)
+    rows = max(math.ceil(count / columns), 1)
+    cell_width = (width - column_gap * (columns - 1)) / columns
+    cell_height = (height - row_gap * (rows - 1)) / rows
+    return [[left + (i % columns) * (cell_width + column_gap), top + (i // columns) * (cell_height + row_gap),
+             cell_width, cell_height] for i in range(count)]
+
+
+def place(elements, boxes=None):
+    """``elements`` with every stack and grid replaced by its children, each given its box."""
+    placed = []
+    for i, el in enumerate(elements):
+        if boxes is not None:
+            el = dict(el, box=boxes[i])
+        if el["type"] == "stack":
+            children = el["elements"]
+            placed += place(children, stack(el["box"], [child.get("basis") for child in children],
+                                            el.get("gap", GAP), el.get("direction", "vertical")))
+        elif el["type"] == "grid":
+            children = el["elements"]
+            placed += place(children, grid(el["box"], len(children), el["columns"], el.get("gap", GAP)))
+        else:
+            placed.append(el)
+    return placed
+
+
+# --- text fitting ---
+def paragraphs(el):
+    """[text, font, size, bold] of each paragraph an element draws, as slides.render styles them."""
+    kind = el["type"]
+    if kind == "code":
+        return [[el["code"], "Courier New", el.get("size", 12), False]]
+    runs = []
+    if kind == "text":
+        runs.append([el["text"], "Arial", el.get("size", 18), el.get("bold", False)])
+    elif "text" in el:
+        runs += [[line, THEME_FONT, el.get("size", 18), False] for line in el["text"].split("\n")]
+    for para in el.get("paragraphs", ()):
+        runs.append([para.get("text", ""), para.get("font", THEME_FONT), para.get("size", 18),
+                     para.get("bold", False)])
+    runs += [[b, "Arial", el.get("bullet_size", 18), False] for b in el.get("bullets", ())]
+    return runs
+
+
+def insets(el):
+    if el["type"] == "code":
+        return CODE_INSETS
+    if "margin" in el:
+        return (el["margin"][0], el["margin"][1]) + INSETS[2:]
+    return INSETS
+
+
+def scaled(size, scale):
+    """``size`` times ``scale``, rounded down to ``STEP``."""
+    return max(math.floor(size * scale / STEP + 1e-9) * STEP, STEP)
+
+
+def sized(el, scale):
+    """A copy of ``el`` with every font size multiplied by ``scale`` (rounded down to ``STEP``)."""
+    def size(value):
+        return scaled(value, scale)
+
+    el = dict(el)
+    if el["type"] == "code":
+        el["size"] = size(el.get("size", 12))
+        return el
+    if el["type"] == "text" or "text" in el:
+        el["size"] = size(el.get("size", 18))
+    if "paragraphs" in el:
+        el["paragraphs"] = [dict(para, size=size(para.get("size", 18))) for para in el["paragraphs"]]
+    if "bullets" in el:
+        el["bullet_size"] = size(el.get("bullet_size", 18))
+    return el
+
+
+def wrapped(words, space, width):
+    """Lines greedy word wrap makes of ``words`` (advances) in ``width``; long words break anywhere."""
+    lines, used = 1, None
+    for word in words:
+        if used is None:
+            used = word
+        elif used + space + word <= width:
+            used += space + word
+        else:
+            lines += 1
+            used = word
+        if used > width:
+            # A word wider than the line runs on over as many lines as it takes
+            extra = math.ceil(used / width) - 1
+            lines += extra
+            used -= extra * width
+    return lines
+
+
+class Block:
+    """The paragraphs of one element, measured once in 1/1000 em so they can be wrapped at any size.
+
+    Lines are measured whole; only a line too long for some size is split
+    into words, the first time it has to wrap.  ``measure_blocks`` builds
+    the blocks of many elements with one ``measure`` call per face.
+    """
+
+    def __init__(self, paragraphs, metrics=METRICS):
+        # (font, bold, space advance, line height in em, [text of each line], [advance of each line])
+        self.paragraphs = paragraphs
+        self.widest = [max(wholes) for *_, wholes in paragraphs]
+        self.metrics = metrics
+        self._words = {}  # (paragraph, line) -> word advances
+
+    def height(self, sizes, width):
+        """Points the wrapped text takes in ``width`` points with its paragraphs at ``sizes``."""
+        total = 0.0
+        for p, (size, paragraph, widest) in enumerate(zip(sizes, self.paragraphs, self.widest)):
+            font, bold, space, line_height, lines, wholes = paragraph
+            limit = width * 1000 / size
+            count = len(lines)  # nothing wraps, unless a line is wider than the limit
+            if widest > limit:
+                for i, whole in enumerate(wholes):
+                    if whole > limit:
+                        words = self._words.get((p, i))
+                        if words is None:
+                            words = self._words[p, i] = self.metrics.words(lines[i].split(" "), font, bold)
+                        count += wrapped(words, space, limit) - 1
+            total += count * size * line_height
+        return total
+
+
+def measure_blocks(elements_runs, metrics=METRICS):
+    """A ``Block`` for each element's ``paragraphs``, the lines of each face measured in one batch."""
+    batches = {}  # (font, bold) -> [every line of that face]
+    for runs in elements_runs:
+        for text, font, _, bold in runs:
+            batches.setdefault((font, bold), []).extend(text.split("\n"))
+    advances = {key: iter(metrics.measure(lines, key[0], 1000, key[1]).tolist()) for key, lines in batches.items()}
+    blocks = []
+    for runs in elements_runs:
+        paragraphs = []
+        for text, font, _, bold in runs:
+            lines = text.split("\n")
+            face, measured = metrics.face(font, bold), advances[font, bold]
+            paragraphs.append((font, bold, float(face.advances[32]), face.line, lines, [next(measured) for _ in lines]))
+        blocks.append(Block(paragraphs, metrics))
+    return blocks
+
+
+def fit(el, metrics=METRICS, block=None):
+    """(``el`` at the largest size its text fits its box, inches of box height that text needs).
+
+    The element comes back as None if its text overflows even at ``MIN_SIZE``;
+    the height is then the one it needs at ``MIN_SIZE``.  ``block`` is the
+    element's measured text, if ``measure_blocks`` already has it.
+    """
+    runs = paragraphs(el)
+    if not runs:
+        return el, 0.0
+    left, top, right, bottom = insets(el)
+    width = max(el["box"][2] - left - right, 0.01) * 72
+    block = block or measure_blocks([runs], metrics)[0]
+    largest = max(size for _, _, size, _ in runs)
+
+    def needed(size):
+        # The sizes sized() gives the paragraphs, as it would for this one
+        sizes = [s if size == largest else scaled(s, size / largest) for _, _, s, _ in runs]
+        return block.height(sizes, width) / 72 + top + bottom
+
+    # Sizes tried, largest first; needed() only grows with the size
+    candidates = [largest - STEP * k for k in range(int((largest - MIN_SIZE) / STEP) + 1)] or [largest]
+    box_height = el["box"][3]
+    height = needed(candidates[0])
+    if height <= box_height:
+        return el, height
+    # Wrapped text takes about size squared of area, so start near largest * sqrt(box / needed) and walk
+    # from there to the first size that fits: usually a step or two rather than a bisection
+    guess = largest * math.sqrt(max(box_height - top - bottom, 0) / max(height - top - bottom, 1e-9))
+    k = min(max(math.ceil((largest - guess) / STEP), 1), len(candidates) - 1)
+    height = needed(candidates[k])
+    while height <= box_height and k > 1:
+        larger = needed(candidates[k - 1])
+        if larger > box_height:
+            break
+        k, height = k - 1, larger
+    while height > box_height:
+        if k == len(candidates) - 1:
+            return None, height
+        k += 1
+        height = needed(candidates[k])
+    return sized(el, candidates[k] / largest), height
+
+
+def layout_slide(spec, metrics=METRICS):
+    """(``spec`` with containers placed and ``fit`` elements sized, [``Overflow``, ...])."""
+    elements = place(spec["elements"])
+    fitted = [i for i, el in enumerate(elements) if el.get("fit")]
+    runs = [paragraphs(elements[i]) for i in fitted]
+    overflows = []
+    for i, el_runs, block in zip(fitted, runs, measure_blocks(runs, metrics)):
+        el = elements[i]
+        sized_el, needed = fit(el, metrics, block)
+        if sized_el is None:
+            text = " ".join(run[0] for run in el_runs).split("\n")[0]
+            overflows.append(Overflow(spec.get("name", ""), el["type"], text[:40], needed, el["box"][3]))
+            sized_el = sized(el, MIN_SIZE / max(size for _, _, size, _ in el_runs))
+        elements[i] = sized_el
+    return dict(spec, elements=elements), overflows
@@ -0,0 +1,325 @@
+"""Assemble a .pptx package from a template and pre-rendered slide parts.
+
+python-pptx only knows how to save a whole in-memory presentation.  Here the
+package is written directly: every part of a slide-less template is copied
+through unchanged, slide parts (already serialized XML, possibly straight from
+the on-disk cache) are spliced in, and ``presentation.xml``, its relationships
+and ``[Content_Types].xml`` are regenerated to list them.
+"""
+import collections
+import io
+import os
+import shutil
+import struct
+import tempfile
+import time
+import zipfile
+import zlib
+from xml.sax.saxutils import quoteattr
+
+from lxml import etree
+
+from slides.cache import replace_file
+
+# xml: serialized slide XML, rels: serialized slide relationships,
+# related: tuple of (name, content_type, blob) for the parts the slide refers
+# to (images, charts and their workbooks and rels), name relative to ppt/
+SlideParts = collections.namedtuple("SlideParts", "xml rels related")
+
+NS_P = "http://schemas.openxmlformats.org/presentationml/2006/main"
+NS_R = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PKG_RELS = "http://schemas.openxmlformats.org/package/2006/relationships"
+NS_CT = "http://schemas.openxmlformats.org/package/2006/content-types"
+RT_SLIDE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/slide"
+CT_SLIDE = "application/vnd.openxmlformats-officedocument.presentationml.slide+xml"
+
+PRESENTATION = "ppt/presentation.xml"
+PRESENTATION_RELS = "ppt/_rels/presentation.xml.rels"
+CONTENT_TYPES = "[Content_Types].xml"
+
+# Elements of <p:presentation> that must follow <p:sldIdLst>
+_AFTER_SLDIDLST = ("sldSz", "notesSz", "smartTags", "embeddedFontLst", "custShowLst",
+                   "photoAlbum", "custDataLst", "kinsoku", "defaultTextStyle",
+                   "modifyVerifier", "extLst")
+
+
+def rels_xml(rels):
+    """Serialize ``(rId, reltype, target, external)`` tuples as a .rels document."""
+    out = ["<?xml version='1.0' encoding='UTF-8' standalone='yes'?>\n"
+           f'<Relationships xmlns="{NS_PKG_RELS}">']
+    for rId, reltype, target, external in rels:
+        mode = ' TargetMode="External"' if external else ""
+        out.append(f"<Relationship Id={quoteattr(rId)} Type={quoteattr(reltype)} "
+                   f"Target={quoteattr(target)}{mode}/>")
+    out.append("</Relationships>")
+    return "".join(out).encode("utf-8")
+
+
+def _serialize(element):
+    return etree.tostring(element, encoding="UTF-8", standalone=True)
+
+
+class DeckTemplate:
+    """The parts of a slide-less presentation, ready to be copied into new packages."""
+
+    def __init__(self, blob):
+        with zipfile.ZipFile(io.BytesIO(blob)) as zf:
+            self.parts = [(info.filename, zf.read(info)) for info in zf.infolist()]
+
+    @classmethod
+    def from_presentation(cls, prs):
+        if len(prs.slides):
+            raise ValueError("Template presentation must not contain slides")
+        buf = io.BytesIO()
+        prs.save(buf)
+        return cls(buf.getvalue())
+
+    def part(self, name):
+        for filename, blob in self.parts:
+            if filename == name:
+                return blob
+        raise KeyError(name)
+
+
+class StreamingZip:
+    """Minimal write-only zip archive whose memory use does not grow with entry count.
+
+    ``zipfile.ZipFile`` keeps a ZipInfo object per entry until it writes the
+    central directory on close.  Here each central directory record is
+    serialized as soon as its entry is written and spooled to a temporary
+    file, then copied behind the file data on ``close``.  Zip64 records are
+    emitted when entry counts or offsets exceed the classic limits.
+    """
+
+    def __init__(self, f, compresslevel=6):
+        self._f = f
+        self._offset = 0
+        self._count = 0
+        self._central = tempfile.TemporaryFile()
+        self._level = compresslevel
+        t = time.localtime()
+        self._dostime = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+        self._dosdate = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+    def writestr(self, name, data):
+        self.write_chunks(name, (data,))
+
+    def write_chunks(self, name, chunks):
+        """Deflate an entry from an iterable of str/bytes chunks without joining them."""
+        name_bytes = name.encode("utf-8")
+        flags = 0 if name_bytes.isascii() else 0x800
+        offset = self._offset
+        # Entries themselves are small; only the header offset can need zip64
+        extra = struct.pack("<HHQ", 1, 8, offset) if offset >= 0xFFFFFFFF else b""
+        version = 45 if extra else 20
+
+        # Header first with zero crc/sizes, patched once the data is written
+        self._f.write(struct.pack("<IHHHHHIIIHH", 0x04034B50, version, flags, 8, self._dostime,
+                                  self._dosdate, 0, 0, 0, len(name_bytes), 0))
+        self._f.write(name_bytes)
+        crc = size = compressed = 0
+        compressor = zlib.compressobj(self._level, zlib.DEFLATED, -15)
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            out = compressor.compress(chunk)
+            compressed += len(out)
+            self._f.write(out)
+        out = compressor.flush()
+        compressed += len(out)
+        self._f.write(out)
+        self._f.seek(offset + 14)
+        self._f.write(struct.pack("<III", crc, compressed, size))
+        self._f.seek(0, os.SEEK_END)
+        self._offset += 30 + len(name_bytes) + compressed
+
+        self._central.write(struct.pack(
+            "<IHHHHHHIIIHHHHHII", 0x02014B50, version, version, flags, 8, self._dostime, self._dosdate,
+            crc, compressed, size, len(name_bytes), len(extra), 0, 0, 0, 0o600 << 16,
+            min(offset, 0xFFFFFFFF)))
+        self._central.write(name_bytes)
+        self._central.write(extra)
+        self._count += 1
+
+    def close(self):
+        cd_offset = self._offset
+        cd_size = self._central.tell()
+        self._central.seek(0)
+        shutil.copyfileobj(self._central, self._f)
+        self._central.close()
+        end = cd_offset + cd_size
+        if self._count >= 0xFFFF or cd_offset >= 0xFFFFFFFF or cd_size >= 0xFFFFFFFF:
+            self._f.write(struct.pack("<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0,
+                                      self._count, self._count, cd_size, cd_offset))
+            self._f.write(struct.pack("<IIQI", 0x07064B50, 0, end, 1))
+        self._f.write(struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, min(self._count, 0xFFFF),
+                                  min(self._count, 0xFFFF), min(cd_size, 0xFFFFFFFF),
+                                  min(cd_offset, 0xFFFFFFFF), 0))
+
+
+class PackageWriter:
+    """Write a package incrementally: template parts first, then one slide at a time.
+
+    Each slide's parts go straight into the zip stream when ``add_slide`` is
+    called, so nothing but the slide count and the names of shared related
+    parts is retained between slides.  Output is written to a temporary file next to
+    ``path`` and only renamed into place by ``close``; ``abort`` (or leaving a
+    ``with`` block with an exception) removes it, so a failure never leaves a
+    partial file behind.
+    """
+
+    def __init__(self, path, template):
+        self.path = path
+        self.template = template
+        self.count = 0
+        self._related_written = set()
+        self._default_types = {}
+        self._override_types = {}
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, self._tmp_path = tempfile.mkstemp(suffix=".pptx.tmp", dir=directory)
+        self._file = os.fdopen(fd, "wb")
+        self._zip = StreamingZip(self._file)
+        regenerated = (PRESENTATION, PRESENTATION_RELS, CONTENT_TYPES)
+        for name, blob in template.parts:
+            if name not in regenerated:
+                self._zip.writestr(name, blob)
+
+    def add_slide(self, parts):
+        self.count += 1
+        self._zip.writestr(f"ppt/slides/slide{self.count}.xml", parts.xml)
+        self._zip.writestr(f"ppt/slides/_rels/slide{self.count}.xml.rels", parts.rels)
+        for name, content_type, blob in parts.related:
+            if name in self._related_written:
+                continue
+            self._zip.writestr(f"ppt/{name}", blob)
+            self._related_written.add(name)
+            # Binary parts are typed by extension, XML parts (charts) one by one;
+            # .rels parts are covered by the template's defaults
+            ext = os.path.splitext(name)[1][1:].lower()
+            if ext == "xml":
+                self._override_types[f"/ppt/{name}"] = content_type
+            elif ext != "rels":
+                self._default_types[ext] = content_type
+
+    def close(self):
+        try:
+            slide_rIds = _write_presentation_rels(self._zip, self.template, self.count)
+            _write_presentation(self._zip, self.template, slide_rIds)
+            _write_content_types(self._zip, self.template, self.count, self._default_types,
+                                 self._override_types)
+            self._zip.close()
+            self._file.close()
+            replace_file(self._tmp_path, self.path)
+        except BaseException:
+            self.abort()
+            raise
+        return self.count
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.unlink(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def write_deck(path, template, slides):
+    """Write ``slides`` (an iterable of SlideParts) into a new package at ``path``."""
+    with PackageWriter(path, template) as writer:
+        for parts in slides:
+            writer.add_slide(parts)
+    return writer.count
+
+
+# presentation.xml, its rels and [Content_Types].xml list every slide, so
+# they are generated as chunk streams rather than built as lxml trees.
+def _split_around(xml, parent_tag, before=()):
+    """Serialize template ``xml`` and split it where a new child of ``parent_tag`` goes.
+
+    The child is placed before the first existing child whose local name is in
+    ``before``, or appended last.
+    """
+    root = etree.fromstring(xml)
+    parent = root if etree.QName(root).localname == parent_tag else root.find(".//{*}" + parent_tag)
+    marker = etree.Comment("SPLIT")
+    successor = next((child for child in parent
+                      if isinstance(child.tag, str) and etree.QName(child).localname in before), None)
+    if successor is None:
+        parent.append(marker)
+    else:
+        successor.addprevious(marker)
+    head, tail = _serialize(root).split(b"<!--SPLIT-->")
+    return head, tail
+
+
+def _write_presentation_rels(zf, template, count):
+    xml = template.part(PRESENTATION_RELS)
+    used = {rel.get("Id") for rel in etree.fromstring(xml)}
+    rIds = []
+    n = 1
+    for _ in range(count):
+        while f"rId{n}" in used:
+            n += 1
+        rIds.append(f"rId{n}")
+        n += 1
+    head, tail = _split_around(xml, "Relationships")
+
+    def chunks():
+        yield head
+        for i, rId in enumerate(rIds, start=1):
+            yield f'<Relationship Id="{rId}" Type="{RT_SLIDE}" Target="slides/slide{i}.xml"/>'
+        yield tail
+
+    zf.write_chunks(PRESENTATION_RELS, chunks())
+    return rIds
+
+
+def _write_presentation(zf, template, slide_rIds):
+    root = etree.fromstring(template.part(PRESENTATION))
+    old = root.find(f"{{{NS_P}}}sldIdLst")
+    if old is not None:
+        root.remove(old)
+    if not slide_rIds:
+        zf.writestr(PRESENTATION, _serialize(root))
+        return
+    head, tail = _split_around(_serialize(root), "presentation", _AFTER_SLDIDLST)
+    prefix = root.prefix + ":" if root.prefix else ""
+    r_prefix = next(prefix for prefix, uri in root.nsmap.items() if uri == NS_R)
+
+    def chunks():
+        yield head
+        yield f"<{prefix}sldIdLst>"
+        for i, rId in enumerate(slide_rIds):
+            yield f'<{prefix}sldId id="{256 + i}" {r_prefix}:id="{rId}"/>'
+        yield f"</{prefix}sldIdLst>"
+        yield tail
+
+    zf.write_chunks(PRESENTATION, chunks())
+
+
+def _write_content_types(zf, template, count, default_types, override_types):
+    xml = template.part(CONTENT_TYPES)
+    defaults = {el.get("Extension").lower() for el in etree.fromstring(xml).findall(f"{{{NS_CT}}}Default")}
+    head, tail = _split_around(xml, "Types")
+
+    def chunks():
+        yield head
+        for ext, content_type in sorted(default_types.items()):
+            if ext not in defaults:
+                yield f'<Default Extension={quoteattr(ext)} ContentType={quoteattr(content_type)}/>'
+        for partname, content_type in sorted(override_types.items()):
+            yield f'<Override PartName={quoteattr(partname)} ContentType={quoteattr(content_type)}/>'
+        for i in range(1, count + 1):
+            yield f'<Override PartName="/ppt/slides/slide{i}.xml" ContentType="{CT_SLIDE}"/>'
+        yield tail
+
+    zf.write_chunks(CONTENT_TYPES, chunks())
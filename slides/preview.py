@@ -0,0 +1,544 @@
+"""Rasterize the slides of a built deck to PNG, without PowerPoint or LibreOffice.
+
+Only the DrawingML this generator writes is understood: rectangles, rounded
+rectangles, ovals and the cloud (``p:sp``), straight connectors
+(``p:cxnSp``), solid fills and outlines -- set on the shape or taken from
+its theme style reference -- text frames, pictures (the LED GIFs, first
+frame) and the XY line charts of ``slides.telemetry``.  Any other preset is
+drawn as its bounding rectangle.
+
+Text is wrapped with ``slides.layout``'s font metrics, so lines break where
+``fit`` expected them to, and drawn with the face's TrueType file, or DejaVu
+when the deck's font is not installed.  Glyphs may then come out a little
+wider or narrower than PowerPoint's; positions and line breaks do not.
+
+Each preview is kept in a cache directory under the hash of everything that
+decides its pixels -- the slide XML, its relationships and related parts,
+the theme, the slide size, the preview width and this module's source -- so
+after an edit only the changed slides are drawn again.  Those are drawn on a
+process pool, one slide per task.  ``benchmarks/bench_preview.py`` measures
+slides per second.
+
+Nothing here imports python-pptx; PIL is imported by the functions that draw.
+"""
+import collections
+import functools
+import hashlib
+import io
+import os
+import posixpath
+import re
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from lxml import etree
+
+from slides.layout import METRICS, THEME_FONT
+
+PREVIEW_WIDTH = 960  # px of a preview; its height follows the slide's aspect
+THUMB_WIDTH = 320  # px of a contact sheet cell
+SHEET_COLUMNS = 4
+
+EMU_PER_PT = 12700
+INSETS = (91440, 45720, 91440, 45720)  # bodyPr defaults: left, top, right, bottom (EMU)
+ROUND_ADJ = 16667  # roundRect corner radius, in 1/100000 of the shorter side
+DEFAULT_SIZE = 1800  # centipoints
+SHEET_BG = (40, 40, 48)
+FALLBACK_FONTS = ("DejaVu Sans", "DejaVu Sans Mono")  # drawn when a deck's font is not installed
+
+NS = {"a": "http://schemas.openxmlformats.org/drawingml/2006/main",
+      "p": "http://schemas.openxmlformats.org/presentationml/2006/main",
+      "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+      "c": "http://schemas.openxmlformats.org/drawingml/2006/chart",
+      "rel": "http://schemas.openxmlformats.org/package/2006/relationships"}
+R_ID = f"{{{NS['r']}}}id"
+R_EMBED = f"{{{NS['r']}}}embed"
+# Scheme colors a slide names, through the master's default color map
+COLOR_MAP = {"tx1": "dk1", "bg1": "lt1", "tx2": "dk2", "bg2": "lt2"}
+# The cloud preset as overlapping ellipses: center x, center y, half width, half height (fractions of the box)
+CLOUD = ((0.25, 0.58, 0.22, 0.24), (0.4, 0.34, 0.22, 0.25), (0.63, 0.3, 0.22, 0.24), (0.8, 0.5, 0.19, 0.22),
+         (0.66, 0.72, 0.22, 0.22), (0.4, 0.74, 0.22, 0.2), (0.5, 0.52, 0.32, 0.3))
+
+PREVIEW_SOURCES = (os.path.abspath(__file__), os.path.join(os.path.dirname(os.path.abspath(__file__)), "layout.py"))
+
+Deck = collections.namedtuple("Deck", "size theme slides")
+# size: (cx, cy) in EMU; theme: Theme; slides: SlideSource of each slide, in order
+Theme = collections.namedtuple("Theme", "colors font lines")
+# colors: scheme name -> (r, g, b); font: the minor (body) font; lines: widths of the style matrix lines (EMU)
+SlideSource = collections.namedtuple("SlideSource", "number xml rels related")
+# related: {rId: blob} of the pictures and charts the slide refers to
+PreviewResult = collections.namedtuple("PreviewResult", "pngs rendered cached seconds workers")
+# pngs: PNG bytes of each slide, in order
+
+
+def preview_fingerprint():
+    """Hash of ``PREVIEW_SOURCES`` and the PIL version; part of every preview cache key."""
+    import PIL
+
+    source = PIL.__version__.encode()
+    for path in PREVIEW_SOURCES:
+        with open(path, "rb") as f:
+            source += f.read()
+    return hashlib.sha256(source).hexdigest()[:16]
+
+
+class PreviewCache:
+    """PNG previews by key, written aside and renamed into place like ``slides.cache.SlideCache``."""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key + ".png")
+
+    def get(self, key):
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, key, png):
+        import tempfile
+
+        from slides.cache import replace_file
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(png)
+        replace_file(tmp_path, path)
+
+
+# --- reading the package ---
+def _rels(zf, part):
+    # {rId: target part name} of a part
+    folder, name = posixpath.split(part)
+    try:
+        root = etree.fromstring(zf.read(posixpath.join(folder, "_rels", name + ".rels")))
+    except KeyError:
+        return {}
+    return {rel.get("Id"): posixpath.normpath(posixpath.join(folder, rel.get("Target")))
+            for rel in root.iterfind("rel:Relationship", NS) if rel.get("TargetMode") != "External"}
+
+
+def _hex(value):
+    return tuple(bytes.fromhex(value[:6]))
+
+
+def read_theme(xml):
+    root = etree.fromstring(xml)
+    colors = {}
+    for el in root.find(".//a:clrScheme", NS):
+        value = el[0].get("val") if el[0].tag.endswith("srgbClr") else el[0].get("lastClr", "000000")
+        colors[etree.QName(el).localname] = _hex(value)
+    font = root.find(".//a:minorFont/a:latin", NS)
+    lines = [int(ln.get("w", 9525)) for ln in root.iterfind(".//a:lnStyleLst/a:ln", NS)]
+    return Theme(colors, font.get("typeface") if font is not None else THEME_FONT, lines or [9525, 25400, 38100])
+
+
+def read_deck(path):
+    """The slide size, theme and slide parts of the .pptx at ``path``."""
+    with zipfile.ZipFile(path) as zf:
+        presentation = etree.fromstring(zf.read("ppt/presentation.xml"))
+        size = presentation.find("p:sldSz", NS)
+        parts = _rels(zf, "ppt/presentation.xml")
+        theme = next((target for target in parts.values() if "/theme/" in target), None)
+        if theme is None:
+            master = next(target for target in parts.values() if "/slideMasters/" in target)
+            theme = next(target for target in _rels(zf, master).values() if "/theme/" in target)
+        slides = []
+        for number, sld in enumerate(presentation.iterfind("p:sldIdLst/p:sldId", NS), 1):
+            part = parts[sld.get(R_ID)]
+            folder, name = posixpath.split(part)
+            rels = zf.read(posixpath.join(folder, "_rels", name + ".rels"))
+            related = {rId: zf.read(target) for rId, target in _rels(zf, part).items()
+                       if "/media/" in target or "/charts/" in target}
+            slides.append(SlideSource(number, zf.read(part), rels, related))
+        return Deck((int(size.get("cx")), int(size.get("cy"))), read_theme(zf.read(theme)), slides)
+
+
+def slide_key(deck, slide, width, salt):
+    digest = hashlib.sha256(f"{salt}|{width}|{deck.size}|{deck.theme}".encode())
+    for blob in (slide.xml, slide.rels, *(slide.related[rId] for rId in sorted(slide.related))):
+        digest.update(len(blob).to_bytes(8, "little"))
+        digest.update(blob)
+    return digest.hexdigest()
+
+
+# --- drawing ---
+@functools.lru_cache(maxsize=256)
+def _font(family, bold, px):
+    # (PIL font, whether it stands in for a face not installed) of a (family, bold) face at px pixels per em
+    from PIL import ImageFont
+
+    mono = re.search(r"courier|mono|consol", family, re.I) is not None
+    for name in (family, FALLBACK_FONTS[mono]):
+        source = METRICS.face(name, bold).source
+        if source != "builtin":
+            return ImageFont.truetype(source, max(px, 1)), name != family
+    return ImageFont.load_default(max(px, 1)), True
+
+
+def _color(el, theme):
+    # (r, g, b) of the color element under a fill, line or style reference; None if there is none
+    if el is None:
+        return None
+    for child in el:
+        kind = etree.QName(child).localname
+        if kind == "srgbClr":
+            return _hex(child.get("val"))
+        if kind == "schemeClr":
+            name = child.get("val")
+            return theme.colors.get(COLOR_MAP.get(name, name))
+        if kind == "sysClr":
+            return _hex(child.get("lastClr", "000000"))
+    return None
+
+
+def _fill(sp_pr, style, theme):
+    if sp_pr is not None:
+        if sp_pr.find("a:noFill", NS) is not None:
+            return None
+        fill = sp_pr.find("a:solidFill", NS)
+        if fill is not None:
+            return _color(fill, theme)
+    ref = style.find("a:fillRef", NS) if style is not None else None
+    return _color(ref, theme) if ref is not None and ref.get("idx") != "0" else None
+
+
+def _line(sp_pr, style, theme):
+    """(color, width in EMU) of an outline, or None."""
+    ln = sp_pr.find("a:ln", NS) if sp_pr is not None else None
+    ref = style.find("a:lnRef", NS) if style is not None else None
+    idx = int(ref.get("idx", 0)) if ref is not None else 0
+    # Line widths of the style reference come from the theme's line style list
+    width = theme.lines[min(idx, len(theme.lines)) - 1] if idx else 9525
+    if ln is not None:
+        width = int(ln.get("w", width))
+        if ln.find("a:noFill", NS) is not None:
+            return None
+        fill = ln.find("a:solidFill", NS)
+        if fill is not None:
+            return _color(fill, theme), width
+    return (_color(ref, theme), width) if idx else None
+
+
+def _xfrm(el):
+    xfrm = el.find("p:spPr/a:xfrm", NS)
+    if xfrm is None:
+        xfrm = el.find("p:xfrm", NS)
+    if xfrm is None:
+        return None
+    off, ext = xfrm.find("a:off", NS), xfrm.find("a:ext", NS)
+    return (int(off.get("x")), int(off.get("y")), int(ext.get("cx")), int(ext.get("cy")),
+            xfrm.get("flipH") == "1", xfrm.get("flipV") == "1")
+
+
+class _Canvas:
+    """One slide being drawn: EMU to pixels, the theme, and the slide's related parts."""
+
+    def __init__(self, deck_size, theme, related, width):
+        from PIL import Image, ImageDraw
+
+        self.scale = width / deck_size[0]
+        self.theme = theme
+        self.related = related
+        self.image = Image.new("RGB", (width, max(round(deck_size[1] * self.scale), 1)), theme.colors.get("lt1"))
+        self.draw = ImageDraw.Draw(self.image)
+
+    def px(self, emu):
+        return emu * self.scale
+
+    def box(self, x, y, cx, cy):
+        return [self.px(x), self.px(y), self.px(x + cx) - 1, self.px(y + cy) - 1]
+
+    def stroke(self, width):
+        return max(round(self.px(width)), 1)
+
+    def background(self, root):
+        fill = root.find("p:cSld/p:bg/p:bgPr/a:solidFill", NS)
+        color = _color(fill, self.theme) if fill is not None else None
+        if color is not None:
+            self.draw.rectangle([0, 0, *self.image.size], fill=color)
+
+    def shape(self, sp):
+        xfrm = _xfrm(sp)
+        if xfrm is None:
+            return
+        x, y, cx, cy, flip_h, flip_v = xfrm
+        sp_pr, style = sp.find("p:spPr", NS), sp.find("p:style", NS)
+        geom = sp_pr.find("a:prstGeom", NS)
+        preset = geom.get("prst") if geom is not None else "rect"
+        line = _line(sp_pr, style, self.theme)
+        if preset in ("line", "straightConnector1"):
+            if line is not None:
+                begin = (self.px(x + cx if flip_h else x), self.px(y + cy if flip_v else y))
+                end = (self.px(x if flip_h else x + cx), self.px(y if flip_v else y + cy))
+                self.draw.line([begin, end], fill=line[0], width=self.stroke(line[1]))
+            return
+        fill = _fill(sp_pr, style, self.theme)
+        outline, width = (line[0], self.stroke(line[1])) if line is not None else (None, 0)
+        box = self.box(x, y, cx, cy)
+        if preset == "roundRect":
+            gd = geom.find("a:avLst/a:gd", NS)
+            adj = int(gd.get("fmla").split()[-1]) if gd is not None else ROUND_ADJ
+            radius = self.px(min(cx, cy)) * adj / 100000
+            self.draw.rounded_rectangle(box, radius, fill=fill, outline=outline, width=width)
+        elif preset == "ellipse":
+            self.draw.ellipse(box, fill=fill, outline=outline, width=width)
+        elif preset == "cloud":
+            self.cloud(box, fill, outline, width)
+        else:
+            self.draw.rectangle(box, fill=fill, outline=outline, width=width)
+        body = sp.find("p:txBody", NS)
+        if body is not None:
+            font = style.find("a:fontRef", NS) if style is not None else None
+            color = _color(font, self.theme) if font is not None else None
+            self.text(body, x, y, cx, cy, color or self.theme.colors.get("dk1"))
+
+    def cloud(self, box, fill, outline, width):
+        left, top, right, bottom = box
+        w, h = right - left, bottom - top
+        bumps = [(left + bx * w, top + by * h, rx * w, ry * h) for bx, by, rx, ry in CLOUD]
+        if outline is not None and fill is None:
+            for bx, by, rx, ry in bumps:
+                self.draw.ellipse([bx - rx, by - ry, bx + rx, by + ry], outline=outline, width=width)
+        elif outline is not None:
+            # Outlined bumps first, the filled ones on top: only the outer edge stays
+            for bx, by, rx, ry in bumps:
+                self.draw.ellipse([bx - rx - width, by - ry - width, bx + rx + width, by + ry + width], fill=outline)
+        if fill is not None:
+            for bx, by, rx, ry in bumps:
+                self.draw.ellipse([bx - rx, by - ry, bx + rx, by + ry], fill=fill)
+
+    def text(self, body, x, y, cx, cy, default_color):
+        pr = body.find("a:bodyPr", NS)
+        left, top, right, bottom = (int(pr.get(attr, inset)) for attr, inset in
+                                    zip(("lIns", "tIns", "rIns", "bIns"), INSETS))
+        width = (cx - left - right) / EMU_PER_PT  # pt
+        wrap = pr.get("wrap") != "none"
+        lines = []  # (align, height in pt, spans)
+        for p in body.iterfind("a:p", NS):
+            lines += _paragraph(p, width if wrap else float("inf"), default_color, self.theme)
+        total = sum(height for _, height, _ in lines) * EMU_PER_PT
+        anchor = pr.get("anchor", "t")
+        at = y + top + ((cy - top - bottom - total) / 2 if anchor == "ctr" else
+                        cy - top - bottom - total if anchor == "b" else 0)
+        for align, height, spans in lines:
+            used = spans[-1][0] + spans[-1][6] if spans else 0
+            shift = {"ctr": (width - used) / 2, "r": width - used}.get(align, 0) * EMU_PER_PT
+            for offset, text, family, bold, size, color, advance in spans:
+                px = round(self.px(size * EMU_PER_PT))
+                font, substitute = _font(family, bold, px)
+                drawn = font.getlength(text) if substitute else 0
+                if drawn:
+                    # A stand-in face is scaled to the width the deck's font gives the span
+                    font, _ = _font(family, bold, round(px * self.px(advance * EMU_PER_PT) / drawn))
+                self.draw.text((self.px(x + left + shift + offset * EMU_PER_PT), self.px(at)), text, fill=color,
+                               font=font)
+            at += height * EMU_PER_PT
+
+    def picture(self, pic):
+        from PIL import Image
+
+        xfrm = _xfrm(pic)
+        blip = pic.find("p:blipFill/a:blip", NS)
+        blob = self.related.get(blip.get(R_EMBED)) if blip is not None else None
+        if xfrm is None or blob is None:
+            return
+        x, y, cx, cy, _, _ = xfrm
+        size = (max(round(self.px(cx)), 1), max(round(self.px(cy)), 1))
+        with Image.open(io.BytesIO(blob)) as image:
+            image = image.convert("RGBA").resize(size, Image.BILINEAR)
+        self.image.paste(image, (round(self.px(x)), round(self.px(y))), image)
+
+    def chart(self, frame):
+        # The plot area of an XY chart: axes and one polyline per series, scaled to the data
+        xfrm = _xfrm(frame)
+        chart = frame.find(".//c:chart", NS)
+        blob = self.related.get(chart.get(R_ID)) if chart is not None else None
+        if xfrm is None or blob is None:
+            return
+        x, y, cx, cy, _, _ = xfrm
+        series = []
+        for ser in etree.fromstring(blob).iterfind(".//c:ser", NS):
+            xs = [float(v.text) for v in ser.iterfind("c:xVal//c:pt/c:v", NS)]
+            ys = [float(v.text) for v in ser.iterfind("c:yVal//c:pt/c:v", NS)]
+            color = _color(ser.find("c:spPr/a:ln/a:solidFill", NS), self.theme)
+            series.append((xs, ys, color or self.theme.colors.get("accent%d" % (len(series) % 6 + 1))))
+        left, top, right, bottom = self.box(x + cx // 10, y + cy // 10, cx * 8 // 10, cy * 8 // 10)
+        axis = self.theme.colors.get("dk2")
+        self.draw.line([(left, top), (left, bottom), (right, bottom)], fill=axis, width=1)
+        points = [(px, py) for xs, ys, _ in series for px, py in zip(xs, ys)]
+        if not points:
+            return
+        x0, x1 = min(p[0] for p in points), max(p[0] for p in points)
+        y0, y1 = min(p[1] for p in points), max(p[1] for p in points)
+        for xs, ys, color in series:
+            line = [(left + (px - x0) / ((x1 - x0) or 1) * (right - left),
+                     bottom - (py - y0) / ((y1 - y0) or 1) * (bottom - top)) for px, py in zip(xs, ys)]
+            if len(line) > 1:
+                self.draw.line(line, fill=color, width=self.stroke(19050))
+
+
+def _run_style(pr, style, theme):
+    # (family, bold, size in pt, color) of run properties over ``style``
+    if pr is None:
+        return style
+    family, bold, size, color = style
+    if pr.get("sz"):
+        size = int(pr.get("sz")) / 100
+    if pr.get("b"):
+        bold = pr.get("b") in ("1", "true")
+    latin = pr.find("a:latin", NS)
+    if latin is not None:
+        family = latin.get("typeface")
+        family = theme.font if family.startswith("+") else family
+    fill = pr.find("a:solidFill", NS)
+    if fill is not None:
+        color = _color(fill, theme) or color
+    return family, bold, size, color
+
+
+def _paragraph(p, width, default_color, theme):
+    """Lines of a paragraph wrapped in ``width`` pt: (align, height in pt, spans)."""
+    ppr = p.find("a:pPr", NS)
+    style = _run_style(ppr.find("a:defRPr", NS) if ppr is not None else None,
+                       (theme.font, False, DEFAULT_SIZE / 100, default_color), theme)
+    align = ppr.get("algn", "l") if ppr is not None else "l"
+    # Words of every run, with whether a space comes before each; a:br ends a line
+    words, space = [[]], False
+    for child in p:
+        kind = etree.QName(child).localname
+        if kind == "br":
+            words.append([])
+            space = False
+        elif kind in ("r", "fld"):
+            run = _run_style(child.find("a:rPr", NS), style, theme)
+            for i, word in enumerate(child.findtext("a:t", "", NS).split(" ")):
+                space = space or i > 0
+                if word:
+                    words[-1].append((word, run, space))
+                    space = False
+    lines = []
+    for segment in words:
+        lines += _wrap(segment, width, style)
+    return [(align, height, spans) for height, spans in lines]
+
+
+def _wrap(words, width, style):
+    """Greedy word wrap, as slides.layout.wrapped counts it: [(height in pt, spans)].
+
+    Words of one style in a row make one span, [x, text, family, bold, size, color, width] in pt.
+    """
+    if not words:
+        family, bold, size, _ = style
+        return [(size * METRICS.face(family, bold).line, [])]
+    advances = {}
+    for word, (family, bold, _, _), _ in words:
+        advances.setdefault((family, bold), []).append(word)
+    for key, group in advances.items():
+        advances[key] = iter(METRICS.words(group, *key))
+    lines, spans, used, height = [], [], 0.0, 0.0
+    for word, run, spaced in words:
+        family, bold, size, color = run
+        face = METRICS.face(family, bold)
+        w = next(advances[family, bold]) * size / 1000
+        gap = float(face.advances[32]) * size / 1000 if spaced and spans else 0.0
+        if spans and used + gap + w > width:
+            lines.append((height, spans))
+            spans, used, height, gap = [], 0.0, 0.0, 0.0
+        if spans and spans[-1][2:6] == [family, bold, size, color]:
+            spans[-1][1] += " " * (gap > 0) + word
+            spans[-1][6] += gap + w
+        else:
+            spans.append([used + gap, word, family, bold, size, color, w])
+        used += gap + w
+        height = max(height, size * face.line)
+    lines.append((height, spans))
+    return lines
+
+
+def render_slide(slide, deck, width=PREVIEW_WIDTH):
+    """The PIL image of one ``SlideSource`` of ``deck``, ``width`` pixels wide."""
+    canvas = _Canvas(deck.size, deck.theme, slide.related, width)
+    root = etree.fromstring(slide.xml)
+    canvas.background(root)
+    draw = {"sp": canvas.shape, "cxnSp": canvas.shape, "pic": canvas.picture, "graphicFrame": canvas.chart}
+    for el in root.find("p:cSld/p:spTree", NS):
+        kind = draw.get(etree.QName(el).localname)
+        if kind is not None:
+            kind(el)
+    return canvas.image
+
+
+def png(image):
+    buf = io.BytesIO()
+    image.save(buf, "PNG", compress_level=1)
+    return buf.getvalue()
+
+
+def _render_one(slide, size, theme, width):
+    # Runs in a worker process
+    return png(render_slide(slide, Deck(size, theme, ()), width))
+
+
+def preview_deck(path, width=PREVIEW_WIDTH, cache_dir=None, workers=None):
+    """PNG previews of every slide of the .pptx at ``path``; only slides not in ``cache_dir`` are drawn."""
+    start = time.perf_counter()
+    deck = read_deck(path)
+    cache = PreviewCache(cache_dir) if cache_dir else None
+    salt = preview_fingerprint()
+    keys = [slide_key(deck, slide, width, salt) for slide in deck.slides]
+    pngs = [cache.get(key) if cache else None for key in keys]
+    todo = [i for i, found in enumerate(pngs) if found is None]
+    workers = min(workers or os.cpu_count() or 1, max(len(todo), 1))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            drawn = list(pool.map(functools.partial(_render_one, size=deck.size, theme=deck.theme, width=width),
+                                  [deck.slides[i] for i in todo]))
+    else:
+        drawn = [_render_one(deck.slides[i], deck.size, deck.theme, width) for i in todo]
+    for i, blob in zip(todo, drawn):
+        pngs[i] = blob
+        if cache:
+            cache.put(keys[i], blob)
+    return PreviewResult(pngs, len(todo), len(pngs) - len(todo), time.perf_counter() - start, workers)
+
+
+def write_previews(pngs, output_dir):
+    """Write ``slide-NN.png`` for each preview; returns the paths."""
+    os.makedirs(output_dir, exist_ok=True)
+    digits = max(len(str(len(pngs))), 2)
+    paths = []
+    for number, blob in enumerate(pngs, 1):
+        path = os.path.join(output_dir, f"slide-{number:0{digits}}.png")
+        with open(path, "wb") as f:
+            f.write(blob)
+        paths.append(path)
+    return paths
+
+
+def contact_sheet(pngs, columns=SHEET_COLUMNS, thumb=THUMB_WIDTH, gap=8):
+    """One image of every preview scaled to ``thumb`` pixels wide, ``columns`` to a row, numbered."""
+    from PIL import Image, ImageDraw
+
+    thumbs = []
+    for blob in pngs:
+        with Image.open(io.BytesIO(blob)) as image:
+            thumbs.append(image.resize((thumb, max(round(image.height * thumb / image.width), 1)), Image.BILINEAR))
+    height = max((t.height for t in thumbs), default=0)
+    rows = -(-len(thumbs) // columns)
+    sheet = Image.new("RGB", (columns * (thumb + gap) + gap, rows * (height + gap) + gap), SHEET_BG)
+    draw = ImageDraw.Draw(sheet)
+    label, _ = _font(FALLBACK_FONTS[0], True, 14)
+    for i, image in enumerate(thumbs):
+        left, top = gap + i % columns * (thumb + gap), gap + i // columns * (height + gap)
+        sheet.paste(image, (left, top))
+        draw.text((left + 4, top + 2), str(i + 1), fill=(255, 255, 255), font=label, stroke_width=2,
+                  stroke_fill=(0, 0, 0))
+    return sheet
@@ -0,0 +1,340 @@
+"""Render resolved slide specs into serialized slide parts with python-pptx.
+
+Element types understood by ``SlideRenderer`` (boxes are [left, top, width,
+height] in inches, colors are [r, g, b] after palette resolution):
+
+    title      text, size (40), top (0.5), color
+    text       text, box, size (18), color, bold (false), align, bullets, bullet_color,
+               bullet_size (18), fit
+    code       code, box, size (12), fill, line, color, fit
+    shape      shape (rectangle | rounded_rectangle | oval | cloud), box, fill,
+               line (color or "none"), text, size (18, of text), paragraphs, bullets,
+               bullet_color, bullet_size (18), margin, anchor, fit
+    connector  begin [x, y], end [x, y]
+    team       members [{name, id, role, color}], box ([1, 2.5, 11.8, 3.5]), gap (0.2),
+               fill, color, secondary -- one card per member, side by side
+    chart      box, series [{name, x, y, color}], title, x_title, y_title,
+               size (10), color (labels), line (gridlines) -- an XY line chart
+    leds       box, states [{smoke, pm25, co2, hold}], fps (10), scale (8) --
+               the ripes.s LED matrix for those switch settings (raw field
+               values, each held ``hold`` frames), animated if it changes
+    stack      box, elements, direction (vertical | horizontal), gap (0.2) --
+               the elements one after another, each given its box; "basis" on
+               an element fixes its length, the others share the rest
+    grid       box, elements, columns, gap (0.2 or [columns, rows]) -- the
+               elements in equal cells, row by row
+
+Stacks and grids nest, and their elements leave out "box".  ``"fit": true``
+shrinks an element's font sizes until its text fits the box
+(``slides.layout``).  Default colors are filled in by ``slides.spec.resolve_slides``.
+
+Paragraph dicts (``paragraphs``) take text, size, color, bold, font and align.
+"""
+import hashlib
+import io
+
+from pptx import Presentation
+from pptx.dml.color import RGBColor
+from pptx.chart.data import XyChartData
+from pptx.enum.chart import XL_CHART_TYPE, XL_LEGEND_POSITION
+from pptx.enum.shapes import MSO_CONNECTOR, MSO_SHAPE
+from pptx.enum.text import MSO_ANCHOR, PP_ALIGN
+from pptx.opc.constants import CONTENT_TYPE as CT
+from pptx.opc.constants import RELATIONSHIP_TYPE as RT
+from pptx.util import Emu, Inches, Pt
+
+from slides.layout import METRICS, grid, layout_slide
+from slides.package import SlideParts, rels_xml
+from slides.styles import STYLES
+
+TEXT_MAIN = RGBColor(255, 255, 255)
+TEXT_SEC = RGBColor(160, 160, 176)
+CARD_BG = RGBColor(20, 20, 30)
+CODE_BG = RGBColor(26, 26, 46)
+CODE_LINE = RGBColor(50, 50, 60)
+CODE_TEXT = RGBColor(200, 200, 200)
+
+SHAPES = {
+    "rectangle": MSO_SHAPE.RECTANGLE,
+    "rounded_rectangle": MSO_SHAPE.ROUNDED_RECTANGLE,
+    "oval": MSO_SHAPE.OVAL,
+    "cloud": MSO_SHAPE.CLOUD,
+}
+ALIGN = {"left": PP_ALIGN.LEFT, "center": PP_ALIGN.CENTER, "right": PP_ALIGN.RIGHT}
+ANCHOR = {"top": MSO_ANCHOR.TOP, "middle": MSO_ANCHOR.MIDDLE, "bottom": MSO_ANCHOR.BOTTOM}
+TEAM_BOX = [1, 2.5, 11.8, 3.5]
+
+
+def inches(value):
+    # Rounded rather than truncated so that computed offsets land on whole EMUs
+    return Emu(round(value * 914400))
+
+
+def rgb(value):
+    return RGBColor(*value)
+
+
+def box(spec):
+    return [inches(v) for v in spec["box"]]
+
+
+# --- HELPER FUNCTIONS ---
+# Text and card formatting goes through the shared style registry, which
+# clones prebuilt property elements instead of setting them one by one.
+def add_title(slide, text, font_size=40, top=Inches(0.5), color=TEXT_MAIN):
+    title_box = STYLES.add_textbox(slide, Inches(0.5), top, Inches(12.333), Inches(1))
+    STYLES.style_paragraph(title_box.text_frame.paragraphs[0], text, "title", size=font_size, color=color)
+    return title_box
+
+
+def add_text_box(slide, text, left, top, width, height, font_size=18, color=TEXT_SEC, bold=False):
+    tb = STYLES.add_textbox(slide, left, top, width, height, word_wrap=True)
+    tf = tb.text_frame
+    STYLES.style_paragraph(tf.paragraphs[0], text, "body", size=font_size, color=color, bold=bold)
+    return tf
+
+
+def add_bullet(tf, text, level=0, color=TEXT_SEC, font_size=18):
+    STYLES.style_paragraph(tf.add_paragraph(), text, "bullet", level=level, color=color, size=font_size)
+
+
+def add_code_block(slide, code_text, left, top, width, height, fill=CODE_BG, line=CODE_LINE, color=CODE_TEXT,
+                   font_size=12):
+    # Background box
+    shape = STYLES.add_card(slide, left, top, width, height, fill, line)
+
+    # Text
+    tf = shape.text_frame
+    tf.margin_left = Inches(0.2)
+    tf.margin_top = Inches(0.2)
+    STYLES.style_paragraph(tf.paragraphs[0], code_text, "code", color=color, size=font_size)
+
+
+def style_paragraph(p, spec):
+    style = {key: spec[key] for key in ("size", "bold", "font", "align") if key in spec}
+    if "color" in spec:
+        style["color"] = rgb(spec["color"])
+    STYLES.style_paragraph(p, spec.get("text", ""), **style)
+
+
+# --- ELEMENT RENDERERS ---
+def render_title(slide, spec):
+    add_title(slide, spec["text"], spec.get("size", 40), inches(spec.get("top", 0.5)), rgb(spec["color"]))
+
+
+def render_text(slide, spec):
+    tf = add_text_box(slide, spec["text"], *box(spec), font_size=spec.get("size", 18),
+                      color=rgb(spec["color"]),
+                      bold=spec.get("bold", False))
+    if "align" in spec:
+        tf.paragraphs[0].alignment = ALIGN[spec["align"]]
+    for b in spec.get("bullets", ()):
+        add_bullet(tf, b, color=rgb(spec["bullet_color"]), font_size=spec.get("bullet_size", 18))
+
+
+def render_code(slide, spec):
+    add_code_block(slide, spec["code"], *box(spec), fill=rgb(spec["fill"]), line=rgb(spec["line"]),
+                   color=rgb(spec["color"]), font_size=spec.get("size", 12))
+
+
+def render_shape(slide, spec):
+    line = spec.get("line")
+    shape = STYLES.add_shape(slide, SHAPES[spec["shape"]], *box(spec),
+                             fill=rgb(spec["fill"]) if "fill" in spec else None,
+                             line=rgb(line) if isinstance(line, list) else line)
+
+    tf = shape.text_frame
+    if "margin" in spec:
+        tf.margin_left, tf.margin_top = (inches(v) for v in spec["margin"])
+    if "text" in spec:
+        tf.text = spec["text"]
+        if "size" in spec:
+            for p in tf.paragraphs:
+                p.font.size = Pt(spec["size"])
+    for i, para in enumerate(spec.get("paragraphs", ())):
+        style_paragraph(tf.paragraphs[0] if i == 0 else tf.add_paragraph(), para)
+    for b in spec.get("bullets", ()):
+        add_bullet(tf, b, color=rgb(spec["bullet_color"]), font_size=spec.get("bullet_size", 18))
+    if "anchor" in spec:
+        tf.vertical_anchor = ANCHOR[spec["anchor"]]
+
+
+def render_connector(slide, spec):
+    slide.shapes.add_connector(MSO_CONNECTOR.STRAIGHT, *(inches(v) for v in spec["begin"] + spec["end"]))
+
+
+def render_team(slide, spec):
+    card_fill, text_main, text_sec = rgb(spec["fill"]), rgb(spec["color"]), rgb(spec["secondary"])
+    members = spec["members"]
+    cards = grid(spec.get("box", TEAM_BOX), len(members), max(len(members), 1), spec.get("gap", 0.2))
+    for (left, top, width, height), member in zip(cards, members):
+        name, color = member["name"], rgb(member["color"])
+        # Card bg
+        STYLES.add_card(slide, inches(left), inches(top), inches(width), inches(height), card_fill, color)
+
+        # Initials circle, centred at the top
+        circle = STYLES.add_shape(slide, MSO_SHAPE.OVAL, inches(left + width / 2 - 0.5), inches(top + 0.5),
+                                  Inches(1), Inches(1), fill=color, line="none")
+        initials = "".join([n[0] for n in name.split()[:2]])
+        STYLES.style_paragraph(circle.text_frame.paragraphs[0], initials, bold=True, size=20, align="center")
+
+        # Name, CMS id and role under it; the role takes the rest of the card
+        tf_name = add_text_box(slide, name, inches(left), inches(top + 1.7), inches(width), Inches(0.5), font_size=16,
+                               color=text_main, bold=True)
+        tf_name.paragraphs[0].alignment = PP_ALIGN.CENTER
+        tf_cms = add_text_box(slide, member["id"], inches(left), inches(top + 2.1), inches(width), Inches(0.4),
+                              font_size=14, color=color, bold=False)
+        tf_cms.paragraphs[0].alignment = PP_ALIGN.CENTER
+        tf_role = add_text_box(slide, member["role"], inches(left + 0.2), inches(top + 2.5), inches(width - 0.4),
+                               inches(height - 2.5), font_size=12, color=text_sec, bold=False)
+        tf_role.paragraphs[0].alignment = PP_ALIGN.CENTER
+
+
+def render_chart(slide, spec):
+    data = XyChartData()
+    for series in spec["series"]:
+        points = data.add_series(series["name"])
+        for x, y in zip(series["x"], series["y"]):
+            points.add_data_point(x, y)
+    chart = slide.shapes.add_chart(XL_CHART_TYPE.XY_SCATTER_LINES_NO_MARKERS, *box(spec), data).chart
+    chart.font.size = Pt(spec.get("size", 10))
+    chart.font.color.rgb = rgb(spec["color"])
+
+    chart.has_title = "title" in spec
+    if chart.has_title:
+        chart.chart_title.text_frame.text = spec["title"]
+    chart.has_legend = len(spec["series"]) > 1
+    if chart.has_legend:
+        chart.legend.position = XL_LEGEND_POSITION.BOTTOM
+        chart.legend.include_in_layout = False
+
+    for series, plot_series in zip(spec["series"], chart.plots[0].series):
+        plot_series.format.line.width = Pt(1.5)
+        if "color" in series:
+            plot_series.format.line.color.rgb = rgb(series["color"])
+
+    # On an XY chart both axes are value axes; category_axis is the X one
+    for axis, title in ((chart.category_axis, spec.get("x_title")), (chart.value_axis, spec.get("y_title"))):
+        axis.format.line.color.rgb = rgb(spec["line"])
+        axis.has_major_gridlines = axis is chart.value_axis
+        if axis.has_major_gridlines:
+            axis.major_gridlines.format.line.color.rgb = rgb(spec["line"])
+        if title:
+            axis.axis_title.text_frame.text = title
+
+
+def leds():
+    """The LED frame renderer, created on first use: ripes.s on the headless machine (corridor.leds)."""
+    global LEDS
+    if LEDS is None:
+        from corridor.leds import LedRenderer
+
+        LEDS = LedRenderer()
+    return LEDS
+
+
+def render_leds(slide, spec):
+    from corridor.leds import switch_words
+
+    states = spec["states"]
+    holds = [state.get("hold", 1) for state in states]
+    sw0, sw1 = switch_words(*([state.get(field, 0) for state in states] for field in ("smoke", "pm25", "co2")))
+    sw0, sw1 = sw0.repeat(holds), sw1.repeat(holds)
+    scale = spec.get("scale", 8)
+    renderer = leds()
+    if len(set(renderer.keys(sw0, sw1).tolist())) == 1:
+        image = renderer.png(sw0[0], sw1[0], scale)
+    else:
+        image = renderer.animation(sw0, sw1, fps=spec.get("fps", 10), scale=scale)
+    slide.shapes.add_picture(io.BytesIO(image), *box(spec))
+
+
+LEDS = None
+
+ELEMENTS = {
+    "title": render_title,
+    "text": render_text,
+    "code": render_code,
+    "shape": render_shape,
+    "connector": render_connector,
+    "team": render_team,
+    "chart": render_chart,
+    "leds": render_leds,
+}
+
+
+def new_presentation(size):
+    prs = Presentation()
+    prs.slide_width = inches(size[0])
+    prs.slide_height = inches(size[1])
+    return prs
+
+
+class SlideRenderer:
+    """Draws one slide at a time on a scratch presentation and serializes it.
+
+    The scratch presentation is emptied after every slide, so it doubles as
+    the package template and never accumulates rendered slides.  Stacks,
+    grids and text fitting are laid out with ``metrics`` first.
+    """
+
+    def __init__(self, size, layout_index=6, metrics=METRICS):  # 6 is blank
+        self.prs = new_presentation(size)
+        self.layout = self.prs.slide_layouts[layout_index]
+        self.metrics = metrics
+
+    def render(self, spec, overflows=None):
+        """Serialized parts of ``spec``; text that overflows its box is appended to ``overflows``."""
+        spec, overflowed = layout_slide(spec, self.metrics)
+        if overflows is not None:
+            overflows += overflowed
+        slide = self.prs.slides.add_slide(self.layout)
+        try:
+            fill = slide.background.fill
+            fill.solid()
+            fill.fore_color.rgb = rgb(spec["background"])
+            for element in spec["elements"]:
+                ELEMENTS[element["type"]](slide, element)
+            return extract_parts(slide)
+        finally:
+            # Also after a failed element, so a reused renderer starts clean
+            self._discard_slides()
+
+    def _discard_slides(self):
+        sldIdLst = self.prs.slides._sldIdLst
+        for sldId in list(sldIdLst):
+            sldIdLst.remove(sldId)
+            self.prs.part.rels.pop(sldId.rId)
+
+
+def extract_parts(slide):
+    """Serialize ``slide`` and everything it references except its layout."""
+    related = []
+    rels = _related_rels(slide.part, related)
+    return SlideParts(slide.part.blob, rels, tuple(related))
+
+
+def _related_rels(part, related):
+    # Serialize the relationships of ``part``, appending the parts they point
+    # to (and, recursively, theirs) to ``related``
+    rels = []
+    for rel in part.rels.values():
+        if rel.is_external or rel.reltype == RT.SLIDE_LAYOUT:
+            rels.append((rel.rId, rel.reltype, rel.target_ref, rel.is_external))
+            continue
+        rels.append((rel.rId, rel.reltype, "../" + _related_part(rel.target_part, related), False))
+    return rels_xml(rels)
+
+
+def _related_part(part, related):
+    # Related parts (images, charts, chart workbooks) are renamed by content
+    # so slides share them; every one lives directly under ppt/<folder>/
+    folder = part.partname.baseURI.rsplit("/", 1)[-1]
+    blob = part.blob
+    rels = _related_rels(part, related) if len(part.rels) else None
+    digest = hashlib.sha1(blob + (rels or b"")).hexdigest()
+    name = f"{folder}/{digest}.{part.partname.ext}"
+    related.append((name, part.content_type, blob))
+    if rels is not None:
+        related.append((f"{folder}/_rels/{digest}.{part.partname.ext}.rels", CT.OPC_RELATIONSHIPS, rels))
+    return name
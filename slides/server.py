@@ -0,0 +1,226 @@
+"""Resident slide build server: python-pptx and the template stay warm.
+
+A fresh ``generate_slides.py`` pays for importing python-pptx and lxml,
+parsing the default template in ``Presentation()`` and snapshotting it
+before the first slide is drawn; for cached or small decks that is most of
+the wall time.  The server keeps a pool of worker processes, each holding a
+``BuildContext`` (renderer plus template) created once, so a request only
+pays for its own slides.
+
+Requests are JSON lines (up to ``MAX_REQUEST_BYTES``, so a large inline
+``deck`` fits) over a Unix socket (default) or ``host:port``:
+
+    {"op": "build", "spec": "/abs/deck.json" | "deck": {...}, "output": "/abs/out.pptx",
+     "cache_dir": "/abs/.slide_cache" | null}
+    {"op": "metrics"}   {"op": "ping"}   {"op": "shutdown"}
+
+At most ``workers`` builds run at once; up to ``max_queue`` more wait for a
+worker and anything beyond that is refused at once with a "busy" error.
+Every build is timed (queue wait, build, total) and ``metrics`` returns
+percentiles over the recent requests.
+"""
+import asyncio
+import collections
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from slides.client import parse_address
+
+# Longest request line read; an inline "deck" can be far over asyncio's 64 KiB default
+MAX_REQUEST_BYTES = 64 << 20
+
+# ms per request: queue (waiting for a worker), build (in the worker), total
+RequestTiming = collections.namedtuple("RequestTiming", "queue build total ok")
+
+_contexts = {}
+
+
+def _init_worker():
+    # Runs once per worker process: import the renderer and warm a context and the LED frames
+    from slides.build import BuildContext
+    from slides.render import leds
+    from slides.spec import DEFAULT_SIZE
+
+    _contexts[tuple(DEFAULT_SIZE)] = BuildContext(DEFAULT_SIZE)
+    leds()
+
+
+def _context(size):
+    from slides.build import BuildContext
+
+    key = tuple(size)
+    if key not in _contexts:
+        _contexts[key] = BuildContext(size)
+    return _contexts[key]
+
+
+def _ready():
+    return os.getpid()
+
+
+def _build(message):
+    # Runs in a worker; errors are returned, not raised, like batch builds
+    from slides.build import build_deck
+    from slides.spec import DEFAULT_SIZE, load_deck
+
+    start = time.perf_counter()
+    try:
+        deck = message["deck"] if "deck" in message else load_deck(message["spec"])
+        context = _context(deck.get("size", DEFAULT_SIZE))
+        stats = build_deck(deck, message["output"], cache_dir=message.get("cache_dir"), context=context)
+        result = {"ok": True, "output": message["output"], "slides": stats.slides, "rendered": stats.rendered,
+                  "cached": stats.cached, "overflows": [list(o) for o in stats.overflows]}
+    except Exception:
+        result = {"ok": False, "error": traceback.format_exc()}
+    result["build_ms"] = (time.perf_counter() - start) * 1000
+    result["worker"] = os.getpid()
+    return result
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of ``values`` (0 < q <= 100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, -(-len(ordered) * q // 100) - 1))]
+
+
+class BuildServer:
+    """``await start()``, then ``await serve_until_stopped()``; ``stop()`` ends it."""
+
+    def __init__(self, address, workers=None, max_queue=64, history=1000):
+        self.address = address
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.timings = collections.deque(maxlen=history)
+        self.requests = self.errors = self.refused = 0
+        self.started = time.time()
+        self._pool = None
+        self._server = None
+        self._slots = None
+        self._waiting = 0
+        self._stopped = None
+        self._connections = {}  # handler task -> its writer
+
+    async def start(self):
+        self._slots = asyncio.Semaphore(self.workers)
+        self._stopped = asyncio.Event()
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        loop = asyncio.get_running_loop()
+        # Start and warm every worker now rather than on the first requests
+        await asyncio.gather(*(loop.run_in_executor(self._pool, _ready) for _ in range(self.workers)))
+        kind, target = parse_address(self.address)
+        if kind == "tcp":
+            self._server = await asyncio.start_server(self._serve, *target, limit=MAX_REQUEST_BYTES)
+        else:
+            if os.path.exists(target):
+                os.unlink(target)  # left behind by a server that did not shut down
+            self._server = await asyncio.start_unix_server(self._serve, target, limit=MAX_REQUEST_BYTES)
+        return self
+
+    async def serve_until_stopped(self):
+        try:
+            await self._stopped.wait()
+        finally:
+            await self.close()
+
+    def stop(self):
+        self._stopped.set()
+
+    async def close(self):
+        self._server.close()
+        for writer in self._connections.values():
+            writer.close()
+        # Let the connection handlers see their streams end rather than be cancelled
+        if self._connections:
+            await asyncio.wait(list(self._connections), timeout=5)
+        await self._server.wait_closed()
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        kind, target = parse_address(self.address)
+        if kind == "unix" and os.path.exists(target):
+            os.unlink(target)
+
+    async def _serve(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        task.add_done_callback(self._connections.pop)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Over MAX_REQUEST_BYTES: the rest of the line cannot be told from the next request
+                    writer.write(json.dumps({"ok": False, "error": f"bad request: over {MAX_REQUEST_BYTES} bytes"})
+                                 .encode() + b"\n")
+                    await writer.drain()
+                    break
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                    response = await self.handle(message)
+                except (ValueError, KeyError) as e:
+                    response = {"ok": False, "error": f"bad request: {e}"}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle(self, message):
+        op = message.get("op")
+        if op == "build":
+            return await self.build(message)
+        if op == "metrics":
+            return dict(self.metrics(), ok=True)
+        if op == "ping":
+            return {"ok": True, "pid": os.getpid()}
+        if op == "shutdown":
+            self.stop()
+            return {"ok": True}
+        return {"ok": False, "error": f"unknown op {op!r}"}
+
+    async def build(self, message):
+        received = time.perf_counter()
+        self.requests += 1
+        if self._slots.locked() and self._waiting >= self.max_queue:
+            self.refused += 1
+            return {"ok": False, "error": f"busy: {self.workers} builds running, {self._waiting} queued"}
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+        try:
+            queued = (time.perf_counter() - received) * 1000
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._pool, _build, message)
+        finally:
+            self._slots.release()
+        total = (time.perf_counter() - received) * 1000
+        if not result["ok"]:
+            self.errors += 1
+        self.timings.append(RequestTiming(queued, result["build_ms"], total, result["ok"]))
+        result.update(queue_ms=queued, total_ms=total)
+        return result
+
+    def metrics(self):
+        """Counters and latency percentiles (ms) over the last ``history`` builds."""
+        out = {"workers": self.workers, "requests": self.requests, "errors": self.errors, "refused": self.refused,
+               "running": self.workers - self._slots._value, "queued": self._waiting,
+               "uptime_s": time.time() - self.started, "recent": len(self.timings)}
+        for field in ("queue", "build", "total"):
+            values = [getattr(t, field) for t in self.timings]
+            out[field + "_ms"] = {f"p{q}": percentile(values, q) for q in (50, 90, 99)}
+            out[field + "_ms"]["max"] = max(values) if values else None
+        return out
+
+
+async def serve(address, workers=None, max_queue=64):
+    server = await BuildServer(address, workers, max_queue).start()
+    print(f"Slide build server on {address} with {server.workers} warm workers", flush=True)
+    await server.serve_until_stopped()
@@ -0,0 +1,254 @@
+"""Deck specification loading, palette resolution and per-slide content hashes.
+
+A deck spec is a JSON (or YAML, when PyYAML is installed) document:
+
+    {
+      "size": [13.333, 7.5],          # slide width/height in inches
+      "background": "DARK_BG",        # palette name or [r, g, b]
+      "palette": {"DARK_BG": [10, 10, 15], ...},
+      "slides": [{"name": "...", "elements": [...]}, ...]
+    }
+
+Colors anywhere in the spec may be given as a palette name or an [r, g, b]
+list.  Strings may reference ``${name}`` entries of the optional "vars"
+mapping (thresholds and the like).  Element types are documented in
+``slides.render``.
+"""
+import copy
+import hashlib
+import json
+import os
+import string
+
+# Keys whose values are colors and get resolved through the palette
+COLOR_KEYS = ("color", "fill", "line", "background", "bullet_color", "secondary")
+
+# Colors every deck can refer to; a spec's own palette overrides these
+DEFAULT_PALETTE = {
+    "DARK_BG": [10, 10, 15],
+    "TEXT_MAIN": [255, 255, 255],
+    "TEXT_SEC": [160, 160, 176],
+    "ACCENT_GREEN": [0, 255, 136],
+    "ACCENT_BLUE": [68, 136, 255],
+    "ACCENT_RED": [255, 68, 102],
+    "ACCENT_PURPLE": [153, 102, 255],
+    "ACCENT_YELLOW": [255, 204, 0],
+    "CARD_BG": [20, 20, 30],
+    "CODE_BG": [26, 26, 46],
+    "CODE_LINE": [50, 50, 60],
+    "CODE_TEXT": [200, 200, 200],
+}
+
+# Colors an element gets when the spec leaves them out
+ELEMENT_DEFAULTS = {
+    "title": {"color": "TEXT_MAIN"},
+    "text": {"color": "TEXT_SEC", "bullet_color": "TEXT_SEC"},
+    "code": {"fill": "CODE_BG", "line": "CODE_LINE", "color": "CODE_TEXT"},
+    "shape": {"bullet_color": "TEXT_SEC"},
+    "team": {"fill": "CARD_BG", "color": "TEXT_MAIN", "secondary": "TEXT_SEC"},
+    "chart": {"color": "TEXT_SEC", "line": "CODE_LINE"},
+}
+
+# (required, optional) keys of each element type, as slides.render reads them
+ELEMENT_KEYS = {
+    "title": ({"text"}, {"size", "top", "color"}),
+    "text": ({"text", "box"}, {"size", "color", "bold", "align", "bullets", "bullet_color", "bullet_size", "fit"}),
+    "code": ({"code", "box"}, {"size", "fill", "line", "color", "fit"}),
+    "shape": ({"shape", "box"}, {"fill", "line", "text", "size", "paragraphs", "bullets", "bullet_color",
+                                 "bullet_size", "margin", "anchor", "fit"}),
+    "connector": ({"begin", "end"}, set()),
+    "team": ({"members"}, {"box", "gap", "fill", "color", "secondary"}),
+    "chart": ({"box", "series"}, {"title", "x_title", "y_title", "size", "color", "line"}),
+    "leds": ({"box", "states"}, {"fps", "scale"}),
+    "stack": ({"box", "elements"}, {"direction", "gap"}),
+    "grid": ({"box", "elements", "columns"}, {"gap"}),
+}
+# Elements that hold others (laid out by slides.layout), and those that can't go in them
+CONTAINERS = ("stack", "grid")
+UNPLACED = ("title", "connector")
+
+DEFAULT_SIZE = [13.333, 7.5]
+
+
+def load_deck(path):
+    with open(path, encoding="utf-8") as f:
+        if os.path.splitext(path)[1].lower() in (".yaml", ".yml"):
+            import yaml  # optional dependency, only needed for YAML specs
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+def resolve_colors(value, palette):
+    """Return a deep copy of ``value`` with every palette name replaced by its RGB list."""
+    if isinstance(value, dict):
+        out = {}
+        for key, item in value.items():
+            if key in COLOR_KEYS and isinstance(item, str) and item != "none":
+                if item not in palette:
+                    raise KeyError(f"Unknown palette color {item!r}")
+                out[key] = list(palette[item])
+            else:
+                out[key] = resolve_colors(item, palette)
+        return out
+    if isinstance(value, list):
+        return [resolve_colors(item, palette) for item in value]
+    return copy.copy(value)
+
+
+def substitute_vars(value, variables):
+    """Return a deep copy of ``value`` with ``${name}`` references in strings filled in."""
+    if isinstance(value, dict):
+        return {key: substitute_vars(item, variables) for key, item in value.items()}
+    if isinstance(value, list):
+        return [substitute_vars(item, variables) for item in value]
+    if isinstance(value, str) and "$" in value:
+        return string.Template(value).safe_substitute(variables)
+    return value
+
+
+def slide_resolver(deck):
+    """Return a function resolving one slide of ``deck``: vars, element defaults and colors.
+
+    Only the deck-level settings are read here, so slides can be resolved one
+    at a time as they are produced.
+    """
+    palette = dict(DEFAULT_PALETTE, **deck.get("palette", {}))
+    variables = {key: str(value) for key, value in deck.get("vars", {}).items()}
+    background = resolve_colors({"background": deck.get("background", "DARK_BG")}, palette)["background"]
+
+    def defaults(elements):
+        return [{**ELEMENT_DEFAULTS.get(el["type"], {}), **el,
+                 **({"elements": defaults(el["elements"])} if el["type"] in CONTAINERS else {})}
+                for el in elements]
+
+    def resolve(slide):
+        slide = substitute_vars(slide, variables)
+        slide["elements"] = defaults(slide["elements"])
+        resolved = resolve_colors(slide, palette)
+        resolved.setdefault("background", background)
+        return resolved
+
+    return resolve
+
+
+def resolve_slides(deck):
+    """Yield every slide of ``deck`` fully resolved."""
+    resolve = slide_resolver(deck)
+    for slide in deck["slides"]:
+        yield resolve(slide)
+
+
+def validate_deck(deck):
+    """Problems that would stop ``deck`` from building, as readable strings; empty if none.
+
+    Checks what can be checked without rendering: element types and keys,
+    boxes, team members, palette names and values, and ``${name}``
+    references left unresolved.
+    """
+    if not isinstance(deck.get("slides"), list):
+        return ["deck has no \"slides\" list"]
+    palette = deck.get("palette", {})
+    if not isinstance(palette, dict):
+        return ["palette: must be a mapping of names to [r, g, b]"]
+    problems = [f"palette {name}: must be [r, g, b] with each 0-255, not {value!r}"
+                for name, value in palette.items() if not _is_rgb(value)]
+    names = set()
+    try:
+        resolve = slide_resolver(deck)
+    except KeyError as e:
+        return problems + [f"deck background: {e.args[0]}"]
+    for index, slide in enumerate(deck["slides"], 1):
+        label = f"slide {index}" + (f" ({slide['name']})" if slide.get("name") else "")
+        if slide.get("name") in names:
+            problems.append(f"{label}: duplicate name")
+        names.add(slide.get("name"))
+        elements = slide.get("elements")
+        if not isinstance(elements, list):
+            problems.append(f"{label}: no \"elements\" list")
+            continue
+        problems += _check_elements(elements, label)
+        try:
+            resolved = resolve(slide)
+        except KeyError as e:
+            problems.append(f"{label}: {e.args[0]}")
+            continue
+        unresolved = sorted(set(_placeholders(resolved)))
+        if unresolved:
+            problems.append(f"{label}: undefined vars {', '.join(unresolved)}")
+    return problems
+
+
+def _check_elements(elements, label, container=None):
+    # Problems with the keys of ``elements``, those of containers included; ``container`` is the one they are in
+    problems = []
+    for n, el in enumerate(elements, 1):
+        keys = ELEMENT_KEYS.get(el.get("type"))
+        if keys is None:
+            problems.append(f"{label}, element {n}: unknown type {el.get('type')!r}")
+            continue
+        where = f"{label}, {el['type']} {n}"
+        required, optional = keys
+        if container is not None:
+            # The container gives the box
+            required, optional = required - {"box"}, optional | {"box"} | ({"basis"} if container == "stack" else set())
+            if el["type"] in UNPLACED:
+                problems.append(f"{where}: can't be placed in a {container}")
+        missing = required - set(el)
+        unknown = set(el) - required - optional - {"type"}
+        if missing:
+            problems.append(f"{where}: missing {', '.join(sorted(missing))}")
+        if unknown:
+            problems.append(f"{where}: unknown keys {', '.join(sorted(unknown))}")
+        box = el.get("box")
+        if box is not None and (len(box) != 4 or not all(isinstance(v, (int, float)) for v in box)):
+            problems.append(f"{where}: box must be [left, top, width, height]")
+        if el.get("direction", "vertical") not in ("vertical", "horizontal"):
+            problems.append(f"{where}: direction must be vertical or horizontal")
+        if "columns" in el and not (isinstance(el["columns"], int) and el["columns"] > 0):
+            problems.append(f"{where}: columns must be a positive integer")
+        if el["type"] == "team" and "members" in el:
+            problems += _check_members(el["members"], where)
+        if el["type"] in CONTAINERS and isinstance(el.get("elements"), list):
+            problems += _check_elements(el["elements"], where, el["type"])
+    return problems
+
+
+def _check_members(members, where):
+    if not isinstance(members, list):
+        return [f"{where}: members must be a list"]
+    problems = []
+    for m, member in enumerate(members, 1):
+        if not isinstance(member, dict):
+            problems.append(f"{where}, member {m}: must be an object")
+            continue
+        missing = {"name", "id", "role", "color"} - set(member)
+        if missing:
+            problems.append(f"{where}, member {m}: missing {', '.join(sorted(missing))}")
+    return problems
+
+
+def _is_rgb(value):
+    return (isinstance(value, list) and len(value) == 3
+            and all(isinstance(v, int) and not isinstance(v, bool) and 0 <= v <= 255 for v in value))
+
+
+def _placeholders(value):
+    # ${name} references still present in the strings of ``value``
+    if isinstance(value, dict):
+        for item in value.values():
+            yield from _placeholders(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _placeholders(item)
+    elif isinstance(value, str) and "$" in value:
+        for match in string.Template.pattern.finditer(value):
+            name = match.group("named") or match.group("braced")
+            if name:
+                yield name
+
+
+def slide_digest(slide, size, salt=""):
+    """Content hash of a resolved slide; ``salt`` carries the renderer fingerprint."""
+    payload = json.dumps({"slide": slide, "size": size, "salt": salt},
+                         sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
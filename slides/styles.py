@@ -0,0 +1,167 @@
+"""Style registry: resolve named text and card styles once, then clone them.
+
+Setting ``p.font.size``, ``p.font.color.rgb``, ``p.font.name`` and
+``p.font.bold`` through python-pptx is four separate walks and writes on the
+lxml tree, and ``add_shape``/``add_textbox`` parse a fresh XML template for
+every shape.  The registry builds each distinct paragraph style (an
+``a:defRPr`` element plus alignment/level) and each distinct shape (textbox,
+or autoshape with its fill and outline already applied) exactly once through
+the python-pptx API, and afterwards only deep-copies the prebuilt elements.
+The XML produced is identical to the property-by-property version.
+"""
+import copy
+import re
+
+from pptx.dml.color import RGBColor
+from pptx.enum.shapes import MSO_SHAPE
+from pptx.enum.text import PP_ALIGN
+from pptx.oxml import parse_xml
+from pptx.oxml.ns import nsdecls, qn
+from pptx.oxml.shapes.autoshape import CT_Shape
+from pptx.shapes.autoshape import AutoShapeType, Shape
+from pptx.text.text import _Paragraph
+from pptx.util import Pt
+
+TEXT_MAIN = RGBColor(255, 255, 255)
+TEXT_SEC = RGBColor(160, 160, 176)
+CODE_TEXT = RGBColor(200, 200, 200)
+
+ALIGN = {"left": PP_ALIGN.LEFT, "center": PP_ALIGN.CENTER, "right": PP_ALIGN.RIGHT}
+
+# Named paragraph styles; any field can be overridden per call
+DEFAULT_STYLES = {
+    "title": {"size": 40, "color": TEXT_MAIN, "bold": True, "font": "Arial"},
+    "body": {"size": 18, "color": TEXT_SEC, "bold": False, "font": "Arial"},
+    "bullet": {"size": 18, "color": TEXT_SEC, "font": "Arial", "level": 0},
+    "code": {"size": 12, "color": CODE_TEXT, "font": "Courier New", "align": "left"},
+    "plain": {},
+}
+
+# Characters python-pptx escapes in run text; such text takes the slow path
+_CTRL_CHARS = re.compile("[\x00-\x08\x0b-\x1f]")
+
+
+class StyleRegistry:
+    def __init__(self, styles=None):
+        self.styles = dict(DEFAULT_STYLES, **(styles or {}))
+        self._paragraphs = {}
+        self._shapes = {}
+
+    # --- paragraphs ---
+    def paragraph_template(self, name, **overrides):
+        """Return the prebuilt ``a:pPr`` for style ``name`` with ``overrides`` applied."""
+        style = dict(self.styles[name], **overrides)
+        key = tuple(sorted((k, str(v)) for k, v in style.items()))
+        pPr = self._paragraphs.get(key)
+        if pPr is None:
+            pPr = self._paragraphs[key] = self._build_paragraph(style)
+        return pPr
+
+    @staticmethod
+    def _build_paragraph(style):
+        p = _Paragraph(parse_xml(f"<a:p {nsdecls('a')}/>"), None)
+        if "size" in style:
+            p.font.size = Pt(style["size"])
+        if "color" in style:
+            p.font.color.rgb = style["color"]
+        if "font" in style:
+            p.font.name = style["font"]
+        if "bold" in style:
+            p.font.bold = style["bold"]
+        if "align" in style:
+            p.alignment = ALIGN[style["align"]]
+        if "level" in style:
+            p.level = style["level"]
+        return p._p.get_or_add_pPr()
+
+    def style_paragraph(self, paragraph, text, name="plain", **overrides):
+        """Set ``paragraph`` (a python-pptx _Paragraph) to ``text`` in the given style."""
+        p = paragraph._p
+        for child in p.content_children:
+            p.remove(child)
+        if _CTRL_CHARS.search(text):
+            p.append_text(text)
+        else:
+            _append_runs(p, text)
+
+        template = self.paragraph_template(name, **overrides)
+        pPr = p.get_or_add_pPr()
+        for attr, value in template.attrib.items():
+            pPr.set(attr, value)
+        defRPr = template.defRPr
+        if defRPr is not None:
+            if pPr.defRPr is not None:
+                pPr.remove(pPr.defRPr)
+            pPr.insert_element_before(copy.deepcopy(defRPr), "a:extLst")
+        return paragraph
+
+    # --- shapes ---
+    def shape_template(self, kind, fill=None, line=None, word_wrap=None):
+        """Return a prebuilt ``p:sp``; ``kind`` is an MSO_SHAPE member or "textbox".
+
+        ``fill`` and ``line`` are RGBColor values; ``line="none"`` hides the
+        outline.
+        """
+        key = (kind, str(fill), str(line), word_wrap)
+        sp = self._shapes.get(key)
+        if sp is None:
+            if kind == "textbox":
+                sp = CT_Shape.new_textbox_sp(0, "", 0, 0, 0, 0)
+            else:
+                shape_type = AutoShapeType(kind)
+                sp = CT_Shape.new_autoshape_sp(0, shape_type.basename, shape_type.prst, 0, 0, 0, 0)
+            shape = Shape(sp, None)
+            if fill is not None:
+                shape.fill.solid()
+                shape.fill.fore_color.rgb = fill
+            if line == "none":
+                shape.line.fill.background()
+            elif line is not None:
+                shape.line.color.rgb = line
+            if word_wrap is not None:
+                shape.text_frame.word_wrap = word_wrap
+            self._shapes[key] = sp
+        return sp
+
+    def add_shape(self, slide, kind, left, top, width, height, fill=None, line=None, word_wrap=None):
+        """Clone the matching shape template onto ``slide``; returns a python-pptx Shape."""
+        sp = copy.deepcopy(self.shape_template(kind, fill, line, word_wrap))
+        spTree = slide.shapes._spTree
+        id_ = spTree.max_shape_id + 1
+        basename = "TextBox" if kind == "textbox" else sp.nvSpPr.cNvPr.get("name")
+        sp.nvSpPr.cNvPr.set("id", str(id_))
+        sp.nvSpPr.cNvPr.set("name", f"{basename} {id_ - 1}")
+        xfrm = sp.spPr.xfrm
+        xfrm.off.set("x", str(int(left)))
+        xfrm.off.set("y", str(int(top)))
+        xfrm.ext.set("cx", str(int(width)))
+        xfrm.ext.set("cy", str(int(height)))
+        spTree.insert_element_before(sp, "p:extLst")
+        return Shape(sp, slide.shapes)
+
+    def add_textbox(self, slide, left, top, width, height, word_wrap=None):
+        return self.add_shape(slide, "textbox", left, top, width, height, word_wrap=word_wrap)
+
+    def add_card(self, slide, left, top, width, height, fill, line, kind=MSO_SHAPE.ROUNDED_RECTANGLE):
+        return self.add_shape(slide, kind, left, top, width, height, fill=fill, line=line)
+
+
+def _append_runs(p, text):
+    # Same structure as CT_TextParagraph.append_text: runs split by a:br,
+    # empty runs omitted
+    r_tag, t_tag, br_tag = qn("a:r"), qn("a:t"), qn("a:br")
+    end = p.find(qn("a:endParaRPr"))
+    append = p.append if end is None else end.addprevious
+    make = p.makeelement
+    for idx, line in enumerate(text.split("\n")):
+        if idx:
+            append(make(br_tag))
+        if line:
+            r = make(r_tag)
+            t = make(t_tag)
+            t.text = line
+            r.append(t)
+            append(r)
+
+
+STYLES = StyleRegistry()
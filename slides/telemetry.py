@@ -0,0 +1,294 @@
+"""Recorded MQTT telemetry -> downsampled series -> chart slides.
+
+A capture is a JSON-lines file.  Each line is either a bare payload as
+published on ``smart-corridor/sensors`` (by ``publishSensorData``, with a
+``timestamp`` in ms) or ``smart-corridor/monitor`` (by the ESP32 ``loop()``,
+recognisable by its ``source`` field), or an envelope wrapping one:
+
+    {"topic": "smart-corridor/sensors", "ts": 1718000000.25, "room": "kitchen",
+     "payload": {"smoke": 12, "co2": 640, "pm25": 31, "temp": 24}}
+
+Lines are grouped into series by ``room`` (payload or envelope), falling back
+to the publisher ("simulation" or "esp32"); lines without any of the four
+metrics (commands) are ignored.  ``ts``/``time``/``timestamp`` may be epoch
+seconds, epoch milliseconds or ISO 8601; a line without one takes the last
+timestamp seen before it.
+
+The file is never loaded whole.  It is split into byte ranges scanned by
+worker processes; each reduces its lines, a block at a time, to the minimum
+and maximum point of every series in each of ``buckets`` equal time slots.
+The per-worker results merge the same way, and the charts are finally
+thinned to their point budget with largest-triangle-three-buckets (LTTB).
+"""
+import collections
+import datetime
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from corridor.capture import parse_record, parse_time
+
+METRICS = ("smoke", "co2", "pm25", "temp")
+METRIC_LABELS = {"smoke": "Smoke (%)", "co2": "CO2 (ppm)", "pm25": "PM2.5 (ug/m3)", "temp": "Temperature (C)"}
+SERIES_COLORS = ("ACCENT_BLUE", "ACCENT_GREEN", "ACCENT_RED", "ACCENT_YELLOW", "ACCENT_PURPLE", "TEXT_MAIN",
+                 "TEXT_SEC", "CODE_TEXT")
+
+BLOCK_LINES = 65536  # lines parsed between vectorized reductions
+_PROBE_BYTES = 1 << 16  # head/tail read when looking for the capture's time range
+
+# series: {(source, metric): (t, v)} sorted by t; start/end: epoch seconds of
+# the first/last timestamp, both None when the capture has no timestamps and
+# t is the line's byte offset instead
+Telemetry = collections.namedtuple("Telemetry", "series start end lines skipped bytes")
+
+
+_decode = json.JSONDecoder().decode
+
+
+def parse_message(line):
+    """Return ``(source, timestamp or None, payload)`` for one capture line, or None."""
+    try:
+        record = _decode(line.decode("utf-8") if isinstance(line, bytes) else line)
+    except ValueError:
+        return None
+    return _message(record) if isinstance(record, dict) else None
+
+
+def _message(record):
+    payload = record.get("payload", record)
+    if payload.__class__ is not dict:
+        if not isinstance(payload, (str, bytes)):
+            return None
+        try:
+            payload = json.loads(payload)
+        except ValueError:
+            return None
+        if not isinstance(payload, dict):
+            return None
+    if "smoke" not in payload and "co2" not in payload and "pm25" not in payload and "temp" not in payload:
+        return None
+
+    stamp = None
+    for value in (payload.get("timestamp"), record.get("ts"), record.get("time"), record.get("timestamp")):
+        if value.__class__ is float or value.__class__ is int:
+            stamp = value / 1000.0 if value > 1e11 else float(value)
+            break
+        if value is not None:
+            try:
+                stamp = parse_time(value)
+            except (TypeError, ValueError):
+                continue
+            break
+
+    source = payload.get("room") or record.get("room")
+    if not source:
+        monitor = "source" in payload or str(record.get("topic", "")).endswith("/monitor")
+        source = "esp32" if monitor else "simulation"
+    return source if source.__class__ is str else str(source), stamp, payload
+
+
+def _probe_time(path, size, tail):
+    # First (or last) timestamp in the first (or last) _PROBE_BYTES of the file
+    with open(path, "rb") as f:
+        f.seek(max(0, size - _PROBE_BYTES) if tail else 0)
+        lines = f.read(_PROBE_BYTES).splitlines()
+    for line in reversed(lines) if tail else lines:
+        message = parse_message(line)
+        if message and message[1] is not None:
+            return message[1]
+    return None
+
+
+def _reduce(sid, t, v, t0, t1, buckets):
+    """Keep the min and max point of every (series, time bucket) group."""
+    keep = ~np.isnan(v)
+    sid, t, v = sid[keep], t[keep], v[keep]
+    if not len(v):
+        return sid, t, v
+    scale = buckets / (t1 - t0) if t1 > t0 else 0.0
+    bucket = np.clip(((t - t0) * scale).astype(np.int64), 0, buckets - 1)
+    group = sid * buckets + bucket
+    # Sorted by group, then value (then time, so ties keep the earliest point)
+    order = np.lexsort((t, v, group))
+    group = group[order]
+    edge = np.flatnonzero(np.diff(group)) + 1
+    first = np.concatenate(([0], edge))
+    last = np.concatenate((edge - 1, [len(group) - 1]))
+    picked = order[np.union1d(first, last)]
+    return sid[picked], t[picked], v[picked]
+
+
+def _lines(path, start, end, chunk_size=1 << 22):
+    """Yield ``(offset, text)`` for every line starting in [start, end) of ``path``."""
+    with open(path, "rb") as f:
+        if start:
+            # A line starting before ``start`` belongs to the previous range; one starting at it is ours
+            f.seek(start - 1)
+            start += len(f.readline()) - 1
+        else:
+            f.seek(0)
+        tail = b""
+        offset = start
+        while offset < end:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                if tail:
+                    yield offset, tail.decode("utf-8", "replace")
+                return
+            chunk = tail + chunk
+            cut = chunk.rfind(b"\n") + 1
+            chunk, tail = chunk[:cut], chunk[cut:]
+            for line in chunk.decode("utf-8", "replace").split("\n")[:-1]:
+                if offset >= end:
+                    return
+                yield offset, line
+                offset += (len(line) if line.isascii() else len(line.encode("utf-8"))) + 1
+
+
+def _scan_range(path, start, end, t0, t1, buckets):
+    """Reduce the lines starting in [start, end) of ``path``; runs in a worker process."""
+    sources = {}
+    state = {metric: (np.empty(0, np.int64), np.empty(0), np.empty(0)) for metric in METRICS}
+    lines = skipped = 0
+    block_sid, block_t, block_v = [], [], {metric: [] for metric in METRICS}
+    nan = float("nan")
+    last_stamp = None
+    timed = t0 is not None
+
+    def flush():
+        sid = np.array(block_sid, np.int64)
+        t = np.array(block_t)
+        for metric in METRICS:
+            old_sid, old_t, old_v = state[metric]
+            state[metric] = _reduce(np.concatenate((old_sid, sid)), np.concatenate((old_t, t)),
+                                    np.concatenate((old_v, np.array(block_v[metric], float))), *bounds, buckets)
+            block_v[metric].clear()
+        block_sid.clear()
+        block_t.clear()
+
+    bounds = (t0, t1) if timed else (0.0, float(os.path.getsize(path)))
+    append_sid, append_t = block_sid.append, block_t.append
+    appends = [(metric, block_v[metric].append) for metric in METRICS]
+    for offset, line in _lines(path, start, end):
+        lines += 1
+        record = parse_record(line)
+        message = _message(record) if record is not None else None
+        if message is None:
+            skipped += 1
+            continue
+        source, stamp, payload = message
+        if not timed:
+            stamp = float(offset)
+        elif stamp is not None:
+            last_stamp = stamp
+        elif last_stamp is not None:
+            stamp = last_stamp
+        else:
+            # Nothing timestamped yet in this range: place it by file position
+            stamp = t0 + (t1 - t0) * offset / bounds[1]
+        sid = sources.get(source)
+        if sid is None:
+            sid = sources[source] = len(sources)
+        append_sid(sid)
+        append_t(stamp)
+        for metric, append in appends:
+            value = payload.get(metric)
+            append(value if value.__class__ in (int, float) else nan)
+        if len(block_sid) >= BLOCK_LINES:
+            flush()
+    flush()
+    return list(sources), state, lines, skipped
+
+
+def read_telemetry(path, buckets=2048, workers=None):
+    """Stream ``path`` into min/max-per-bucket series (see the module docstring)."""
+    size = os.path.getsize(path)
+    t0 = _probe_time(path, size, tail=False)
+    t1 = _probe_time(path, size, tail=True) if t0 is not None else None
+    if t1 is not None and t1 < t0:
+        t0, t1 = t1, t0
+
+    workers = max(1, min(workers or os.cpu_count() or 1, size // (1 << 20) or 1))
+    edges = [size * i // workers for i in range(workers + 1)]
+    args = [(path, edges[i], edges[i + 1], t0, t1, buckets) for i in range(workers)]
+    if workers == 1:
+        results = [_scan_range(*args[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_scan_range, *zip(*args)))
+
+    # Merge: renumber each worker's sources, then reduce the union once more
+    names = sorted({name for result in results for name in result[0]})
+    index = {name: i for i, name in enumerate(names)}
+    bounds = (t0, t1) if t0 is not None else (0.0, float(size))
+    series = {}
+    for metric in METRICS:
+        sid = np.concatenate([np.array([index[n] for n in r[0]], np.int64)[r[1][metric][0]] for r in results])
+        t = np.concatenate([r[1][metric][1] for r in results])
+        v = np.concatenate([r[1][metric][2] for r in results])
+        sid, t, v = _reduce(sid, t, v, *bounds, buckets)
+        for i, name in enumerate(names):
+            mine = sid == i
+            if mine.any():
+                order = np.argsort(t[mine], kind="stable")
+                series[name, metric] = (t[mine][order], v[mine][order])
+    return Telemetry(series, t0, t1, sum(r[2] for r in results), sum(r[3] for r in results), size)
+
+
+def lttb(x, y, threshold):
+    """Largest-triangle-three-buckets: thin (x, y) to ``threshold`` points keeping its shape."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+    every = (n - 2) / (threshold - 2)
+    picked = np.empty(threshold, np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = int(i * every) + 1, int((i + 1) * every) + 1
+        next_lo, next_hi = hi, min(int((i + 2) * every) + 1, n)
+        avg_x, avg_y = x[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = picked[i + 1] = lo + int(area.argmax())
+    return x[picked], y[picked]
+
+
+def _time_axis(span):
+    # Unit that keeps the x axis readable for anything from seconds to weeks
+    for limit, unit, label in ((120, 1, "seconds"), (2 * 3600, 60, "minutes"), (float("inf"), 3600, "hours")):
+        if span < limit:
+            return unit, label
+
+
+def telemetry_slides(telemetry, points=400, title="Recorded Telemetry"):
+    """One slide of four charts (smoke, co2, pm25, temp), one line per room/source."""
+    sources = sorted({source for source, _ in telemetry.series})
+    colors = {source: SERIES_COLORS[i % len(SERIES_COLORS)] for i, source in enumerate(sources)}
+    if telemetry.start is not None:
+        origin, (unit, label) = telemetry.start, _time_axis(telemetry.end - telemetry.start)
+        start = datetime.datetime.fromtimestamp(telemetry.start, datetime.timezone.utc)
+        x_title = f"{label} since {start:%Y-%m-%d %H:%M} UTC"
+    else:
+        origin, unit, x_title = 0.0, max(telemetry.bytes, 1) / 100.0, "position in capture (%)"
+
+    elements = [
+        {"type": "title", "text": title},
+        {"type": "text", "text": f"{telemetry.lines - telemetry.skipped:,} messages, {len(sources)} sources",
+         "box": [0.5, 1.25, 12.333, 0.4], "size": 14},
+    ]
+    for i, metric in enumerate(METRICS):
+        series = []
+        for source in sources:
+            if (source, metric) not in telemetry.series:
+                continue
+            t, v = telemetry.series[source, metric]
+            x, y = lttb((t - origin) / unit, v, points)
+            series.append({"name": source, "color": colors[source],
+                           "x": [round(float(value), 4) for value in x], "y": [float(value) for value in y]})
+        if series:
+            left, top = 0.5 + (i % 2) * 6.3, 1.7 + (i // 2) * 2.85
+            elements.append({"type": "chart", "box": [left, top, 6.1, 2.75], "title": METRIC_LABELS[metric],
+                             "x_title": x_title, "series": series})
+    return [{"name": "telemetry", "elements": elements}]